@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import argparse
+import gzip
+from multiprocessing import get_context
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+#local libraries
+from ppanggolin.formats.writeSequences import read_fasta_gbk
+from ppanggolin.annotate import read_org_gbff, create_gene, get_dna_sequence
+from ppanggolin.genome import Organism
+from ppanggolin.utils import read_compressed_or_not
+
+### Times the streaming GBFF reader (read_gbff_records, through read_org_gbff and read_fasta_gbk) against the parser it replaced,
+### which read the whole file in a list of lines. Each parser runs in a new process, whose peak RSS is reported.
+### With ppanggolin installed, from the repository: python benchmarks/gbffParser.py [--concatenate 10]
+
+def former_read_org_gbff(organism, gbff_file_path, circular_contigs, getSeq, pseudo = False):
+    """ reads a gbff file and fills Organism, Contig and Genes objects based on information contained in this file (ppanggolin.annotate before the streaming reader) """
+    org = Organism(organism)
+    lines = read_compressed_or_not(gbff_file_path).readlines()[::-1]
+    geneCounter = 0
+    rnaCounter = 0
+    while len(lines) != 0:
+        line = lines.pop()
+        if line.startswith('LOCUS'):
+            is_circ = False
+            if "CIRCULAR" in line.upper():
+                is_circ = True
+            contigLocusID = line.split()[1]
+            setContig = False
+            while not line.startswith('FEATURES'):
+                if line.startswith('VERSION'):
+                    contigID = line[12:].strip()
+                    if contigID != "":
+                        if contigID in circular_contigs:
+                            is_circ = True
+                        contig = org.getOrAddContig(contigID, is_circ)
+                        setContig = True
+                line = lines.pop()
+        if not setContig:
+            if contigLocusID in circular_contigs:
+                is_circ = True
+            contig = org.getOrAddContig(contigLocusID, is_circ)
+        dbxref = set()
+        gene_name = ""
+        product = ""
+        locus_tag = ""
+        objType = ""
+        protein_id = ""
+        genetic_code = ""
+        usefulInfo = False
+        start = None
+        end = None
+        strand = None
+        line = lines.pop()
+        while not line.startswith("ORIGIN"):
+            currType = line[5:21].strip()
+            if currType != "":
+                if usefulInfo:
+                    create_gene(org, contig, geneCounter, rnaCounter, locus_tag, dbxref, start, end, strand, objType, len(contig.genes), gene_name, product, genetic_code, protein_id)
+                    if objType == "CDS":
+                        geneCounter+=1
+                    else:
+                        rnaCounter+=1
+                usefulInfo = False
+                objType = currType
+                if objType in ['CDS','rRNA','tRNA']:
+                    dbxref = set()
+                    gene_name = ""
+                    try:
+                        if not 'join' in line[21:]:
+                            usefulInfo = True
+                            if line[21:].startswith('complement('):
+                                strand = "-"
+                                start, end = line[32:].replace(')', '').split("..")
+                            else:
+                                strand = "+"
+                                start, end = line[21:].strip().split('..')
+                            if '>' in start or '<' in start or '>' in end or '<' in end:
+                                usefulInfo = False
+                    except ValueError:
+                        pass
+            elif usefulInfo:
+                if line[21:].startswith("/db_xref"):
+                    dbxref.add(line.split("=")[1].replace('"', '').strip())
+                elif line[21:].startswith("/locus_tag"):
+                    locus_tag = line.split("=")[1].replace('"', '').strip()
+                elif line[21:].startswith("/protein_id"):
+                    protein_id = line.split("=")[1].replace('"', '').strip()
+                elif line[21:].startswith('/gene'):
+                    gene_name = line.split("=")[1].replace('"', '').strip()
+                elif line[21:].startswith('/transl_table'):
+                    genetic_code = line.split("=")[1].replace('"', '').strip()
+                elif line[21:].startswith('/product'):
+                    product = line.split('=')[1].replace('"', '').strip()
+                    if line.count('"') == 1:
+                        line = lines.pop()
+                        product += line.strip().replace('"', '')
+                        while line.count('"') != 1:
+                            line = lines.pop()
+                            product += line.strip().replace('"', '')
+                elif line[21:].startswith("/pseudo") and not pseudo:
+                    usefulInfo = False
+                elif line[21:].startswith("/transl_except"):
+                    usefulInfo = False
+            line = lines.pop()
+        if usefulInfo:
+            create_gene(org, contig, geneCounter, rnaCounter, locus_tag, dbxref, start, end, strand, objType, len(contig.genes), gene_name, product, genetic_code, protein_id)
+            if objType == "CDS":
+                geneCounter+=1
+            else:
+                rnaCounter+=1
+        if getSeq:
+            line = lines.pop()
+            sequence = ""
+            while not line.startswith('//'):
+                sequence += line[10:].replace(" ", "").strip().upper()
+                line = lines.pop()
+            for gene in contig.genes:
+                gene.add_dna(get_dna_sequence(sequence, gene))
+    return org, True
+
+def former_read_fasta_gbk(filename):
+    """ reads the contig sequences of a gbff file (ppanggolin.formats.writeSequences before the streaming reader) """
+    sequence_dict = {}
+    line = ""
+    lines = read_compressed_or_not(filename).readlines()[::-1]
+    while len(lines) != 0:
+        line = lines.pop()
+        if line.startswith('LOCUS'):
+            contigLocusID = line.split()[1]
+            while not line.startswith('FEATURES'):
+                if line.startswith('VERSION'):
+                    contigID = line[12:].strip()
+                line = lines.pop()
+        if contigID == "":
+            contigID = contigLocusID
+        while not line.startswith("ORIGIN"):
+            line = lines.pop()
+        line = lines.pop()
+        sequence = ""
+        while not line.startswith('//'):
+            sequence += line[10:].replace(" ", "").strip().upper()
+            line = lines.pop()
+        sequence_dict[contigID] = sequence
+    return sequence_dict
+
+def genes(org):
+    return sorted( (gene.contig.name, gene.start, gene.stop, gene.strand, gene.type, gene.dna) for gene in org.genes )
+
+def check(fileNames):
+    """checks that both parsers read the same genes and contig sequences"""
+    differ = []
+    for fileName in fileNames:
+        if genes(read_org_gbff("org", fileName, [], True)[0]) != genes(former_read_org_gbff("org", fileName, [], True)[0]) or \
+           read_fasta_gbk(fileName) != former_read_fasta_gbk(fileName):
+            differ.append(fileName)
+    print(f"{len(fileNames) - len(differ)} / {len(fileNames)} files read identically by both parsers")
+    for fileName in differ:
+        print(f"  differs: {fileName}")
+
+def read_organisms(fileNames):
+    for fileName in fileNames:
+        read_org_gbff("org", fileName, [], True)
+
+def former_read_organisms(fileNames):
+    for fileName in fileNames:
+        former_read_org_gbff("org", fileName, [], True)
+
+def read_sequences(fileNames):
+    for fileName in fileNames:
+        read_fasta_gbk(fileName)
+
+def former_read_sequences(fileNames):
+    for fileName in fileNames:
+        former_read_fasta_gbk(fileName)
+
+def run(func, fileNames):
+    """runs func in this process and returns the time it took and the peak RSS of the process"""
+    start = time.perf_counter()
+    func(fileNames)
+    return time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def timed(name, func, fileNames):
+    """runs func on the files in a new process and prints the time it took and the peak RSS of that process"""
+    with get_context("spawn").Pool(processes = 1) as p:
+        elapsed, peak = p.apply(run, (func, fileNames))
+    print(f"{name:<40}{elapsed:>10.2f}s{peak / 2 ** 20:>10.0f} MiB")
+    return elapsed
+
+def concatenate(fileNames, times, output):
+    """writes a gzipped gbff file with the records of all the given files, times times"""
+    with gzip.open(output, "wt", compresslevel = 1) as out:
+        for _ in range(times):
+            for fileName in fileNames:
+                with read_compressed_or_not(fileName) as gbff:
+                    shutil.copyfileobj(gbff, out)
+    print(f"{output}: {os.path.getsize(output) / 2 ** 20:.0f} MiB gzipped")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Times the streaming GBFF reader against the parser it replaced.",
+                                     formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--organisms", type = str, default = "testingDataset/organisms.gbff.list", help = "list of the GBFF files, as given to 'annotate --anno'")
+    parser.add_argument("--concatenate", type = int, default = 0, help = "also time a single GBFF file with the records of all the files, repeated this number of times")
+    parser.add_argument("--skip_check", action = "store_true", help = "do not check that both parsers read the same genes and sequences")
+    args = parser.parse_args()
+
+    listDir = os.path.dirname(os.path.abspath(args.organisms))
+    with open(args.organisms) as organisms:
+        fileNames = [ os.path.join(listDir, line.split("\t")[1].strip()) for line in organisms if line.strip() != "" ]
+    if not args.skip_check:
+        check(fileNames)
+    benches = [(f"{len(fileNames)} files", fileNames)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.concatenate > 0:
+            concatenated = os.path.join(tmpdir, "concatenated.gbff.gz")
+            concatenate(fileNames, args.concatenate, concatenated)
+            benches.append((os.path.basename(concatenated), [concatenated]))
+        for name, files in benches:
+            print(name)
+            timed("  read_org_gbff", read_organisms, files)
+            timed("  former read_org_gbff", former_read_organisms, files)
+            timed("  read_fasta_gbk", read_sequences, files)
+            timed("  former read_fasta_gbk", former_read_sequences, files)
+
+if __name__ == "__main__":
+    main()
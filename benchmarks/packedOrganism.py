@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import argparse
+from multiprocessing import Pool
+import random
+import time
+
+#local libraries
+from syntheticPangenome import make_organism
+from ppanggolin.genome import PackedOrganism
+
+### Times the transfer of annotated organisms from a pool of workers to the parent process, as Organism objects or as PackedOrganism,
+### in genomes per second of wall time and of cpu time of the parent. Each worker annotates nothing and returns the same organism,
+### built once with its gene sequences, so that only the pickling, the pipe and the unpickling are timed.
+### With ppanggolin installed: python benchmarks/packedOrganism.py [--cpu 32] [--genomes 400]
+
+worker_org = None
+
+def init_worker(genes, seed):
+    global worker_org
+    rng = random.Random(seed)
+    worker_org = make_organism("genome", list(range(genes)), 2, rng, dna = True)[0]
+
+def send_organism(i):
+    return worker_org
+
+def send_packed(i):
+    return PackedOrganism(worker_org)
+
+def timed(name, func, genomes, cpu, genes, seed, unpack = False):
+    """receives genomes organisms from a pool of cpu workers and prints the throughput"""
+    with Pool(processes = cpu, initializer = init_worker, initargs = (genes, seed)) as p:
+        p.map(int, range(cpu))#the workers are started and have built their organism before the timing
+        start = time.perf_counter()
+        startCpu = time.process_time()
+        for org in p.imap_unordered(func, range(genomes)):
+            if unpack:
+                org.unpack()
+        elapsed = time.perf_counter() - start
+        elapsedCpu = time.process_time() - startCpu
+    print(f"{name:<30}{genomes / elapsed:>10.1f} genomes/s{genomes / elapsedCpu:>10.1f} genomes/cpu-s in the parent")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Times the transfer of annotated organisms from a pool of workers, as Organism objects or as PackedOrganism.",
+                                     formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--cpu", type = int, default = 32, help = "number of workers")
+    parser.add_argument("--genomes", type = int, default = 400, help = "number of genomes sent to the parent")
+    parser.add_argument("--genes", type = int, default = 900, help = "number of genes of each genome")
+    parser.add_argument("--seed", type = int, default = 42)
+    args = parser.parse_args()
+
+    print(f"{args.genomes} genomes of {args.genes} genes, {args.cpu} workers")
+    timed("Organism", send_organism, args.genomes, args.cpu, args.genes, args.seed)
+    timed("PackedOrganism", send_packed, args.genomes, args.cpu, args.genes, args.seed)
+    timed("PackedOrganism + unpack", send_packed, args.genomes, args.cpu, args.genes, args.seed, unpack = True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import argparse
+import gc
+import time
+import tracemalloc
+
+#local libraries
+from syntheticPangenome import make_pangenome
+
+### Measures the memory taken by the objects of a pangenome (organisms, contigs, genes, gene families and neighbors graph),
+### on a synthetic pangenome of 5000 genomes of 150 genes by default. The memory is the one traced by tracemalloc once the pangenome is built.
+### To compare with another version of ppanggolin, run it with that version first in the PYTHONPATH.
+### With ppanggolin installed: python benchmarks/pangenomeMemory.py [--genomes 5000] [--genes 150]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measures the memory taken by the objects of a synthetic pangenome.",
+                                     formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--genomes", type = int, default = 5000, help = "number of genomes")
+    parser.add_argument("--genes", type = int, default = 150, help = "number of genes of each genome")
+    parser.add_argument("--no_graph", action = "store_true", help = "do not compute the neighbors graph")
+    parser.add_argument("--seed", type = int, default = 42)
+    args = parser.parse_args()
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    pangenome = make_pangenome(args.genomes, args.genes, seed = args.seed, graph = not args.no_graph)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nbGenes = sum( org.number_of_genes() for org in pangenome.organisms )
+    print(f"{args.genomes} genomes, {nbGenes} genes, {len(pangenome.geneFamilies)} families, {len(pangenome.edges)} edges, built in {elapsed:.1f}s")
+    print(f"memory: {current / 2 ** 20:.0f} MiB ({current / nbGenes:.0f} B/gene), peak {peak / 2 ** 20:.0f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import argparse
+import os
+import tempfile
+import time
+
+#local libraries
+from syntheticPangenome import make_pangenome
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.formats import writePangenome, readPangenome
+
+### Times the loading of a pangenome file: the annotations, then the gene families and then the neighbors graph,
+### on a synthetic pangenome with the layout of the testingDataset scaled up (200 genomes of 1500 genes by default), or on the given pangenome files.
+### Files written by a release before the column layout (--legacy) are read with the legacy readers.
+### With ppanggolin installed: python benchmarks/readPangenome.py [--genomes 200] [--legacy old_pangenome.h5]
+
+def load(fileName, **parts):
+    """reads the given parts of the pangenome file in a new pangenome, and returns the time it took"""
+    pangenome = Pangenome()
+    pangenome.addFile(fileName)
+    start = time.perf_counter()
+    readPangenome(pangenome, show_bar = False, **parts)
+    return time.perf_counter() - start
+
+def timed(name, fileName, repeat, **parts):
+    """prints the best loading time out of repeat"""
+    elapsed = min(load(fileName, **parts) for _ in range(repeat))
+    print(f"{name:<40}{elapsed:>10.2f}s")
+    return elapsed
+
+def bench(name, fileName, repeat, graph = True):
+    print(name)
+    timed("  annotations", fileName, repeat, annotation = True)
+    timed("  + families", fileName, repeat, annotation = True, geneFamilies = True)
+    if graph:
+        timed("  + graph", fileName, repeat, annotation = True, geneFamilies = True, graph = True)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Times the loading of pangenome files.",
+                                     formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--genomes", type = int, default = 200, help = "number of genomes of the synthetic pangenome")
+    parser.add_argument("--genes", type = int, default = 1500, help = "number of genes of each genome")
+    parser.add_argument("--pangenome", type = str, nargs = "*", default = [], help = "pangenome files to time instead of the synthetic one")
+    parser.add_argument("--legacy", type = str, nargs = "*", default = [], help = "pangenome files written by a release before the column layout, to time the legacy readers")
+    parser.add_argument("--repeat", type = int, default = 2, help = "the best time out of this number of loadings is reported")
+    parser.add_argument("--seed", type = int, default = 42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fileNames = args.pangenome
+        if len(fileNames) == 0 and len(args.legacy) == 0:
+            start = time.perf_counter()
+            pangenome = make_pangenome(args.genomes, args.genes, seed = args.seed)
+            nbGenes = sum( org.number_of_genes() for org in pangenome.organisms )
+            fileName = os.path.join(tmpdir, "pangenome.h5")
+            writePangenome(pangenome, fileName, False, show_bar = False)
+            del pangenome
+            print(f"synthetic pangenome of {args.genomes} genomes and {nbGenes} genes written in {time.perf_counter() - start:.2f}s")
+            fileNames = [fileName]
+        for fileName in fileNames:
+            bench(fileName, fileName, args.repeat)
+        for fileName in args.legacy:
+            bench(f"{fileName} (legacy)", fileName, args.repeat)
+
+if __name__ == "__main__":
+    main()
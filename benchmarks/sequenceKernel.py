@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+#installed libraries
+import numpy
+
+#local libraries
+from ppanggolin.genetic_codes import genetic_codes
+from ppanggolin.sequenceKernel import reverse_complement, get_dna_sequence, translate, translate_all, pack_dna, unpack_dna
+
+### Times the functions of ppanggolin.sequenceKernel against the pure python ones they replaced, on random genes sliced from a random contig.
+### With ppanggolin installed: python benchmarks/sequenceKernel.py [--genes 1000000]
+
+def former_reverse_complement(seq):
+    """ reverse complement the given dna sequence (ppanggolin.annotate.synta before the kernel) """
+    complement = {'A':  'T', 'C':  'G', 'G':  'C', 'T':  'A', 'N': 'N', 'R': 'Y', 'Y': 'R',
+                  'S': 'S', 'W': 'W', 'K': 'M', 'M': 'K', 'B': 'V', 'V': 'B', 'D': 'H', 'H': 'D'}
+    rcseq = ""
+    for i in reversed(seq):
+        rcseq += complement[i]
+    return rcseq
+
+def former_get_dna_sequence(contigSeq, gene):
+    if gene.strand == "+":
+        return contigSeq[gene.start-1:gene.stop]
+    elif gene.strand == "-":
+        return former_reverse_complement(contigSeq[gene.start-1:gene.stop])
+
+def former_translate(seq, code):
+    """ translates the given dna sequence with the given translation table (ppanggolin.formats.writeMSA before the kernel) """
+    start_table = code["start_table"]
+    table = code["trans_table"]
+    protein = start_table.get(seq[0: 3], 'X')#the former function raised a KeyError for undetermined start codons
+    for i in range(3, len(seq), 3):
+        codon = seq[i: i + 3]
+        try:
+            protein += table[codon]
+        except KeyError:
+            protein += 'X'
+    return protein
+
+def make_genes(nbGenes, contigLength, minLength, maxLength, ambiguity, seed):
+    """a random contig with a fraction `ambiguity` of IUPAC ambiguity codes, and random genes on it with a length that is a multiple of 3"""
+    rng = numpy.random.default_rng(seed)
+    contig = numpy.frombuffer(b"ACGT", dtype = numpy.uint8)[rng.integers(0, 4, contigLength)]
+    ambiguous = rng.random(contigLength) < ambiguity
+    contig[ambiguous] = numpy.frombuffer(b"NRYSWKMBVDH", dtype = numpy.uint8)[rng.integers(0, 11, numpy.count_nonzero(ambiguous))]
+    lengths = rng.integers(minLength // 3, maxLength // 3 + 1, nbGenes) * 3
+    starts = rng.integers(1, contigLength - lengths + 2)
+    strands = rng.choice(["+", "-"], nbGenes)
+    genes = [ SimpleNamespace(start = start, stop = start + length - 1, strand = strand) for start, length, strand in zip(starts.tolist(), lengths.tolist(), strands.tolist()) ]
+    return contig.tobytes().decode("ascii"), genes
+
+def timed(name, func, items):
+    """calls func on each item and prints the time it took"""
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40}{elapsed:>10.2f}s")
+    return elapsed
+
+def check(contig, genes, code):
+    """checks that the kernel gives the same results as the former functions"""
+    codeTable = genetic_codes(code)
+    for gene in genes:
+        seq = get_dna_sequence(contig, gene)
+        assert seq == former_get_dna_sequence(contig, gene)
+        assert reverse_complement(seq) == former_reverse_complement(seq)
+        assert translate(seq, code) == former_translate(seq, codeTable)
+    seqs = [ get_dna_sequence(contig, gene) for gene in genes ]
+    for seq, protein in zip(seqs, translate_all(seqs, code)):
+        if protein is not None:
+            assert protein[1:].decode() == translate(seq, code)[1:]
+    data = numpy.frombuffer("".join(seqs).encode("ascii"), dtype = numpy.uint8)
+    padded = numpy.concatenate([data, numpy.zeros(-len(data) % 4, dtype = numpy.uint8)])
+    packed, exceptions, exceptionBases = pack_dna(padded)
+    unpacked = unpack_dna(packed, 0, len(data)).copy()
+    unpacked[exceptions[exceptions < len(data)]] = exceptionBases[exceptions < len(data)]
+    assert unpacked.tobytes() == data.tobytes()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Times the functions of ppanggolin.sequenceKernel against the pure python ones they replaced.",
+                                     formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--genes", type = int, default = 10 ** 6, help = "number of genes")
+    parser.add_argument("--contig_length", type = int, default = 10 ** 7, help = "length of the contig the genes are sliced from")
+    parser.add_argument("--min_length", type = int, default = 300, help = "minimal length of the genes")
+    parser.add_argument("--max_length", type = int, default = 1200, help = "maximal length of the genes")
+    parser.add_argument("--ambiguity", type = float, default = 0.0001, help = "fraction of the bases that are IUPAC ambiguity codes")
+    parser.add_argument("--batch", type = int, default = 10000, help = "number of genes translated or packed at once by the batch functions")
+    parser.add_argument("--code", type = str, default = "11", help = "genetic code")
+    parser.add_argument("--skip_former", action = "store_true", help = "do not time the former functions, which are much slower")
+    parser.add_argument("--seed", type = int, default = 42)
+    args = parser.parse_args()
+
+    contig, genes = make_genes(args.genes, args.contig_length, args.min_length, args.max_length, args.ambiguity, args.seed)
+    print(f"{len(genes)} genes of {args.min_length} to {args.max_length} nt")
+    check(contig, random.Random(args.seed).sample(genes, min(len(genes), 2000)), args.code)
+    codeTable = genetic_codes(args.code)
+
+    timed("get_dna_sequence", lambda gene : get_dna_sequence(contig, gene), genes)
+    if not args.skip_former:
+        timed("former get_dna_sequence", lambda gene : former_get_dna_sequence(contig, gene), genes)
+    sequences = ( contig[gene.start-1:gene.stop] for gene in genes )
+    timed("reverse_complement", reverse_complement, sequences)
+    if not args.skip_former:
+        sequences = ( contig[gene.start-1:gene.stop] for gene in genes )
+        timed("former reverse_complement", former_reverse_complement, sequences)
+    sequences = ( contig[gene.start-1:gene.stop] for gene in genes )
+    timed("translate", lambda seq : translate(seq, args.code), sequences)
+    if not args.skip_former:
+        sequences = ( contig[gene.start-1:gene.stop] for gene in genes )
+        timed("former translate", lambda seq : former_translate(seq, codeTable), sequences)
+
+    batches = ( [ contig[gene.start-1:gene.stop] for gene in genes[first:first + args.batch] ] for first in range(0, len(genes), args.batch) )
+    timed(f"translate_all (batches of {args.batch})", lambda seqs : translate_all(seqs, args.code), batches)
+    def pack_unpack(seqs):
+        data = numpy.frombuffer("".join(seqs).encode("ascii"), dtype = numpy.uint8)
+        packed = pack_dna(numpy.concatenate([data, numpy.zeros(-len(data) % 4, dtype = numpy.uint8)]))[0]
+        unpack_dna(packed, 0, len(data))
+    batches = ( [ contig[gene.start-1:gene.stop] for gene in genes[first:first + args.batch] ] for first in range(0, len(genes), args.batch) )
+    timed(f"pack_dna + unpack_dna (batches of {args.batch})", pack_unpack, batches)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import random
+
+#local libraries
+from ppanggolin.genome import Organism, Gene, RNA
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.graph import computeNeighborsGraph
+
+### Builds an annotated, clustered and partitionned pangenome with a layout like the one of the testingDataset, scaled up, for the benchmarks of this directory.
+### The core families are in every genome, the shell families in about half of them and each genome has its own cloud families.
+
+def make_organism(name, families, nbContigs, rng, dna = False):
+    """an organism whose genes are split on nbContigs contigs, in the given family order. Returns the organism and the family of each of its genes."""
+    org = Organism(name)
+    genes = []
+    perContig = -(-len(families) // nbContigs)
+    for c in range(nbContigs):
+        contig = org.getOrAddContig(f"{name}_contig{c}", is_circular = c == 0)
+        position = 0
+        start = 1
+        for fam in families[c * perContig:(c + 1) * perContig]:
+            length = rng.randrange(100, 400) * 3
+            gene = Gene(f"{name}_CDS_{len(genes):05d}")
+            gene.fill_annotations(start = start, stop = start + length - 1, strand = rng.choice("+-"), geneType = "CDS", position = position,
+                                  name = f"gene{fam}" if fam % 3 == 0 else "", product = f"product of family {fam}", genetic_code = 11)
+            gene.fill_parents(org, contig)
+            if dna:
+                gene.add_dna("ATG" + "".join(rng.choice("ACGT") for _ in range(length - 6)) + "TAA")
+            contig.addGene(gene)
+            genes.append((gene, fam))
+            position += 1
+            start += length + rng.randrange(0, 200)
+        rna = RNA(f"{name}_tRNA_{c}")
+        rna.fill_annotations(start = start, stop = start + 75, strand = "+", geneType = "tRNA", product = "tRNA-Ala")
+        rna.fill_parents(org, contig)
+        contig.addRNA(rna)
+    return org, genes
+
+def make_pangenome(nbGenomes, genesPerGenome, nbContigs = 2, core = 0.6, shell = 0.3, seed = 42, dna = False, graph = True):
+    """
+        Builds a pangenome of nbGenomes genomes of about genesPerGenome genes each, a fraction `core` of them in core families,
+        a fraction `shell` of them in shell families and the others in cloud families.
+    """
+    rng = random.Random(seed)
+    nbCore = int(genesPerGenome * core)
+    nbShell = int(genesPerGenome * shell * 2)#each shell family is in half of the genomes
+    nbCloud = genesPerGenome - nbCore - nbShell // 2
+    pangenome = Pangenome()
+    famObjs = {}
+    for i in range(nbGenomes):
+        families = list(range(nbCore)) + [ fam for fam in range(nbCore, nbCore + nbShell) if rng.random() < 0.5 ]
+        families += [ nbCore + nbShell + i * nbCloud + j for j in range(nbCloud) ]
+        org, genes = make_organism(f"genome{i}", families, nbContigs, rng, dna = dna)
+        pangenome.addOrganism(org)
+        for gene, fam in genes:
+            famObj = famObjs.get(fam)
+            if famObj is None:
+                famObj = famObjs[fam] = pangenome.addGeneFamily(f"family{fam}")
+                famObj.addSequence("M" + "".join(rng.choice("ACDEFGHIKLMNPQRSTVWY") for _ in range(100)))
+                famObj.partition = "P" if fam < nbCore else "S1" if fam < nbCore + nbShell else "C1"
+            famObj.addGene(gene)
+    pangenome.status["genomesAnnotated"] = "Computed"
+    pangenome.status["genesClustered"] = "Computed"
+    pangenome.status["geneFamilySequences"] = "Computed"
+    pangenome.status["partitionned"] = "Computed"
+    if dna:
+        pangenome.status["geneSequences"] = "Computed"
+    pangenome.parameters["cluster"] = {"coverage" : 0.8, "identity" : 0.8, "defragmentation" : False, "translation_table" : "11"}
+    pangenome.parameters["partition"] = {"K" : 3}
+    if graph:
+        computeNeighborsGraph(pangenome, show_bar = False)
+    return pangenome
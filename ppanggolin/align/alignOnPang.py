@@ -10,6 +10,7 @@ from collections import defaultdict
 
 #local libraries
 from ppanggolin.formats import checkPangenomeInfo
+from ppanggolin.formats.lazyPangenome import LazyPangenome
 from ppanggolin.utils import mkOutdir, read_compressed_or_not
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.annotate import detect_filetype, read_org_gff, read_org_gbff
@@ -337,13 +338,13 @@ def align(pangenome, proteinFile, output, tmpdir, identity = 0.8, coverage=0.8,
 
 def launch(args):
     mkOutdir(args.output, args.force)
-    pangenome = Pangenome()
-    pangenome.addFile(args.pangenome)
-    if args.proteins is not None:
-        align(pangenome = pangenome, proteinFile = args.proteins, output = args.output, tmpdir = args.tmpdir, identity = args.identity, coverage =args.coverage, defrag =args.defrag,cpu= args.cpu, getinfo =args.getinfo, draw_related = args.draw_related )
+    with LazyPangenome() as pangenome:
+        pangenome.addFile(args.pangenome)
+        if args.proteins is not None:
+            align(pangenome = pangenome, proteinFile = args.proteins, output = args.output, tmpdir = args.tmpdir, identity = args.identity, coverage =args.coverage, defrag =args.defrag,cpu= args.cpu, getinfo =args.getinfo, draw_related = args.draw_related )
 
-    if args.annotation is not None:
-        projectRGP(pangenome, args.annotation, args.output, args.tmpdir, args.identity, args.coverage, args.defrag, args.cpu, args.translation_table, pseudo=args.use_pseudo)
+        if args.annotation is not None:
+            projectRGP(pangenome, args.annotation, args.output, args.tmpdir, args.identity, args.coverage, args.defrag, args.cpu, args.translation_table, pseudo=args.use_pseudo)
 
 def alignSubparser(subparser):
     parser = subparser.add_parser("align", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
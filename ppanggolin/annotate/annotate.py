@@ -3,20 +3,25 @@
 
 #default libraries
 import argparse
-from multiprocessing import Pool
+from multiprocessing import Pool, Semaphore
 import logging
 import os
 import time
+from collections import defaultdict
 
 #installed libraries
 from tqdm import tqdm
+import numpy
+import tables
 
 #local libraries
-from ppanggolin.annotate import  annotate_organism, read_fasta, get_dna_sequence
+from ppanggolin.annotate import  annotate_organism, read_fasta_records, setToolSlots, train_prodigal_on_genomes, PRODIGAL_TRAINING_SIZE
+from ppanggolin.sequenceKernel import get_dna_sequence, reverse_complement
+from ppanggolin.annotate.cache import cacheKey, readCachedOrganism, writeCachedOrganism
 from ppanggolin.pangenome import Pangenome
-from ppanggolin.genome import Organism, Gene, RNA
+from ppanggolin.genome import Organism, Gene, RNA, PackedOrganism
 from ppanggolin.utils import read_compressed_or_not, mkFilename, get_num_lines
-from ppanggolin.formats import writePangenome
+from ppanggolin.formats import AnnotationWriter, createPangenomeFile, SequenceWriter, SequenceReader, writeGeneIDIndex, writeStatus, readStringPool, getContigIndex
 
 def detect_filetype(filename):
     """ detects whether the current file is gff3, gbk/gbff, fasta or unknown. If unknown, it will raise an error"""
@@ -65,120 +70,115 @@ def create_gene(org, contig, geneCounter, rnaCounter, ID, dbxref, start, stop, s
         contig.addRNA(newGene)
     newGene.fill_parents(org, contig)
 
+def read_gbff_records(gbff_file_path, getSeq = True, types = None, keys = None):
+    """
+        Reads a gbff file one contig at a time, so that only the current contig is in memory.
+        For each contig, yields its identifier (the one in VERSION, or in LOCUS if there is none), whether LOCUS tells it is circular,
+        its features, and its uppercase sequence (None if getSeq is False).
+        Each feature is a tuple of its type, its location, and a dict of its qualifiers with the list of their values (without quotes, multi-line values being joined).
+        Only the features whose type is in types and the qualifiers whose key is in keys are read (all of them if None).
+    """
+    with read_compressed_or_not(gbff_file_path) as gbff:
+        lines = ( line for block in iter(lambda : gbff.readlines(1 << 16), []) for line in block )#reading about 64kB at a time is much faster than line by line
+        for line in lines:
+            if not line.startswith('LOCUS'):
+                continue
+            is_circ = "CIRCULAR" in line.upper()#this line contains linear/circular word telling if the dna sequence is circularized or not
+            contigID = line.split()[1]#If contigID is not specified in VERSION afterwards like with Prokka, in that case we use the one in LOCUS.
+            for line in lines:
+                if line.startswith('VERSION'):
+                    if line[12:].strip() != "":
+                        contigID = line[12:].strip()
+                elif line.startswith('FEATURES'):
+                    break
+
+            features = []
+            feature = None
+            inQualifiers = False
+            value = None#the parts of the value of the qualifier being read, None if it is not kept
+            quotes = 0#the number of quotes of the qualifier being read, which goes on while it is odd
+            for line in lines:
+                if line.startswith('ORIGIN'):
+                    break
+                currType = line[5:21].strip()
+                if currType != "":
+                    feature = None
+                    if types is None or currType in types:
+                        feature = (currType, [line[21:].strip()], {})
+                        features.append(feature)
+                    inQualifiers = False
+                    quotes = 0
+                elif feature is not None:
+                    content = line[21:].strip()
+                    if content.startswith('/') and quotes % 2 == 0:
+                        inQualifiers = True
+                        key, _, first = content[1:].partition('=')
+                        quotes = first.count('"')
+                        value = None
+                        if keys is None or key in keys:
+                            value = [first]
+                            feature[2].setdefault(key, []).append(value)
+                    elif not inQualifiers:#the location is on several lines
+                        feature[1].append(content)
+                    else:
+                        quotes += content.count('"')
+                        if value is not None:
+                            value.append(content)
+
+            sequence = None
+            if getSeq:
+                parts = []
+                for line in lines:
+                    if line.startswith('//'):
+                        break
+                    parts.append(line[10:].replace(" ", "").strip())
+                sequence = "".join(parts).upper()
+            else:
+                for line in lines:
+                    if line.startswith('//'):
+                        break
+            yield (contigID, is_circ, [ (currType, "".join(location), { key : [ "".join(value).replace('"', '') for value in values ] for key, values in qualifiers.items() })
+                                        for currType, location, qualifiers in features ], sequence)
+
+def read_gbff_location(location):
+    """
+        Reads the location of a feature of a gbff file.
+        returns its start, its end and its strand, or None if the location is not a single interval with known ends (joins, partial features...)
+    """
+    strand = "+"
+    if location.startswith('complement(') and location.endswith(')'):
+        strand = "-"
+        location = location[11:-1]
+    bounds = location.split('..')
+    if len(bounds) != 2 or not bounds[0].isdigit() or not bounds[1].isdigit():
+        return None
+    return int(bounds[0]), int(bounds[1]), strand
+
 def read_org_gbff(organism, gbff_file_path, circular_contigs, getSeq, pseudo = False):
     """ reads a gbff file and fills Organism, Contig and Genes objects based on information contained in this file """
     org = Organism(organism)
 
     logging.getLogger().debug("Extracting genes informations from the given gbff")
-    # revert the order of the file, to read the first line first.
-    lines = read_compressed_or_not(gbff_file_path).readlines()[::-1]
     geneCounter = 0
     rnaCounter = 0
-    while len(lines) != 0:
-        line = lines.pop()
-        # beginning of contig
-        if line.startswith('LOCUS'):
-            is_circ = False
-            if "CIRCULAR" in line.upper():#this line contains linear/circular word telling if the dna sequence is circularized or not
-                is_circ = True
-            contigLocusID = line.split()[1]#If contigID is not specified in VERSION afterwards like with Prokka, in that case we use the one in LOCUS.
-            setContig = False
-            while not line.startswith('FEATURES'):
-                if line.startswith('VERSION'):
-                    contigID = line[12:].strip()
-                    if contigID != "":
-                        if contigID in circular_contigs:
-                            is_circ = True
-                        contig = org.getOrAddContig(contigID, is_circ)
-                        setContig = True
-                line = lines.pop()
-        if not setContig:#if no contig ids were filled after VERSION, we use what was found in LOCUS for the contig ID. Should be unique in a dataset, but if there's an update the contig ID might still be the same even though it should not(?)
-            if contigLocusID in circular_contigs:
-                is_circ = True
-            contig = org.getOrAddContig(contigLocusID, is_circ)
-        # start of the feature object.
-        dbxref = set()
-        gene_name = ""
-        product = ""
-        locus_tag = ""
-        objType = ""
-        protein_id = ""
-        genetic_code = ""
-        usefulInfo = False
-        start = None
-        end = None
-        strand = None
-        line = lines.pop()
-        while not line.startswith("ORIGIN"):
-            currType = line[5:21].strip()
-            if currType != "":
-                if usefulInfo:
-                    create_gene(org, contig, geneCounter, rnaCounter, locus_tag, dbxref, start, end, strand, objType, len(contig.genes), gene_name, product, genetic_code, protein_id)
-                    if objType == "CDS":
-                        geneCounter+=1
-                    else:
-                        rnaCounter+=1
-                usefulInfo = False
-                objType = currType
-                if objType in ['CDS','rRNA','tRNA']:
-                    dbxref = set()
-                    gene_name = ""
-                    try:
-                        if not 'join' in line[21:]:
-                            usefulInfo = True
-                            if line[21:].startswith('complement('):
-                                strand = "-"
-                                start, end = line[32:].replace(
-                                    ')', '').split("..")
-                            else:
-                                strand = "+"
-                                start, end = line[21:].strip().split('..')
-                            if '>' in start or '<' in start or '>' in end or '<' in end:
-                                usefulInfo = False
-                    except ValueError:
-                        pass
-                        #don't know what to do with that, ignoring for now.
-                        #there is a protein with a frameshift mecanism.
-            elif usefulInfo:# current info goes to current objtype, if it's useful.
-                if line[21:].startswith("/db_xref"):
-                    dbxref.add(line.split("=")[1].replace('"', '').strip())
-                elif line[21:].startswith("/locus_tag"):
-                    locus_tag = line.split("=")[1].replace('"', '').strip()
-                elif line[21:].startswith("/protein_id"):
-                    protein_id = line.split("=")[1].replace('"', '').strip()
-                elif line[21:].startswith('/gene'):#gene name
-                    gene_name = line.split("=")[1].replace('"', '').strip()
-                elif line[21:].startswith('/transl_table'):
-                    genetic_code = line.split("=")[1].replace('"', '').strip()
-                elif line[21:].startswith('/product'):#need to loop as it can be more than one line long
-                    product = line.split('=')[1].replace('"', '').strip()
-                    if line.count('"') == 1:#then the product line is on multiple lines
-                        line = lines.pop()
-                        product += line.strip().replace('"', '')
-                        while line.count('"') != 1:
-                            line = lines.pop()
-                            product += line.strip().replace('"', '')
-                #if it's a pseudogene, we're not keeping it.
-                elif line[21:].startswith("/pseudo") and not pseudo:
-                    usefulInfo = False
-                #that's probably a 'stop' codon into selenocystein.
-                elif line[21:].startswith("/transl_except"):
-                    usefulInfo = False
-            line = lines.pop()
-            #end of contig
-        if usefulInfo:#saving the last element...
-            create_gene(org, contig, geneCounter, rnaCounter, locus_tag, dbxref, start, end, strand, objType, len(contig.genes), gene_name, product, genetic_code, protein_id)
+    for contigID, is_circ, features, sequence in read_gbff_records(gbff_file_path, getSeq, types = ['CDS','rRNA','tRNA'],
+                                                                   keys = ["locus_tag", "db_xref", "gene", "product", "transl_table", "protein_id", "pseudo", "pseudogene", "transl_except"]):
+        contig = org.getOrAddContig(contigID, is_circ or contigID in circular_contigs)
+        for objType, location, qualifiers in features:
+            #if it's a pseudogene, we're not keeping it. A 'stop' codon into selenocystein is not kept either.
+            if "transl_except" in qualifiers or (not pseudo and ("pseudo" in qualifiers or "pseudogene" in qualifiers)):
+                continue
+            coordinates = read_gbff_location(location)
+            if coordinates is None:#there is a protein with a frameshift mecanism, or a partial gene. Ignoring them.
+                continue
+            start, end, strand = coordinates
+            create_gene(org, contig, geneCounter, rnaCounter, qualifiers.get("locus_tag", [""])[-1], set(qualifiers.get("db_xref", [])), start, end, strand, objType, len(contig.genes),
+                        qualifiers.get("gene", [""])[-1], qualifiers.get("product", [""])[-1], qualifiers.get("transl_table", ["11"])[-1], qualifiers.get("protein_id", [""])[-1])
             if objType == "CDS":
                 geneCounter+=1
             else:
                 rnaCounter+=1
         if getSeq:
-            line = lines.pop()#first sequence line.
-            #if the seq was to be gotten, it would be here.
-            sequence = ""
-            while not line.startswith('//'):
-                sequence += line[10:].replace(" ", "").strip().upper()
-                line = lines.pop()
             #get each gene's sequence.
             for gene in contig.genes:
                 gene.add_dna(get_dna_sequence(sequence, gene))
@@ -221,20 +221,17 @@ def read_org_gff(organism, gff_file_path, circular_contigs, getSeq, pseudo = Fal
         return ElementID
 
     hasFasta = False
-    fastaString = ""
     org = Organism(organism)
     geneCounter = 0
     rnaCounter = 0
     with read_compressed_or_not(gff_file_path) as gff_file:
         for line in gff_file:
-            if hasFasta:
-                fastaString += line
-                continue
-            elif line.startswith('##',0,2):
+            if line.startswith('##',0,2):
                 if line.startswith('FASTA',2,7):
-                    if not getSeq:#if getting the sequences is useless...
-                        break
-                    hasFasta = True
+                    if getSeq:#if getting the sequences is useful, they are read from the rest of the file
+                        hasFasta = True
+                        read_gff_fasta(org, gff_file)
+                    break
                 elif line.startswith('sequence-region',2,17):
                     fields = [el.strip() for el in line.split()]
                     contig = org.getOrAddContig(fields[1], True if fields[1] in circular_contigs else False)
@@ -299,30 +296,59 @@ def read_org_gff(organism, gff_file_path, circular_contigs, getSeq, pseudo = Fal
                     rna.fill_parents(org, contig)
                     contig.addRNA(rna)
                     rnaCounter+=1
-    ### GET THE FASTA SEQUENCES OF THE GENES
-    if hasFasta and fastaString != "":
-        contigSequences = read_fasta( org, fastaString.split('\n'))
-        for contig in org.contigs:
-            for gene in contig.genes:
-                gene.add_dna(get_dna_sequence(contigSequences[contig.name], gene))
-            for rna in contig.RNAs:
-                rna.add_dna(get_dna_sequence(contigSequences[contig.name], rna))
     return org, hasFasta
 
+def read_gff_fasta(org, fnaFile):
+    """
+        Reads the ##FASTA section of a gff file one contig at a time, and gets the sequences of the genes of each contig as soon as its sequence is read,
+        so that only the sequence of the current contig is in memory.
+    """
+    read = set()
+    for name, sequence in read_fasta_records(fnaFile):
+        contig = org.getOrAddContig(name)
+        if sequence == "":
+            continue
+        sequence = sequence.upper()
+        for gene in contig.genes:
+            gene.add_dna(get_dna_sequence(sequence, gene))
+        for rna in contig.RNAs:
+            rna.add_dna(get_dna_sequence(sequence, rna))
+        read.add(contig)
+    missing = [ contig.name for contig in org.contigs if contig not in read and (len(contig.genes) > 0 or len(contig.RNAs) > 0) ]
+    if len(missing) > 0:
+        raise KeyError(f"The ##FASTA section of the gff file of {org.name} does not have the sequence of the contig(s) : {', '.join(missing)}")
+
 
 def launchReadAnno(args):
-    return readAnnoFile(*args)
+    org, hasSeq = readAnnoFile(*args)
+    return PackedOrganism(org), hasSeq
 
-def readAnnoFile(organism_name, filename, circular_contigs, getSeq, pseudo):
+def readAnnoFile(organism_name, filename, circular_contigs, getSeq, pseudo, cache = None):
+    """
+        Reads the annotations of an organism from its gff or gbff file.
+        If a cache directory is given, the annotations are read from it if the same file was read with the same parameters before, and written in it otherwise.
+    """
+    if cache is not None:
+        key = cacheKey(filename, "read", getSeq, pseudo, sorted(circular_contigs))
+        cached = readCachedOrganism(cache, key, organism_name)
+        if cached is not None:
+            return cached
     filetype = detect_filetype(filename)
     if filetype == "gff":
-        return read_org_gff(organism_name, filename, circular_contigs, getSeq, pseudo)
+        org, hasSeq = read_org_gff(organism_name, filename, circular_contigs, getSeq, pseudo)
     elif filetype == "gbff":
-        return read_org_gbff(organism_name, filename, circular_contigs, getSeq, pseudo)
+        org, hasSeq = read_org_gbff(organism_name, filename, circular_contigs, getSeq, pseudo)
     else:
         raise Exception("Wrong file type provided. This looks like a fasta file. You may be able to use --fasta instead.")
+    if cache is not None:
+        writeCachedOrganism(cache, key, org, hasSeq)
+    return org, hasSeq
 
-def readAnnotations(pangenome, organisms_file, cpu, getSeq = True, pseudo = False, show_bar= True):
+def readAnnotations(pangenome, organisms_file, cpu, getSeq = True, pseudo = False, show_bar= True, cache = None, writer = None, release = False):
+    """
+        Reads the annotations of the organisms of the list.
+        If an :class:`ppanggolin.formats.writeBinaries.AnnotationWriter` is given, each organism is written with it as soon as it is read, and if release is True it is not kept in the pangenome.
+    """
     logging.getLogger().info("Reading "+organisms_file+" the list of organism files ...")
 
     pangenome.status["geneSequences"] = "Computed"#we assume there are gene sequences in the annotation files, unless a gff file without fasta is met (which is the only case where sequences can be asbent)
@@ -332,51 +358,241 @@ def readAnnotations(pangenome, organisms_file, cpu, getSeq = True, pseudo = Fals
         if len(elements)<=1:
             logging.getLogger().error(f"No tabulation separator found in given --fasta file: '{organisms_file}'")
             exit(1)
-        args.append((elements[0], elements[1], elements[2:], getSeq, pseudo))
+        args.append((elements[0], elements[1], elements[2:], getSeq, pseudo, cache))
     bar = tqdm(range(len(args)), unit = "file", disable= not show_bar)
     with Pool(cpu) as p:
         for org, flag in p.imap_unordered(launchReadAnno, args):
-            pangenome.addOrganism(org)
+            if writer is not None:
+                writer.addOrganism(org)
+            if not release:
+                pangenome.addOrganism(org.unpack())
             if flag == False:
                 pangenome.status["geneSequences"] = "No"
             bar.update()
     bar.close()
 
-    pangenome.status["genomesAnnotated"] = "Computed"
+    pangenome.status["genomesAnnotated"] = "inFile" if release else "Computed"
+    if release and pangenome.status["geneSequences"] == "Computed":
+        pangenome.status["geneSequences"] = "inFile"
     pangenome.parameters["annotation"] = {}
     pangenome.parameters["annotation"]["read_annotations_from_file"] = True
 
-def getGeneSequencesFromFastas(pangenome, fasta_file):
-    fastaDict = {}
+def launchReadFeatureSequences(args):
+    return readFeatureSequences(*args)
+
+def readFeatureSequences(orgName, fastaFile, contigNames, contigs, starts, stops, strands):
+    """
+        Reads the dna sequences of features of an organism from its fasta file, one contig at a time so that only the contig being read is in memory.
+
+        :param contigNames: the names of the contigs of the organism
+        :param contigs: the index in contigNames of the contig of each feature
+        :param starts: the start of each feature
+        :param stops: the stop of each feature
+        :param strands: the strand of each feature
+        :return: the concatenated sequences of the features, in the order they were given, and their end offsets
+        :rtype: str, :class:`numpy.ndarray`
+    """
+    byContig = defaultdict(list)
+    for index, contig in enumerate(contigs.tolist()):
+        byContig[contigNames[contig]].append(index)
+    sequences = [ "" ] * len(contigs)
+    with read_compressed_or_not(fastaFile) as currFastaFile:
+        for name, contigSeq in read_fasta_records(currFastaFile):
+            indexes = byContig.pop(name, None)
+            if indexes is None:
+                continue
+            contigSeq = contigSeq.upper()
+            for index in indexes:
+                seq = contigSeq[int(starts[index]) - 1:int(stops[index])]
+                sequences[index] = reverse_complement(seq) if strands[index] == b"-" else seq
+    if len(byContig) > 0:
+        raise KeyError(f"Fasta file for organism {orgName} did not have the contig {next(iter(byContig))} that was read from the annotation file.")
+    return "".join(sequences), numpy.cumsum([ len(seq) for seq in sequences ], dtype = numpy.uint64)
+
+def readFastaList(fasta_file):
+    """ reads the tab-separated file listing the organism names and the fasta file of each one """
+    fastaFiles = {}
     for line in read_compressed_or_not(fasta_file):
         elements = [el.strip() for el in line.split("\t")]
         if len(elements)<=1:
             logging.getLogger().error("No tabulation separator found in organisms file")
             exit(1)
-        org = pangenome.addOrganism(elements[0])
-        with read_compressed_or_not(elements[1]) as currFastaFile:
-            fastaDict[org] = read_fasta(org, currFastaFile)
-    if not set(pangenome.organisms) <= set(fastaDict.keys()):
-        missing = len(pangenome.organisms) - len(set(pangenome.organisms) & set(fastaDict.keys()))
-        raise Exception(f"Not all of your pangenome's organisms are present within the provided fasta file. {missing} are missing (out of {len(pangenome.organisms)}).")
-
-    for org in pangenome.organisms:
-        try:
-            for contig in org.contigs:
-                for gene in contig.genes:
-                    gene.add_dna(get_dna_sequence(fastaDict[org][contig.name], gene))
-                for rna in contig.RNAs:
-                    rna.add_dna(get_dna_sequence(fastaDict[org][contig.name], gene))
-        except KeyError:
-            msg = f"Fasta file for organism {org.name} did not have the contig {contig.name} that was read from the annotation file. "
-            msg += f"The provided contigs in the fasta were : { ', '.join([contig for contig in fastaDict[org].keys()])}."
-            raise KeyError(msg)
-    pangenome.status["geneSequences"] = "Computed"
+        fastaFiles[elements[0]] = elements[1]
+    return fastaFiles
+
+def checkFastaList(orgNames, fastaFiles):
+    missing = len([ name for name in orgNames if name not in fastaFiles ])
+    if missing > 0:
+        raise Exception(f"Not all of your pangenome's organisms are present within the provided fasta file. {missing} are missing (out of {len(orgNames)}).")
+
+def getGeneSequencesFromFastas(pangenome, fasta_file, cpu = 1, show_bar = True):
+    """
+        Reads the dna sequences of the genes of the pangenome from the fasta files of its organisms.
+        Each organism is read by one of the cpu processes, so that only the genomes being read are in memory.
+        If the annotations are loaded, the sequences are given to the genes and RNAs. Otherwise, the sequences of the genes are written directly in the 'geneSequences' group of the pangenome file.
+    """
+    fastaFiles = readFastaList(fasta_file)
+    if pangenome.status["genomesAnnotated"] in ["Computed", "Loaded"]:
+        getSequencesOfOrganisms(pangenome, fastaFiles, cpu, show_bar)
+        pangenome.status["geneSequences"] = "Computed"
+    else:
+        writeGeneSequencesFromFastas(pangenome, fastaFiles, cpu, show_bar)
+
+def getSequencesOfOrganisms(pangenome, fastaFiles, cpu = 1, show_bar = True):
+    """ gives their dna sequence to the genes and RNAs of the organisms of the pangenome """
+    organisms = list(pangenome.organisms)
+    checkFastaList([ org.name for org in organisms ], fastaFiles)
+    def getFeatures(org):
+        return [ (contigIndex, feature) for contigIndex, contig in enumerate(org.contigs) for feature in list(contig.genes) + list(contig.RNAs) ]
+    def getArgs(org):
+        features = getFeatures(org)
+        return (org.name, fastaFiles[org.name], [ contig.name for contig in org.contigs ], numpy.array([ contig for contig, _ in features ], dtype = numpy.uint32),
+                numpy.array([ feature.start for _, feature in features ], dtype = numpy.uint32), numpy.array([ feature.stop for _, feature in features ], dtype = numpy.uint32),
+                numpy.array([ feature.strand for _, feature in features ], dtype = "S1"))
+    bar = tqdm(organisms, unit = "genome", disable = not show_bar)
+    with Pool(cpu) as p:
+        for org, (dna, offsets) in zip(bar, p.imap(launchReadFeatureSequences, map(getArgs, organisms))):
+            start = 0
+            for (_, feature), stop in zip(getFeatures(org), offsets.tolist()):
+                feature.add_dna(dna[start:stop])
+                start = stop
+    bar.close()
+
+def writeGeneSequencesFromFastas(pangenome, fastaFiles, cpu = 1, show_bar = True):
+    """ writes the dna sequences of the genes of the pangenome file in its 'geneSequences' group, reading the annotations from the file """
+    h5f = tables.open_file(pangenome.file, "a")
+    try:
+        annotations = h5f.root.annotations
+        orgNames = readStringPool(h5f, annotations.organisms.name.read()).tolist()
+        checkFastaList(orgNames, fastaFiles)
+        contigOrgs = annotations.contigs.organism.read()
+        contigNames = readStringPool(h5f, annotations.contigs.name.read()).tolist()
+        genes = { column : annotations.genes._f_get_child(column).read() for column in ["contig", "start", "stop", "strand"] }
+        #the contigs are written organism per organism, and the genes contig per contig.
+        orgContigs = numpy.searchsorted(contigOrgs, numpy.arange(len(orgNames) + 1))
+        contigGenes = numpy.searchsorted(genes["contig"], numpy.arange(len(contigNames) + 1))
+        def getArgs(orgIndex):
+            firstContig, lastContig = orgContigs[orgIndex], orgContigs[orgIndex + 1]
+            firstGene, lastGene = contigGenes[firstContig], contigGenes[lastContig]
+            return (orgNames[orgIndex], fastaFiles[orgNames[orgIndex]], contigNames[firstContig:lastContig], genes["contig"][firstGene:lastGene] - firstContig,
+                    genes["start"][firstGene:lastGene], genes["stop"][firstGene:lastGene], genes["strand"][firstGene:lastGene])
+        if "/geneSequences" in h5f:
+            h5f.remove_node("/", "geneSequences", recursive = True)
+        geneSeq = SequenceWriter(h5f, "/", "geneSequences", packed = True, expectedrows=len(genes["start"]))
+        bar = tqdm(orgNames, unit = "genome", disable = not show_bar)
+        with Pool(cpu) as p:
+            #the organisms are given to the processes a few at a time, as the sequences they read would pile up in memory if they were read faster than they are written.
+            batch = 4 * cpu
+            for first in range(0, len(orgNames), batch):
+                for dna, offsets in p.imap(launchReadFeatureSequences, [ getArgs(orgIndex) for orgIndex in range(first, min(first + batch, len(orgNames))) ]):
+                    geneSeq.extend(dna.encode("ascii"), offsets)#the genes are read in the order of the 'genes' table
+                    bar.update()
+        geneSeq.close()
+        writeGeneIDIndex(h5f)
+        bar.close()
+        pangenome.status["geneSequences"] = "inFile"
+        writeStatus(pangenome, h5f)
+    except BaseException:
+        #the sequences that were written would be taken for those of all the genes
+        if "/geneSequences" in h5f:
+            h5f.remove_node("/", "geneSequences", recursive = True)
+        raise
+    finally:
+        h5f.close()
+
+def launchReadContigSequences(args):
+    return readContigSequences(*args)
+
+def readContigSequences(orgName, fileName, contigNames):
+    """
+        Reads the dna sequences of the contigs of an organism from its fasta, gff or gbff file.
+
+        :param contigNames: the names of the contigs of the organism
+        :return: the concatenated sequences of the contigs, in the order they were given, and their end offsets
+        :rtype: str, :class:`numpy.ndarray`
+    """
+    wanted = set(contigNames)
+    sequences = {}
+    if detect_filetype(fileName) == "gbff":
+        for contigID, _, _, sequence in read_gbff_records(fileName, types = []):
+            if contigID in wanted:
+                sequences[contigID] = sequence
+    else:
+        with read_compressed_or_not(fileName) as genomeFile:
+            for name, sequence in read_fasta_records(genomeFile):#in a gff, the lines before the ##FASTA section do not start with '>' and are skipped
+                if name in wanted:
+                    sequences[name] = sequence.upper()
+    missing = [ name for name in contigNames if name not in sequences ]
+    if len(missing) > 0:
+        raise KeyError(f"The file {fileName} of organism {orgName} did not have the sequence of the contig {missing[0]} that was read from the annotation file.")
+    return "".join(sequences[name] for name in contigNames), numpy.cumsum([ len(sequences[name]) for name in contigNames ], dtype = numpy.uint64)
+
+def writeContigSequences(pangenome, genomes_file, cpu = 1, show_bar = True, formerFile = None):
+    """
+        Writes the dna sequences of the contigs of the pangenome file in its 'contigSequences' group, with :class:`ppanggolin.formats.writeBinaries.SequenceWriter`,
+        so that the sequence at index i is the one of the contig at index i in the annotation table. They are read from the fasta, gff or gbff files of the organisms, one organism per process.
+        If a former pangenome file with stored contig sequences is given, the sequences of the organisms that are not in genomes_file are copied from it.
+
+        :param genomes_file: the tab-separated file listing the organism names and their genome file
+        :param formerFile: a former pangenome file with the sequences of the contigs of some of the organisms
+    """
+    genomeFiles = readFastaList(genomes_file)
+    h5f = tables.open_file(pangenome.file, "a")
+    former = tables.open_file(formerFile, "r") if formerFile is not None else None
+    try:
+        annotations = h5f.root.annotations
+        orgNames = readStringPool(h5f, annotations.organisms.name.read()).tolist()
+        contigNames = readStringPool(h5f, annotations.contigs.name.read()).tolist()
+        orgContigs = numpy.searchsorted(annotations.contigs.organism.read(), numpy.arange(len(orgNames) + 1))
+        if former is not None:
+            formerIndex = getContigIndex(former)
+            formerSequences = SequenceReader(former.root.contigSequences)
+            formerOrgs = set(org for org, _ in formerIndex)
+            checkFastaList([ name for name in orgNames if name not in formerOrgs ], genomeFiles)
+        else:
+            checkFastaList(orgNames, genomeFiles)
+        if "/contigSequences" in h5f:
+            h5f.remove_node("/", "contigSequences", recursive = True)
+        contigSeq = SequenceWriter(h5f, "/", "contigSequences", packed = True, expectedrows=len(contigNames))
+        bar = tqdm(orgNames, unit = "genome", disable = not show_bar)
+        with Pool(cpu) as p:
+            #the organisms are given to the processes a few at a time, as the sequences they read would pile up in memory if they were read faster than they are written.
+            batch = 4 * cpu
+            for first in range(0, len(orgNames), batch):
+                orgIndexes = range(first, min(first + batch, len(orgNames)))
+                args = [ (orgNames[orgIndex], genomeFiles[orgNames[orgIndex]], contigNames[orgContigs[orgIndex]:orgContigs[orgIndex + 1]]) for orgIndex in orgIndexes if orgNames[orgIndex] in genomeFiles ]
+                readSequences = p.imap(launchReadContigSequences, args)
+                for orgIndex in orgIndexes:
+                    if orgNames[orgIndex] in genomeFiles:
+                        dna, offsets = next(readSequences)
+                    else:
+                        sequences = formerSequences[[ formerIndex[(orgNames[orgIndex], contig)] for contig in contigNames[orgContigs[orgIndex]:orgContigs[orgIndex + 1]] ]]
+                        dna, offsets = "".join(sequences), numpy.cumsum([ len(seq) for seq in sequences ], dtype = numpy.uint64)
+                    contigSeq.extend(dna.encode("ascii"), offsets)
+                    bar.update()
+        contigSeq.close()
+        bar.close()
+    except BaseException:
+        #the sequences that were written would be taken for those of all the contigs
+        if "/contigSequences" in h5f:
+            h5f.remove_node("/", "contigSequences", recursive = True)
+        raise
+    finally:
+        if former is not None:
+            former.close()
+        h5f.close()
 
 def launchAnnotateOrganism(pack):
-    return annotate_organism(*pack)
+    return PackedOrganism(annotate_organism(*pack))
 
-def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11", kingdom = "bacteria", norna=False,  overlap=True, show_bar = True):
+def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11", kingdom = "bacteria", norna=False,  overlap=True, show_bar = True, cache = None, training = None, training_genomes = 0,
+                      writer = None, release = False):
+    """
+        Annotates the genomes of the list.
+        If an :class:`ppanggolin.formats.writeBinaries.AnnotationWriter` is given, each organism is written with it as soon as it is annotated, and if release is True it is not kept in the pangenome.
+        If a Prodigal training file is given, it is used for all the genomes instead of training Prodigal on each of them.
+        If training_genomes is more than 0, this training file is first written by training Prodigal once on the first training_genomes genomes of the list.
+    """
     logging.getLogger().info(f"Reading {fastaList} the list of organism files")
 
     arguments = []
@@ -388,41 +604,84 @@ def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11",
         arguments.append((elements[0], elements[1], elements[2:], translation_table, kingdom, norna, tmpdir, overlap))
     if len(arguments) == 0:
         raise Exception("There are no genomes in the provided file")
+    if training is not None:
+        training = os.path.abspath(training)#prodigal is run from tmpdir
+    if training_genomes > 0:
+        logging.getLogger().info(f"Training Prodigal on up to {min(training_genomes, len(arguments))} genomes...")
+        used = train_prodigal_on_genomes([args[1] for args in arguments[:training_genomes]], translation_table, training, tmpdir)
+        if used < min(training_genomes, len(arguments)):
+            logging.getLogger().info(f"Prodigal was trained on the first {used} genomes only, as it trains on at most {PRODIGAL_TRAINING_SIZE} bases.")
+        else:
+            logging.getLogger().info(f"Prodigal was trained on {used} genomes.")
+    #when there are less genomes than cpus, the contigs of each genome are annotated by prodigal in several batches so that no cpu is idle.
+    batches = max(1, cpu // len(arguments))
+    arguments = [ args + (batches, cache, training) for args in arguments ]
     logging.getLogger().info(f"Annotating {len(arguments)} genomes using {cpu} cpus...")
-    with Pool(processes = cpu) as p:
+    #the annotation tools of all the genomes are run at the same time, using at most one cpu each, and no more than cpu of them are running at any time.
+    with Pool(processes = min(cpu, len(arguments)), initializer = setToolSlots, initargs = (Semaphore(cpu),)) as p:
         bar = tqdm(range(len(arguments)), unit = "genome", disable=not show_bar)
         for organism in p.imap_unordered(launchAnnotateOrganism, arguments):
             bar.update()
-            pangenome.addOrganism(organism)
+            if writer is not None:
+                writer.addOrganism(organism)
+            if not release:
+                pangenome.addOrganism(organism.unpack())
         p.close()
         p.join()
     bar.close()
 
     logging.getLogger().info("Done annotating genomes")
-    pangenome.status["genomesAnnotated"] = "Computed"#the pangenome is now annotated.
-    pangenome.status["geneSequences"] = "Computed"#the gene objects have their respective gene sequences.
+    if release:#the annotations and gene sequences are only in the file
+        pangenome.status["genomesAnnotated"] = "inFile"
+        pangenome.status["geneSequences"] = "inFile"
+    else:
+        pangenome.status["genomesAnnotated"] = "Computed"#the pangenome is now annotated.
+        pangenome.status["geneSequences"] = "Computed"#the gene objects have their respective gene sequences.
     pangenome.parameters["annotation"] = {}
     pangenome.parameters["annotation"]["remove_Overlapping_CDS"] = overlap
     pangenome.parameters["annotation"]["annotate_RNA"] = True if not norna else False
     pangenome.parameters["annotation"]["kingdom"] = kingdom
     pangenome.parameters["annotation"]["translation_table"] = translation_table
+    pangenome.parameters["annotation"]["prodigal_training"] = training
     pangenome.parameters["annotation"]["read_annotations_from_file"] = False
 
 def launch(args):
+    #the arguments are checked before the pangenome file is created
+    if args.train_prodigal > 0 and args.prodigal_training is not None:
+        raise Exception("--train_prodigal and --prodigal_training cannot be used together.")
+    if args.prodigal_training is not None and not os.path.isfile(args.prodigal_training):
+        raise FileNotFoundError(f"The Prodigal training file {args.prodigal_training} does not exist.")
     filename = mkFilename(args.basename, args.output, args.force)
     pangenome = Pangenome()
+    #the organisms are written in the pangenome file as soon as they are annotated, and are not kept in memory.
+    writer = AnnotationWriter(createPangenomeFile(filename), sequences = True)
     if args.fasta is not None and args.anno is None:
-        annotatePangenome(pangenome, args.fasta, tmpdir=args.tmpdir, cpu=args.cpu, translation_table=args.translation_table,  kingdom=args.kingdom,  norna=args.norna, overlap=args.overlap, show_bar=args.show_prog_bars)
+        training = args.prodigal_training
+        if args.train_prodigal > 0:
+            training = args.output + "/prodigal_training.trn"
+        annotatePangenome(pangenome, args.fasta, tmpdir=args.tmpdir, cpu=args.cpu, translation_table=args.translation_table,  kingdom=args.kingdom,  norna=args.norna, overlap=args.overlap, show_bar=args.show_prog_bars, cache=args.cache,
+                          training = training, training_genomes = args.train_prodigal, writer = writer, release = True)
+        writer.close(pangenome)
+        if args.contig_sequences:
+            pangenome.addFile(filename)
+            writeContigSequences(pangenome, args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
     elif args.anno is not None:
-        readAnnotations(pangenome, args.anno, cpu = args.cpu, pseudo = args.use_pseudo, show_bar=args.show_prog_bars)
+        readAnnotations(pangenome, args.anno, cpu = args.cpu, pseudo = args.use_pseudo, show_bar=args.show_prog_bars, cache=args.cache, writer = writer, release = True)
+        writer.close(pangenome)
         if pangenome.status["geneSequences"] == "No":
             if args.fasta:
-                getGeneSequencesFromFastas(pangenome, args.fasta)
+                pangenome.addFile(filename)
+                getGeneSequencesFromFastas(pangenome, args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
             else:
                 logging.getLogger().warning("You provided gff files without sequences, and you did not provide fasta sequences. Thus it was not possible to get the gene sequences.")
                 logging.getLogger().warning("You will be able to proceed with your analysis ONLY if you provide the clustering results in the next step.")
-
-    writePangenome(pangenome, filename, args.force, show_bar=args.show_prog_bars)
+        if args.contig_sequences:
+            if not hasattr(pangenome, "file"):
+                pangenome.addFile(filename)
+            if pangenome.status["geneSequences"] == "No" and args.fasta is None:
+                logging.getLogger().warning("The annotation files do not have the sequences of the contigs, so they were not stored in the pangenome file.")
+            else:
+                writeContigSequences(pangenome, args.anno if args.fasta is None else args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
 
 def syntaSubparser(subparser):
     parser = subparser.add_parser("annotate", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -439,4 +698,8 @@ def syntaSubparser(subparser):
     optional.add_argument("--translation_table",required=False, default="11", help = "Translation table (genetic code) to use.")
     optional.add_argument("--basename",required = False, default = "pangenome", help = "basename for the output file")
     optional.add_argument("--use_pseudo",required=False, action="store_true",help = "In the context of provided annotation, use this option to read pseudogenes. (Default behavior is to ignore them)")
+    optional.add_argument("--cache", required=False, type=str, default=None, help = "A directory where the annotations of each genome are kept, and read back instead of being computed again when the same file is given with the same parameters.")
+    optional.add_argument("--train_prodigal", required=False, type=int, default=0, help = "Train Prodigal once on the given number of genomes, the first ones of the --fasta list, and use this training for all the genomes instead of training it on each of them. This is much faster for genomes of the same species. Prodigal trains on at most 32 Mbp, so the genomes after this size are not read. The training file is written in the output directory, and stored in the pangenome file to annotate the genomes added by 'update'.")
+    optional.add_argument("--prodigal_training", required=False, type=str, default=None, help = "A Prodigal training file (written with 'prodigal -t') to use for all the genomes instead of training Prodigal on each of them. It is stored in the pangenome file.")
+    optional.add_argument("--contig_sequences", required=False, action="store_true", default=False, help = "Store the sequences of the contigs in the pangenome file, so that the sequences of the RGPs can be written by 'ppanggolin fasta --regions' without the genome files.")
     return parser
\ No newline at end of file
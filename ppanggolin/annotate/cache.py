@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import os
+import gzip
+import pickle
+import hashlib
+import tempfile
+
+#local libraries
+from ppanggolin.genome import Organism, Gene, RNA
+
+CACHE_VERSION = "1"#to change whenever the records or the way genomes are annotated change, so that former records are not used anymore.
+
+def fileHash(fileName):
+    """
+        Computes the SHA-256 hash of the content of a file
+
+        :rtype: :class:`hashlib.sha256`
+    """
+    h = hashlib.sha256()
+    with open(fileName, "rb") as f:
+        for block in iter(lambda : f.read(1 << 20), b""):
+            h.update(block)
+    return h
+
+def cacheKey(fileName, *parameters):
+    """
+        Computes the key of the annotations of a genome file, from a hash of its content and of the parameters used to annotate or to read it.
+        The name of the organism is not part of it, so that a renamed genome is still found.
+
+        :param fileName: the fasta, gff or gbff file of the genome
+        :type fileName: str
+        :param parameters: the parameters that change the annotations (translation table, kingdom, ...)
+        :return: the key
+        :rtype: str
+    """
+    h = fileHash(fileName)
+    h.update(repr((CACHE_VERSION,) + parameters).encode())
+    return h.hexdigest()
+
+def readCachedOrganism(cache, key, orgName):
+    """
+        Reads the annotations of a genome from the cache directory, if they are in it.
+
+        :return: the organism and whether its genes have their sequence, or None if the genome is not in the cache
+        :rtype: :class:`ppanggolin.genome.Organism`, bool
+    """
+    path = f"{cache}/{key[:2]}/{key}.pkl.gz"
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rb") as f:
+        hasSeq, contigs = pickle.load(f)
+    org = Organism(orgName)
+    for name, is_circular, genes, rnas in contigs:
+        contig = org.getOrAddContig(name, is_circular)
+        for (ID, start, stop, strand, geneType, geneName, product, local_identifier, position, genetic_code, dna) in genes:
+            gene = Gene(orgName + ID)
+            gene.fill_annotations(start = start, stop = stop, strand = strand, geneType = geneType, name = geneName, product = product,
+                                  local_identifier = local_identifier, position = position, genetic_code = genetic_code)
+            if dna is not None:
+                gene.add_dna(dna)
+            gene.fill_parents(org, contig)
+            contig.addGene(gene)
+        for (ID, start, stop, strand, geneType, geneName, product, local_identifier, dna) in rnas:
+            rna = RNA(orgName + ID)
+            rna.fill_annotations(start = start, stop = stop, strand = strand, geneType = geneType, name = geneName, product = product, local_identifier = local_identifier)
+            if dna is not None:
+                rna.add_dna(dna)
+            rna.fill_parents(org, contig)
+            contig.addRNA(rna)
+    return org, hasSeq
+
+def writeCachedOrganism(cache, key, org, hasSeq = True):
+    """
+        Writes the annotations of a genome in the cache directory.
+        The gene identifiers are written without the name of the organism, and it is not written if one of them does not start with it.
+        The record is written in a temporary file first, so that several processes can fill the cache at the same time.
+    """
+    contigs = []
+    for contig in org.contigs:
+        genes = []
+        for gene in contig.genes:
+            if gene is None:
+                continue
+            if not gene.ID.startswith(org.name):
+                return
+            genes.append((gene.ID[len(org.name):], gene.start, gene.stop, gene.strand, gene.type, gene.name, gene.product, gene.local_identifier,
+                          gene.position, gene.genetic_code, getattr(gene, "dna", None)))
+        rnas = []
+        for rna in contig.RNAs:
+            if not rna.ID.startswith(org.name):
+                return
+            rnas.append((rna.ID[len(org.name):], rna.start, rna.stop, rna.strand, rna.type, rna.name, rna.product, rna.local_identifier, getattr(rna, "dna", None)))
+        contigs.append((contig.name, contig.is_circular, genes, rnas))
+    directory = f"{cache}/{key[:2]}"
+    os.makedirs(directory, exist_ok = True)
+    tmpFile = tempfile.NamedTemporaryFile(dir = directory, suffix = ".tmp", delete = False)
+    with gzip.open(tmpFile, "wb", compresslevel = 1) as f:
+        pickle.dump((hasSeq, contigs), f, protocol = pickle.HIGHEST_PROTOCOL)
+    tmpFile.close()
+    os.replace(tmpFile.name, f"{directory}/{key}.pkl.gz")
@@ -3,44 +3,68 @@
 
 #default libraries
 import os
+from subprocess import Popen, PIPE, DEVNULL
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
-from subprocess import Popen, PIPE
 import ast
 from collections import defaultdict
 
 #local libraries
 from ppanggolin.genome import Organism, Gene, RNA
 from ppanggolin.utils import is_compressed, read_compressed_or_not
+from ppanggolin.sequenceKernel import get_dna_sequence
+from ppanggolin.annotate.cache import fileHash, cacheKey, readCachedOrganism, writeCachedOrganism
 
-def reverse_complement(seq):
-    """ reverse complement the given dna sequence """
-    complement = {'A':  'T', 'C':  'G', 'G':  'C', 'T':  'A', 'N': 'N', 'R': 'Y', 'Y': 'R',
-                  'S': 'S', 'W': 'W', 'K': 'M', 'M': 'K', 'B': 'V', 'V': 'B', 'D': 'H', 'H': 'D'}
-    # see https://www.bioinformatics.org/sms/iupac.html for the code.
-    # complement = {'A':  'T', 'C':  'G', 'G':  'C', 'T':  'A', 'N': 'N' } ## basic
-    rcseq = ""
-    for i in reversed(seq):
-        rcseq += complement[i]
-    return rcseq
+toolSlots = None#the semaphore limiting the number of annotation tools running at the same time, if any
 
-def launch_aragorn(fnaFile, org):
+def write_fasta(contigs, fileObj):
+    """
+        Writes the contig sequences in the given file-like object in the fasta format, with lines of 60 nucleotides, and closes it.
+        It is used to feed the annotation tools through their standard input.
+    """
+    try:
+        for header, sequence in contigs.items():
+            fileObj.write(f">{header}\n")
+            for j in range(0, len(sequence), 60):
+                fileObj.write(sequence[j: j+60]+"\n")
+        fileObj.close()
+    except BrokenPipeError:
+        pass#the tool stopped reading. It will be known from its return code.
+
+def launch_tool(cmd, contigs = None, **kwargs):
+    """
+        Launches the given command and returns the process, whose standard output can be read line by line while it is written.
+        If contigs are given, their sequences are written in the standard input of the command from another thread, so that no temporary fasta file is needed.
+    """
+    p = Popen(cmd, stdin = PIPE if contigs is not None else DEVNULL, stdout = PIPE, universal_newlines = True, **kwargs)
+    if contigs is not None:
+        Thread(target = write_fasta, args = (contigs, p.stdin), daemon = True).start()
+    return p
+
+def check_tool(p, name):
+    """ waits for the process to end, and raises an error if it failed """
+    if p.wait() != 0:
+        raise Exception(f"{name} failed with the return code {p.returncode}.")
+
+def launch_aragorn(fnaFile, org, contigs = None):
     """
         launches Aragorn to annotate tRNAs. Takes a fna file name and a locustag to give an ID to the found genes.
+        If the fna file name is None, the contig sequences are given to Aragorn through its standard input.
         returns the annotated genes in a list of gene objects.
     """
     locustag = org.name
-    cmd = ["aragorn", "-t", "-gcbact", "-l", "-w", fnaFile]
-    p = Popen(cmd, stdout=PIPE)
-    # loading the whole thing, reverting it to 'pop' in order.
-    fileData = p.communicate()[0].decode().split("\n")[:: -1]
+    cmd = ["aragorn", "-t", "-gcbact", "-l", "-w"]
+    if fnaFile is not None:
+        cmd.append(fnaFile)
+    p = launch_tool(cmd, None if fnaFile is not None else contigs)
     geneObjs = defaultdict(set)
     c = 0
-    while len(fileData) != 0:
-        line = fileData.pop()
+    for line in p.stdout:
         if line.startswith(">"):
             header = line.replace(">", "").split()[0]
-            fileData.pop()  # then next line must be removed too.
-        elif len(line) > 0:  # if the line isn't empty, there's data to get.
+            next(p.stdout, None)  # then next line must be skipped too.
+        elif len(line.strip()) > 0:  # if the line isn't empty, there's data to get.
             lineData = line.split()
             start, stop = ast.literal_eval(lineData[2].replace("c", ""))
             c += 1
@@ -52,29 +76,51 @@ def launch_aragorn(fnaFile, org):
                                  geneType="tRNA",
                                  product=lineData[1] + lineData[4])
             geneObjs[header].add(gene)
+    check_tool(p, "Aragorn")
     return geneObjs
 
-def launch_prodigal(fnaFile, org, code):
+#the maximal number of bases Prodigal reads to train (MAX_SEQ in its sources), the following ones are ignored.
+PRODIGAL_TRAINING_SIZE = 32000000
+
+def train_prodigal(fnaFile, code, training, contigs = None, tmpdir = None):
+    """
+        Trains Prodigal on the given sequences, and writes its training file in training, to be used to annotate them in several batches.
+        If the fna file name is None, the contig sequences are given to Prodigal through its standard input.
+    """
+    cmd = ["prodigal", "-g", code, "-m", "-c", "-p", "single", "-q", "-t", training]
+    if fnaFile is not None:
+        cmd.extend(["-i", fnaFile])
+    p = launch_tool(cmd, None if fnaFile is not None else contigs, cwd = tmpdir)
+    p.stdout.read()
+    check_tool(p, "Prodigal")
+
+def launch_prodigal(fnaFile, org, code, contigs = None, tmpdir = None, training = None):
     """
         launches Prodigal to annotate CDS. Takes a fna file name and a locustag to give an ID to the found genes.
+        If the fna file name is None, the contig sequences are given to Prodigal through its standard input.
+        Prodigal copies a piped input to a file of its working directory to read it twice in single mode, so it is run in tmpdir.
+        If a training file is given, Prodigal uses it instead of training on the sequences.
         returns the annotated genes in a list of gene objects.
     """
     locustag = org.name
-    cmd = ["prodigal", "-f", "sco","-g",code, "-m", "-c", "-i", fnaFile, "-p", "single", "-q"]
-    p = Popen(cmd, stdout=PIPE)
+    cmd = ["prodigal", "-f", "sco","-g",code, "-m", "-c", "-p", "single", "-q"]
+    if fnaFile is not None:
+        cmd.extend(["-i", fnaFile])
+    if training is not None:
+        cmd.extend(["-t", training])
+    p = launch_tool(cmd, None if fnaFile is not None else contigs, cwd = tmpdir)
 
     geneObjs = defaultdict(set)
     c = 0
-    for line in p.communicate()[0].decode().split("\n"):
+    for line in p.stdout:
         if line.startswith("# Sequence Data: "):
             for data in line.split(";"):
                 if data.startswith("seqhdr"):
                     header = data.split("=")[1].replace('"', "").split()[0]
-                    # print(header)
 
         elif line.startswith(">"):
             c += 1
-            lineData = line[1:].split("_")  # not considering the '>'
+            lineData = line[1:].strip().split("_")  # not considering the '>'
             gene = Gene(ID = locustag + "_CDS_" + str(c).zfill(4))
             gene.fill_annotations(start=lineData[1],
                                  stop=lineData[2],
@@ -82,12 +128,14 @@ def launch_prodigal(fnaFile, org, code):
                                  geneType="CDS",
                                  genetic_code=code)
             geneObjs[header].add(gene)
-
+    check_tool(p, "Prodigal")
     return geneObjs
 
-def launch_infernal(fnaFile, org, kingdom, tmpdir):
+def launch_infernal(fnaFile, org, kingdom, contigs = None):
     """
         launches Infernal in hmmer-only mode to annotate rRNAs. Takes a fna file name and a locustag to give an ID to the found genes.
+        If the fna file name is None, the contig sequences are given to Infernal through its standard input.
+        The hits table is read from the standard output of cmscan as it is written.
         returns the annotated genes in a list of gene objects.
     """
     locustag = org.name
@@ -96,19 +144,12 @@ def launch_infernal(fnaFile, org, kingdom, tmpdir):
     elif kingdom == "archaea":
         modelfile = os.path.dirname(os.path.realpath(__file__)) + "/rRNA_DB/rRNA_arch.cm"
 
-    tmpFile = tempfile.NamedTemporaryFile(mode="r", dir = tmpdir)
-    cmd = ["cmscan", "--tblout", tmpFile.name, "--hmmonly", "--cpu",str(1), "--noali", modelfile, fnaFile]
-    p = Popen(cmd, stdout=open(os.devnull, "w"), stderr=PIPE)
-    err = p.communicate()[1].decode().split()
-    if err != []:
-        if err[0] == 'Error: ':
-            raise Exception(f"Infernal (cmscan) failed with error:  '{ ' '.join(err) }'. If you never used this script, you should press the .cm file using cmpress executable from Infernal. You should find the file in '{os.path.dirname(os.path.realpath(__file__))}/rRNA_DB/'.")
-        raise Exception(f"An error occurred with Infernal. Error is:  '{ ' '.join(err) }'.")
-    # never managed to test what happens if the .cm files are compressed with a 'bad' version of infernal, so if that happens you are on your own.
+    cmd = ["cmscan", "-o", os.devnull, "--tblout", "/dev/stdout", "--hmmonly", "--cpu",str(1), "--noali", modelfile, fnaFile if fnaFile is not None else "-"]
+    p = launch_tool(cmd, None if fnaFile is not None else contigs, stderr = PIPE)
 
     geneObjs = defaultdict(set)
     c = 0
-    for line in tmpFile:
+    for line in p.stdout:
         if not line.startswith("#"):
             c += 1
             lineData = line.split()
@@ -127,64 +168,144 @@ def launch_infernal(fnaFile, org, kingdom, tmpdir):
                                  product=" ".join(lineData[17:]))
             geneObjs[lineData[2]].add(gene)
 
+    err = p.stderr.read().split()
+    p.wait()
+    if err != []:
+        if err[0] == 'Error: ':
+            raise Exception(f"Infernal (cmscan) failed with error:  '{ ' '.join(err) }'. If you never used this script, you should press the .cm file using cmpress executable from Infernal. You should find the file in '{os.path.dirname(os.path.realpath(__file__))}/rRNA_DB/'.")
+        raise Exception(f"An error occurred with Infernal. Error is:  '{ ' '.join(err) }'.")
+    # never managed to test what happens if the .cm files are compressed with a 'bad' version of infernal, so if that happens you are on your own.
     return geneObjs
 
+def read_fasta_records(fnaFile):
+    """
+        Reads a fna file (or stream, or list of lines) one sequence at a time, and yields the name of each sequence with the sequence itself.
+        Only the sequence being read is kept in memory. Lines before the first header are ignored.
+    """
+    name = None
+    seqParts = []
+    for line in fnaFile:
+        if line.startswith('>'):
+            if name is not None:
+                yield name, "".join(seqParts)
+            name = line.split()[0][1:]
+            seqParts = []
+        elif name is not None:
+            seqParts.append(line.strip())
+    # processing the last sequence
+    if name is not None:
+        yield name, "".join(seqParts)
+
 def read_fasta(org, fnaFile):
     """
         Reads a fna file  (or stream, or string) and stores it in a dictionnary with contigs as key and sequence as value.
     """
     contigs = {}
-    contig_seq = ""
-    contig = None
-    for line in fnaFile:
-        if line.startswith('>'):
-            if contig_seq != "":
-                contigs[contig.name] = contig_seq.upper()
-            contig_seq = ""
-            contig = org.getOrAddContig(line.split()[0][1:])
-        else:
-            contig_seq += line.strip()
-    # processing the last contig
-    if contig_seq != "":
-        contigs[contig.name] = contig_seq.upper()
+    for name, sequence in read_fasta_records(fnaFile):
+        contig = org.getOrAddContig(name)
+        if sequence != "":
+            contigs[contig.name] = sequence.upper()
     return contigs
 
-def write_tmp_fasta(contigs, tmpdir ):
+def setToolSlots(slots):
     """
-        Writes a temporary fna formated file, and returns the file-like object.
-        This is for the cases where the given file is compressed, then we write a temporary file for the annotation tools to read from. The file will be deleted when close() is called.
+        Sets the semaphore giving the number of annotation tools that can run at the same time, shared by all the annotation processes.
+        It is the initializer of their process pool.
     """
-    tmpFile = tempfile.NamedTemporaryFile(mode="w", dir = tmpdir)
-    for header in contigs.keys():
-        tmpFile.write(f">{header}\n")
-        j = 0
-        while j < len(contigs[header]):
-            tmpFile.write(contigs[header][j: j+60]+"\n")
-            j += 60
-    tmpFile.flush()  # force write what remains in the buffer.
-    return tmpFile
+    global toolSlots
+    toolSlots = slots
 
-def syntaxic_annotation(org, fastaFile, norna, kingdom, code, tmpdir):
+def run_in_slot(func, *args):
+    """ runs the function launching an annotation tool once a slot is free, if the number of tools running at the same time is limited """
+    if toolSlots is None:
+        return func(*args)
+    with toolSlots:
+        return func(*args)
+
+def split_contigs(contigs, batches):
     """
-        Runs the different softwares for the syntaxic annotation.
+        Splits the contigs in at most the given number of batches of consecutive contigs, of about the same length.
 
-        Takes in the file-like object containing the uncompressed fasta sequences to annotate
-        the number of cpus that we can use.
+        :return: the batches, as dicts of contig sequences
+        :rtype: list
+    """
+    target = sum(len(seq) for seq in contigs.values()) / batches
+    splitted = [{}]
+    size = 0
+    for name, seq in contigs.items():
+        if size >= target and len(splitted) < batches:
+            splitted.append({})
+            size = 0
+        splitted[-1][name] = seq
+        size += len(seq)
+    return splitted
+
+def syntaxic_annotation(org, fnaFile, contigs, norna, kingdom, code, tmpdir, batches = 1, training = None):
+    """
+        Runs the different softwares for the syntaxic annotation, at the same time.
+
+        Takes the name of the uncompressed fasta file to annotate, or None to give the contig sequences to the softwares through their standard input,
         whether to annotate rna or not
         the locustag to give gene IDs.
+        the number of batches of contigs Prodigal can be launched on. If there are several, Prodigal is trained once on the whole genome and the batches are annotated at the same time.
+        the Prodigal training file to use instead of training Prodigal on the genome, if any.
     """
-    # launching tools for syntaxic annotation
-    genes = defaultdict(list)
-    for key, items in launch_prodigal(fastaFile.name, org, code).items():
-        genes[key].extend(items)
-    if not norna:
-        for key, items in launch_aragorn(fastaFile.name, org).items():
-            genes[key].extend(items)
-        for key, items in launch_infernal(fastaFile.name, org, kingdom, tmpdir).items():
-            genes[key].extend(items)
-    fastaFile.close()#closing either tmp file or original fasta file.
+    contigBatches = split_contigs(contigs, batches) if batches > 1 else [contigs]
+    with ThreadPoolExecutor(max_workers = len(contigBatches) + 2) as executor:
+        rnas = []
+        if not norna:
+            rnas.append(executor.submit(run_in_slot, launch_aragorn, fnaFile, org, contigs))
+            rnas.append(executor.submit(run_in_slot, launch_infernal, fnaFile, org, kingdom, contigs))
+        trainingDir = None
+        if training is None and len(contigBatches) > 1:
+            trainingDir = tempfile.TemporaryDirectory(dir = tmpdir)
+            training = trainingDir.name + "/prodigal.trn"
+            run_in_slot(train_prodigal, fnaFile, code, training, contigs, trainingDir.name)
+        if len(contigBatches) > 1:
+            cdss = [ executor.submit(run_in_slot, launch_prodigal, None, org, code, batch, tmpdir, training) for batch in contigBatches ]
+        else:
+            cdss = [ executor.submit(run_in_slot, launch_prodigal, fnaFile, org, code, contigs, tmpdir, training) ]
+
+        # launching tools for syntaxic annotation
+        genes = defaultdict(list)
+        c = 0
+        for future in cdss:
+            for key, items in future.result().items():
+                if len(cdss) > 1:#the genes of each batch are numbered from 1, so they are numbered again as if Prodigal was launched once
+                    for gene in sorted(items, key = lambda x : x.start):
+                        c += 1
+                        gene.ID = org.name + "_CDS_" + str(c).zfill(4)
+                genes[key].extend(items)
+        if trainingDir is not None:
+            trainingDir.cleanup()
+        for future in rnas:
+            for key, items in future.result().items():
+                genes[key].extend(items)
     return genes
 
+def train_prodigal_on_genomes(fileNames, code, training, tmpdir):
+    """
+        Trains Prodigal once on the contigs of all the given genomes, and writes its training file in training,
+        so that it can be used to annotate genomes of the same species without training Prodigal on each of them.
+        Prodigal trains on at most PRODIGAL_TRAINING_SIZE bases, so the genomes are no longer read once this size is reached.
+        returns the number of genomes Prodigal was trained on.
+    """
+    contigs = {}
+    size = 0
+    used = 0
+    for i, fileName in enumerate(fileNames):
+        if size >= PRODIGAL_TRAINING_SIZE:
+            break
+        used += 1
+        with read_compressed_or_not(fileName) as fastaFile:
+            for name, sequence in read_fasta_records(fastaFile):
+                contigs[f"{i}_{name}"] = sequence.upper()#contigs of different genomes can have the same name
+                size += len(sequence)
+                if size >= PRODIGAL_TRAINING_SIZE:
+                    break
+    run_in_slot(train_prodigal, None, code, training, contigs, tmpdir)
+    return used
+
 def overlap_filter(allGenes, contigs, overlap):
     """
         Removes the CDS that overlap with RNA genes.
@@ -212,24 +333,24 @@ def overlap_filter(allGenes, contigs, overlap):
         sortedGenes[key] = tmpGenes
     return sortedGenes
 
-def get_dna_sequence(contigSeq, gene):
-    if gene.strand == "+":
-        return contigSeq[gene.start-1:gene.stop]
-    elif gene.strand == "-":
-        return reverse_complement(contigSeq[gene.start-1:gene.stop])
-
-def annotate_organism(orgName, fileName, circular_contigs, code, kingdom, norna, tmpdir, overlap):
+def annotate_organism(orgName, fileName, circular_contigs, code, kingdom, norna, tmpdir, overlap, batches = 1, cache = None, training = None):
     """
-        Function to annotate a single organism
+        Function to annotate a single organism, with Prodigal launched on at most the given number of batches of contigs, with the given training file if any.
+        If a cache directory is given, the annotations are read from it if the same file was annotated with the same parameters before, and written in it otherwise.
     """
+    if cache is not None:
+        key = cacheKey(fileName, "annotate", code, kingdom, norna, overlap, sorted(circular_contigs), fileHash(training).hexdigest() if training is not None else None)
+        cached = readCachedOrganism(cache, key, orgName)
+        if cached is not None:
+            return cached[0]
     org = Organism(orgName)
 
-    fastaFile = read_compressed_or_not(fileName)
-    contigSequences = read_fasta(org, fastaFile)
-    if is_compressed(fileName):
-        fastaFile = write_tmp_fasta(contigSequences, tmpdir)
+    with read_compressed_or_not(fileName) as fastaFile:
+        contigSequences = read_fasta(org, fastaFile)
+    #the softwares read uncompressed files themselves, and compressed ones are given to them through their standard input.
+    fnaFile = None if is_compressed(fileName) else fileName
 
-    genes = syntaxic_annotation(org, fastaFile, norna, kingdom, code, tmpdir)
+    genes = syntaxic_annotation(org, fnaFile, contigSequences, norna, kingdom, code, tmpdir, batches, training)
     genes = overlap_filter(genes, contigSequences, overlap)
 
     for contigName, genes in genes.items():
@@ -243,4 +364,6 @@ def annotate_organism(orgName, fileName, circular_contigs, code, kingdom, norna,
                 contig.addGene(gene)
             elif isinstance(gene, RNA):
                 contig.addRNA(gene)
+    if cache is not None:
+        writeCachedOrganism(cache, key, org)
     return org
@@ -8,15 +8,18 @@ import subprocess
 from collections import defaultdict
 import os
 import argparse
+import hashlib
+from itertools import islice
 
 #installed libraries
-import networkx
+import numpy
 from tqdm import tqdm
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.genome import Gene
 from ppanggolin.utils import read_compressed_or_not, restricted_float
+from ppanggolin.sequenceKernel import translate_all
 from ppanggolin.formats import writePangenome, checkPangenomeInfo, getGeneSequencesFromFile, writeGeneSequencesFromAnnotations, ErasePangenome
 
 def alignRep(faaFile, tmpdir, cpu, coverage, identity):
@@ -36,6 +39,65 @@ def alignRep(faaFile, tmpdir, cpu, coverage, identity):
     subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
     return outfile
 
+def proteinKeys(seqs, code):
+    """
+        Computes a key for each dna sequence, so that sequences with the same key are translated into the same protein by mmseqs.
+        The key of a sequence made of A, C, G and T with a length that is a multiple of 3 is its first codon followed by the translation of the other ones,
+        so that it does not depend on whether the first codon is translated as a start codon or not. Other sequences only share their key with identical sequences.
+
+        :param seqs: the dna sequences
+        :type seqs: list of str
+        :param code: the number of the genetic code
+        :type code: str
+        :return: the keys of the sequences
+        :rtype: list of bytes
+    """
+    keys = []
+    for seq, protein in zip(seqs, translate_all(seqs, code)):
+        if protein:
+            key = seq[:3].encode("ascii") + protein[1:]
+        else:
+            key = b"\0" + seq.encode("ascii")#no protein key starts with this byte
+        keys.append(hashlib.blake2b(key, digest_size = 16).digest())
+    return keys
+
+def writeUniqueSequences(sequenceFile, uniqueFile, code, chunk = 10000):
+    """
+        Writes in uniqueFile the genes of the fasta sequenceFile whose protein is not the same as the one of a gene written before,
+        so that identical proteins are clustered only once.
+
+        :param sequenceFile: the name of the fasta file with all the gene sequences, with a line for each sequence
+        :type sequenceFile: str
+        :param uniqueFile: the file where the unique sequences are written
+        :type uniqueFile: file-like object
+        :param code: the number of the genetic code
+        :type code: str
+        :param chunk: the number of sequences translated at once
+        :type chunk: int
+        :return: the genes that were not written, grouped by the gene with the same protein that was written
+        :rtype: dict
+    """
+    seen = {}
+    copies = defaultdict(list)
+    with open(sequenceFile, "r") as fasta:
+        while True:
+            lines = list(islice(fasta, 2 * chunk))
+            if not lines:
+                break
+            IDs = [ line[1:].strip() for line in lines[0::2] ]
+            seqs = [ line.strip() for line in lines[1::2] ]
+            for ID, seq, key in zip(IDs, seqs, proteinKeys(seqs, code)):
+                rep = seen.setdefault(key, ID)
+                if rep is ID:
+                    uniqueFile.write('>' + ID + "\n")
+                    uniqueFile.write(seq + "\n")
+                else:
+                    copies[rep].append(ID)
+    nbGenes = len(seen) + sum(len(genes) for genes in copies.values())
+    if nbGenes > 0:
+        logging.getLogger().info(f"{len(seen)} unique proteins out of {nbGenes} genes will be clustered ({nbGenes / len(seen):.2f} genes per unique protein)")
+    return copies
+
 def firstClustering(sequences, tmpdir, cpu, code, coverage, identity, mode):
     seqNucdb = tmpdir.name + '/nucleotid_sequences_db'
     cmd = ["mmseqs","createdb"]
@@ -80,49 +142,127 @@ def read_faa(faFileName):
                 fam2seq[head] = line.strip()
     return fam2seq
 
-def read_tsv(tsvfileName):
+def read_tsv(tsvfileName, copies = None):
     # reading tsv file
     genes2fam = {}
     fam2genes = defaultdict(set)
+    copies = {} if copies is None else copies
     with open(tsvfileName, "r") as tsvfile:
         for line in tsvfile:
             line = line.split()
-            genes2fam[line[1]] = (line[0],False)#fam id, and its a gene (and not a fragment)
-            fam2genes[line[0]].add(line[1])
+            for gene in [line[1]] + copies.get(line[1], []):#the genes with the same protein as the clustered one are in its family
+                genes2fam[gene] = (line[0],False)#fam id, and its a gene (and not a fragment)
+                fam2genes[line[0]].add(gene)
     return genes2fam, fam2genes
 
-def refineClustering(tsv, alnFile, fam2seq):
-    simgraph = networkx.Graph()
-    genes2fam, fam2genes = read_tsv(tsv)
-    logging.getLogger().info(f"Starting with {len(fam2seq)} families")
-    #create the nodes
-    for fam, genes in fam2genes.items():
-        simgraph.add_node(fam, nbgenes = len(genes) )
-    #add the edges
+def read_alignments(alnFile, famIndex, chunk = 1 << 22):
+    """
+        Reads the alignments between the family representatives, skipping the alignments of a representative with itself.
+
+        :param alnFile: the name of the alignment file, with the query, target, query length, target length and bitscore columns
+        :type alnFile: str
+        :param famIndex: the index of each family
+        :type famIndex: dict
+        :param chunk: the approximate number of bytes read at once
+        :type chunk: int
+        :return: the query and target indexes, their lengths and the bitscores, in the order of the file
+        :rtype: :class:`numpy.ndarray`, :class:`numpy.ndarray`, :class:`numpy.ndarray`, :class:`numpy.ndarray`, :class:`numpy.ndarray`
+    """
+    columns = [ [] for _ in range(5) ]
     with open(alnFile,"r") as alnfile:
-        for line in alnfile:
-            line = line.split()
+        while True:
+            lines = alnfile.readlines(chunk)
+            if not lines:
+                break
+            fields = "".join(lines).split()
+            queries = numpy.array([ famIndex[fam] for fam in fields[0::5] ], dtype = numpy.int64)
+            targets = numpy.array([ famIndex[fam] for fam in fields[1::5] ], dtype = numpy.int64)
+            keep = queries != targets
+            for column, values in zip(columns, (queries, targets, numpy.array(fields[2::5], dtype = numpy.int64),
+                                                numpy.array(fields[3::5], dtype = numpy.int64), numpy.array(fields[4::5], dtype = numpy.float64))):
+                column.append(values[keep])
+    return tuple( numpy.concatenate(column) if column else numpy.zeros(0, dtype = dtype) for column, dtype in zip(columns, [numpy.int64] * 4 + [numpy.float64]) )
+
+def firstAndLast(keys):
+    """
+        Finds the first and the last positions of each distinct key.
+
+        :param keys: positive integers
+        :type keys: :class:`numpy.ndarray`
+        :return: the distinct keys in increasing order, and the first and last positions of each of them
+        :rtype: :class:`numpy.ndarray`, :class:`numpy.ndarray`, :class:`numpy.ndarray`
+    """
+    order = numpy.argsort(keys, kind = "stable")
+    sortedKeys = keys[order]
+    starts = numpy.flatnonzero(numpy.diff(sortedKeys, prepend = -1))#the keys are positive
+    ends = numpy.flatnonzero(numpy.diff(sortedKeys, append = sortedKeys[-1:] + 1))
+    return sortedKeys[starts], order[starts], order[ends]
+
+def chooseFamilies(nbgenes, queries, targets, qlens, tlens, scores):
+    """
+        Chooses the family each family is a fragment of, if any: the one with the best alignment among the longer families with as many genes or more.
+        When several alignments are given for the same representatives, in any direction, the last one is used. The ties are broken by keeping the family aligned first.
+
+        :param nbgenes: the number of genes of each family
+        :type nbgenes: :class:`numpy.ndarray`
+        :return: the chosen family of each family, or -1
+        :rtype: :class:`numpy.ndarray`
+    """
+    nbFam = len(nbgenes)
+    #the length of a representative is the last one given for it.
+    known, _, last = firstAndLast(numpy.stack((queries, targets), axis = 1).ravel())
+    lengths = numpy.full(nbFam, -1, dtype = numpy.int64)
+    lengths[known] = numpy.stack((qlens, tlens), axis = 1).ravel()[last]
+    #each pair of representatives has the score of its last alignment and the rank of its first one.
+    pairs, ranks, last = firstAndLast(numpy.minimum(queries, targets) * nbFam + numpy.maximum(queries, targets))
+    pairScores = scores[last]
+    low, high = pairs // nbFam, pairs % nbFam
+    fams, candidates, keptRanks, keptScores = [], [], [], []
+    for fam, candidate in [(low, high), (high, low)]:
+        keep = (lengths[candidate] > lengths[fam]) & (nbgenes[candidate] >= nbgenes[fam]) & (pairScores > 0)
+        fams.append(fam[keep])
+        candidates.append(candidate[keep])
+        keptRanks.append(ranks[keep])
+        keptScores.append(pairScores[keep])
+    fams, candidates = numpy.concatenate(fams), numpy.concatenate(candidates)
+    #the best candidate of each family comes first once sorted by family, decreasing score and rank.
+    order = numpy.lexsort((numpy.concatenate(keptRanks), -numpy.concatenate(keptScores), fams))
+    fams, candidates = fams[order], candidates[order]
+    best = numpy.flatnonzero(numpy.diff(fams, prepend = -1))
+    choice = numpy.full(nbFam, -1, dtype = numpy.int64)
+    choice[fams[best]] = candidates[best]
+    return choice
 
-            if line[0] != line[1]:
-                simgraph.add_edge(line[0],line[1], score = float(line[4]))
-                simgraph.nodes[line[0]]["length"] = int(line[2])
-                simgraph.nodes[line[1]]["length"] = int(line[3])
-    for node, nodedata in simgraph.nodes(data = True):
-        choice = (None, 0, 0, 0)
-        for neighbor in simgraph.neighbors(node):
-            nei = simgraph.nodes[neighbor]
-            score = simgraph[neighbor][node]["score"]
-            if nei["length"] > nodedata["length"] and nei["nbgenes"] >= nodedata["nbgenes"] and  choice[3] < score:
-                choice = (genes2fam[neighbor][0], nei["length"] , nei["nbgenes"], score)#genes2fam[neighbor] instead of just neighbor in case that family has been assigned already (this is for smaller fragments that are closer to other fragments than the actual gene family)
-        if choice[0] is not None:
-            genestochange = fam2genes[node]
-            for gene in genestochange:
-                genes2fam[gene] = (choice[0], True)
-                fam2genes[choice[0]].add(gene)
-            del fam2genes[node]
+def findRoots(parents):
+    """
+        Finds the root of each element of a forest given the parent of each element, or -1 for the roots.
+
+        :rtype: :class:`numpy.ndarray`
+    """
+    roots = numpy.where(parents >= 0, parents, numpy.arange(len(parents)))
+    while True:
+        nextRoots = roots[roots]#every element jumps to the element its own target points to, doubling the distance covered each time
+        if numpy.array_equal(nextRoots, roots):
+            return roots
+        roots = nextRoots
+
+def refineClustering(tsv, alnFile, fam2seq, copies = None):
+    genes2fam, fam2genes = read_tsv(tsv, copies)
+    logging.getLogger().info(f"Starting with {len(fam2seq)} families")
+    famNames = list(fam2genes.keys())
+    famIndex = { fam : i for i, fam in enumerate(famNames) }
+    nbgenes = numpy.array([ len(genes) for genes in fam2genes.values() ], dtype = numpy.int64)
+    choice = chooseFamilies(nbgenes, *read_alignments(alnFile, famIndex))
+    #as a family is always longer than the fragments moved to it, the families they are moved to form a forest.
+    roots = findRoots(choice)
     newFam2seq = {}
-    for fam in fam2genes:
-        newFam2seq[fam] = fam2seq[fam]
+    for i, fam in enumerate(famNames):
+        if choice[i] >= 0:
+            newFam = famNames[roots[i]]
+            for gene in fam2genes[fam]:
+                genes2fam[gene] = (newFam, True)
+        else:
+            newFam2seq[fam] = fam2seq[fam]
     logging.getLogger().info(f"Ending with {len(newFam2seq)} gene families")
     return genes2fam, newFam2seq
 
@@ -184,17 +324,21 @@ def clustering(pangenome, tmpdir, cpu , defrag = True, code = "11", coverage = 0
     sequenceFile = open(newtmpdir.name + '/nucleotid_sequences',"w")
 
     checkPangenomeForClustering(pangenome, sequenceFile, force, show_bar=show_bar)
+    sequenceFile.close()
+    logging.getLogger().info("Collapsing the genes with identical proteins...")
+    uniqueFile = open(newtmpdir.name + '/unique_sequences',"w")
+    copies = writeUniqueSequences(sequenceFile.name, uniqueFile, code)
+    uniqueFile.close()
     logging.getLogger().info("Clustering all of the genes sequences...")
-    rep, tsv = firstClustering(sequenceFile, newtmpdir, cpu, code, coverage, identity, mode)
+    rep, tsv = firstClustering(uniqueFile, newtmpdir, cpu, code, coverage, identity, mode)
 
-    sequenceFile.close()
     fam2seq = read_faa(rep)
     if not defrag:
-        genes2fam = read_tsv(tsv)[0]
+        genes2fam = read_tsv(tsv, copies)[0]
     else:
         logging.getLogger().info("Associating fragments to their original gene family...")
         aln = alignRep(rep, newtmpdir, cpu, coverage, identity)
-        genes2fam, fam2seq = refineClustering(tsv, aln, fam2seq)
+        genes2fam, fam2seq = refineClustering(tsv, aln, fam2seq, copies)
         pangenome.status["defragmented"] = "Computed"
     newtmpdir.cleanup()
     read_fam2seq(pangenome, fam2seq)
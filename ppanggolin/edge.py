@@ -13,6 +13,8 @@ class Edge:
     :param targetGene: a second gene to initialize the edge
     :type targetGene: :class:`ppanggolin.genome.Gene`
     """
+    __slots__ = ("source", "target", "organisms")
+
     def __init__(self, sourceGene, targetGene):
         if sourceGene.family is None:
             raise Exception(f"You cannot create a graph without gene families. gene {sourceGene.ID} did not have a gene family.")
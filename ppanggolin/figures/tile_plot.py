@@ -24,11 +24,6 @@ def drawTilePlot(pangenome, output, nocloud = False):
     if len(pangenome.organisms) > 500 and nocloud is False:
         logging.getLogger().warning("You asked to draw a tile plot for a lot of organisms (>500). Your browser will probably not be able to open it.")
     logging.getLogger().info("Drawing the tile plot...")
-    data        = []
-    all_indexes = []
-    all_columns = []
-    fam2index = {}
-    index2fam = {}
     if nocloud:
         families = { fam for fam in pangenome.geneFamilies if not fam.partition.startswith("C")}
     else:
@@ -41,15 +36,10 @@ def drawTilePlot(pangenome, output, nocloud = False):
 
     logging.getLogger().info("start with matrice")
 
-    for row, fam in enumerate(families):
-        new_col=[ org_index[org] for org in fam.organisms ]
-        all_indexes.extend([row]*len(new_col))
-        all_columns.extend(new_col)
-        data.extend([1.0]*len(new_col))
-        index2fam[row]=fam.name
-        fam2index[fam.name] = row
-
-    mat_p_a = csc_matrix((data, (all_indexes,all_columns)), shape = (len(families),len(pangenome.organisms)), dtype='float')
+    fam_index = pangenome.getFamilyIndex()
+    counts = pangenome.getFamilyMatrix()
+    nb_orgs = numpy.diff(counts.indptr)
+    mat_p_a = csc_matrix(counts[[ fam_index[fam] for fam in families ]] > 0, dtype='float')
     dist    = pdist(1 - jaccard_similarities(mat_p_a,0).todense())
     hc      = linkage(dist, 'single')
 
@@ -68,13 +58,13 @@ def drawTilePlot(pangenome, output, nocloud = False):
         if fam.partition.startswith("S"):
             shell_subs.add(fam.partition)#number of elements will tell the number of subpartitions
     ordered_nodes = []
-    ordored_nodes_p = sorted(partitions_dict["P"], key=lambda n:len(n.organisms), reverse=True)
-    ordored_nodes_c = sorted(partitions_dict["C"], key=lambda n:len(n.organisms), reverse=True)
+    ordored_nodes_p = sorted(partitions_dict["P"], key=lambda n:nb_orgs[fam_index[n]], reverse=True)
+    ordored_nodes_c = sorted(partitions_dict["C"], key=lambda n:nb_orgs[fam_index[n]], reverse=True)
     sep_p = len(ordored_nodes_p)-0.5
     separators = [sep_p]
     shell_NA = None
     if len(shell_subs)==1:
-        ordored_nodes_s = sorted(partitions_dict[shell_subs.pop()], key=lambda n:len(n.organisms), reverse=True)
+        ordored_nodes_s = sorted(partitions_dict[shell_subs.pop()], key=lambda n:nb_orgs[fam_index[n]], reverse=True)
         ordered_nodes = ordored_nodes_p+ordored_nodes_s+ordored_nodes_c
         separators.append(separators[len(separators)-1]+len(ordored_nodes_s))
         separators.append(separators[len(separators)-1]+len(ordored_nodes_c))
@@ -83,18 +73,19 @@ def drawTilePlot(pangenome, output, nocloud = False):
         for subpartition in sorted(shell_subs):
             if subpartition=="S_":
                 shell_NA=len(separators)-1
-            ordored_nodes_s = sorted(partitions_dict[subpartition], key=lambda n:len(n.organisms), reverse=True)
+            ordored_nodes_s = sorted(partitions_dict[subpartition], key=lambda n:nb_orgs[fam_index[n]], reverse=True)
             ordered_nodes+= ordored_nodes_s
             separators.append(separators[len(separators)-1]+len(ordored_nodes_s))
         ordered_nodes+=ordored_nodes_c
         separators.append(separators[len(separators)-1]+len(ordored_nodes_c))
 
     logging.getLogger().info("Getting the gene name(s) and the number for each tile of the plot ...")
+    order_columns = [ org_index[org] for org in order_organisms ]
     for node in ordered_nodes:
         fam_order.append('\u200c' + node.name)
-        data = node.organisms
-        binary_data.append([len(node.getGenesPerOrg(org)) if org in data else numpy.nan for org in order_organisms])
-        text_data.append([("\n".join(map(str,node.getGenesPerOrg(org)))) if org in data else numpy.nan for org in order_organisms])
+        row = counts[fam_index[node]].toarray()[0][order_columns]
+        binary_data.append([ count if count > 0 else numpy.nan for count in row.tolist() ])
+        text_data.append([("\n".join(map(str,node.getGenesPerOrg(org)))) if count > 0 else numpy.nan for org, count in zip(order_organisms, row.tolist())])
 
     xaxis_values = [ '\u200c'+org.name for org in order_organisms ]
 
@@ -2,4 +2,5 @@ from .writeBinaries import *
 from .readBinaries import *
 from .writeFlat import *
 from .writeSequences import *
-from .writeMSA import *
\ No newline at end of file
+from .writeMSA import *
+from .lazyPangenome import *
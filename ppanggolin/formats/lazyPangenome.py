@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import logging
+
+#installed libraries
+import numpy
+import tables
+
+#local libraries
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.geneFamily import GeneFamily
+from ppanggolin.genome import Organism, Gene, RNA
+from ppanggolin.formats.readBinaries import getLayoutVersion, readColumns, StringPoolReader, SequenceReader
+
+
+class LazyGeneFamily(GeneFamily):
+    """A gene family of a :class:`ppanggolin.formats.lazyPangenome.LazyPangenome`. Its genes and its edges are read from the pangenome file the first time they are accessed.
+
+    :param ID: The index of the gene family in the pangenome file
+    :type ID: int
+    :param name: The name of the gene family
+    :type name: str
+    :param pangenome: The pangenome the gene family is read from
+    :type pangenome: :class:`ppanggolin.formats.lazyPangenome.LazyPangenome`
+    """
+    __slots__ = ("_pangenome", "_genesRead", "_edgesRead", "_geneSet", "_genePerOrgDict", "_edgeDict")
+
+    def __init__(self, ID, name, pangenome):
+        self._pangenome = pangenome
+        self._genesRead = False
+        self._edgesRead = False
+        super().__init__(ID, name)
+
+    def _readGenes(self):
+        if not self._genesRead:
+            self._genesRead = True
+            self._pangenome._readFamilyGenes(self)
+
+    @property
+    def genes(self):
+        self._readGenes()
+        return self._geneSet
+
+    @genes.setter
+    def genes(self, genes):
+        self._geneSet = genes
+
+    @property
+    def _genePerOrg(self):
+        self._readGenes()
+        return self._genePerOrgDict
+
+    @_genePerOrg.setter
+    def _genePerOrg(self, genePerOrg):
+        self._genePerOrgDict = genePerOrg
+
+    @property
+    def _edges(self):
+        if not self._edgesRead and not self._pangenome._readingEdges:#edges of other families are not read while creating this family's edges.
+            self._edgesRead = True
+            self._pangenome._readFamilyEdges(self)
+        return self._edgeDict
+
+    @_edges.setter
+    def _edges(self, edges):
+        self._edgeDict = edges
+
+
+class _GenesByIndex:
+    """Genes of a :class:`ppanggolin.formats.lazyPangenome.LazyPangenome` accessed by their index in the pangenome file"""
+    def __init__(self, pangenome):
+        self._pangenome = pangenome
+
+    def __getitem__(self, index):
+        return self._pangenome.getGeneByIndex(index)
+
+
+class LazyPangenome(Pangenome):
+    """A pangenome whose annotations, gene families and edges are read from its .h5 file only when they are needed, using integer indexes of the file, instead of being entirely loaded by :func:`ppanggolin.formats.readBinaries.checkPangenomeInfo`.
+
+    An organism is read as a whole (contigs, genes and RNAs) the first time one of its genes is needed. A gene family is created with its sequence and partition the first time it is needed, and its genes and edges are read the first time they are accessed.
+    Accessing :attr:`organisms`, :attr:`genes` or :attr:`edges` reads everything, as a regular :class:`ppanggolin.pangenome.Pangenome` would.
+
+    This is meant for commands that only read a pangenome, and can be used as a context manager that closes the pangenome file. A file written with a former layout of the tables cannot be read lazily, in that case the pangenome behaves as a regular :class:`ppanggolin.pangenome.Pangenome`.
+    """
+    def __init__(self):
+        """Constructor method.
+        """
+        super().__init__()
+        self._h5f = None
+        self._readingEdges = False
+
+    def addFile(self, pangenomeFile):
+        """Links an HDF5 file to the pangenome, and reads the indexes needed to serve its elements on demand.
+
+        :param pangenomeFile: A string representing the filepath to the hdf5 pangenome file to be used
+        :type pangenomeFile: str
+        """
+        super().addFile(pangenomeFile)
+        h5f = tables.open_file(pangenomeFile, "r")
+        if getLayoutVersion(h5f) == 1:
+            logging.getLogger().warning("The pangenome file was written with a former layout of its tables, and cannot be read lazily. Its content will be entirely read when needed.")
+            h5f.close()
+            return
+        self._h5f = h5f
+        self._strings = StringPoolReader(h5f)
+        if self.status["genomesAnnotated"] == "inFile":
+            annotations = h5f.root.annotations
+            self._contigOrgs = annotations.contigs.organism.read()
+            self._nbOrgs = annotations.organisms.name.nrows
+            #organisms, contigs and genes are written in order, so the contigs of an organism and the genes of a contig are contiguous
+            self._orgContigStarts = numpy.searchsorted(self._contigOrgs, numpy.arange(self._nbOrgs + 1))
+            self._contigGeneStarts = numpy.searchsorted(annotations.genes.contig.read(), numpy.arange(len(self._contigOrgs) + 1))
+            self._contigRNAStarts = numpy.searchsorted(annotations.RNAs.contig.read(), numpy.arange(len(self._contigOrgs) + 1))
+            self._orgs = {}
+            self._genes = {}
+            self._geneIndex = None
+            self.status["genomesAnnotated"] = "Loaded"
+        if self.status["genesClustered"] == "inFile":
+            gene2fam = readColumns(h5f.root.geneFamilies)
+            self._nbFams = h5f.root.geneFamiliesInfo.name.nrows
+            self._famOfGene = numpy.full(h5f.root.annotations.genes.ID.nrows, -1, dtype = numpy.int64)
+            self._famOfGene[gene2fam["gene"]] = gene2fam["geneFam"]
+            order = numpy.argsort(gene2fam["geneFam"], kind = "stable")
+            self._famGenes = gene2fam["gene"][order]
+            self._famGeneStarts = numpy.searchsorted(gene2fam["geneFam"][order], numpy.arange(self._nbFams + 1))
+            self._fams = {}
+            self._famIndex = None
+            proteins = h5f.root.geneFamiliesInfo.protein
+            self._proteins = SequenceReader(proteins) if isinstance(proteins, tables.Group) else None#files written with the second layout have a column of fixed-width strings
+            self.max_fam_id = self._nbFams
+            self.status["genesClustered"] = "Loaded"
+            if self.status["partitionned"] == "inFile":
+                self.status["partitionned"] = "Loaded"
+            if self.status["geneFamilySequences"] == "inFile":
+                self.status["geneFamilySequences"] = "Loaded"
+        if self.status["neighborsGraph"] == "inFile":
+            edges = readColumns(h5f.root.edges)
+            self._edgeSources = edges["geneSource"]
+            self._edgeTargets = edges["geneTarget"]
+            self._edgeRowsRead = numpy.zeros(len(self._edgeSources), dtype = bool)
+            #rows of the edge table where each family is found, either as source or as target
+            famOfRows = numpy.concatenate((self._famOfGene[self._edgeSources], self._famOfGene[self._edgeTargets]))
+            rows = numpy.tile(numpy.arange(len(self._edgeSources), dtype = numpy.int64), 2)
+            order = numpy.argsort(famOfRows, kind = "stable")
+            self._famEdgeRows = rows[order]
+            self._famEdgeStarts = numpy.searchsorted(famOfRows[order], numpy.arange(self._nbFams + 1))
+            self.status["neighborsGraph"] = "Loaded"
+
+    def closeFile(self):
+        """Closes the pangenome file. Elements that have not been read yet cannot be accessed anymore.
+        """
+        if self._h5f is not None:
+            self._h5f.close()
+            self._h5f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        """Closes the pangenome file when leaving a `with` block, even if an exception was raised in it.
+        """
+        self.closeFile()
+
+    @property
+    def _lazy(self):
+        return self._h5f is not None
+
+    def _readOrganism(self, orgIndex):
+        annotations = self._h5f.root.annotations
+        firstContig, lastContig = self._orgContigStarts[orgIndex], self._orgContigStarts[orgIndex + 1]
+        org = Organism(self._strings[[annotations.organisms.name[orgIndex]]][0])
+        contigCols = readColumns(annotations.contigs, firstContig, lastContig)
+        contigs = [ org.getOrAddContig(name, is_circular = is_circular) for name, is_circular in zip(self._strings[contigCols["name"]].tolist(), contigCols["is_circular"].tolist()) ]
+
+        start, stop = self._contigGeneStarts[firstContig], self._contigGeneStarts[lastContig]
+        genes = readColumns(annotations.genes, start, stop)
+        IDs = self._strings[genes["ID"]].tolist()
+        names = self._strings[genes["name"]].tolist()
+        products = self._strings[genes["product"]].tolist()
+        localIDs = self._strings[genes["local"]].tolist()
+        strands = genes["strand"].astype(str).tolist()
+        families = self._getFamilies(self._famOfGene[start:stop]) if hasattr(self, "_famOfGene") else [None] * (stop - start)
+        for i, (contigIndex, geneStart, geneStop, position, geneticCode, isFragment) in enumerate(zip(*[ genes[col].tolist() for col in ["contig", "start", "stop", "position", "genetic_code", "is_fragment"] ])):
+            gene = Gene(IDs[i])
+            gene.fill_annotations(start = geneStart, stop = geneStop, strand = strands[i], geneType = "CDS", position = position,
+                                  genetic_code = geneticCode, name = names[i], product = products[i], local_identifier = localIDs[i])
+            gene.is_fragment = isFragment
+            contig = contigs[contigIndex - firstContig]
+            gene.fill_parents(org, contig)
+            contig.addGene(gene)
+            gene.family = families[i]#the gene is added to the family when the genes of the family are read.
+            self._genes[start + i] = gene
+
+        start, stop = self._contigRNAStarts[firstContig], self._contigRNAStarts[lastContig]
+        RNAs = readColumns(annotations.RNAs, start, stop)
+        for ID, contigIndex, rnaStart, rnaStop, strand, rnaType, name, product, local in zip(self._strings[RNAs["ID"]].tolist(), RNAs["contig"].tolist(), RNAs["start"].tolist(), RNAs["stop"].tolist(),
+                                                                                            RNAs["strand"].astype(str).tolist(), self._strings[RNAs["type"]].tolist(), self._strings[RNAs["name"]].tolist(),
+                                                                                            self._strings[RNAs["product"]].tolist(), self._strings[RNAs["local"]].tolist()):
+            rna = RNA(ID)
+            rna.fill_annotations(start = rnaStart, stop = rnaStop, strand = strand, geneType = rnaType, name = name, product = product, local_identifier = local)
+            contig = contigs[contigIndex - firstContig]
+            rna.fill_parents(org, contig)
+            contig.addRNA(rna)
+
+        self._orgs[orgIndex] = org
+        self._orgGetter[org.name] = org
+        return org
+
+    def _getOrganism(self, orgIndex):
+        org = self._orgs.get(orgIndex)
+        if org is None:
+            org = self._readOrganism(orgIndex)
+        return org
+
+    def getGeneByIndex(self, index):
+        """returns the gene that is at the given index in the annotation table of the pangenome file, reading its organism if needed.
+
+        :param index: The index of the gene
+        :type index: int
+        :return: the gene
+        :rtype: :class:`ppanggolin.genome.Gene`
+        """
+        gene = self._genes.get(index)
+        if gene is None:
+            contigIndex = numpy.searchsorted(self._contigGeneStarts, index, side = "right") - 1
+            self._getOrganism(int(self._contigOrgs[contigIndex]))
+            gene = self._genes[index]
+        return gene
+
+    @property
+    def genesByIndex(self):
+        """A view of the genes of the pangenome by their index in the annotation table of the pangenome file, reading them when they are accessed. None if the annotations are not read lazily.
+        """
+        if self._lazy and hasattr(self, "_genes"):
+            return _GenesByIndex(self)
+        return None
+
+    def _getFamilies(self, indices):
+        """returns the gene families at the given indices of the pangenome file, creating those that were not created yet. Negative indices give None."""
+        indices = numpy.asarray(indices)
+        missing = [ index for index in numpy.unique(indices[indices >= 0]).tolist() if index not in self._fams ]
+        if len(missing) > 0:
+            info = self._h5f.root.geneFamiliesInfo
+            if len(missing) > self._nbFams / 10:#reading whole columns is faster than reading many rows one by one
+                famInfo = { col : values[missing] for col, values in readColumns(info).items() }
+            else:
+                famInfo = { column._v_name : column[missing] for column in info._f_iter_nodes("Leaf") }
+            proteins = famInfo["protein"].astype(str).tolist() if self._proteins is None else self._proteins[missing]
+            for index, name, partition, protein in zip(missing, self._strings[famInfo["name"]].tolist(), self._strings[famInfo["partition"]].tolist(), proteins):
+                fam = LazyGeneFamily(index, name, self)
+                fam.addPartition(partition)
+                fam.addSequence(protein)
+                self._fams[index] = fam
+                self._famGetter[name] = fam
+        return [ self._fams[index] if index >= 0 else None for index in indices.tolist() ]
+
+    def _readFamilyGenes(self, fam):
+        for index in self._famGenes[self._famGeneStarts[fam.ID]:self._famGeneStarts[fam.ID + 1]].tolist():
+            fam.addGene(self.getGeneByIndex(index))
+
+    def _readFamilyEdges(self, fam):
+        if not hasattr(self, "_famEdgeRows"):
+            return
+        rows = self._famEdgeRows[self._famEdgeStarts[fam.ID]:self._famEdgeStarts[fam.ID + 1]]
+        self._readEdgeRows(rows[~self._edgeRowsRead[rows]])
+
+    def _readEdgeRows(self, rows):
+        self._edgeRowsRead[rows] = True
+        self._readingEdges = True
+        for source, target in zip(self._edgeSources[rows].tolist(), self._edgeTargets[rows].tolist()):
+            self.addEdge(self.getGeneByIndex(source), self.getGeneByIndex(target))
+        self._readingEdges = False
+
+    @property
+    def organisms(self):
+        """returns all the organisms in the pangenome, reading those that were not read yet
+
+        :return: list of :class:`ppanggolin.genome.Organism`
+        :rtype: list
+        """
+        if self._lazy and hasattr(self, "_orgs"):
+            return [ self._getOrganism(index) for index in range(self._nbOrgs) ]
+        return super().organisms
+
+    def number_of_organisms(self):
+        """Returns the number of organisms present in the pangenome, without reading them
+
+        :return: the number of organism
+        :rtype: int
+        """
+        if self._lazy and hasattr(self, "_orgs"):
+            return self._nbOrgs
+        return super().number_of_organisms()
+
+    @property
+    def geneFamilies(self):
+        """returns all the gene families in the pangenome. Their genes and edges are read when they are accessed.
+
+        :return: list of :class:`ppanggolin.geneFamily.GeneFamily`
+        :rtype: list
+        """
+        if self._lazy and hasattr(self, "_fams"):
+            self._getFamilies(numpy.arange(self._nbFams))
+            return sorted(self._famGetter.values(), key = lambda fam : fam.ID)
+        return super().geneFamilies
+
+    def number_of_geneFamilies(self):
+        """Returns the number of gene families present in the pangenome, without reading them
+
+        :return: the number of gene families
+        :rtype: int
+        """
+        if self._lazy and hasattr(self, "_fams"):
+            return self._nbFams + len(self._famGetter) - len(self._fams)#the families of the file, and those added since
+        return super().number_of_geneFamilies()
+
+    @property
+    def edges(self):
+        """returns all the edges in the pangenome graph, reading those that were not read yet
+
+        :return: list of :class:`ppanggolin.pangenome.Edge`
+        :rtype: list
+        """
+        if self._lazy and hasattr(self, "_edgeRowsRead"):
+            self._readEdgeRows(numpy.nonzero(~self._edgeRowsRead)[0])
+        return super().edges
+
+    def getGeneFamily(self, name):
+        """returns the gene family that has the given `name`, creating it from the pangenome file if needed
+
+        :param name: The gene family name to look for
+        :type name: any
+        :return: returns the gene family that has the name `name`
+        :rtype: :class:`ppanggolin.geneFamily.GeneFamily`
+        """
+        fam = self._famGetter.get(name)
+        if fam is None and self._lazy and hasattr(self, "_fams"):
+            if self._famIndex is None:
+                self._famIndex = { famName : index for index, famName in enumerate(self._strings[self._h5f.root.geneFamiliesInfo.name.read()].tolist()) }
+            fam = self._getFamilies([self._famIndex[name]])[0]
+        elif fam is None:
+            raise KeyError(name)
+        return fam
+
+    def addGeneFamily(self, name):
+        """
+            Get the :class:`ppanggolin.geneFamily.GeneFamily` object that has the given `name`, from the pangenome file if it is there. If it does not exist, creates it.
+
+            :param name: The gene family name to get if it exists, and create otherwise.
+            :type name: str
+        """
+        try:
+            return self.getGeneFamily(name)
+        except KeyError:
+            return super().addGeneFamily(name)
+
+    def getGene(self, geneID):
+        """returns the gene that has the given `geneID`, reading its organism if needed.
+        The first call reads the IDs of all of the genes to index them.
+
+        :param geneID: The gene ID to look for
+        :type geneID: any
+        :return: returns the gene that has the ID `geneID`
+        :rtype: :class:`ppanggolin.genome.Gene`
+        :raises KeyError: If the `geneID` is not in the pangenome
+        """
+        if not (self._lazy and hasattr(self, "_genes")):
+            return super().getGene(geneID)
+        if self._geneIndex is None:
+            self._geneIndex = { ID : index for index, ID in enumerate(self._strings[self._h5f.root.annotations.genes.ID.read()].tolist()) }
+        try:
+            return self.getGeneByIndex(self._geneIndex[geneID])
+        except KeyError:
+            raise KeyError(f"{geneID} does not exist in the pangenome.")
@@ -4,14 +4,17 @@
 #default libraries
 import logging
 import sys
+from multiprocessing import Pool
 
 #installed libraries
 from tqdm import tqdm
 import tables
+import numpy
 
 #local libraries
 from ppanggolin.genome import Organism, Gene, RNA
 from ppanggolin.region import Spot
+from ppanggolin.sequenceKernel import unpack_dna
 
 def getNumberOfOrganisms(pangenome):
     """ standalone function to get the number of organisms in a pangenome"""
@@ -20,14 +23,15 @@ def getNumberOfOrganisms(pangenome):
     else:
         raise FileNotFoundError("The provided pangenome does not have an associated .h5 file")
     h5f =  tables.open_file(filename,"r")
-    annotations = h5f.root.annotations
-
-    table = annotations.genes
-    orgSet = set()
-    for org in read_chunks(table, column = "organism"):
-        orgSet.add(org)
+    if getLayoutVersion(h5f) == 1:
+        orgSet = set()
+        for org in read_chunks(h5f.root.annotations.genes, column = "organism"):
+            orgSet.add(org)
+        nbOrgs = len(orgSet)
+    else:
+        nbOrgs = h5f.root.annotations.organisms.name.nrows
     h5f.close()
-    return len(orgSet)
+    return nbOrgs
 
 def getStatus(pangenome, pangenomeFile):
     """
@@ -70,13 +74,361 @@ def read_chunks(table, column = None, chunk=10000):
         for row in table.read(start = i, stop = i + chunk, field = column):
             yield row
 
-def getGeneSequencesFromFile(filename, fileObj, list_CDS=None, show_bar = False):
+def read_decoded_chunks(table, columns, chunk = 100000):
+    """
+        Reading entirely the provided table chunk per chunk as numpy structured arrays, and yielding its rows as tuples of the given columns.
+        Strings are decoded for a whole column at once instead of row per row.
+    """
+    for i in range(0, table.nrows, chunk):
+        data = table.read(start = i, stop = i + chunk)
+        yield from zip(*[ data[col].astype(str).tolist() if data[col].dtype.kind == "S" else data[col].tolist() for col in columns ])
+
+def readColumns(group, start = None, stop = None):
+    """
+        Reads a table stored column per column (as written by :class:`ppanggolin.formats.writeBinaries.ColumnTable`), entirely or between the given rows.
+        Returns a dictionnary with the column names as keys and numpy arrays as values.
+    """
+    return { column._v_name : column.read(start, stop) for column in group._f_iter_nodes("Leaf") }
+
+def readColumnChunks(group, chunk = 10000):
+    """
+        Reading entirely the provided column table chunk per chunk to limit RAM usage.
+    """
+    nrows = next(group._f_iter_nodes("Leaf")).nrows
+    for i in range(0, nrows, chunk):
+        yield readColumns(group, i, i + chunk)
+
+def getLayoutVersion(h5f):
+    """
+        Returns the version of the layout of the tables of the pangenome file. Files written before the layout was versionned are version 1, where every table stores strings.
+    """
+    if "layoutVersion" in h5f.root.status._v_attrs._f_list():
+        return h5f.root.status._v_attrs.layoutVersion
+    return 1
+
+class StringPoolReader:
+    """
+        Random access to the strings of the pool of a pangenome file, reading only the parts of the pool that hold the requested strings.
+
+        :param h5f: the pangenome file
+        :type h5f: :class:`tables.File`
+        :param gap: the number of bytes between two requested strings below which they are read at once
+        :type gap: int
+    """
+    def __init__(self, h5f, gap = 65536):
+        self.data = h5f.root.stringPool.data
+        self.stops = h5f.root.stringPool.offsets.read()
+        self.gap = gap
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __getitem__(self, indices):
+        """returns the strings at the given indices, as a numpy array of objects aligned with `indices`"""
+        unique, inverse = numpy.unique(indices, return_inverse = True)
+        stops = self.stops[unique]
+        starts = numpy.zeros(len(unique), dtype = stops.dtype)
+        hasPrevious = unique > 0
+        starts[hasPrevious] = self.stops[unique[hasPrevious] - 1]
+        strings = []
+        #close strings are read in a single block
+        blockBreaks = numpy.nonzero(starts[1:] - stops[:-1] > self.gap)[0] + 1
+        for blockStart, blockStop in zip(numpy.append(0, blockBreaks).tolist(), numpy.append(blockBreaks, len(unique)).tolist()):
+            if blockStart == blockStop:
+                continue
+            offset = int(starts[blockStart])
+            buffer = self.data[offset:int(stops[blockStop - 1])].tobytes()
+            strings.extend(buffer[start - offset:stop - offset].decode() for start, stop in zip(starts[blockStart:blockStop].tolist(), stops[blockStart:blockStop].tolist()))
+        return numpy.array(strings, dtype = object)[inverse]
+
+class SequenceReader:
+    """
+        Reads the sequences written by :class:`ppanggolin.formats.writeBinaries.SequenceWriter` in a group of a pangenome file.
+        The sequences are only read when they are asked for. The end offsets of all of them are read the first time they are needed, unless only a few sequences are asked for.
+
+        :param group: the group of the sequences
+        :type group: :class:`tables.Group`
+        :param gap: the number of bases, or bytes, between two requested sequences below which they are read at once
+        :type gap: int
+    """
+    def __init__(self, group, gap = 65536):
+        self.gap = gap
+        self.data = group.data
+        self.offsets = group.offsets
+        self._stops = None
+        self.packed = group._v_attrs.packed
+        if self.packed:
+            self.exceptionPositions = group.exceptionPositions.read()
+            self.exceptionBases = group.exceptionBases.read()
+
+    @property
+    def stops(self):
+        """the end offsets of all of the sequences"""
+        if self._stops is None:
+            self._stops = self.offsets.read()
+        return self._stops
+
+    def __len__(self):
+        return self.offsets.nrows
+
+    def read(self, start = 0, stop = None):
+        """returns the list of the sequences between the given indices"""
+        stop = len(self.stops) if stop is None else min(stop, len(self.stops))
+        if start >= stop:
+            return []
+        stops = self.stops[start:stop].tolist()
+        starts = [ int(self.stops[start - 1]) if start > 0 else 0 ] + stops[:-1]
+        text = self.readBases(starts[0], stops[-1])
+        return [ text[seqStart - starts[0]:seqStop - starts[0]] for seqStart, seqStop in zip(starts, stops) ]
+
+    def readBases(self, start, stop):
+        """returns the concatenated sequences between the given offsets, as a str"""
+        if not self.packed:
+            return self.data[start:stop].tobytes().decode()
+        bases = unpack_dna(self.data[start // 4:(stop + 3) // 4], start % 4, stop - start)
+        first, last = numpy.searchsorted(self.exceptionPositions, [start, stop])
+        if first < last:
+            bases[self.exceptionPositions[first:last] - numpy.uint64(start)] = self.exceptionBases[first:last]
+        return bases.tobytes().decode()
+
+    def readSlice(self, index, start, stop):
+        """returns the part of the sequence at the given index between the given positions, as sequence[start:stop] would, reading only that part"""
+        seqStart = int(self.stops[index - 1]) if index > 0 else 0
+        start, stop, _ = slice(start, stop).indices(int(self.stops[index]) - seqStart)
+        return self.readBases(seqStart + start, seqStart + max(start, stop))
+
+    def chunks(self, chunk = 20000):
+        """yields the index of the first sequence of each chunk of sequences, with the list of their sequences"""
+        for start in range(0, len(self.stops), chunk):
+            yield start, self.read(start, start + chunk)
+
+    def __getitem__(self, indices):
+        """returns the list of the sequences at the given indices. Close sequences are read in a single block, as with :class:`StringPoolReader`."""
+        unique, inverse = numpy.unique(numpy.asarray(indices, dtype = numpy.int64), return_inverse = True)
+        hasPrevious = unique > 0
+        if self._stops is None and len(unique) * 100 < len(self):#reading the offsets of a few sequences is faster than reading them all
+            stops = self.offsets[unique.tolist()] if len(unique) > 0 else numpy.zeros(0, dtype = numpy.uint64)
+            previous = self.offsets[(unique[hasPrevious] - 1).tolist()] if hasPrevious.any() else []
+        else:
+            stops = self.stops[unique]
+            previous = self.stops[unique[hasPrevious] - 1]
+        starts = numpy.zeros(len(unique), dtype = stops.dtype)
+        starts[hasPrevious] = previous
+        sequences = []
+        blockBreaks = numpy.nonzero(starts[1:] - stops[:-1] > self.gap)[0] + 1
+        for blockStart, blockStop in zip(numpy.append(0, blockBreaks).tolist(), numpy.append(blockBreaks, len(unique)).tolist()):
+            if blockStart == blockStop:
+                continue
+            offset = int(starts[blockStart])
+            text = self.readBases(offset, int(stops[blockStop - 1]))
+            sequences.extend(text[start - offset:stop - offset] for start, stop in zip(starts[blockStart:blockStop].tolist(), stops[blockStart:blockStop].tolist()))
+        return [ sequences[index] for index in inverse.tolist() ]
+
+def hashStrings(data, starts, stops):
+    """
+        Computes the 64-bit FNV-1a hash of strings stored in a byte array, all at once.
+
+        :param data: the bytes of the strings
+        :type data: :class:`numpy.ndarray` of uint8
+        :param starts: the start offset of each string in data
+        :param stops: the end offset of each string in data
+        :return: the hashes
+        :rtype: :class:`numpy.ndarray` of uint64
+    """
+    starts = numpy.asarray(starts, dtype = numpy.int64)
+    lengths = numpy.asarray(stops, dtype = numpy.int64) - starts
+    hashes = numpy.full(len(starts), 0xcbf29ce484222325, dtype = numpy.uint64)
+    rows = numpy.arange(len(starts))
+    position = 0
+    while len(rows) > 0:#the strings are hashed one byte position at a time, dropping those that are over
+        rows = rows[lengths[rows] > position]
+        hashes[rows] = (hashes[rows] ^ data[starts[rows] + position]) * numpy.uint64(0x100000001b3)
+        position += 1
+    return hashes
+
+def hashIDs(IDs):
+    """Computes the hash of strings given as a list, as :func:`hashStrings` does."""
+    encoded = [ ID.encode() for ID in IDs ]
+    lengths = numpy.array([ len(ID) for ID in encoded ], dtype = numpy.int64)
+    stops = numpy.cumsum(lengths)
+    return hashStrings(numpy.frombuffer(b"".join(encoded), dtype = numpy.uint8), stops - lengths, stops)
+
+def getGeneIndexes(h5f, geneIDs):
+    """
+        Returns the sorted indexes of the genes with the given IDs in the annotation table of the pangenome file. IDs that are not in it are ignored.
+        The genes are found by binary search in the hashes of their IDs written by :func:`ppanggolin.formats.writeBinaries.writeGeneIDIndex`, or from all of the IDs if the file has none.
+    """
+    geneIDs = list(geneIDs)
+    if "IDHashes" not in h5f.root.geneSequences:
+        geneIndex = { ID : index for index, ID in enumerate(readStringPool(h5f, h5f.root.annotations.genes.ID.read()).tolist()) }
+        return numpy.array(sorted(geneIndex[ID] for ID in geneIDs if ID in geneIndex), dtype = numpy.int64)
+    if len(geneIDs) == 0:
+        return numpy.zeros(0, dtype = numpy.int64)
+    group = h5f.root.geneSequences
+    hashes = group.IDHashes.read()
+    queries = hashIDs(geneIDs)
+    lefts = numpy.searchsorted(hashes, queries, side = "left")
+    rights = numpy.searchsorted(hashes, queries, side = "right")
+    candidates = [ (row, ID) for left, right, ID in zip(lefts.tolist(), rights.tolist(), geneIDs) for row in range(left, right) ]#several IDs may have the same hash
+    if len(candidates) == 0:
+        return numpy.zeros(0, dtype = numpy.int64)
+    indexes = group.IDOrder[[ row for row, _ in candidates ]]
+    names = StringPoolReader(h5f)[h5f.root.annotations.genes.ID[indexes.tolist()]]
+    return numpy.unique([ index for index, name, (_, ID) in zip(indexes.tolist(), names.tolist(), candidates) if name == ID ]).astype(numpy.int64)
+
+def readStringPool(h5f, indices = None):
+    """
+        Returns the strings of the pangenome file as a numpy array of objects. The other tables reference the strings by their index in the pool.
+        If `indices` is given, only the strings at those indices are decoded, and the returned array is aligned with `indices`.
+    """
+    if indices is not None:
+        return StringPoolReader(h5f)[indices]
+    buffer = h5f.root.stringPool.data.read().tobytes()
+    stops = h5f.root.stringPool.offsets.read()
+    starts = numpy.zeros(len(stops), dtype = stops.dtype)
+    starts[1:] = stops[:-1]
+    text = buffer.decode()
+    if len(text) == len(buffer):#only ascii characters, so byte offsets are character offsets.
+        strings = [ text[start:stop] for start, stop in zip(starts.tolist(), stops.tolist()) ]
+    else:
+        strings = [ buffer[start:stop].decode() for start, stop in zip(starts.tolist(), stops.tolist()) ]
+    return numpy.array(strings, dtype = object)
+
+def readProdigalTraining(pangenomeFile, training):
+    """
+        Writes the Prodigal training file stored in the pangenome file (see :func:`ppanggolin.formats.writeBinaries.writeProdigalTraining`) in training.
+
+        :return: whether the pangenome file has a stored training file
+        :rtype: bool
+    """
+    h5f = tables.open_file(pangenomeFile, "r")
+    try:
+        if "/prodigalTraining" not in h5f:
+            return False
+        with open(training, "wb") as trainingFile:
+            trainingFile.write(h5f.root.prodigalTraining.read().tobytes())
+        return True
+    finally:
+        h5f.close()
+
+def getContigIndex(h5f):
+    """
+        Returns a dictionnary with the organism and contig names of the contigs of the pangenome file as keys, and their index in its annotation table as values.
+    """
+    annotations = h5f.root.annotations
+    orgNames = readStringPool(h5f, annotations.organisms.name.read())
+    contigs = readColumns(annotations.contigs)
+    return { key : index for index, key in enumerate(zip(orgNames[contigs["organism"]].tolist(), readStringPool(h5f, contigs["name"]).tolist())) }
+
+def getGenesByIndex(pangenome, h5f):
+    """
+        Returns the list of the CDS of the pangenome, in the order of the annotation table of the pangenome file so that the position of a gene in the list is its index in the other tables.
+        The genes are taken from the annotations if they are loaded, from the gene families if they are loaded, and created otherwise.
+        For a :class:`ppanggolin.formats.lazyPangenome.LazyPangenome`, only the genes that are accessed are read.
+    """
+    genesByIndex = getattr(pangenome, "genesByIndex", None)
+    if genesByIndex is not None:
+        return genesByIndex
+    if pangenome.status["genomesAnnotated"] in ["Computed","Loaded"]:
+        return [ gene for org in pangenome.organisms for contig in org.contigs for gene in contig.genes ]
+    geneIDs = readStringPool(h5f, h5f.root.annotations.genes.ID.read()).tolist()
+    if pangenome.status["genesClustered"] in ["Computed","Loaded"]:
+        return [ pangenome.getGene(ID) for ID in geneIDs ]
+    return [ Gene(ID) for ID in geneIDs ]
+
+def getGroups(values):
+    """
+        Returns the indices sorting the given array, and the boundaries in the sorted array of each group of equal values, to iterate over the groups without a python-level grouping.
+    """
+    order = numpy.argsort(values, kind = "stable")
+    groupValues, groupStarts = numpy.unique(values[order], return_index = True)
+    groupStops = numpy.append(groupStarts[1:], len(values))
+    return order, zip(groupValues.tolist(), groupStarts.tolist(), groupStops.tolist())
+
+def readGeneSequenceChunks(h5f, chunk = 20000):
+    """
+        Reads the gene sequences of a pangenome file chunk per chunk, yielding the list of the indexes of the genes of each chunk with the list of their sequences.
+        Since the third layout, the sequence at index i is the one of the gene at index i. Before, each row of the 'geneSequences' table had the index of its gene.
+    """
+    if "gene" in h5f.root.geneSequences:
+        for columns in readColumnChunks(h5f.root.geneSequences, chunk = chunk):
+            yield columns["gene"].tolist(), columns["dna"].astype(str).tolist()
+    else:
+        for start, sequences in SequenceReader(h5f.root.geneSequences).chunks(chunk):
+            yield range(start, start + len(sequences)), sequences
+
+exportFile = None#the pangenome file the sequences are exported from, in each process of getGeneSequencesFromFile
+
+def initSequenceExport(filename):
+    """opens the pangenome file the sequences are exported from"""
+    global exportFile
+    h5f = tables.open_file(filename, "r")
+    exportFile = (h5f, SequenceReader(h5f.root.geneSequences), StringPoolReader(h5f))
+
+def exportGeneSequences(indexes):
+    """returns the fasta records of the genes at the given sorted indexes of the pangenome file, as a single str"""
+    h5f, sequences, strings = exportFile
+    first, last = int(indexes[0]), int(indexes[-1]) + 1
+    if last - first == len(indexes):#consecutive genes are read at once
+        IDs = h5f.root.annotations.genes.ID[first:last]
+        dna = sequences.read(first, last)
+    else:
+        IDs = h5f.root.annotations.genes.ID[indexes.tolist()]
+        dna = sequences[indexes]
+    return "".join(f">{ID}\n{seq}\n" for ID, seq in zip(strings[IDs].tolist(), dna))
+
+def getGeneSequencesFromFile(filename, fileObj, list_CDS=None, show_bar = False, cpu = 1, chunk = 20000):
     """
         Writes the CDS sequences of the Pangenome object to a File object that can by filtered or not by a list of CDS
-        Loads the sequences from a .h5 pangenome file
+        Loads the sequences from a .h5 pangenome file. The requested genes are found with :func:`getGeneIndexes`,
+        and their sequences are read by shards of `chunk` genes, by `cpu` processes if there are several shards.
     """
     logging.getLogger().info("Extracting and writing CDS sequences from a .h5 pangenome file to a fasta file...")
     h5f = tables.open_file(filename,"r", driver_core_backing_store=0)
+    if getLayoutVersion(h5f) == 1:
+        getGeneSequencesFromFileLegacy(h5f, fileObj, list_CDS, show_bar)
+        h5f.close()
+        return
+    if "gene" in h5f.root.geneSequences:#files written with the second layout are read entirely
+        getGeneSequencesFromColumns(h5f, fileObj, list_CDS, show_bar)
+        h5f.close()
+        return
+    indexes = numpy.arange(h5f.root.annotations.genes.ID.nrows) if list_CDS is None else getGeneIndexes(h5f, list_CDS)
+    h5f.close()
+    shards = [ indexes[start:start + chunk] for start in range(0, len(indexes), chunk) ]
+    bar =  tqdm(total = len(indexes), unit="gene", disable= not show_bar)
+    if cpu > 1 and len(shards) > 1:
+        with Pool(processes = min(cpu, len(shards)), initializer = initSequenceExport, initargs = (filename,)) as p:
+            #the shards are given to the processes a few at a time, so that their records do not pile up in memory if the file is written slower than they are read.
+            batch = 4 * cpu
+            for first in range(0, len(shards), batch):
+                for shard, records in zip(shards[first:first + batch], p.imap(exportGeneSequences, shards[first:first + batch])):
+                    fileObj.write(records)
+                    bar.update(len(shard))
+    else:
+        initSequenceExport(filename)
+        for shard in shards:
+            fileObj.write(exportGeneSequences(shard))
+            bar.update(len(shard))
+        exportFile[0].close()
+    fileObj.flush()
+    bar.close()
+
+def getGeneSequencesFromColumns(h5f, fileObj, list_CDS=None, show_bar = False):
+    list_CDS=set(list_CDS) if list_CDS is not None else None
+    geneIDs = readStringPool(h5f, h5f.root.annotations.genes.ID.read())
+    bar =  tqdm(range(len(geneIDs)), unit="gene", disable= not show_bar)
+    for genes, sequences in readGeneSequenceChunks(h5f, chunk = 20000):#reading the sequences chunk per chunk otherwise RAM dies on big pangenomes
+        for gene, dna in zip(genes, sequences):
+            nameCDS = geneIDs[gene]
+            if list_CDS is None or nameCDS in list_CDS:
+                fileObj.write('>' + nameCDS + "\n")
+                fileObj.write(dna + "\n")
+        bar.update(len(genes))
+    fileObj.flush()
+    bar.close()
+
+def getGeneSequencesFromFileLegacy(h5f, fileObj, list_CDS=None, show_bar = False):
     table = h5f.root.geneSequences
     bar =  tqdm(range(table.nrows), unit="gene", disable= not show_bar)
     list_CDS=set(list_CDS) if list_CDS is not None else None
@@ -88,87 +440,44 @@ def getGeneSequencesFromFile(filename, fileObj, list_CDS=None, show_bar = False)
         bar.update()
     fileObj.flush()
     bar.close()
-    h5f.close()
 
-def launchReadOrganism(args):
-    return readOrganism(*args)
-
-def readOrganism(pangenome, orgName, contigDict, circularContigs, link = False):
-    org = Organism(orgName)
-    for contigName, geneList in contigDict.items():
-        contig = org.getOrAddContig(contigName, is_circular=circularContigs[contigName])
-        for row in geneList:
-            if link:#if the gene families are already computed/loaded the gene exists.
-                gene = pangenome.getGene(row["ID"].decode())
-            else:#else creating the gene.
-                gene_type = row["type"].decode()
-                if gene_type == "CDS":
-                    gene = Gene(row["ID"].decode())
-                elif "RNA" in gene_type:
-                    gene = RNA(row["ID"].decode())
-            try:
-                local = row["local"].decode()
-            except ValueError:
-                local = ""
-            gene.fill_annotations(
-                start = row["start"],
-                stop = row["stop"],
-                strand =  row["strand"].decode(),
-                geneType = row["type"].decode(),
-                position = row["position"],
-                genetic_code= row["genetic_code"],
-                name = row["name"].decode(),
-                product = row["product"].decode(),
-                local_identifier=local)
-            gene.is_fragment = row["is_fragment"]
-            gene.fill_parents(org, contig)
-            if gene_type == "CDS":
-                contig.addGene(gene)
-            elif "RNA" in gene_type:
-                contig.addRNA(gene)
-            else:
-                raise Exception(f"A strange type '{gene_type}', which we do not know what to do with, was met.")
-    pangenome.addOrganism(org)
-
-def readGraph(pangenome, h5f, show_bar = True):
+def readGraphLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.edges
 
     if not pangenome.status["genomesAnnotated"] in ["Computed","Loaded"] or not pangenome.status["genesClustered"] in ["Computed","Loaded"] :
         raise Exception("It's not possible to read the graph if the annotations and the gene families have not been loaded.")
     bar = tqdm(range(table.nrows), unit = "contig adjacency", disable= not show_bar)
-    for row in read_chunks(table):
-        source = pangenome.getGene(row["geneSource"].decode())
-        target = pangenome.getGene(row["geneTarget"].decode())
-        pangenome.addEdge(source, target)
+    for source, target in read_decoded_chunks(table, ["geneSource", "geneTarget"]):
+        pangenome.addEdge(pangenome.getGene(source), pangenome.getGene(target))
         bar.update()
     bar.close()
     pangenome.status["neighborsGraph"] = "Loaded"
 
-def readGeneFamilies(pangenome, h5f, show_bar = True):
+def readGeneFamiliesLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.geneFamilies
 
     link = True if pangenome.status["genomesAnnotated"] in ["Computed", "Loaded"] else False
 
     bar = tqdm(range(table.nrows), unit = "gene", disable=not show_bar)
-    for row in read_chunks(table):
-        fam = pangenome.addGeneFamily(row["geneFam"].decode())
+    for famName, geneID in read_decoded_chunks(table, ["geneFam", "gene"]):
+        fam = pangenome.addGeneFamily(famName)
         if link:#linking if we have loaded the annotations
-            geneObj = pangenome.getGene(row["gene"].decode())
+            geneObj = pangenome.getGene(geneID)
         else:#else, no
-            geneObj = Gene(row["gene"].decode())
+            geneObj = Gene(geneID)
         fam.addGene(geneObj)
         bar.update()
     bar.close()
     pangenome.status["genesClustered"] = "Loaded"
 
-def readGeneFamiliesInfo(pangenome, h5f, show_bar = True):
+def readGeneFamiliesInfoLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.geneFamiliesInfo
 
     bar = tqdm(range(table.nrows), unit = "gene family", disable=not show_bar)
-    for row in read_chunks(table):
-        fam = pangenome.addGeneFamily(row["name"].decode())
-        fam.addPartition(row["partition"].decode())
-        fam.addSequence(row["protein"].decode())
+    for name, partition, protein in read_decoded_chunks(table, ["name", "partition", "protein"]):
+        fam = pangenome.addGeneFamily(name)
+        fam.addPartition(partition)
+        fam.addSequence(protein)
         bar.update()
     bar.close()
     if h5f.root.status._v_attrs.Partitionned:
@@ -176,25 +485,24 @@ def readGeneFamiliesInfo(pangenome, h5f, show_bar = True):
     if h5f.root.status._v_attrs.geneFamilySequences:
         pangenome.status["geneFamilySequences"] = "Loaded"
 
-def readGeneSequences(pangenome, h5f, show_bar = True):
+def readGeneSequencesLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.geneSequences
 
     bar = tqdm(range(table.nrows), unit = "gene", disable= not show_bar)
-    for row in read_chunks(table):
-        gene = pangenome.getGene(row['gene'].decode())
-        gene.add_dna(row['dna'].decode())
+    for geneID, dna in read_decoded_chunks(table, ["gene", "dna"], chunk = 10000):
+        pangenome.getGene(geneID).add_dna(dna)
         bar.update()
     bar.close()
     pangenome.status["geneSequences"] = "Loaded"
 
 
-def readRGP(pangenome, h5f, show_bar = True):
+def readRGPLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.RGP
 
     bar = tqdm(range(table.nrows), unit = "gene", disable=not show_bar)
-    for row in read_chunks(table):
-        region = pangenome.getOrAddRegion(row["RGP"].decode())
-        region.append(pangenome.getGene(row["gene"].decode()))
+    for name, geneID in read_decoded_chunks(table, ["RGP", "gene"]):
+        region = pangenome.getOrAddRegion(name)
+        region.append(pangenome.getGene(geneID))
         bar.update()
     bar.close()
     #order the genes properly in the regions
@@ -202,50 +510,269 @@ def readRGP(pangenome, h5f, show_bar = True):
         region.genes = sorted(region.genes, key = lambda x : x.position )#order the same way than on the contig
     pangenome.status["predictedRGP"] = "Loaded"
 
-def readSpots(pangenome, h5f, show_bar = True):
+def readSpotsLegacy(pangenome, h5f, show_bar = True):
     table = h5f.root.spots
     bar = tqdm(range(table.nrows), unit= "region", disable=not show_bar)
     spots = {}
-    for row in read_chunks(table):
-        curr_spot = spots.get(row["spot"])
+    for spot, name in read_decoded_chunks(table, ["spot", "RGP"]):
+        curr_spot = spots.get(spot)
         if curr_spot is None:
-            curr_spot = Spot(row["spot"])
-            spots[row["spot"]] = curr_spot
-        curr_spot.addRegion(pangenome.getOrAddRegion(row["RGP"].decode()))
+            curr_spot = Spot(spot)
+            spots[spot] = curr_spot
+        curr_spot.addRegion(pangenome.getOrAddRegion(name))
         bar.update()
     bar.close()
     pangenome.addSpots(spots.values())
     pangenome.status["spots"] = "Loaded"
 
-def readAnnotation(pangenome, h5f, show_bar = True):
-    annotations = h5f.root.annotations
-
-    table = annotations.genes
+def readAnnotationLegacy(pangenome, h5f, show_bar = True):
+    """
+        Reads the annotations of a file written with the first layout, where each row of the table holds the organism and contig names of the gene.
+        The table is read chunk per chunk as numpy structured arrays, whose columns are decoded at once and grouped by organism and contig with numpy.
+    """
+    table = h5f.root.annotations.genes
+    link = True if pangenome.status["genesClustered"] in ["Computed","Loaded"] else False
+    organisms = {}
     bar = tqdm(range(table.nrows), unit="gene", disable=not show_bar)
-    pangenomeDict = {}
-    circularContigs = {}
-    for row in read_chunks(table):
-        try:
-            pangenomeDict[row["organism"].decode()][row["contig"]["name"].decode()].append(row["gene"])#new gene, seen contig, seen org
-        except KeyError:
-            try:
-                pangenomeDict[row["organism"].decode()][row["contig"]["name"].decode()] = [row["gene"]]#new contig, seen org
-                circularContigs[row["organism"].decode()][row["contig"]["name"].decode()] = row["contig"]["is_circular"]
-            except KeyError:
-                pangenomeDict[sys.intern(row["organism"].decode())] = { row["contig"]["name"].decode() : [row["gene"]]}#new org
-                circularContigs[row["organism"].decode()] = {row["contig"]["name"].decode():row["contig"]["is_circular"]}
-        bar.update()
+    for i in range(0, table.nrows, 100000):
+        chunk = table.read(start = i, stop = i + 100000)
+        genes = chunk["gene"]
+        IDs = genes["ID"].astype(str).tolist()
+        types = genes["type"].astype(str).tolist()
+        names = genes["name"].astype(str).tolist()
+        products = genes["product"].astype(str).tolist()
+        strands = genes["strand"].astype(str).tolist()
+        localIDs = genes["local"].astype(str).tolist() if "local" in genes.dtype.names else [""] * len(chunk)
+        starts = genes["start"].tolist()
+        stops = genes["stop"].tolist()
+        positions = genes["position"].tolist()
+        geneticCodes = genes["genetic_code"].tolist()
+        fragments = genes["is_fragment"].tolist()
+
+        orgNames, orgInverse = numpy.unique(chunk["organism"], return_inverse = True)
+        contigNames, contigInverse = numpy.unique(chunk["contig"]["name"], return_inverse = True)
+        orgNames = orgNames.astype(str).tolist()
+        contigNames = contigNames.astype(str).tolist()
+        circular = chunk["contig"]["is_circular"].tolist()
+        order, groups = getGroups(orgInverse.astype(numpy.int64) * len(contigNames) + contigInverse)
+        for key, groupStart, groupStop in sorted(groups, key = lambda group : order[group[1]]):#keeping the order of the file
+            orgName = orgNames[key // len(contigNames)]
+            org = organisms.get(orgName)
+            if org is None:
+                org = Organism(sys.intern(orgName))
+                organisms[orgName] = org
+            rows = order[groupStart:groupStop].tolist()
+            contig = org.getOrAddContig(contigNames[key % len(contigNames)], is_circular = circular[rows[0]])
+            for row in rows:
+                gene_type = types[row]
+                if gene_type == "CDS":
+                    if link:#if the gene families are already computed/loaded the gene exists.
+                        gene = pangenome.getGene(IDs[row])
+                    else:#else creating the gene.
+                        gene = Gene(IDs[row])
+                elif "RNA" in gene_type:
+                    gene = RNA(IDs[row])
+                else:
+                    raise Exception(f"A strange type '{gene_type}', which we do not know what to do with, was met.")
+                gene.fill_annotations(start = starts[row], stop = stops[row], strand = strands[row], geneType = gene_type, position = positions[row],
+                                      genetic_code = geneticCodes[row], name = names[row], product = products[row], local_identifier = localIDs[row])
+                gene.is_fragment = fragments[row]
+                gene.fill_parents(org, contig)
+                if gene_type == "CDS":
+                    contig.addGene(gene)
+                else:
+                    contig.addRNA(gene)
+        bar.update(len(chunk))
     bar.close()
+    for org in organisms.values():
+        pangenome.addOrganism(org)
+    pangenome.status["genomesAnnotated"] = "Loaded"
 
+def readAnnotation(pangenome, h5f, show_bar = True):
+    """
+        Reads the annotations column per column. Strings are gathered from the string pool for whole columns at once and the genes are grouped by contig with numpy, so that python objects are only created at the end.
+    """
+    if getLayoutVersion(h5f) == 1:
+        return readAnnotationLegacy(pangenome, h5f, show_bar)
+    annotations = h5f.root.annotations
+    strings = readStringPool(h5f)
     link = True if pangenome.status["genesClustered"] in ["Computed","Loaded"] else False
 
-    bar = tqdm(range(len(pangenomeDict)), unit = "organism", disable=not show_bar)
-    for orgName, contigDict in pangenomeDict.items():
-        readOrganism(pangenome, orgName, contigDict, circularContigs[orgName], link)
-        bar.update()
+    organisms = [ Organism(name) for name in strings[annotations.organisms.name.read()].tolist() ]
+    contigCols = readColumns(annotations.contigs)
+    contigs = []
+    for name, orgIndex, is_circular in zip(strings[contigCols["name"]].tolist(), contigCols["organism"].tolist(), contigCols["is_circular"].tolist()):
+        org = organisms[orgIndex]
+        contigs.append((org, org.getOrAddContig(name, is_circular = is_circular)))
+
+    genes = readColumns(annotations.genes)
+    RNAs = readColumns(annotations.RNAs)
+    bar = tqdm(range(len(genes["ID"]) + len(RNAs["ID"])), unit="gene", disable=not show_bar)
+    for cols, isCDS in [(genes, True), (RNAs, False)]:
+        IDs = strings[cols["ID"]].tolist()
+        names = strings[cols["name"]].tolist()
+        products = strings[cols["product"]].tolist()
+        localIDs = strings[cols["local"]].tolist()
+        strands = cols["strand"].astype(str).tolist()
+        starts = cols["start"].tolist()
+        stops = cols["stop"].tolist()
+        if isCDS:
+            positions = cols["position"].tolist()
+            geneticCodes = cols["genetic_code"].tolist()
+            fragments = cols["is_fragment"].tolist()
+        else:
+            types = strings[cols["type"]].tolist()
+        order, groups = getGroups(cols["contig"])
+        for contigIndex, groupStart, groupStop in groups:
+            org, contig = contigs[contigIndex]
+            for i in order[groupStart:groupStop].tolist():
+                if isCDS:
+                    if link:#if the gene families are already computed/loaded the gene exists.
+                        gene = pangenome.getGene(IDs[i])
+                    else:#else creating the gene.
+                        gene = Gene(IDs[i])
+                    gene.fill_annotations(start = starts[i], stop = stops[i], strand = strands[i], geneType = "CDS", position = positions[i],
+                                          genetic_code = geneticCodes[i], name = names[i], product = products[i], local_identifier = localIDs[i])
+                    gene.is_fragment = fragments[i]
+                    gene.fill_parents(org, contig)
+                    contig.addGene(gene)
+                else:
+                    rna = RNA(IDs[i])
+                    rna.fill_annotations(start = starts[i], stop = stops[i], strand = strands[i], geneType = types[i], name = names[i], product = products[i], local_identifier = localIDs[i])
+                    rna.fill_parents(org, contig)
+                    contig.addRNA(rna)
+            bar.update(groupStop - groupStart)
     bar.close()
+    for org in organisms:
+        pangenome.addOrganism(org)
     pangenome.status["genomesAnnotated"] = "Loaded"
 
+def readGraph(pangenome, h5f, show_bar = True):
+    """
+        Reads the edges. The gene pairs are grouped by pair of gene families with numpy, so that each edge is created once and then filled with all of its gene pairs.
+    """
+    if getLayoutVersion(h5f) == 1:
+        return readGraphLegacy(pangenome, h5f, show_bar)
+
+    if not pangenome.status["genomesAnnotated"] in ["Computed","Loaded"] or not pangenome.status["genesClustered"] in ["Computed","Loaded"] :
+        raise Exception("It's not possible to read the graph if the annotations and the gene families have not been loaded.")
+    genes = getGenesByIndex(pangenome, h5f)
+    famOfGene = numpy.array([ gene.family.ID if gene.family is not None else -1 for gene in genes ], dtype = numpy.int64)
+    edges = readColumns(h5f.root.edges)
+    sourceFams = famOfGene[edges["geneSource"]]
+    targetFams = famOfGene[edges["geneTarget"]]
+    #an edge is identified by its unordered pair of families
+    pairKeys = numpy.minimum(sourceFams, targetFams) * (pangenome.max_fam_id + 1) + numpy.maximum(sourceFams, targetFams)
+    sources = edges["geneSource"].tolist()
+    targets = edges["geneTarget"].tolist()
+    order, groups = getGroups(pairKeys)
+    bar = tqdm(range(len(sources)), unit = "contig adjacency", disable= not show_bar)
+    for _, groupStart, groupStop in groups:
+        rows = order[groupStart:groupStop].tolist()
+        edge = pangenome.addEdge(genes[sources[rows[0]]], genes[targets[rows[0]]])
+        for row in rows[1:]:
+            edge.addGenes(genes[sources[row]], genes[targets[row]])
+        bar.update(len(rows))
+    bar.close()
+    pangenome.status["neighborsGraph"] = "Loaded"
+
+def readGeneFamilies(pangenome, h5f, show_bar = True):
+    if getLayoutVersion(h5f) == 1:
+        return readGeneFamiliesLegacy(pangenome, h5f, show_bar)
+
+    genes = getGenesByIndex(pangenome, h5f)
+    families = [ pangenome.addGeneFamily(name) for name in readStringPool(h5f, h5f.root.geneFamiliesInfo.name.read()).tolist() ]
+    gene2fam = readColumns(h5f.root.geneFamilies)
+    geneIndexes = gene2fam["gene"].tolist()
+    order, groups = getGroups(gene2fam["geneFam"])
+    bar = tqdm(range(len(geneIndexes)), unit = "gene", disable=not show_bar)
+    for famIndex, groupStart, groupStop in groups:
+        fam = families[famIndex]
+        for row in order[groupStart:groupStop].tolist():
+            fam.addGene(genes[geneIndexes[row]])
+        bar.update(groupStop - groupStart)
+    bar.close()
+    pangenome.status["genesClustered"] = "Loaded"
+
+def readGeneFamiliesInfo(pangenome, h5f, show_bar = True):
+    if getLayoutVersion(h5f) == 1:
+        return readGeneFamiliesInfoLegacy(pangenome, h5f, show_bar)
+
+    famInfo = readColumns(h5f.root.geneFamiliesInfo)
+    names = readStringPool(h5f, famInfo["name"]).tolist()
+    partitions = readStringPool(h5f, famInfo["partition"]).tolist()
+    if "protein" in famInfo:#files written with the second layout have a column of fixed-width strings
+        proteins = famInfo["protein"].astype(str).tolist()
+    else:
+        proteins = SequenceReader(h5f.root.geneFamiliesInfo.protein).read()
+    for name, partition, protein in tqdm(zip(names, partitions, proteins), total = len(names), unit = "gene family", disable=not show_bar):
+        fam = pangenome.addGeneFamily(name)
+        fam.addPartition(partition)
+        fam.addSequence(protein)
+    if h5f.root.status._v_attrs.Partitionned:
+        pangenome.status["partitionned"] = "Loaded"
+    if h5f.root.status._v_attrs.geneFamilySequences:
+        pangenome.status["geneFamilySequences"] = "Loaded"
+
+def readGeneSequences(pangenome, h5f, show_bar = True):
+    if getLayoutVersion(h5f) == 1:
+        return readGeneSequencesLegacy(pangenome, h5f, show_bar)
+
+    genes = getGenesByIndex(pangenome, h5f)
+    bar = tqdm(range(len(genes)), unit = "gene", disable= not show_bar)
+    for indexes, sequences in readGeneSequenceChunks(h5f):
+        for gene, dna in zip(indexes, sequences):
+            genes[gene].add_dna(dna)
+        bar.update(len(indexes))
+    bar.close()
+    pangenome.status["geneSequences"] = "Loaded"
+
+def readRGP(pangenome, h5f, show_bar = True):
+    if getLayoutVersion(h5f) == 1:
+        return readRGPLegacy(pangenome, h5f, show_bar)
+
+    genes = getGenesByIndex(pangenome, h5f)
+    RGP = readColumns(h5f.root.RGP)
+    names = readStringPool(h5f, RGP["RGP"]).tolist()
+    for name, gene in tqdm(zip(names, RGP["gene"].tolist()), total = len(names), unit = "gene", disable=not show_bar):
+        region = pangenome.getOrAddRegion(name)
+        region.append(genes[gene])
+    #order the genes properly in the regions
+    for region in pangenome.regions:
+        region.genes = sorted(region.genes, key = lambda x : x.position )#order the same way than on the contig
+    pangenome.status["predictedRGP"] = "Loaded"
+
+def readSpots(pangenome, h5f, show_bar = True):
+    if getLayoutVersion(h5f) == 1:
+        return readSpotsLegacy(pangenome, h5f, show_bar)
+    spotTable = readColumns(h5f.root.spots)
+    names = readStringPool(h5f, spotTable["RGP"]).tolist()
+    spots = {}
+    for spot, name in tqdm(zip(spotTable["spot"].tolist(), names), total = len(names), unit= "region", disable=not show_bar):
+        curr_spot = spots.get(spot)
+        if curr_spot is None:
+            curr_spot = Spot(spot)
+            spots[spot] = curr_spot
+        curr_spot.addRegion(pangenome.getOrAddRegion(name))
+    pangenome.addSpots(spots.values())
+    pangenome.status["spots"] = "Loaded"
+
+def readICLCache(filename, sample):
+    """
+        Reads the log likelihood and the entropy of the models of NEM computed on a sample of organisms during former evaluations of the number of partitions,
+        as written by :func:`ppanggolin.formats.writeBinaries.writeICLCache`.
+        Returns a dictionnary with the numbers of partitions as keys and (log likelihood, entropy) as values, both being None if NEM did not work.
+    """
+    h5f = tables.open_file(filename, "r")
+    cache = {}
+    if "/ICLCache" in h5f:
+        columns = readColumns(h5f.root.ICLCache)
+        rows = columns["sample"] == sample.encode()
+        for K, log_likelihood, entropy in zip(columns["K"][rows].tolist(), columns["logLikelihood"][rows].tolist(), columns["entropy"][rows].tolist()):
+            cache[K] = (None, None) if numpy.isnan(log_likelihood) else (log_likelihood, entropy)
+    h5f.close()
+    return cache
+
 def readInfo(h5f):
     if "/info" in h5f:
         infoGroup = h5f.root.info
@@ -10,320 +10,574 @@ import pkg_resources
 #installed libraries
 from tqdm import tqdm
 import tables
+import numpy
 
-def geneDesc(orgLen, contigLen, IDLen, typeLen, nameLen, productLen, maxLocalId):
+#local libraries
+from ppanggolin.formats.readBinaries import readStringPool, StringPoolReader, hashIDs, getLayoutVersion, readPangenome
+from ppanggolin.genome import PackedOrganism
+from ppanggolin.sequenceKernel import pack_dna
+
+#version of the layout of the tables written in the pangenome files. Files written before the layout was versionned are considered to be version 1.
+LAYOUT_VERSION = 3
+
+class StringPool:
+    """
+        Deduplicated pool of the strings of a pangenome file.
+        Each distinct string is stored once, concatenated in '/stringPool/data' with its end offset in '/stringPool/offsets'. The other tables reference strings by their index in the pool.
+        Strings that are not expected to be found again, such as identifiers, are added with :func:`StringPool.unique` so that the pool does not keep them in memory.
+        New strings are written chunk per chunk.
+
+        :param h5f: the pangenome file, opened in a writable mode
+        :type h5f: :class:`tables.File`
+        :param chunk: the number of new strings that are buffered before being written
+    """
+    def __init__(self, h5f, chunk = 100000):
+        self.h5f = h5f
+        self.chunk = chunk
+        self._index = None
+        self._new = []
+        if "/stringPool" not in h5f:
+            group = h5f.create_group("/", "stringPool", "Strings of the pangenome, referenced by their index in the other tables")
+            h5f.create_earray(group, "data", tables.UInt8Atom(), shape=(0,))
+            h5f.create_earray(group, "offsets", tables.UInt64Atom(), shape=(0,))
+            self._index = {}
+        self._size = h5f.root.stringPool.offsets.nrows
+
+    def _getIndex(self):
+        if self._index is None:#the strings already in the file are only read when they are needed.
+            self._index = { string : index for index, string in enumerate(readStringPool(self.h5f).tolist()) }
+        return self._index
+
+    def _append(self, string):
+        """adds the string at the end of the pool, and returns its index"""
+        index = self._size
+        self._size += 1
+        self._new.append(string)
+        if len(self._new) >= self.chunk:
+            self.flush()
+        return index
+
+    def __getitem__(self, string):
+        """returns the index of the given string in the pool, adding it to the pool if needed"""
+        index = self._getIndex().get(string)
+        if index is None:
+            index = self._append(string)
+            self._index[string] = index
+        return index
+
+    def unique(self, string):
+        """
+            returns the index of a string that is not expected to be found again, such as an identifier.
+            It is added to the pool unless it is already indexed, but is not indexed itself, so that the memory of the pool does not grow with the number of such strings.
+        """
+        index = self._getIndex().get(string)
+        return self._append(string) if index is None else index
+
+    def flush(self):
+        """writes the strings that were added to the pool since the last flush"""
+        if len(self._new) == 0:
+            return
+        data = [ string.encode() for string in self._new ]
+        group = self.h5f.root.stringPool
+        lastOffset = int(group.offsets[-1]) if group.offsets.nrows > 0 else 0
+        group.data.append(numpy.frombuffer(b"".join(data), dtype=numpy.uint8))
+        group.offsets.append(numpy.cumsum([ len(string) for string in data ], dtype=numpy.uint64) + lastOffset)
+        self._new = []
+
+class ColumnTable:
+    """
+        Table of a pangenome file stored column per column: the table is a group holding one enlargeable array per column, all of the same length.
+        Rows are buffered and appended to the arrays chunk per chunk.
+
+        :param h5f: the pangenome file, opened in a writable mode
+        :type h5f: :class:`tables.File`
+        :param where: the group where the table is created
+        :param name: the name of the table
+        :param desc: a dictionnary with the column names as keys and their numpy dtype as values
+        :param expectedrows: the expected number of rows of the table
+    """
+    def __init__(self, h5f, where, name, desc, expectedrows = 1000, title = "", chunk = 100000):
+        self.group = h5f.create_group(where, name, title)
+        self.desc = desc
+        self.chunk = chunk
+        self.columns = {}
+        for colname, dtype in desc.items():
+            self.columns[colname] = h5f.create_earray(self.group, colname, tables.Atom.from_dtype(numpy.dtype(dtype)), shape=(0,), expectedrows = max(expectedrows, 1))
+        self.buffer = { colname : [] for colname in desc }
+        self.nbBuffered = 0
+
+    def append(self, row):
+        """appends a row, given as a dictionnary with the column names as keys"""
+        for colname, value in row.items():
+            self.buffer[colname].append(value)
+        self.nbBuffered += 1
+        if self.nbBuffered >= self.chunk:
+            self.flush()
+
+    def extend(self, columns):
+        """appends several rows, given as a dictionnary with the column names as keys and the lists or arrays of the values of the rows as values"""
+        nbRows = 0
+        for colname, values in columns.items():
+            self.buffer[colname].extend(values.tolist() if isinstance(values, numpy.ndarray) else values)
+            nbRows = len(values)
+        self.nbBuffered += nbRows
+        if self.nbBuffered >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        """writes the buffered rows"""
+        for colname, dtype in self.desc.items():
+            self.columns[colname].append(numpy.array(self.buffer[colname], dtype = dtype))
+            self.buffer[colname] = []
+        self.nbBuffered = 0
+
+class SequenceWriter:
+    """
+        Writes variable-length sequences in a group of a pangenome file: the sequences are concatenated in its 'data' array, and the end offset of each one is in its 'offsets' array,
+        so that the sequence at index i spans from offsets[i-1] (or 0) to offsets[i].
+        If packed is True, the sequences are dna sequences stored with 2 bits per base by :func:`ppanggolin.sequenceKernel.pack_dna`, and the offsets are counted in bases.
+        The positions of the bases that are not A, C, G or T are then in its 'exceptionPositions' array, and those bases in its 'exceptionBases' array.
+        Sequences are buffered, and :func:`SequenceWriter.close` must be called once all of them are appended.
+
+        :param h5f: the pangenome file, opened in a writable mode
+        :type h5f: :class:`tables.File`
+        :param where: the group where the group of the sequences is created
+        :param name: the name of the group of the sequences
+        :param expectedrows: the expected number of sequences
+        :param chunk: the number of bytes of sequence that are buffered before being written
+    """
+    def __init__(self, h5f, where, name, packed = False, expectedrows = 1000, title = "", chunk = 1 << 20):
+        self.group = h5f.create_group(where, name, title)
+        self.group._v_attrs.packed = packed
+        self.packed = packed
+        self.chunk = chunk
+        self.data = h5f.create_earray(self.group, "data", tables.UInt8Atom(), shape=(0,), expectedrows = max(expectedrows, 1) * 1000)
+        self.offsets = h5f.create_earray(self.group, "offsets", tables.UInt64Atom(), shape=(0,), expectedrows = max(expectedrows, 1))
+        if packed:
+            self.exceptionPositions = h5f.create_earray(self.group, "exceptionPositions", tables.UInt64Atom(), shape=(0,))
+            self.exceptionBases = h5f.create_earray(self.group, "exceptionBases", tables.UInt8Atom(), shape=(0,))
+            self.pending = numpy.zeros(0, dtype = numpy.uint8)#the last bases written, that do not fill a byte
+        self.buffer = []
+        self.stops = []
+        self.nbBuffered = 0
+        self.written = 0#the number of bases, or bytes, that are written or buffered
+
+    def append(self, sequence):
+        """appends a sequence, given as a str or as bytes"""
+        if isinstance(sequence, str):
+            sequence = sequence.encode("ascii")
+        self.extend(sequence, [len(sequence)])
+
+    def extend(self, sequences, stops):
+        """
+            appends several sequences at once
+
+            :param sequences: the concatenated sequences
+            :type sequences: bytes
+            :param stops: the end offset of each sequence in sequences
+        """
+        self.buffer.append(sequences)
+        self.stops.append(numpy.asarray(stops, dtype = numpy.uint64) + self.written)
+        self.written += len(sequences)
+        self.nbBuffered += len(sequences)
+        if self.nbBuffered >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        """writes the buffered sequences. When they are packed, the last bases that do not fill a byte stay buffered."""
+        if len(self.stops) > 0:
+            self.offsets.append(numpy.concatenate(self.stops))
+        seq = numpy.frombuffer(b"".join(self.buffer), dtype = numpy.uint8)
+        if self.packed:
+            seq = numpy.concatenate([self.pending, seq])
+            packable = len(seq) - len(seq) % 4
+            self.writePacked(seq[:packable], self.written - len(seq))
+            self.pending = seq[packable:]
+        else:
+            self.data.append(seq)
+        self.buffer = []
+        self.stops = []
+        self.nbBuffered = 0
+
+    def writePacked(self, seq, start):
+        """packs and writes bases, start being the position of the first one"""
+        packed, exceptions, exceptionBases = pack_dna(seq)
+        self.data.append(packed)
+        self.exceptionPositions.append(exceptions.astype(numpy.uint64) + start)
+        self.exceptionBases.append(exceptionBases)
+
+    def close(self):
+        """writes everything that is left"""
+        self.flush()
+        if self.packed and len(self.pending) > 0:#the last byte is filled with A
+            self.writePacked(numpy.concatenate([self.pending, numpy.full(4 - len(self.pending), ord("A"), dtype = numpy.uint8)]), self.written - len(self.pending))
+            self.pending = self.pending[:0]
+
+def writeGeneIDIndex(h5f, chunk = 1000000):
+    """
+        Writes the hashes of the gene IDs in the 'geneSequences' group, sorted, with the index of their gene in the annotation table,
+        so that :func:`ppanggolin.formats.readBinaries.getGeneIndexes` finds genes by binary search instead of reading all of the IDs.
+    """
+    IDs = h5f.root.annotations.genes.ID
+    strings = StringPoolReader(h5f)
+    hashes = numpy.zeros(IDs.nrows, dtype = numpy.uint64)
+    for start in range(0, IDs.nrows, chunk):
+        hashes[start:start + chunk] = hashIDs(strings[IDs[start:start + chunk]].tolist())
+    order = numpy.argsort(hashes, kind = "stable")
+    group = h5f.root.geneSequences
+    h5f.create_carray(group, "IDHashes", obj = hashes[order])
+    h5f.create_carray(group, "IDOrder", obj = order.astype(numpy.uint32))
+
+def getGeneIndex(pangenome, h5f):
+    """
+        Returns a dictionnary with the gene IDs as keys and the index of the genes in the annotation table of the pangenome file as values.
+        If the annotations are loaded, the index is the order in which :func:`writeAnnotations` writes the genes. Otherwise it is read from the file.
+    """
+    if pangenome.status["genomesAnnotated"] in ["Computed","Loaded"]:
+        return { gene.ID : index for index, gene in enumerate(gene for org in pangenome.organisms for contig in org.contigs for gene in contig.genes) }
+    return { ID : index for index, ID in enumerate(readStringPool(h5f, h5f.root.annotations.genes.ID.read()).tolist()) }
+
+def organismDesc():
     return {
-            'organism':tables.StringCol(itemsize=orgLen),
-            "contig":{
-                    'name':tables.StringCol(itemsize=contigLen),
-                    "is_circular":tables.BoolCol(dflt = False)
-            },
-            "gene":{
-                'ID':tables.StringCol(itemsize=IDLen),
-                'start':tables.UInt64Col(),
-                'stop':tables.UInt64Col(),
-                'strand':tables.StringCol(itemsize=1),
-                'type':tables.StringCol(itemsize=typeLen),
-                'position':tables.UInt32Col(),
-                'name':tables.StringCol(itemsize=nameLen),
-                'product':tables.StringCol(itemsize=productLen),
-                'genetic_code':tables.UInt32Col(dflt = 11),
-                'is_fragment':tables.BoolCol(dflt = False),
-                'local':tables.StringCol(itemsize=maxLocalId)
-            }
-            }
-
-def getMaxLenAnnotations(pangenome):
-    maxOrgLen = 1
-    maxContigLen = 1
-    maxGeneIDLen = 1
-    maxNameLen = 1
-    maxProductLen = 1
-    maxTypeLen = 1
-    maxLocalId = 1
-    for org in pangenome.organisms:
-        if len(org.name) > maxOrgLen:
-            maxOrgLen = len(org.name)
-        for contig in org.contigs:
-            if len(contig.name) > maxContigLen:
-                maxContigLen = len(contig.name)
-            for gene in contig.genes:
-                if len(gene.ID) > maxGeneIDLen:
-                    maxGeneIDLen = len(gene.ID)
-                if len(gene.name) > maxNameLen:
-                    maxNameLen = len(gene.name)
-                if len(gene.product) > maxProductLen:
-                    maxProductLen = len(gene.product)
-                if len(gene.type) > maxTypeLen:
-                    maxTypeLen = len(gene.type)
-                if len(gene.local_identifier) > maxLocalId:
-                    maxLocalId = len(gene.local_identifier)
-            for gene in contig.RNAs:
-                if len(gene.ID) > maxGeneIDLen:
-                    maxGeneIDLen = len(gene.ID)
-                if len(gene.name) > maxNameLen:
-                    maxNameLen = len(gene.name)
-                if len(gene.product) > maxProductLen:
-                    maxProductLen = len(gene.product)
-                if len(gene.type) > maxTypeLen:
-                    maxTypeLen = len(gene.type)
-                if len(gene.local_identifier) > maxLocalId:
-                    maxLocalId = len(gene.local_identifier)
-
-    return maxOrgLen, maxContigLen, maxGeneIDLen, maxTypeLen, maxNameLen, maxProductLen, maxLocalId
+        'name':numpy.uint32
+    }
+
+def contigDesc():
+    return {
+        'name':numpy.uint32,
+        'organism':numpy.uint32,
+        'is_circular':numpy.bool_
+    }
+
+def geneDesc():
+    return {
+        'ID':numpy.uint32,
+        'contig':numpy.uint32,
+        'start':numpy.uint32,
+        'stop':numpy.uint32,
+        'strand':"S1",
+        'position':numpy.uint32,
+        'name':numpy.uint32,
+        'product':numpy.uint32,
+        'genetic_code':numpy.uint32,
+        'is_fragment':numpy.bool_,
+        'local':numpy.uint32
+    }
+
+def RNADesc():
+    return {
+        'ID':numpy.uint32,
+        'contig':numpy.uint32,
+        'start':numpy.uint32,
+        'stop':numpy.uint32,
+        'strand':"S1",
+        'type':numpy.uint32,
+        'name':numpy.uint32,
+        'product':numpy.uint32,
+        'local':numpy.uint32
+    }
+
+class AnnotationWriter:
+    """
+        Writes the annotations of organisms in the tables of a pangenome file one organism at a time, so that they can be written as soon as they are annotated and do not all need to be kept in memory.
+        Organisms, contigs and genes are written in their own table, and their index is the row they are written in. CDS are written in the 'genes' table, in the order the organisms are given, and RNAs in the 'RNAs' table.
+        If sequences is True, the dna sequences of the CDS are written in the 'geneSequences' group as well, with :class:`SequenceWriter`, so that the sequence at index i is the one of the gene at index i.
+        If the CDS of an organism do not all have a sequence, no sequences are written.
+
+        :param h5f: the pangenome file, opened in a writable mode
+        :type h5f: :class:`tables.File`
+    """
+    def __init__(self, h5f, expectedOrganisms = 1000, expectedContigs = 1000, expectedGenes = 1000, expectedRNAs = 1000, sequences = False):
+        self.h5f = h5f
+        self.pool = StringPool(h5f)
+        annotation = h5f.create_group("/","annotations","Annotations of the pangenome's organisms")
+        self.orgTable = ColumnTable(h5f, annotation, "organisms", organismDesc(), expectedrows=expectedOrganisms)
+        self.contigTable = ColumnTable(h5f, annotation, "contigs", contigDesc(), expectedrows=expectedContigs)
+        self.geneTable = ColumnTable(h5f, annotation, "genes", geneDesc(), expectedrows=expectedGenes)
+        self.rnaTable = ColumnTable(h5f, annotation, "RNAs", RNADesc(), expectedrows=expectedRNAs)
+        self.nbOrganisms = 0
+        self.nbContigs = 0
+        self.nbGenes = 0
+        self.sequences = sequences
+        if sequences:
+            self.seqWriter = SequenceWriter(h5f, "/", "geneSequences", packed = True, expectedrows=expectedGenes)
+
+    def addOrganism(self, org):
+        """
+            appends the annotations of the organism to the tables
+
+            :param org: the organism, packed or not
+            :type org: :class:`ppanggolin.genome.Organism` or :class:`ppanggolin.genome.PackedOrganism`
+        """
+        if not isinstance(org, PackedOrganism):
+            org = PackedOrganism(org)
+        pool = self.pool
+        self.orgTable.append({"name":pool[org.name]})
+        for name, is_circular in org.contigs:
+            self.contigTable.append({"name":pool[name], "organism":self.nbOrganisms, "is_circular":is_circular})
+        genes = org.genes
+        self.geneTable.extend({
+            "ID":[ pool.unique(string) for string in org.strings(genes, "ID") ],
+            "contig":genes["contig"] + self.nbContigs,
+            "start":genes["start"],
+            "stop":genes["stop"],
+            "strand":genes["strand"],
+            "position":genes["position"],
+            "name":[ pool[string] for string in org.strings(genes, "name") ],
+            "product":[ pool[string] for string in org.strings(genes, "product") ],
+            "genetic_code":genes["genetic_code"].astype(numpy.uint32),
+            "is_fragment":genes["is_fragment"],
+            "local":[ pool.unique(string) for string in org.strings(genes, "local_identifier") ]})
+        RNAs = org.RNAs
+        self.rnaTable.extend({
+            "ID":[ pool.unique(string) for string in org.strings(RNAs, "ID") ],
+            "contig":RNAs["contig"] + self.nbContigs,
+            "start":RNAs["start"],
+            "stop":RNAs["stop"],
+            "strand":RNAs["strand"],
+            "type":[ pool[string] for string in org.strings(RNAs, "type") ],
+            "name":[ pool[string] for string in org.strings(RNAs, "name") ],
+            "product":[ pool[string] for string in org.strings(RNAs, "product") ],
+            "local":[ pool.unique(string) for string in org.strings(RNAs, "local_identifier") ]})
+        if self.sequences:
+            self.addSequences(org)
+        self.nbGenes += genes["number"]
+        self.nbContigs += len(org.contigs)
+        self.nbOrganisms += 1
+
+    def addSequences(self, org):
+        genes = org.genes
+        if genes["dna"] is None:
+            logging.getLogger().warning(f"The genes of the organism {org.name} do not have a dna sequence. The gene sequences will not be written.")
+            self.sequences = False
+            self.h5f.remove_node("/", "geneSequences", recursive = True)
+            return
+        self.seqWriter.extend(genes["dna"], genes["offsets"])
+
+    def flush(self):
+        """writes the buffered rows, and the gene sequences if they were asked for"""
+        self.orgTable.flush()
+        self.contigTable.flush()
+        self.geneTable.flush()
+        self.rnaTable.flush()
+        self.pool.flush()
+        if self.sequences:
+            self.seqWriter.close()
+            writeGeneIDIndex(self.h5f)
+            self.sequences = False
+
+    def close(self, pangenome):
+        """
+            Writes what is left to write, with the status and the information of the pangenome, and closes the pangenome file.
+            The annotations and gene sequences that were computed are then flagged as loaded.
+        """
+        self.flush()
+        for status in ["genomesAnnotated", "geneSequences"]:
+            if pangenome.status[status] == "Computed":
+                pangenome.status[status] = "Loaded"
+        writeStatus(pangenome, self.h5f)
+        writeInfo(pangenome, self.h5f)
+        training = pangenome.parameters.get("annotation", {}).get("prodigal_training")
+        if training is not None:
+            writeProdigalTraining(self.h5f, training)
+        self.h5f.root.info._v_attrs.numberOfGenes = self.nbGenes#the organisms may not have been kept in the pangenome
+        self.h5f.root.info._v_attrs.numberOfOrganisms = self.nbOrganisms
+        logging.getLogger().info(f"Done writing the pangenome. It is in file : {self.h5f.filename}")
+        self.h5f.close()
+
+def writeProdigalTraining(h5f, training):
+    """
+        Stores the Prodigal training file the genomes were annotated with in the 'prodigalTraining' array of the pangenome file,
+        so that new genomes can be annotated with the same training even if the file is moved or deleted. Its path is kept as information.
+    """
+    if "/prodigalTraining" in h5f:
+        h5f.remove_node("/", "prodigalTraining")
+    with open(training, "rb") as trainingFile:
+        data = numpy.frombuffer(trainingFile.read(), dtype = numpy.uint8)
+    array = h5f.create_carray("/", "prodigalTraining", obj = data, title = "The Prodigal training file the genomes were annotated with")
+    array._v_attrs.path = training
+
+def createPangenomeFile(filename):
+    """creates a new pangenome file, with the compression filter of the pangenome files"""
+    compressionFilter = tables.Filters(complevel=1, shuffle=True, bitshuffle=True, complib='blosc:zstd')
+    return tables.open_file(filename,"w", filters=compressionFilter)
 
 def writeAnnotations(pangenome, h5f, show_bar = True):
     """
-        Function writing all of the pangenome's annotations
+        Function writing all of the pangenome's annotations, with :class:`AnnotationWriter`. CDS are written in the order used by :func:`getGeneIndex`.
     """
-    annotation = h5f.create_group("/","annotations","Annotations of the pangenome's organisms")
-    geneTable = h5f.create_table(annotation, "genes", geneDesc(*getMaxLenAnnotations(pangenome)), expectedrows=len(pangenome.genes))
+    nbContigs = 0
     nbRNA = 0
     for org in pangenome.organisms:
         for contig in org.contigs:
+            nbContigs += 1
             nbRNA += len(contig.RNAs)
-    bar = tqdm(pangenome.organisms, unit="genome", disable = not show_bar)
-    geneRow = geneTable.row
-    for org in bar:
-        for contig in org.contigs:
-            for gene in contig.genes:
-                geneRow["organism"] = org.name
-                geneRow["contig/name"] = contig.name
-                geneRow["contig/is_circular"] = contig.is_circular#this should be somewhere else.
-                geneRow["gene/ID"]= gene.ID
-                geneRow["gene/start"] = gene.start
-                geneRow["gene/stop"] = gene.stop
-                geneRow["gene/strand"] = gene.strand
-                geneRow["gene/type"] = gene.type
-                geneRow["gene/position"] = gene.position
-                geneRow["gene/name"] = gene.name
-                geneRow["gene/product"] = gene.product
-                geneRow["gene/is_fragment"] = gene.is_fragment
-                geneRow["gene/genetic_code"] = gene.genetic_code
-                geneRow["gene/local"] = gene.local_identifier
-                geneRow.append()
-            for rna in contig.RNAs:
-                geneRow["organism"] = org.name
-                geneRow["contig/name"] = contig.name
-                geneRow["contig/is_circular"] = contig.is_circular#this should be somewhere else.
-                geneRow["gene/ID"]= rna.ID
-                geneRow["gene/start"] = rna.start
-                geneRow["gene/stop"] = rna.stop
-                geneRow["gene/strand"] = rna.strand
-                geneRow["gene/type"] = rna.type
-                geneRow["gene/name"] = rna.name
-                geneRow["gene/product"] = rna.product
-                geneRow["gene/is_fragment"] = rna.is_fragment
-                geneRow.append()
-    geneTable.flush()
-    bar.close()
-
-def getGeneSequencesLen(pangenome):
-    maxSeqLen = 1
-    maxGeneIDLen = 1
-    maxGeneType = 1
-    for gene in pangenome.genes:
-        if len(gene.dna) > maxSeqLen:
-            maxSeqLen = len(gene.dna)
-        if len(gene.ID) > maxGeneIDLen:
-            maxGeneIDLen = len(gene.ID)
-        if len(gene.type) > maxGeneType:
-            maxGeneType = len(gene.type)
-    return maxGeneIDLen, maxSeqLen, maxGeneType
-
-def geneSequenceDesc(geneIDLen, geneSeqLen, geneTypeLen):
-    return {
-        "gene":tables.StringCol(itemsize=geneIDLen),
-        "dna":tables.StringCol(itemsize=geneSeqLen),
-        "type":tables.StringCol(itemsize=geneTypeLen)
-    }
+    writer = AnnotationWriter(h5f, expectedOrganisms=len(pangenome.organisms), expectedContigs=nbContigs, expectedGenes=len(pangenome.genes), expectedRNAs=nbRNA)
+    for org in tqdm(pangenome.organisms, unit="genome", disable = not show_bar):
+        writer.addOrganism(org)
+    writer.flush()
 
 def writeGeneSequences(pangenome, h5f, show_bar=True):
-    geneSeq = h5f.create_table("/","geneSequences", geneSequenceDesc(*getGeneSequencesLen(pangenome)), expectedrows=len(pangenome.genes))
-    geneRow = geneSeq.row
-    bar = tqdm(pangenome.genes, unit = "gene", disable=not show_bar)
-    for gene in bar:
-        geneRow["gene"] = gene.ID
-        geneRow["dna"] = gene.dna
-        geneRow["type"] = gene.type
-        geneRow.append()
-    geneSeq.flush()
-    bar.close()
+    """
+        Writes the dna sequences of the genes in the 'geneSequences' group, with :class:`SequenceWriter`. The sequence at index i is the one of the gene at index i in the annotation table.
+    """
+    genes = [None] * len(pangenome.genes)
+    for gene, index in getGeneIndex(pangenome, h5f).items():
+        genes[index] = gene
+    geneSeq = SequenceWriter(h5f, "/", "geneSequences", packed = True, expectedrows=len(genes))
+    for geneID in tqdm(genes, unit = "gene", disable=not show_bar):
+        geneSeq.append(pangenome.getGene(geneID).dna)
+    geneSeq.close()
+    writeGeneIDIndex(h5f)
 
 
-def geneFamDesc(maxNameLen, maxSequenceLength, maxPartLen):
+def geneFamDesc():
      return {
-        "name": tables.StringCol(itemsize = maxNameLen),
-        "protein": tables.StringCol(itemsize=maxSequenceLength),
-        "partition": tables.StringCol(itemsize=maxPartLen)
+        "name": numpy.uint32,
+        "partition": numpy.uint32
         }
 
-def getGeneFamLen(pangenome):
-    maxGeneFamNameLen = 1
-    maxGeneFamSeqLen = 1
-    maxPartLen = 1
-    for genefam in pangenome.geneFamilies:
-        if len(genefam.sequence) > maxGeneFamSeqLen:
-            maxGeneFamSeqLen = len(genefam.sequence)
-        if len(genefam.name) > maxGeneFamNameLen:
-            maxGeneFamNameLen = len(genefam.name)
-        if len(genefam.partition) > maxPartLen:
-            maxPartLen = len(genefam.partition)
-    return maxGeneFamNameLen, maxGeneFamSeqLen, maxPartLen
-
 def writeGeneFamInfo(pangenome, h5f, force, show_bar=True):
     """
-        Writing a table containing the protein sequences of each family
+        Writing a table containing the name and partition of each family, and their protein sequences in its 'protein' group, with :class:`SequenceWriter`.
+        The index of a family is the row it is written in, and families are written in the same order as in :func:`writeGeneFamilies`.
     """
     if '/geneFamiliesInfo' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed gene family representative sequences...")
-        h5f.remove_node('/', 'geneFamiliesInfo')#erasing the table, and rewriting a new one.
-    geneFamSeq = h5f.create_table("/","geneFamiliesInfo",geneFamDesc(*getGeneFamLen(pangenome)), expectedrows=len(pangenome.geneFamilies))
-
-    row = geneFamSeq.row
+        h5f.remove_node('/', 'geneFamiliesInfo', recursive = True)#erasing the table, and rewriting a new one.
+    pool = StringPool(h5f)
+    geneFamInfo = ColumnTable(h5f, "/", "geneFamiliesInfo", geneFamDesc(), expectedrows=len(pangenome.geneFamilies))
+    proteins = SequenceWriter(h5f, geneFamInfo.group, "protein", expectedrows=len(pangenome.geneFamilies))
     bar = tqdm( pangenome.geneFamilies, unit = "gene family", disable = not show_bar)
     for fam in bar:
-        row["name"] = fam.name
-        row["protein"] = fam.sequence
-        row["partition"] = fam.partition
-        row.append()
-    geneFamSeq.flush()
+        geneFamInfo.append({"name":pool[fam.name], "partition":pool[fam.partition]})
+        proteins.append(fam.sequence)
+    geneFamInfo.flush()
+    proteins.close()
+    pool.flush()
     bar.close()
 
 
-def gene2famDesc(geneFamNameLen, geneIDLen):
+def gene2famDesc():
     return {
-        "geneFam": tables.StringCol(itemsize = geneFamNameLen),
-        "gene":tables.StringCol(itemsize= geneIDLen)
+        "geneFam": numpy.uint32,
+        "gene": numpy.uint32
         }
 
-def getGene2famLen(pangenome):
-    maxGeneFamName = 1
-    maxGeneID = 1
-    for geneFam in pangenome.geneFamilies:
-        if len(geneFam.name)>maxGeneFamName:
-            maxGeneFamName = len(geneFam.name)
-        for gene in geneFam.genes:
-            if len(gene.ID) > maxGeneID:
-                maxGeneID = len(gene.ID)
-    return maxGeneFamName, maxGeneID
-
 def writeGeneFamilies(pangenome, h5f, force, show_bar = True):
     """
         Function writing all of the pangenome's gene families
     """
     if '/geneFamilies' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed gene family to gene associations...")
-        h5f.remove_node('/', 'geneFamilies')#erasing the table, and rewriting a new one.
-    geneFamilies = h5f.create_table("/", "geneFamilies",gene2famDesc(*getGene2famLen(pangenome)))
-    geneRow = geneFamilies.row
+        h5f.remove_node('/', 'geneFamilies', recursive = True)#erasing the table, and rewriting a new one.
+    geneIndex = getGeneIndex(pangenome, h5f)
+    geneFamilies = ColumnTable(h5f, "/", "geneFamilies", gene2famDesc(), expectedrows=len(geneIndex))
     bar = tqdm(pangenome.geneFamilies, unit = "gene family", disable = not show_bar)
-    for geneFam in bar:
+    for famIndex, geneFam in enumerate(bar):
         for gene in geneFam.genes:
-            geneRow["gene"] = gene.ID
-            geneRow["geneFam"] = geneFam.name
-            geneRow.append()
+            geneFamilies.append({"gene":geneIndex[gene.ID], "geneFam":famIndex})
     geneFamilies.flush()
     bar.close()
 
 
-def graphDesc(maxGeneIDLen):
+def graphDesc():
     return {
-            'geneTarget':tables.StringCol(itemsize = maxGeneIDLen),
-            'geneSource':tables.StringCol(itemsize = maxGeneIDLen)
+            'geneTarget':numpy.uint32,
+            'geneSource':numpy.uint32
         }
 
-def getGeneIDLen(pangenome):
-    maxGeneLen = 1
-    for gene in pangenome.genes:
-        if len(gene.ID) > maxGeneLen:
-            maxGeneLen=len(gene.ID)
-    return maxGeneLen
-
 def writeGraph(pangenome, h5f, force, show_bar = True):
     #if we want to be able to read the graph without reading the annotations (because it is one of the most time consumming parts to read), it might be good to add the organism name in the table here.
     #for now, forcing the read of annotations.
     if '/edges' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed edges")
-        h5f.remove_node("/","edges")
-    edgeTable = h5f.create_table("/","edges", graphDesc(getGeneIDLen(pangenome)), expectedrows=len(pangenome.edges))
-    edgeRow = edgeTable.row
+        h5f.remove_node("/","edges", recursive = True)
+    geneIndex = getGeneIndex(pangenome, h5f)
+    edgeTable = ColumnTable(h5f, "/", "edges", graphDesc(), expectedrows=len(pangenome.edges))
     bar = tqdm(pangenome.edges, unit = "edge", disable = not show_bar)
     for edge in bar:
         for genePairs in edge.organisms.values():
             for gene1, gene2 in genePairs:
-                edgeRow["geneTarget"] = gene1.ID
-                edgeRow["geneSource"] = gene2.ID
-                edgeRow.append()
+                edgeTable.append({"geneTarget":geneIndex[gene1.ID], "geneSource":geneIndex[gene2.ID]})
     bar.close()
     edgeTable.flush()
 
 
-def RGPDesc(maxRGPLen, maxGeneLen):
+def RGPDesc():
     return { 
-            'RGP': tables.StringCol(itemsize=maxRGPLen),
-            'gene':tables.StringCol(itemsize=maxGeneLen)
+            'RGP': numpy.uint32,
+            'gene': numpy.uint32
         }
 
-def getRGPLen(pangenome):
-    maxGeneLen = 1
-    maxRGPLen = 1
-    for region in pangenome.regions:
-        for gene in region.genes:
-            if len(gene.ID) > maxGeneLen:
-                maxGeneLen = len(gene.ID)
-        if len(region.name) > maxRGPLen:
-            maxRGPLen = len(region.name)
-    return maxRGPLen, maxGeneLen
-
 def writeRGP(pangenome, h5f, force, show_bar=True):
     if '/RGP' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computer RGP")
-        h5f.remove_node('/', 'RGP')
+        h5f.remove_node('/', 'RGP', recursive = True)
 
-    RGPTable = h5f.create_table('/', 'RGP', RGPDesc(*getRGPLen(pangenome)), expectedrows = sum([ len(region.genes) for region in pangenome.regions ]) )
-    RGPRow = RGPTable.row
+    pool = StringPool(h5f)
+    geneIndex = getGeneIndex(pangenome, h5f)
+    RGPTable = ColumnTable(h5f, '/', 'RGP', RGPDesc(), expectedrows = sum([ len(region.genes) for region in pangenome.regions ]) )
     bar = tqdm(pangenome.regions, unit="region", disable = not show_bar)
     for region in bar:
         for gene in region.genes:
-            RGPRow["RGP"] = region.name
-            RGPRow["gene"] = gene.ID
-            RGPRow.append()
+            RGPTable.append({"RGP":pool[region.name], "gene":geneIndex[gene.ID]})
     bar.close()
     RGPTable.flush()
+    pool.flush()
 
-def spotDesc(maxRGPLen):
+def spotDesc():
     return { 
-            'spot': tables.UInt32Col(),
-            'RGP':tables.StringCol(itemsize=maxRGPLen)
+            'spot': numpy.uint32,
+            'RGP': numpy.uint32
         }
 
-def getSpotDesc(pangenome):
-    maxRGPLen = 1
-    for spot in pangenome.spots:
-        for region in spot.regions:
-            if len(region.name) > maxRGPLen:
-                maxRGPLen = len(region.name)
-    return maxRGPLen
-
 def writeSpots(pangenome, h5f, force, show_bar=True):
     if '/spots' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed spots")
-        h5f.remove_node("/","spots")
-    
-    SpoTable = h5f.create_table("/","spots",spotDesc(getSpotDesc(pangenome)), expectedrows= sum([len(spot.regions) for spot in pangenome.spots]))
-    SpotRow = SpoTable.row
+        h5f.remove_node("/","spots", recursive = True)
+
+    pool = StringPool(h5f)
+    SpoTable = ColumnTable(h5f, "/", "spots", spotDesc(), expectedrows= sum([len(spot.regions) for spot in pangenome.spots]))
     bar = tqdm(pangenome.spots, unit="spot", disable = not show_bar)
     for spot in pangenome.spots:
         for region in spot.regions:
-            SpotRow["spot"] = spot.ID
-            SpotRow["RGP"] = region.name
-            SpotRow.append()
+            SpoTable.append({"spot":spot.ID, "RGP":pool[region.name]})
         bar.update()
     bar.close()
     SpoTable.flush()
+    pool.flush()
 
 
+def ICLCacheDesc():
+    return {
+        'sample':'S32',
+        'K':numpy.uint16,
+        'logLikelihood':numpy.float64,
+        'entropy':numpy.float64
+    }
+
+def writeICLCache(filename, sample, results):
+    """
+        Appends the log likelihood and the entropy of the models of NEM computed on a sample of organisms while evaluating the number of partitions
+        to the cache of the pangenome file, so that the next evaluations on the same sample can skip them.
+
+        :param filename: the pangenome file
+        :param sample: the key of the sample of organisms, and of the parameters of the evaluation
+        :param results: the number of partitions, log likelihood and entropy of each model, the last two being None if NEM did not work
+    """
+    h5f = tables.open_file(filename, "a")
+    if '/ICLCache' not in h5f:
+        ColumnTable(h5f, "/", "ICLCache", ICLCacheDesc(), title = "Log likelihood and entropy of NEM for the numbers of partitions evaluated on samples of organisms")
+    columns = { "sample" : [sample.encode()] * len(results), "K" : [], "logLikelihood" : [], "entropy" : [] }
+    for K, log_likelihood, entropy in results:
+        columns["K"].append(K)
+        columns["logLikelihood"].append(numpy.nan if log_likelihood is None else log_likelihood)
+        columns["entropy"].append(numpy.nan if entropy is None else entropy)
+    for colname, dtype in ICLCacheDesc().items():
+        h5f.root.ICLCache._f_get_child(colname).append(numpy.array(columns[colname], dtype = dtype))
+    h5f.close()
+
 def writeStatus(pangenome, h5f):
     if "/status" in h5f:#if statuses are already written
         statusGroup = h5f.root.status
@@ -340,6 +594,7 @@ def writeStatus(pangenome, h5f):
     statusGroup._v_attrs.spots = True if pangenome.status["spots"] in ["Computed","Loaded","inFile"] else False
 
     statusGroup._v_attrs.version = pkg_resources.get_distribution("ppanggolin").version
+    statusGroup._v_attrs.layoutVersion = LAYOUT_VERSION
 
 def writeInfo(pangenome, h5f):
     """ writes information and numbers to be eventually called with the 'info' submodule """
@@ -406,29 +661,24 @@ def writeInfo(pangenome, h5f):
 
 def updateGeneFamPartition(pangenome, h5f, show_bar=True):
     logging.getLogger().info("Updating gene families with partition information")
-    table = h5f.root.geneFamiliesInfo
-    bar = tqdm(range(table.nrows), unit = "gene family", disable = not show_bar)
-    for row in table:
-        row["partition"] = pangenome.getGeneFamily(row["name"].decode()).partition
-        row.update()
-        bar.update()
-    bar.close()
+    pool = StringPool(h5f)
+    names = readStringPool(h5f, h5f.root.geneFamiliesInfo.name.read()).tolist()
+    partitions = numpy.zeros(len(names), dtype=numpy.uint32)
+    for famIndex, name in enumerate(tqdm(names, unit = "gene family", disable = not show_bar)):
+        partitions[famIndex] = pool[pangenome.getGeneFamily(name).partition]
+    h5f.root.geneFamiliesInfo.partition[:] = partitions
+    pool.flush()
 
 def updateGeneFragments(pangenome, h5f, show_bar=True):
     """
         updates the annotation table with the fragmentation informations from the defrag pipeline
     """
     logging.getLogger().info("Updating annotations with fragment information")
-    table = h5f.root.annotations.genes
-    row = table.row
-    bar =  tqdm(range(table.nrows), unit="gene", disable= not show_bar)
-    for row in table:
-        if row['gene/type'].decode() == 'CDS':
-            row['gene/is_fragment'] = pangenome.getGene(row['gene/ID'].decode()).is_fragment
-            row.update()
-        bar.update()
-    bar.close()
-    table.flush()
+    geneIndex = getGeneIndex(pangenome, h5f)
+    isFragment = numpy.zeros(len(geneIndex), dtype=bool)
+    for gene in tqdm(pangenome.genes, unit="gene", disable= not show_bar):
+        isFragment[geneIndex[gene.ID]] = gene.is_fragment
+    h5f.root.annotations.genes.is_fragment[:] = isFragment
 
 
 def ErasePangenome(pangenome, graph=False, geneFamilies = False, partition = False, rgp = False, spots = False):
@@ -439,19 +689,22 @@ def ErasePangenome(pangenome, graph=False, geneFamilies = False, partition = Fal
 
     if '/edges' in h5f and (graph or geneFamilies):
         logging.getLogger().info("Erasing the formerly computed edges")
-        h5f.remove_node("/","edges")
+        h5f.remove_node("/","edges", recursive = True)
         statusGroup._v_attrs.NeighborsGraph = False
         pangenome.status["neighborsGraph"] = "No"
     if '/geneFamilies' in h5f and geneFamilies:
         logging.getLogger().info("Erasing the formerly computed gene family to gene associations...")
-        h5f.remove_node('/', 'geneFamilies')#erasing the table, and rewriting a new one.
+        h5f.remove_node('/', 'geneFamilies', recursive = True)#erasing the table, and rewriting a new one.
         pangenome.status["defragmented"] = "No"
         pangenome.status["genesClustered"] = "No"
         statusGroup._v_attrs.defragmented = False
         statusGroup._v_attrs.genesClustered = False
+    if '/ICLCache' in h5f and geneFamilies:
+        logging.getLogger().info("Erasing the formerly computed evaluations of the number of partitions...")
+        h5f.remove_node('/', 'ICLCache', recursive = True)
     if '/geneFamiliesInfo' in h5f and geneFamilies:
         logging.getLogger().info("Erasing the formerly computed gene family representative sequences...")
-        h5f.remove_node('/', 'geneFamiliesInfo')#erasing the table, and rewriting a new one.
+        h5f.remove_node('/', 'geneFamiliesInfo', recursive = True)#erasing the table, and rewriting a new one.
         pangenome.status["partitionned"] = "No"
         pangenome.status["geneFamilySequences"] = "No"
         statusGroup._v_attrs.geneFamilySequences = False
@@ -460,24 +713,47 @@ def ErasePangenome(pangenome, graph=False, geneFamilies = False, partition = Fal
         logging.getLogger().info("Erasing the formerly computer RGP...")
         pangenome.status["predictedRGP"] = "No"
         statusGroup._v_attrs.predictedRGP = False
-        h5f.remove_node("/", "RGP")
+        h5f.remove_node("/", "RGP", recursive = True)
     if '/spots' in h5f and (geneFamilies or partition or rgp or spots):
         logging.getLogger().info("Erasing the formerly computed spots...")
         pangenome.status["spots"] = "No"
         statusGroup._v_attrs.spots = False
-        h5f.remove_node("/","spots")
+        h5f.remove_node("/","spots", recursive = True)
 
     h5f.close()
 
+def upgradePangenome(pangenome, show_bar = True):
+    """
+        Loads everything stored in a pangenome file written with a former layout of the tables, and flags it as computed so that :func:`writePangenome` rewrites the whole file with the current layout.
+    """
+    logging.getLogger().warning("The pangenome file was written with a former layout of its tables. It will be entirely read and rewritten with the current one.")
+    readPangenome(pangenome,
+                  annotation = pangenome.status["genomesAnnotated"] == "inFile",
+                  geneFamilies = pangenome.status["genesClustered"] == "inFile",
+                  graph = pangenome.status["neighborsGraph"] == "inFile",
+                  rgp = pangenome.status["predictedRGP"] == "inFile",
+                  spots = pangenome.status["spots"] == "inFile",
+                  geneSequences = pangenome.status["geneSequences"] == "inFile",
+                  show_bar = show_bar)
+    for key, value in pangenome.status.items():
+        if value in ["Loaded", "inFile"]:
+            pangenome.status[key] = "Computed"
+
 def writePangenome(pangenome, filename, force, show_bar = True):
     """
         Writes or updates a pangenome file
         pangenome is the corresponding pangenome object, filename the h5 file and status what has been modified.
     """
 
+    if pangenome.status["genomesAnnotated"] in ["Loaded", "inFile"]:
+        h5f = tables.open_file(filename,"r")
+        layoutVersion = getLayoutVersion(h5f)
+        h5f.close()
+        if layoutVersion < LAYOUT_VERSION:
+            upgradePangenome(pangenome, show_bar=show_bar)
+
     if pangenome.status["genomesAnnotated"] == "Computed":
-        compressionFilter = tables.Filters(complevel=1, shuffle=True, bitshuffle=True, complib='blosc:zstd')
-        h5f = tables.open_file(filename,"w", filters=compressionFilter)
+        h5f = createPangenomeFile(filename)
         logging.getLogger().info("Writing genome annotations...")
         writeAnnotations(pangenome, h5f, show_bar=show_bar)
         pangenome.status["genomesAnnotated"] = "Loaded"
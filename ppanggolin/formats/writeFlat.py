@@ -10,6 +10,9 @@ import pkg_resources
 from statistics import median, mean, stdev
 import os
 
+#installed libraries
+import numpy
+
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import write_compressed_or_not, mkOutdir, restricted_float
@@ -248,14 +251,17 @@ def writeMatrix(sep, ext, output, compress=False, geneNames = False):
         org_index = pan.getIndex()#should just return things
         for fam in pan.geneFamilies:
             genes = default_genes.copy()
-            l = []
-            alt = fam.namedPartition if fam.partition != "" else False
+            orgs, counts = pan.getFamilyCounts(fam)
             genenames = Counter()
             product = Counter()
-            for org, gene_list in fam.getOrgDict().items():
-                genes[org_index[org]] = " ".join([ '"' + str(gene) + '"' for gene in gene_list]) if geneNames else str(len(gene_list))
+            if geneNames:
+                for org, gene_list in fam.getOrgDict().items():
+                    genes[org_index[org]] = " ".join([ '"' + str(gene) + '"' for gene in gene_list])
+            else:
+                for org, count in zip(orgs.tolist(), counts.tolist()):
+                    genes[org] = str(count)
+            for gene_list in fam.getOrgDict().values():
                 for gene in gene_list:
-                    l.append(gene.stop - gene.start)
                     product[gene.product] +=1
                     genenames[gene.name] += 1
 
@@ -268,9 +274,9 @@ def writeMatrix(sep, ext, output, compress=False, geneNames = False):
             matrix.write(sep.join(['"'+fam.name+'"',#1
                                     '"'+alt+'"',#2
                                     '"'+ str(product.most_common(1)[0][0])  +'"',#3
-                                    '"' + str(len(fam.organisms)) + '"',#4
+                                    '"' + str(len(orgs)) + '"',#4
                                     '"' + str(len(fam.genes)) + '"',#5
-                                    '"' + str(round(len(fam.genes)/len(fam.organisms),2)) + '"',#6
+                                    '"' + str(round(len(fam.genes)/len(orgs),2)) + '"',#6
                                     '"NA"',#7
                                     '"NA"',#8
                                     '""',#9
@@ -295,11 +301,10 @@ def writeGenePresenceAbsence(output, compress=False):
         matrix.write('\t'.join(['Gene']#14
                                 +[str(org) for org in pan.organisms])+"\n")#15
         default_genes =  ["0"] * len(pan.organisms)
-        org_index = pan.getIndex()#should just return things
         for fam in pan.geneFamilies:
             genes = default_genes.copy()
-            for org in fam.organisms:
-                genes[org_index[org]] = "1"
+            for org in pan.getFamilyCounts(fam)[0].tolist():
+                genes[org] = "1"
 
             matrix.write('\t'.join([fam.name]#14
                                     +genes)+"\n")#15
@@ -308,88 +313,63 @@ def writeGenePresenceAbsence(output, compress=False):
 def writeStats(output, soft_core, dup_margin, compress=False):
     logging.getLogger().info("Writing pangenome statistics...")
     logging.getLogger().info("Writing statistics on persistent duplication...")
-    single_copy_markers = set()#could use bitarrays if speed is needed
+    fam_index = pan.getFamilyIndex()
+    single_copy_markers = numpy.zeros(len(fam_index), dtype=bool)
     with write_compressed_or_not(output + "/mean_persistent_duplication.tsv", compress) as outfile:
         outfile.write(f"#duplication_margin={round(dup_margin,3)}\n")
         outfile.write("\t".join(["persistent_family","duplication_ratio","mean_presence","is_single_copy_marker"]) + "\n")
         for fam in pan.geneFamilies:
             if fam.namedPartition == "persistent":
-                mean_pres = len(fam.genes) / len(fam.organisms)
-                nb_multi = 0
-                for gene_list in fam.getOrgDict().values():
-                    if len(gene_list) > 1:
-                        nb_multi +=1
-                dup_ratio = nb_multi / len(fam.organisms)
+                counts = pan.getFamilyCounts(fam)[1]
+                mean_pres = counts.sum() / len(counts)
+                dup_ratio = numpy.count_nonzero(counts > 1) / len(counts)
                 is_SCM = False
                 if dup_ratio < dup_margin:
                     is_SCM = True
-                    single_copy_markers.add(fam)
+                    single_copy_markers[fam_index[fam]] = True
                 outfile.write("\t".join([fam.name,
                                          str(round(dup_ratio,3)),
                                          str(round(mean_pres,3)),
                                          str(is_SCM)]) + "\n")
     logging.getLogger().info("Done writing stats on persistent duplication")
     logging.getLogger().info("Writing genome per genome statistics (completeness and counts)...")
-    soft = set()#could use bitarrays if speed is needed
-    core = set()
-    for fam in pan.geneFamilies:
-        if len(fam.organisms) >= pan.number_of_organisms() * soft_core:
-            soft.add(fam)
-        if len(fam.organisms) == pan.number_of_organisms():
-            core.add(fam)
+    #gene families are the rows of the matrix, organisms its columns
+    matrix = pan.getFamilyMatrix().tocsc()
+    nb_orgs = numpy.diff(pan.getFamilyMatrix().indptr)
+    soft = nb_orgs >= pan.number_of_organisms() * soft_core
+    core = nb_orgs == pan.number_of_organisms()
+    named_partitions = numpy.array([ fam.namedPartition for fam in fam_index ])
+    pers = named_partitions == "persistent"
+    shell = named_partitions == "shell"
+    cloud = ~(pers | shell)
+    nb_scm = numpy.count_nonzero(single_copy_markers)
 
     with write_compressed_or_not(output + "/organisms_statistics.tsv", compress) as outfile:
         outfile.write(f"#soft_core={round(soft_core,3)}\n")
         outfile.write(f"#duplication_margin={round(dup_margin,3)}\n")
         outfile.write("\t".join(["organism","nb_families","nb_persistent_families","nb_shell_families","nb_cloud_families","nb_exact_core","nb_soft_core","nb_genes","nb_persistent_genes","nb_shell_genes","nb_cloud_genes","nb_exact_core_genes","nb_soft_core_genes","completeness","nb_single_copy_markers"]) + "\n")
 
-        for org in pan.organisms:
-            fams = org.families
-            nb_pers = 0
-            nb_shell = 0
-            nb_cloud = 0
-            for fam in fams:
-                if fam.namedPartition == "persistent":
-                    nb_pers+=1
-                elif fam.namedPartition == "shell":
-                    nb_shell+=1
-                else:
-                    nb_cloud+=1
-
-            nb_gene_pers = 0
-            nb_gene_shell = 0
-            nb_gene_soft = 0
-            nb_gene_cloud = 0
-            nb_gene_core = 0
-            for gene in org.genes:
-                if gene.family.namedPartition == "persistent":
-                    nb_gene_pers +=1
-                elif gene.family.namedPartition == "shell":
-                    nb_gene_shell +=1
-                else:
-                    nb_gene_cloud += 1
-                if gene.family in soft:
-                    nb_gene_soft+=1
-                    if gene.family in core:
-                        nb_gene_core+=1
+        for org, index in pan.getIndex().items():
+            fams = matrix.indices[matrix.indptr[index]:matrix.indptr[index+1]]
+            counts = matrix.data[matrix.indptr[index]:matrix.indptr[index+1]]
             completeness = "NA"
-            if len(single_copy_markers) > 0:
-                completeness = round((len(fams & single_copy_markers) / len(single_copy_markers))*100,2)
+            if nb_scm > 0:
+                completeness = round((numpy.count_nonzero(single_copy_markers[fams]) / nb_scm)*100,2)
             outfile.write("\t".join(map(str,[org.name,
                                     len(fams),
-                                    nb_pers,
-                                    nb_shell,
-                                    nb_cloud,
-                                    len(core & fams),
-                                    len(soft & fams),
+                                    numpy.count_nonzero(pers[fams]),
+                                    numpy.count_nonzero(shell[fams]),
+                                    numpy.count_nonzero(cloud[fams]),
+                                    numpy.count_nonzero(core[fams]),
+                                    numpy.count_nonzero(soft[fams]),
                                     org.number_of_genes(),
-                                    nb_gene_pers,
-                                    nb_gene_shell,
-                                    nb_gene_cloud,
-                                    nb_gene_core,
-                                    nb_gene_soft,
+                                    counts[pers[fams]].sum(),
+                                    counts[shell[fams]].sum(),
+                                    counts[cloud[fams]].sum(),
+                                    counts[(soft & core)[fams]].sum(),
+                                    counts[soft[fams]].sum(),
                                     completeness,
-                                    len(fams & single_copy_markers)])) + "\n")
+                                    numpy.count_nonzero(single_copy_markers[fams])])) + "\n")
 
     logging.getLogger().info("Done writing genome per genome statistics")
 
@@ -443,9 +423,10 @@ def writeParts(output, soft_core, compress=False):
         partSets[fam.namedPartition].add(fam.name)
         if fam.partition.startswith("S"):
             partSets[fam.partition].add(fam.name)
-        if len(fam.organisms) >= len(pan.organisms) * soft_core:
+        nb_orgs = len(pan.getFamilyCounts(fam)[0])
+        if nb_orgs >= pan.number_of_organisms() * soft_core:
             partSets["soft_core"].add(fam.name)
-            if len(fam.organisms) == len(pan.organisms):
+            if nb_orgs == pan.number_of_organisms():
                 partSets["exact_core"].add(fam.name)
             else:
                 partSets["exact_accessory"].add(fam.name)
@@ -566,6 +547,8 @@ def writeFlatFiles(pangenome, output, cpu = 1, soft_core = 0.95, dup_margin = 0.
 
     checkPangenomeInfo(pan, needAnnotations=needAnnotations, needFamilies=needFamilies, needGraph=needGraph, needPartitions= needPartitions, needRGP = needRegions, needSpots = needSpots)
     pan.getIndex()#make the index because it will be used most likely
+    if csv or genePA or stats or partitions:
+        pan.getFamilyMatrix()#make it once here rather than in each process
     with Pool(processes = cpu) as p:
         if csv:
             processes.append(p.apply_async(func = writeMatrix, args = (',', "csv", output, compress, True)))
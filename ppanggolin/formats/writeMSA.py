@@ -16,7 +16,7 @@ from tqdm import tqdm
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import mkOutdir
 from ppanggolin.formats import checkPangenomeInfo
-from ppanggolin.genetic_codes import genetic_codes
+from ppanggolin.sequenceKernel import translate
 
 
 def getFamiliesToWrite(pangenome, partitionFilter):
@@ -39,27 +39,7 @@ def getFamiliesToWrite(pangenome, partitionFilter):
                     fams.add(fam)
     return fams
 
-def translate(seq, code):
-    """ translates the given dna sequence with the given translation table"""
-    # code:  https://www.bioinformatics.org/sms/iupac.html
-    start_table = code["start_table"]
-    table = code["trans_table"]
-
-    protein = ""
-    if len(seq) % 3 == 0:
-        protein = start_table[seq[0: 3]]
-        for i in range(3, len(seq), 3):
-            codon = seq[i: i + 3]
-            try:
-                protein += table[codon]
-            except KeyError:  # codon was not planned for. Probably can't determine it.
-                protein += 'X'  # X is for unknown
-    else:
-        raise IndexError(
-            "Given sequence length modulo 3 was different than 0, which is unexpected.")
-    return protein
-
-def writeFastaFamilies(family, tmpdir, source, code_table):
+def writeFastaFamilies(family, tmpdir, source, code):
 
     #have a directory for each gene family, to make deletion of tmp files simpler
     
@@ -71,7 +51,7 @@ def writeFastaFamilies(family, tmpdir, source, code_table):
         if source == "dna":
             fObj.write(gene.dna + '\n')
         elif source == "protein":
-            fObj.write(translate(gene.dna, code_table)+ "\n")
+            fObj.write(translate(gene.dna, code)+ "\n")
         else:
             raise Exception("Unknown sequence source given (expected 'dna' or 'protein')")
     fObj.flush()
@@ -95,11 +75,10 @@ def computeMSA(families, output, cpu, tmpdir, source, code, show_bar=True):
     msa_total = 0
     args = []
     bar = tqdm(families, unit="family")
-    code_table = genetic_codes(code)
 
     for family in bar:
         start_write = time.time()
-        fname = writeFastaFamilies(family, newtmpdir, source, code_table)
+        fname = writeFastaFamilies(family, newtmpdir, source, code)
         write_total = write_total + (time.time() - start_write)
         args.append((fname, output, family.name))
     bar.close()
@@ -7,12 +7,14 @@ import logging
 
 #installed libraries
 from tqdm import tqdm
+import tables
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import write_compressed_or_not, mkOutdir, read_compressed_or_not
-from ppanggolin.formats import checkPangenomeInfo, getGeneSequencesFromFile
-from ppanggolin.annotate import detect_filetype
+from ppanggolin.formats import checkPangenomeInfo, getGeneSequencesFromFile, SequenceReader, getContigIndex
+from ppanggolin.formats.lazyPangenome import LazyPangenome
+from ppanggolin.annotate import detect_filetype, read_gbff_records, read_fasta_records
 
 def writeGeneSequencesFromAnnotations(pangenome, fileObj, list_CDS=None, show_bar = True):
     """
@@ -30,7 +32,7 @@ def writeGeneSequencesFromAnnotations(pangenome, fileObj, list_CDS=None, show_ba
     fileObj.flush()
     bar.close()
 
-def writeGeneSequences(pangenome, output, compress, genes, show_bar=True):
+def writeGeneSequences(pangenome, output, compress, genes, cpu = 1, show_bar=True):
     logging.getLogger().info("Writing all the gene nucleic sequences...")
     outname = output + f"/{genes}_genes.fna"
 
@@ -50,7 +52,7 @@ def writeGeneSequences(pangenome, output, compress, genes, show_bar=True):
     logging.getLogger().info(f"There are {len(genes_to_write)} genes to write")
     with write_compressed_or_not(outname,compress) as fasta:
         if pangenome.status["geneSequences"] in ["inFile"]:
-            getGeneSequencesFromFile(pangenome.file ,fasta, set([gene.ID for gene in genes_to_write]), show_bar=show_bar)
+            getGeneSequencesFromFile(pangenome.file ,fasta, set([gene.ID for gene in genes_to_write]), show_bar=show_bar, cpu=cpu)
         elif pangenome.status["geneSequences"] in ["Computed","Loaded"]:
             writeGeneSequencesFromAnnotations(pangenome, fasta, genes_to_write, show_bar=show_bar)
         else:
@@ -58,7 +60,7 @@ def writeGeneSequences(pangenome, output, compress, genes, show_bar=True):
             raise Exception("The pangenome does not include gene sequences")
     logging.getLogger().info(f"Done writing the gene sequences : '{outname}'")
 
-def writeFastaGeneFam(pangenome, output, compress, gene_families, show_bar=True):
+def writeFastaGeneFam(pangenome, output, compress, gene_families, cpu = 1, show_bar=True):
     outname = output + f"/{gene_families}_nucleotide_families.fasta"
 
     genefams = set()
@@ -76,7 +78,7 @@ def writeFastaGeneFam(pangenome, output, compress, gene_families, show_bar=True)
             genefams |= region.families
 
     with write_compressed_or_not(outname,compress) as fasta:
-        getGeneSequencesFromFile(pangenome.file ,fasta,[fam.name for fam in genefams], show_bar=show_bar)
+        getGeneSequencesFromFile(pangenome.file ,fasta,[fam.name for fam in genefams], show_bar=show_bar, cpu=cpu)
 
     logging.getLogger().info(f"Done writing the representative nucleotide sequences of the gene families : '{outname}'")
 
@@ -107,51 +109,16 @@ def writeFastaProtFam(pangenome, output, compress, prot_families, show_bar = Fal
 
 def read_fasta_or_gff(filename):
     sequence_dict = {}
-    line = ""
-    seqname = ""
-    seq = ""
-    z = False
     with read_compressed_or_not(filename) as f:
-        for line in f:
-            if line.startswith(">"):
-                z = True
-            if z:
-                if line.startswith('>'):
-                    if seq != "":
-                        sequence_dict[seqname] = seq
-                    seqname = line[1:].strip().split()[0]
-                else:
-                    seq += line.strip()
-        if seq != "":
-            sequence_dict[seqname] = seq
+        for seqname, seq in read_fasta_records(f):#in a gff, the lines before the ##FASTA section do not start with '>' and are skipped
+            if seq != "":
+                sequence_dict[seqname] = seq
     return sequence_dict
 
 def read_fasta_gbk(filename):
-    #line.startswith("ORIGIN"):
     sequence_dict = {}
-    line = ""
-    lines = read_compressed_or_not(filename).readlines()[::-1]
-    while len(lines) != 0:
-        line = lines.pop()
-        # beginning of contig
-        if line.startswith('LOCUS'):
-            contigLocusID = line.split()[1]#If contigID is not specified in VERSION afterwards like with Prokka, in that case we use the one in LOCUS.
-            while not line.startswith('FEATURES'):
-                if line.startswith('VERSION'):
-                    contigID = line[12:].strip()
-                line = lines.pop()
-        if contigID == "":
-            contigID = contigLocusID
-        while not line.startswith("ORIGIN"):
-            line = lines.pop()#stuff
-        line = lines.pop()#first sequence line.
-        sequence = ""
-        while not line.startswith('//'):
-            sequence += line[10:].replace(" ", "").strip().upper()
-            line = lines.pop()
-        #get each gene's sequence.
+    for contigID, _, _, sequence in read_gbff_records(filename, types = []):
         sequence_dict[contigID] = sequence
-        #end of contig
     return sequence_dict
 
 def read_genome_file(file_dict, genome_name):
@@ -171,15 +138,31 @@ def write_spaced_fasta(sequence, space):
         j+=space
     return seq
 
+def hasContigSequences(filename):
+    """ returns whether the sequences of the contigs are stored in the pangenome file """
+    h5f = tables.open_file(filename, "r")
+    stored = "/contigSequences" in h5f
+    h5f.close()
+    return stored
+
 def writeRegionsSequences(pangenome, output, compress, regions, fasta, anno, show_bar=True):
-    organisms_file = fasta if fasta is not None else anno
-    org_dict = {}
-    for line in read_compressed_or_not(organisms_file):
-        elements = [el.strip() for el in line.split("\t")]
-        if len(elements)<=1:
-            logging.getLogger().error(f"No tabulation separator found in given --fasta or --anno file: '{organisms_file}'")
-            exit(1)
-        org_dict[elements[0]] = elements[1]
+    """
+        Writes the genomic sequences of the RGPs. They are read from the contig sequences stored in the pangenome file if there are any, and from the genome files of the organisms otherwise.
+    """
+    h5f = tables.open_file(pangenome.file, "r")
+    if "/contigSequences" in h5f:
+        contigSequences = SequenceReader(h5f.root.contigSequences)
+        contigIndex = getContigIndex(h5f)
+    else:
+        contigSequences = None
+        organisms_file = fasta if fasta is not None else anno
+        org_dict = {}
+        for line in read_compressed_or_not(organisms_file):
+            elements = [el.strip() for el in line.split("\t")]
+            if len(elements)<=1:
+                logging.getLogger().error(f"No tabulation separator found in given --fasta or --anno file: '{organisms_file}'")
+                exit(1)
+            org_dict[elements[0]] = elements[1]
     
     logging.getLogger().info(f"Writing {regions} rgp genomic sequences...")
     regions_to_write = []
@@ -197,12 +180,17 @@ def writeRegionsSequences(pangenome, output, compress, regions, fasta, anno, sho
         loaded_genome = ""
         bar = tqdm(regions_to_write, unit = "rgp", disable=not show_bar)
         for region in bar:
-            if region.organism.name != loaded_genome:
-                loaded_genome = region.organism.name
-                genome_sequence = read_genome_file(org_dict, loaded_genome)
+            if contigSequences is not None:
+                sequence = contigSequences.readSlice(contigIndex[region.organism.name, region.contig.name], region.start, region.stop)
+            else:
+                if region.organism.name != loaded_genome:
+                    loaded_genome = region.organism.name
+                    genome_sequence = read_genome_file(org_dict, loaded_genome)
+                sequence = genome_sequence[region.contig.name][region.start:region.stop]
             fasta.write(f">{region.name}\n")
-            fasta.write(write_spaced_fasta(genome_sequence[region.contig.name][region.start:region.stop], 60))
+            fasta.write(write_spaced_fasta(sequence, 60))
         bar.close()
+    h5f.close()
     logging.getLogger().info(f"Done writing the regions nucleotide sequences: '{outname}'")
 
 def writeSequenceFiles(pangenome, output, fasta=None, anno=None, cpu=1, regions=None, genes=None, gene_families=None, prot_families=None, compress=False, show_bar=True):
@@ -238,24 +226,24 @@ def writeSequenceFiles(pangenome, output, fasta=None, anno=None, cpu=1, regions=
     if prot_families is not None:
         writeFastaProtFam(pangenome, output, compress, prot_families, show_bar=show_bar)
     if gene_families is not None:
-        writeFastaGeneFam(pangenome, output, compress, gene_families, show_bar=show_bar)
+        writeFastaGeneFam(pangenome, output, compress, gene_families, cpu=cpu, show_bar=show_bar)
     if genes is not None:
-        writeGeneSequences(pangenome, output, compress, genes, show_bar=show_bar)
+        writeGeneSequences(pangenome, output, compress, genes, cpu=cpu, show_bar=show_bar)
     if regions is not None:
         writeRegionsSequences(pangenome, output, compress, regions, fasta, anno, show_bar=show_bar)
 
 def checkOptions(args):
     if hasattr(args,"regions"):
         if args.regions is not None:
-            if args.fasta is None and args.anno is None:
-                raise Exception("The --regions options requires the use of --anno or --fasta (You need to provide the same file used to compute the pangenome)")
+            if args.fasta is None and args.anno is None and not hasContigSequences(args.pangenome):
+                raise Exception("The --regions options requires the use of --anno or --fasta (You need to provide the same file used to compute the pangenome), unless the contig sequences were stored in the pangenome file with 'ppanggolin annotate --contig_sequences'")
 
 def launchSequences(args):
     mkOutdir(args.output, args.force)
-    pangenome = Pangenome()
-    pangenome.addFile(args.pangenome)
-    checkOptions(args)
-    writeSequenceFiles(pangenome, args.output, fasta=args.fasta, anno=args.anno, cpu=args.cpu, regions=args.regions, genes=args.genes, prot_families=args.prot_families, gene_families= args.gene_families, compress=args.compress, show_bar=args.show_prog_bars)
+    with LazyPangenome() as pangenome:
+        pangenome.addFile(args.pangenome)
+        checkOptions(args)
+        writeSequenceFiles(pangenome, args.output, fasta=args.fasta, anno=args.anno, cpu=args.cpu, regions=args.regions, genes=args.genes, prot_families=args.prot_families, gene_families= args.gene_families, compress=args.compress, show_bar=args.show_prog_bars)
 
 def writeSequenceSubparser(subparser):
     parser = subparser.add_parser("fasta", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -269,7 +257,7 @@ def writeSequenceSubparser(subparser):
 
     optional = parser.add_argument_group(title = "Optional arguments. Indicating 'all' writes all elements. Writing a partition ('persistent', 'shell' or 'cloud') write the elements associated to said partition. Writing 'rgp' writes elements associated to RGPs.")
     ##could make choice to allow customization
-    optional.add_argument("--regions", required=False, choices=["all","complete"], help = "Write the RGP nucleotide sequences (requires --anno or --fasta used to compute the pangenome to be given)")
+    optional.add_argument("--regions", required=False, choices=["all","complete"], help = "Write the RGP nucleotide sequences (requires --anno or --fasta used to compute the pangenome to be given, unless the contig sequences are stored in the pangenome file)")
     optional.add_argument("--genes", required=False,choices=["all","persistent","shell","cloud","rgp"], help = "Write all nucleotide CDS sequences")
     optional.add_argument("--prot_families", required=False, choices=["all","persistent","shell","cloud","rgp"], help = "Write representative amino acid sequences of gene families")
     optional.add_argument("--gene_families", required=False, choices=["all","persistent","shell","cloud","rgp"], help = "Write representative nucleotide sequences of gene families")
@@ -15,6 +15,8 @@ class GeneFamily:
     """This represents a single gene family. It will be a node in the pangenome graph, and be aware of its genes and edges.
 
     """
+    __slots__ = ("name", "ID", "_edges", "_genePerOrg", "genes", "removed", "sequence", "partition", "bitarray")
+
     def __init__(self, ID, name):
         """Constructor method
 
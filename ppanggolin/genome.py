@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 #coding: utf8
 
+#installed libraries
+import numpy
+
 class Feature:
+    __slots__ = ("ID", "is_fragment", "type", "start", "stop", "strand", "product", "name", "local_identifier", "organism", "contig", "dna")#no per-instance dict, there can be tens of millions of features.
+
     def __init__(self, ID):
         self.ID = ID
         self.is_fragment = False
@@ -27,9 +32,11 @@ class Feature:
         self.dna = dna
 
 class RNA(Feature):
-    pass
+    __slots__ = ()
 
 class Gene(Feature):
+    __slots__ = ("position", "family", "genetic_code", "protein")
+
     def __init__(self, ID):
         super().__init__(ID)
         self.position = None
@@ -50,11 +57,13 @@ class Gene(Feature):
 
 
 class Contig:
+    __slots__ = ("name", "is_circular", "RNAs", "_genes_start", "_genes_position")
+
     def __init__(self, name, is_circular = False):
         self.name = name
         self.is_circular = is_circular
         self.RNAs = set()#saving the rna annotations. We're not using them in the vast majority of cases.
-        self._genes_start = {}
+        self._genes_start = None#built when a gene is first looked up by its start
         self._genes_position = []
 
     @property
@@ -69,6 +78,8 @@ class Contig:
 
     # retrieve gene by start position
     def __getitem__(self, index):
+        if self._genes_start is None:
+            self._genes_start = { gene.start : gene for gene in self._genes_position if gene is not None }
         gene = self._genes_start.get(index)
         if not gene:
             if not isinstance(index, int):
@@ -90,9 +101,12 @@ class Contig:
             # adding empty values. They should be filled by the end of the parsing. Doing this because genes are not always met in order.
             self._genes_position.append(None)
         self._genes_position[gene.position] = gene
-        self._genes_start[gene.start] = gene
+        if self._genes_start is not None:
+            self._genes_start[gene.start] = gene
 
 class Organism:
+    __slots__ = ("name", "_contigs_getter")
+
     def __init__(self, name):
         self.name = name
         self._contigs_getter = {}
@@ -128,3 +142,113 @@ class Organism:
         new_contig = Contig(key, is_circular)
         self._contigs_getter[key] = new_contig
         return new_contig
+
+
+def _joinStrings(strings):
+    return "\0".join(strings)
+
+def _splitStrings(joined, number):
+    return joined.split("\0") if number > 0 else []
+
+def _packSequences(features):
+    """concatenates the dna sequences of the features, returning them with their end offsets, or None if one of the features does not have any"""
+    dna = []
+    for feature in features:
+        seq = getattr(feature, "dna", None)
+        if seq is None:
+            return None, None
+        dna.append(seq)
+    return "".join(dna).encode("ascii"), numpy.cumsum([ len(seq) for seq in dna ], dtype = numpy.uint64)
+
+class PackedOrganism:
+    """
+        Compact form of the annotations of an organism, used to send them from one process to another.
+        The attributes of the genes and of the RNAs are stored column per column in numpy arrays, their strings are joined in a single string per attribute,
+        and their dna sequences are concatenated in bytes with their end offsets, so that they are pickled as a few large objects instead of one object per feature.
+
+        :param org: the organism to pack
+        :type org: :class:`ppanggolin.genome.Organism`
+    """
+    def __init__(self, org):
+        self.name = org.name
+        self.contigs = []
+        genes = []
+        geneContigs = []
+        RNAs = []
+        rnaContigs = []
+        for contigIndex, contig in enumerate(org.contigs):
+            self.contigs.append((contig.name, contig.is_circular))
+            for gene in contig.genes:
+                if gene is not None:
+                    genes.append(gene)
+                    geneContigs.append(contigIndex)
+            for rna in contig.RNAs:
+                RNAs.append(rna)
+                rnaContigs.append(contigIndex)
+        self.genes = self._packFeatures(genes, geneContigs)
+        self.genes["position"] = numpy.array([ gene.position for gene in genes ], dtype = numpy.uint32)
+        self.genes["genetic_code"] = numpy.array([ gene.genetic_code for gene in genes ])
+        self.genes["is_fragment"] = numpy.array([ gene.is_fragment for gene in genes ], dtype = bool)
+        self.RNAs = self._packFeatures(RNAs, rnaContigs)
+
+    @staticmethod
+    def _packFeatures(features, contigs):
+        packed = {
+            "number" : len(features),
+            "contig" : numpy.array(contigs, dtype = numpy.uint32),
+            "start" : numpy.array([ feature.start for feature in features ], dtype = numpy.uint32),
+            "stop" : numpy.array([ feature.stop for feature in features ], dtype = numpy.uint32),
+            "strand" : numpy.array([ feature.strand for feature in features ], dtype = "S1")}
+        for attribute in ["ID", "type", "name", "product", "local_identifier"]:
+            packed[attribute] = _joinStrings([ getattr(feature, attribute) for feature in features ])
+        packed["dna"], packed["offsets"] = _packSequences(features)
+        return packed
+
+    @staticmethod
+    def strings(packed, attribute):
+        """returns the list of the values of a string attribute of the packed genes or RNAs"""
+        return _splitStrings(packed[attribute], packed["number"])
+
+    @staticmethod
+    def sequences(packed):
+        """returns the list of the dna sequences of the packed genes or RNAs, or None if they do not have any"""
+        if packed["dna"] is None:
+            return None
+        dna = packed["dna"].decode("ascii")
+        starts = [0] + packed["offsets"].tolist()
+        return [ dna[start:stop] for start, stop in zip(starts, starts[1:]) ]
+
+    @classmethod
+    def columns(cls, packed):
+        """returns the lists of the contig index, ID, start, stop, strand, type, name, product and local identifier of the packed genes or RNAs"""
+        return [ packed["contig"].tolist(), cls.strings(packed, "ID"), packed["start"].tolist(), packed["stop"].tolist(), packed["strand"].astype(str).tolist(),
+                 cls.strings(packed, "type"), cls.strings(packed, "name"), cls.strings(packed, "product"), cls.strings(packed, "local_identifier") ]
+
+    def unpack(self):
+        """
+            Builds the organism back
+
+            :rtype: :class:`ppanggolin.genome.Organism`
+        """
+        org = Organism(self.name)
+        contigs = [ org.getOrAddContig(name, is_circular) for name, is_circular in self.contigs ]
+        sequences = self.sequences(self.genes)
+        columns = self.columns(self.genes) + [ self.genes["position"].tolist(), self.genes["genetic_code"].tolist(), self.genes["is_fragment"].tolist() ]
+        for index, (contig, ID, start, stop, strand, geneType, name, product, local, position, genetic_code, is_fragment) in enumerate(zip(*columns)):
+            gene = Gene(ID)
+            gene.fill_annotations(start = start, stop = stop, strand = strand, geneType = geneType, name = name, product = product,
+                                  local_identifier = local, position = position, genetic_code = genetic_code)
+            gene.is_fragment = is_fragment
+            if sequences is not None:
+                gene.add_dna(sequences[index])
+            gene.fill_parents(org, contigs[contig])
+            contigs[contig].addGene(gene)
+        sequences = self.sequences(self.RNAs)
+        for index, (contig, ID, start, stop, strand, geneType, name, product, local) in enumerate(zip(*self.columns(self.RNAs))):
+            rna = RNA(ID)
+            rna.fill_annotations(start = start, stop = stop, strand = strand, geneType = geneType, name = name, product = product, local_identifier = local)
+            if sequences is not None:
+                rna.add_dna(sequences[index])
+            rna.fill_parents(org, contigs[contig])
+            contigs[contig].addRNA(rna)
+        return org
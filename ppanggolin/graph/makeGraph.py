@@ -44,6 +44,24 @@ def remove_high_copy_number(pangenome, number):
                 fam.removed = True
 
 
+def computeOrganismEdges(pangenome, org):
+    """
+        Adds to the pangenome graph the edges between the families of the consecutive genes of the contigs of an organism.
+    """
+    for contig in org.contigs:
+        prev = None
+        for gene in contig.genes:
+            try:
+                if not gene.family.removed:
+                    if prev is not None:
+                        if not (prev.family == gene.family and (prev.is_fragment or gene.is_fragment)):
+                            pangenome.addEdge(gene, prev)
+                    prev = gene
+            except AttributeError:
+                raise AttributeError("a Gene does not have a GeneFamily object associated")
+        if contig.is_circular and len(contig.genes) > 0:
+            pangenome.addEdge(contig.genes[0],prev)
+
 def computeNeighborsGraph(pangenome, remove_copy_number = 0, force = False, show_bar = True):
     """
         Creates the Pangenome Graph. Will either load the informations from the pangenome file if they are not loaded, or use the informations loaded if they are.
@@ -58,19 +76,7 @@ def computeNeighborsGraph(pangenome, remove_copy_number = 0, force = False, show
     for org in bar:
         bar.set_description(f"Processing {org.name}")
         bar.refresh()
-        for contig in org.contigs:
-            prev = None
-            for gene in contig.genes:
-                try:
-                    if not gene.family.removed:
-                        if prev is not None:
-                            if not (prev.family == gene.family and (prev.is_fragment or gene.is_fragment)):
-                                pangenome.addEdge(gene, prev)
-                        prev = gene
-                except AttributeError:
-                    raise AttributeError("a Gene does not have a GeneFamily object associated")
-            if contig.is_circular and len(contig.genes) > 0:
-                pangenome.addEdge(contig.genes[0],prev)
+        computeOrganismEdges(pangenome, org)
     logging.getLogger().info("Done making the neighbors graph.")
     pangenome.status["neighborsGraph"] = "Computed"
 
@@ -23,6 +23,7 @@ import ppanggolin.annotate
 import ppanggolin.cluster
 import ppanggolin.workflow.workflow
 import ppanggolin.workflow.panRGP
+import ppanggolin.workflow.update
 import ppanggolin.figures
 import ppanggolin.formats
 import ppanggolin.info
@@ -95,6 +96,7 @@ def cmdLine():
     desc += "    partition     Partition the pangenome graph\n"
     desc += "    rarefaction   Compute the rarefaction curve of the pangenome\n"
     desc += "    msa           Compute Multiple Sequence Alignments for pangenome gene families\n"
+    desc += "    update        Add new genomes to a pangenome without computing it again\n"
     desc += "  \n"
     desc += "  Output:\n"
     desc += "    draw          Draw figures representing the pangenome through different aspects\n"
@@ -120,6 +122,7 @@ def cmdLine():
     subs.append(ppanggolin.nem.rarefaction.rarefactionSubparser(subparsers))
     subs.append(ppanggolin.workflow.workflow.workflowSubparser(subparsers))
     subs.append(ppanggolin.workflow.panRGP.panRGPSubparser(subparsers))
+    subs.append(ppanggolin.workflow.update.updateSubparser(subparsers))
     subs.append(ppanggolin.figures.figureSubparser(subparsers))
     subs.append(ppanggolin.formats.writeFlat.writeFlatSubparser(subparsers))
     subs.append(ppanggolin.formats.writeSequences.writeSequenceSubparser(subparsers))
@@ -147,7 +150,7 @@ def cmdLine():
         sys.exit(0)
 
     args = parser.parse_args()
-    if args.subcommand == "annotate":
+    if args.subcommand in ["annotate", "update"]:
         if args.fasta is None and args.anno is None:
             raise Exception( "You must provide at least a file with the --fasta option to annotate from sequences, or a file with the --gff option to load annotations from.")
     return args
@@ -208,6 +211,8 @@ def main():
         ppanggolin.RGP.spot.launch(args)
     elif args.subcommand == "panrgp":
         ppanggolin.workflow.panRGP.launch(args)
+    elif args.subcommand == "update":
+        ppanggolin.workflow.update.launch(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -113,6 +113,31 @@ static void FreeAllocatedData
  float*       ClassifM     /* O and deallocated */
 ) ;
 
+    static void AllocModelPara
+        (
+            const int    K,            /* I : number of classes */
+            const int    D,            /* I : number of variables */
+            StatModelT*  StatModelP    /* O and allocated */
+        ) ;
+
+    static int SetNemPara
+        (
+            const char*  algo,           /* I */
+            const float  beta,           /* I */
+            const char*  convergence,    /* I */
+            const float  convergence_th, /* I */
+            const char*  format,         /* I */
+            const int    it_max,         /* I */
+            const int    dolog,          /* I */
+            const char*  model_family,   /* I */
+            const char*  proportion,     /* I */
+            const char*  dispersion,     /* I */
+            const int    init_mode,      /* I */
+            const int    seed,           /* I */
+            NemParaT*    NemParaP,       /* O */
+            StatModelT*  StatModelP      /* O */
+        ) ;
+
 
     static int SetVisitOrder  /*V1.04-e*/
         ( 
@@ -200,6 +225,28 @@ static void FreeAllocatedData
                 ) ;
 
 
+/* Called by nem_arrays */
+
+    static int  SetParamArray
+         ( 
+             const float*   Values,  /* I : (K-1) + K*D + K*D values */
+             const FamilyET Family,
+             const int      K,       /* I : number of classes */
+             const int      D,       /* I : number of variables */
+             ModelParaT*    ParaP    /* O : parameters */
+         ) ;
+
+    static int  SetPtsNeighs
+                (
+                    const int*   NeiStarts,     /* I (NbPts + 1) */
+                    const int*   NeiIndex,      /* I 0..NbPts-1 */
+                    const float* NeiWeights,    /* I */
+                    int          NbPts,         /* I */
+                    int          *MaxNeiP,      /* O */
+                    NeighDataT   *NeighDataP    /* O and allocated */
+                ) ;
+
+
 /* Called by MakeErrinfo */
 
 static int factorial(int n);
@@ -310,138 +357,18 @@ int nem(const char* Fname,
                 &Spatial.Type) ) != STS_OK )
     return err ;
 
-      /* !!! Allocate model parameters */ /*V1.06-a*/
-    StatModel.Para.Prop_K    = GenAlloc( nk, sizeof(float), 
-                       1, func, "Prop_K" ) ;
-    StatModel.Para.Disp_KD   = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                         1, func, "Disp_KD" ) ;
-    StatModel.Para.Center_KD = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "Center_KD" ) ;
-    StatModel.Para.NbObs_K   = GenAlloc( nk, sizeof(float), 
-                       1, func, "NbObs_K" ) ;
-    StatModel.Para.NbObs_KD  = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "NbObs_KD" ) ;
-    StatModel.Para.Iner_KD   = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "NbObs_KD" ) ;
-    StatModel.Desc.DispSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "DispSam_D" );
-    StatModel.Desc.MiniSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "MiniSam_D" );
-    StatModel.Desc.MaxiSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "MaxiSam_D" );
-    /* Set default value of optional parameters */
-    StatModel.Spec.ClassFamily = DEFAULT_FAMILY ;
-    StatModel.Spec.ClassDisper = DEFAULT_DISPER ;
-    StatModel.Spec.ClassPropor = DEFAULT_PROPOR ;
-    NemPara.Algo          = DEFAULT_ALGO ;
-    StatModel.Para.Beta   = DEFAULT_BETA ;          /*V1.06-b*/
-    StatModel.Spec.BetaModel = DEFAULT_BTAMODE ;       /*V1.04-b*/
-    NemPara.BtaHeuStep    = DEFAULT_BTAHEUSTEP ;    /*V1.04-b*/
-    NemPara.BtaHeuMax     = DEFAULT_BTAHEUMAX ;
-    NemPara.BtaHeuDDrop   = DEFAULT_BTAHEUDDROP ;
-    NemPara.BtaHeuDLoss   = DEFAULT_BTAHEUDLOSS ;
-    NemPara.BtaHeuLLoss   = DEFAULT_BTAHEULLOSS ;
-    NemPara.BtaPsGrad.NbIter    = DEFAULT_BTAGRADNIT  ;/*V1.06-g*/
-    NemPara.BtaPsGrad.ConvThres = DEFAULT_BTAGRADCVTH ;
-    NemPara.BtaPsGrad.Step      = DEFAULT_BTAGRADSTEP ;
-    NemPara.BtaPsGrad.RandInit  = DEFAULT_BTAGRADRAND ;
-    NemPara.Crit          = DEFAULT_CRIT ;          /*V1.04-h*/
-    NemPara.CvThres       = DEFAULT_CVTHRES ;       /*V1.04-d*/
-    NemPara.CvTest        = CVTEST_CLAS ;           /*V1.06-g*/
-    NemPara.DoLog         = FALSE ;                 /*V1.03-a previously TRUE*/
-    NemPara.NbIters       = DEFAULT_NBITERS ;
-    NemPara.NbEIters      = DEFAULT_NBEITERS ;
-    NemPara.NbRandomInits = DEFAULT_NBRANDINITS ;  /*V1.06-h*/
-    NemPara.Seed          = seed ;//time( NULL )          /*V1.04-e*/
-    NemPara.Format        = DEFAULT_FORMAT ;
-    NemPara.InitMode      = DEFAULT_INIT ;
-    NemPara.ParamFileMode = DEFAULT_NO_PARAM_FILE ;
-    NemPara.SortedVar     = DEFAULT_SORTEDVAR ;
-    NemPara.NeighSpec     = DEFAULT_NEIGHSPEC ;
-    NemPara.VisitOrder    = DEFAULT_ORDER ;         /*V1.04-f*/
-    NemPara.SiteUpdate    = DEFAULT_UPDATE ;        /*V1.06-d*/
-    NemPara.TieRule       = DEFAULT_TIE ;           /*V1.06-e*/
-    NemPara.Debug         = FALSE ;                 /*V1.04-g*/
+    /* !!! Allocate model parameters */ /*V1.06-a*/
+    AllocModelPara( nk, Data.NbVars, &StatModel ) ;
+
+    err = SetNemPara( algo, beta, convergence, convergence_th, format,
+                      it_max, dolog, model_family, proportion, dispersion,
+                      init_mode, seed, &NemPara, &StatModel ) ;
     strncpy( NemPara.OutBaseName, out_file_prefix, LEN_FILENAME ) ;
     strncpy( NemPara.NeighName, Fname, LEN_FILENAME ) ;
     strncpy( NemPara.ParamName, init_file, LEN_FILENAME ) ;
     strncat( NemPara.NeighName, ".nei", LEN_FILENAME ) ;
     strncpy( NemPara.RefName, "", LEN_FILENAME ) ;
 
-    //-----
-    NemPara.Algo = GetEnum( algo , AlgoStrVC, ALGO_NB ) ;
-    if ( NemPara.Algo == -1 )
-    {
-        fprintf( out_stderr, " Unknown type of algorithm %s\n", algo ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    
-    if (beta < 0)
-    {
-        StatModel.Spec.BetaModel = BETA_PSGRAD ;
-    }
-    else{
-        StatModel.Para.Beta = beta ;
-    }
-    //-----
-    NemPara.CvTest=GetEnum( convergence, CvTestStrVC, CVTEST_NB );
-    if ( NemPara.CvTest == -1 ) {
-      fprintf( out_stderr, " Unknown convergence test %s\n", convergence ) ;
-      err = STS_E_ARG ;
-    }
-    else if ( NemPara.CvTest != CVTEST_NONE ) /* get threshold */ {
-        NemPara.CvThres = convergence_th ;
-        if ( NemPara.CvThres <= 0 ) {
-            fprintf( out_stderr, " Conv threshold must be > 0 (here %f)\n", convergence_th ) ;
-            err = STS_E_ARG ;
-        } /* else threshold > 0 : OK */
-    } 
-    //-----
-    NemPara.Format=GetEnum( format , FormatStrVC, FORMAT_NB );
-    if ( NemPara.Format == -1 )
-    {
-        fprintf( out_stderr, " Unknown format %s\n", format) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    NemPara.NbIters = it_max ;
-    if ( NemPara.NbIters < 0 )
-    {
-        fprintf( out_stderr, "Nb iterations must be >= 0 (here %d)\n",  it_max ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    if ( dolog )
-        NemPara.DoLog = TRUE ;
-    else
-        NemPara.DoLog = FALSE ;
-    //-----
-    StatModel.Spec.ClassFamily = GetEnum( model_family, FamilyStrVC, FAMILY_NB );
-    if ( StatModel.Spec.ClassFamily == -1 )
-    {
-        fprintf( out_stderr, " Unknown family %s\n", model_family ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    StatModel.Spec.ClassPropor = GetEnum( proportion, ProporStrVC, PROPOR_NB );
-    if ( StatModel.Spec.ClassPropor == -1 )
-    {
-        fprintf( out_stderr, " Unknown proportion %s\n", proportion ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    StatModel.Spec.ClassDisper = GetEnum( dispersion, DisperStrVC, DISPER_NB );
-    if ( StatModel.Spec.ClassDisper == -1 )
-    {
-        fprintf( out_stderr, " Unknown dispersion %s\n", dispersion) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    NemPara.NeighSpec = NEIGH_FILE;
-    //-----
-    NemPara.InitMode = init_mode;
-
     strncpy( NemPara.OutName, NemPara.OutBaseName, LEN_FILENAME ) ;
     strncat( NemPara.OutName, 
            NemPara.Format == FORMAT_HARD ? EXT_OUTNAMEHARD : EXT_OUTNAMEFUZZY,
@@ -711,6 +638,188 @@ int nem(const char* Fname,
 } /* end of mainfunc() */
 
 
+/* ------------------------------------------------------------------- */
+int nem_arrays(const int    nbPts,
+               const int    nbVars,
+               const float* pointsM,
+               const int*   neiStarts,
+               const int*   neiIndex,
+               const float* neiWeights,
+               const int    nk,
+               const char*  algo,
+               const float  beta,
+               const char*  convergence,
+               const float  convergence_th,
+               const int    it_max,
+               const char*  model_family,
+               const char*  proportion,
+               const char*  dispersion,
+               const int    init_mode,
+               const float* init_param,
+               const char*  log_prefix,
+               const int    seed,
+               float*       classifOut,
+               float*       paramOut,
+               float*       criteriaOut)
+/*\
+    NEM function working on data held in memory rather than in files.
+
+    The points are given as a (nbPts x nbVars) row-major matrix, and 
+    the neighbours of point i (0-based indices) are in neiIndex and
+    neiWeights from neiStarts[ i ] to neiStarts[ i + 1 ].  If init_mode
+    is INIT_PARAM_FILE, init_param holds the values of the parameter
+    file (without its leading 1).  If log_prefix is not empty, the
+    progress and the detailed running are logged to log_prefix.stderr
+    and log_prefix.log.
+
+    On success (STS_OK), the fuzzy classification (nbPts x nk) is 
+    copied to classifOut, the proportions (nk), centers (nk x nbVars)
+    and dispersions (nk x nbVars) of the classes to paramOut, and the
+    criteria U, D, L, M, Z and error rate to criteriaOut.  Otherwise
+    the status of the failure is returned and nothing is copied.
+\*/
+/* ------------------------------------------------------------------- */
+{
+    const char*     func = "nem_arrays" ;
+    StatusET        err ;
+    DataT           Data = {0} ;
+    NemParaT        NemPara = {0} ;
+    SpatialT        Spatial = {{{0}}} ;
+    StatModelT      StatModel = {{0}} ;
+    float           *ClassifM = NULL ;
+    CriterT         Criteria = {0} ;
+    int             k, d ;
+
+    if ( strcmp( log_prefix, "" ) != 0 )
+    {
+        char name_out_stderr[LEN_FILENAME];
+        strncpy( name_out_stderr , log_prefix , LEN_FILENAME ) ;
+        strncat( name_out_stderr , ".stderr", LEN_FILENAME ) ;
+        out_stderr = fopen(name_out_stderr, "w");
+    }
+    else
+        out_stderr = fopen("/dev/null", "w");
+    if ( out_stderr == NULL )
+        out_stderr = stderr ;
+
+    StatModel.Spec.K = nk ;
+    if ( nk <= 0 )
+    {
+        fprintf( out_stderr, "Nb of classes must be > 0 (here %d)\n", nk ) ;
+        err = STS_E_ARG ;
+        goto end ;
+    }
+
+    Data.NbPts    = nbPts ;
+    Data.NbVars   = nbVars ;
+    Spatial.Type  = TYPE_NONSPATIAL ; /* no neighbours to deallocate yet */
+
+    AllocModelPara( nk, Data.NbVars, &StatModel ) ;
+
+    /* The criteria are only checked at each iteration when logging : 
+       always log, as nem() is used, but to nowhere if no log is wanted */
+    if ( ( err = SetNemPara( algo, beta, convergence, convergence_th, "fuzzy",
+                             it_max, TRUE, model_family, proportion, dispersion,
+                             init_mode, seed, &NemPara, &StatModel ) ) != STS_OK )
+        goto end ;
+    strncpy( NemPara.OutBaseName, log_prefix, LEN_FILENAME ) ;
+    strncpy( NemPara.RefName, "", LEN_FILENAME ) ;
+    if ( strcmp( log_prefix, "" ) != 0 )
+    {
+        strncpy( NemPara.LogName, log_prefix, LEN_FILENAME ) ;
+        strncat( NemPara.LogName, EXT_LOGNAME, LEN_FILENAME ) ;
+    }
+    else
+        strncpy( NemPara.LogName, "/dev/null", LEN_FILENAME ) ;
+
+    /* The points are only read by the algorithm : use them in place */
+    Data.PointsM = (float*) pointsM ;
+    Data.NbMiss = 0 ;
+
+    if ( ( err = SetVisitOrder( Data.NbPts, NemPara.VisitOrder,
+                                & Data.SiteVisitV ) ) != STS_OK )
+        goto end ;
+
+    Data.LabelV = NULL ;
+    switch( NemPara.InitMode )
+    {
+    case INIT_PARAM_FILE:
+        NemPara.ParamFileMode = PARAM_FILE_INIT ;
+        if ( ( err = SetParamArray( init_param,
+                                    StatModel.Spec.ClassFamily,
+                                    StatModel.Spec.K,
+                                    Data.NbVars,
+                                    & StatModel.Para ) ) != STS_OK )
+            goto end ;
+    case INIT_SORT:
+    case INIT_RANDOM:
+        if ( ( ClassifM = 
+	       GenAlloc( Data.NbPts * StatModel.Spec.K, sizeof( float ),
+			 0, func, "ClassifM" ) ) == NULL )
+        {
+            err = STS_E_MEMORY ;
+            goto end ;
+        }
+        break ;
+
+    default: /* the other modes need files */
+        fprintf( out_stderr, "Unknown initialization mode (%d)\n", 
+                 NemPara.InitMode );
+        err = STS_E_FUNCARG ;
+        goto end ;
+    }
+
+    if ( ( err = MakeErrinfo( NemPara.RefName, Data.NbPts, 
+                              StatModel.Spec.K, NemPara.TieRule, 
+                              &Criteria.Errinfo, &Criteria.Errcur ) ) != STS_OK )
+        goto end ;
+
+    Spatial.Type = TYPE_SPATIAL ;
+    if ( ( err = SetPtsNeighs( neiStarts, neiIndex, neiWeights, Data.NbPts,
+                               &Spatial.MaxNeighs,
+                               &Spatial.NeighData ) ) != STS_OK )
+        goto end ;
+
+    srandom( NemPara.Seed ) ;
+
+    if ( ( err = ClassifyByNem( &NemPara, &Spatial, &Data, 
+                                &StatModel, ClassifM, 
+                                &Criteria ) ) == STS_OK )
+    {
+        memcpy( classifOut, ClassifM, 
+                Data.NbPts * nk * sizeof( float ) ) ;
+        memcpy( paramOut, StatModel.Para.Prop_K, nk * sizeof( float ) ) ;
+        memcpy( paramOut + nk, StatModel.Para.Center_KD,
+                nk * Data.NbVars * sizeof( float ) ) ;
+        for ( k = 0 ; k < nk ; k ++ )
+          for ( d = 0 ; d < Data.NbVars ; d ++ )
+            paramOut[ nk + nk * Data.NbVars + k * Data.NbVars + d ] =
+              StatModel.Spec.ClassFamily == FAMILY_NORMAL ?
+              sqrt( StatModel.Para.Disp_KD[ k * Data.NbVars + d ] ) :
+              StatModel.Para.Disp_KD[ k * Data.NbVars + d ] ;
+        criteriaOut[ 0 ] = Criteria.U ;
+        criteriaOut[ 1 ] = Criteria.D ;
+        criteriaOut[ 2 ] = Criteria.L ;
+        criteriaOut[ 3 ] = Criteria.M ;
+        criteriaOut[ 4 ] = Criteria.Z ;
+        criteriaOut[ 5 ] = Criteria.Errcur.Errorrate ;
+    }
+
+end:
+    /* the points belong to the caller */
+    Data.PointsM = NULL ;
+    FreeAllocatedData( &Data, &Spatial, &StatModel.Para, 
+                       &Criteria, ClassifM ) ;
+    GenFree( StatModel.Desc.DispSam_D ) ;
+    GenFree( StatModel.Desc.MiniSam_D ) ;
+    GenFree( StatModel.Desc.MaxiSam_D ) ;
+    if ( out_stderr != stderr )
+        fclose( out_stderr ) ;
+    return err ;
+
+} /* end of nem_arrays() */
+
+
 
 /* ==================== LOCAL FUNCTION DEFINITION =================== */
 
@@ -1787,6 +1896,307 @@ static int SaveResults
 
 }  /* end of SaveResults() */
 
+
+/* ------------------------------------------------------------------- */
+static void AllocModelPara
+        (
+            const int    K,            /* I : number of classes */
+            const int    D,            /* I : number of variables */
+            StatModelT*  StatModelP    /* O and allocated */
+        )
+/* ------------------------------------------------------------------- */
+{
+    const char* func = "AllocModelPara" ;
+
+    StatModelP->Para.Prop_K    = GenAlloc( K, sizeof(float), 
+                       1, func, "Prop_K" ) ;
+    StatModelP->Para.Disp_KD   = GenAlloc( K * D, sizeof(float), 
+                         1, func, "Disp_KD" ) ;
+    StatModelP->Para.Center_KD = GenAlloc( K * D, sizeof(float), 
+                       1, func, "Center_KD" ) ;
+    StatModelP->Para.NbObs_K   = GenAlloc( K, sizeof(float), 
+                       1, func, "NbObs_K" ) ;
+    StatModelP->Para.NbObs_KD  = GenAlloc( K * D, sizeof(float), 
+                       1, func, "NbObs_KD" ) ;
+    StatModelP->Para.Iner_KD   = GenAlloc( K * D, sizeof(float), 
+                       1, func, "NbObs_KD" ) ;
+    StatModelP->Desc.DispSam_D = GenAlloc( D, sizeof(float), 
+                        1, func, "DispSam_D" );
+    StatModelP->Desc.MiniSam_D = GenAlloc( D, sizeof(float), 
+                        1, func, "MiniSam_D" );
+    StatModelP->Desc.MaxiSam_D = GenAlloc( D, sizeof(float), 
+                        1, func, "MaxiSam_D" );
+}  /* end of AllocModelPara() */
+
+
+/* ------------------------------------------------------------------- */
+static int SetNemPara
+        (
+            const char*  algo,           /* I */
+            const float  beta,           /* I */
+            const char*  convergence,    /* I */
+            const float  convergence_th, /* I */
+            const char*  format,         /* I */
+            const int    it_max,         /* I */
+            const int    dolog,          /* I */
+            const char*  model_family,   /* I */
+            const char*  proportion,     /* I */
+            const char*  dispersion,     /* I */
+            const int    init_mode,      /* I */
+            const int    seed,           /* I */
+            NemParaT*    NemParaP,       /* O */
+            StatModelT*  StatModelP      /* O */
+        )
+/*\
+  Set default value of optional parameters, then the ones given
+  as arguments. Returns STS_E_ARG if one of the arguments is invalid.
+\*/
+/* ------------------------------------------------------------------- */
+{
+    StatusET err = STS_OK ;
+
+    /* Set default value of optional parameters */
+    StatModelP->Spec.ClassFamily = DEFAULT_FAMILY ;
+    StatModelP->Spec.ClassDisper = DEFAULT_DISPER ;
+    StatModelP->Spec.ClassPropor = DEFAULT_PROPOR ;
+    NemParaP->Algo          = DEFAULT_ALGO ;
+    StatModelP->Para.Beta   = DEFAULT_BETA ;          /*V1.06-b*/
+    StatModelP->Spec.BetaModel = DEFAULT_BTAMODE ;       /*V1.04-b*/
+    NemParaP->BtaHeuStep    = DEFAULT_BTAHEUSTEP ;    /*V1.04-b*/
+    NemParaP->BtaHeuMax     = DEFAULT_BTAHEUMAX ;
+    NemParaP->BtaHeuDDrop   = DEFAULT_BTAHEUDDROP ;
+    NemParaP->BtaHeuDLoss   = DEFAULT_BTAHEUDLOSS ;
+    NemParaP->BtaHeuLLoss   = DEFAULT_BTAHEULLOSS ;
+    NemParaP->BtaPsGrad.NbIter    = DEFAULT_BTAGRADNIT  ;/*V1.06-g*/
+    NemParaP->BtaPsGrad.ConvThres = DEFAULT_BTAGRADCVTH ;
+    NemParaP->BtaPsGrad.Step      = DEFAULT_BTAGRADSTEP ;
+    NemParaP->BtaPsGrad.RandInit  = DEFAULT_BTAGRADRAND ;
+    NemParaP->Crit          = DEFAULT_CRIT ;          /*V1.04-h*/
+    NemParaP->CvThres       = DEFAULT_CVTHRES ;       /*V1.04-d*/
+    NemParaP->CvTest        = CVTEST_CLAS ;           /*V1.06-g*/
+    NemParaP->DoLog         = FALSE ;                 /*V1.03-a previously TRUE*/
+    NemParaP->NbIters       = DEFAULT_NBITERS ;
+    NemParaP->NbEIters      = DEFAULT_NBEITERS ;
+    NemParaP->NbRandomInits = DEFAULT_NBRANDINITS ;  /*V1.06-h*/
+    NemParaP->Seed          = seed ;//time( NULL )          /*V1.04-e*/
+    NemParaP->Format        = DEFAULT_FORMAT ;
+    NemParaP->InitMode      = DEFAULT_INIT ;
+    NemParaP->ParamFileMode = DEFAULT_NO_PARAM_FILE ;
+    NemParaP->SortedVar     = DEFAULT_SORTEDVAR ;
+    NemParaP->NeighSpec     = DEFAULT_NEIGHSPEC ;
+    NemParaP->VisitOrder    = DEFAULT_ORDER ;         /*V1.04-f*/
+    NemParaP->SiteUpdate    = DEFAULT_UPDATE ;        /*V1.06-d*/
+    NemParaP->TieRule       = DEFAULT_TIE ;           /*V1.06-e*/
+    NemParaP->Debug         = FALSE ;                 /*V1.04-g*/
+
+    //-----
+    NemParaP->Algo = GetEnum( algo , AlgoStrVC, ALGO_NB ) ;
+    if ( NemParaP->Algo == -1 )
+    {
+        fprintf( out_stderr, " Unknown type of algorithm %s\n", algo ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    
+    if (beta < 0)
+    {
+        StatModelP->Spec.BetaModel = BETA_PSGRAD ;
+    }
+    else{
+        StatModelP->Para.Beta = beta ;
+    }
+    //-----
+    NemParaP->CvTest=GetEnum( convergence, CvTestStrVC, CVTEST_NB );
+    if ( NemParaP->CvTest == -1 ) {
+      fprintf( out_stderr, " Unknown convergence test %s\n", convergence ) ;
+      err = STS_E_ARG ;
+    }
+    else if ( NemParaP->CvTest != CVTEST_NONE ) /* get threshold */ {
+        NemParaP->CvThres = convergence_th ;
+        if ( NemParaP->CvThres <= 0 ) {
+            fprintf( out_stderr, " Conv threshold must be > 0 (here %f)\n", convergence_th ) ;
+            err = STS_E_ARG ;
+        } /* else threshold > 0 : OK */
+    } 
+    //-----
+    NemParaP->Format=GetEnum( format , FormatStrVC, FORMAT_NB );
+    if ( NemParaP->Format == -1 )
+    {
+        fprintf( out_stderr, " Unknown format %s\n", format) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    NemParaP->NbIters = it_max ;
+    if ( NemParaP->NbIters < 0 )
+    {
+        fprintf( out_stderr, "Nb iterations must be >= 0 (here %d)\n",  it_max ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    if ( dolog )
+        NemParaP->DoLog = TRUE ;
+    else
+        NemParaP->DoLog = FALSE ;
+    //-----
+    StatModelP->Spec.ClassFamily = GetEnum( model_family, FamilyStrVC, FAMILY_NB );
+    if ( StatModelP->Spec.ClassFamily == -1 )
+    {
+        fprintf( out_stderr, " Unknown family %s\n", model_family ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    StatModelP->Spec.ClassPropor = GetEnum( proportion, ProporStrVC, PROPOR_NB );
+    if ( StatModelP->Spec.ClassPropor == -1 )
+    {
+        fprintf( out_stderr, " Unknown proportion %s\n", proportion ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    StatModelP->Spec.ClassDisper = GetEnum( dispersion, DisperStrVC, DISPER_NB );
+    if ( StatModelP->Spec.ClassDisper == -1 )
+    {
+        fprintf( out_stderr, " Unknown dispersion %s\n", dispersion) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    NemParaP->NeighSpec = NEIGH_FILE;
+    //-----
+    NemParaP->InitMode = init_mode;
+
+    return err ;
+
+}  /* end of SetNemPara() */
+
+
+/* ------------------------------------------------------------------- */
+static int  SetParamArray
+         ( 
+             const float*   Values,  /* I : (K-1) + K*D + K*D values */
+             const FamilyET Family,
+             const int      K,       /* I : number of classes */
+             const int      D,       /* I : number of variables */
+             ModelParaT*    ParaP    /* O : parameters */
+         )
+/*\
+  Same as ReadParamFile(), the values being given in memory in the
+  order of the parameter file : proportions of the K-1 first classes,
+  then centers, then dispersions.
+\*/
+/* ------------------------------------------------------------------- */
+{
+  StatusET  sts = STS_OK ;
+  int       k ;   /* class counter : 0..K-1 */
+  int       d ;   /* variable counter : 0..D-1 */
+  float     pK ;  /* remaining proportion for class K */
+  const float* centers = Values + ( K - 1 ) ;
+  const float* disps   = centers + K * D ;
+
+  /* Set proportions */
+  for ( k = 0, pK = 1 ; k < K - 1 ; k ++ ) {
+    ParaP->Prop_K[ k ] = Values[ k ] ;
+    pK = pK - ParaP->Prop_K[ k ] ;
+  }
+  ParaP->Prop_K[ K - 1 ] = pK ;
+  if ( pK <= 0.0 ) {
+    sts = STS_E_FILE ;
+  }
+
+  /* Set centers and dispersions */
+  for ( k = 0 ; k < K ; k ++ ) {
+    for ( d = 0 ; d < D ; d ++ ) {
+      ParaP->Center_KD[ k * D + d ] = centers[ k * D + d ] ;
+      if ( Family == FAMILY_NORMAL )
+        ParaP->Disp_KD[ k * D + d ] = disps[ k * D + d ] * disps[ k * D + d ] ;
+      else
+        ParaP->Disp_KD[ k * D + d ] = disps[ k * D + d ] ;
+      if ( ParaP->Disp_KD[ k * D + d ] <= 0 ) {
+        fprintf( out_stderr, "Dispersion(k=%d, d=%d) = %5.3f <= 0\n", 
+	         k+1, d+1, ParaP->Disp_KD[ k * D + d ] ) ;
+        sts = STS_E_FILE ;
+      }
+    }
+  }
+
+  return sts ;
+
+}  /* end of SetParamArray() */
+
+
+/* ------------------------------------------------------------------- */
+static int  SetPtsNeighs
+                (
+                    const int*   NeiStarts,     /* I (NbPts + 1) */
+                    const int*   NeiIndex,      /* I 0..NbPts-1 */
+                    const float* NeiWeights,    /* I */
+                    int          NbPts,         /* I */
+                    int          *MaxNeiP,      /* O */
+                    NeighDataT   *NeighDataP    /* O and allocated */
+                ) 
+/*\
+  Same as ReadPtsNeighs(), the neighbours of point i being given by
+  NeiIndex and NeiWeights from NeiStarts[ i ] to NeiStarts[ i + 1 ].
+\*/
+/* ------------------------------------------------------------------- */
+{
+    const char* func = "SetPtsNeighs" ;
+    PtNeighsT *ptsneighsV ;
+    int       ipt ;
+    int       nmax ;
+
+    /* Allocate structure of all points' neighbours */
+    if ( ( ptsneighsV = GenAlloc( NbPts, sizeof( PtNeighsT ), 
+				  0, func, "ptsneighsV" ) )
+           == NULL )
+    {
+        fprintf( stderr, "Cannot allocate list of neighbours of %d points\n" ,
+                 NbPts ) ;
+        return STS_E_MEMORY ;
+    }
+    NeighDataP->PtsNeighsV = ptsneighsV ;
+
+    nmax = 0 ;
+    for ( ipt = 0 ; ipt < NbPts ; ipt ++ )
+    {
+        NeighT   *neighsV ;
+        int      iv ;
+        int      nv ;
+        int      nbv = NeiStarts[ ipt + 1 ] - NeiStarts[ ipt ] ;
+
+        ptsneighsV[ ipt ].NbNeigh = 0 ;
+        ptsneighsV[ ipt ].NeighsV = NULL ;
+        if ( nbv == 0 )
+            continue ;
+
+        if ( ( neighsV = GenAlloc( nbv, sizeof( NeighT ),
+				   0, func, "neighsV" ) ) == NULL )
+        {
+            fprintf( stderr, "Can't allocate %d neighb. for pt %d\n" ,
+                     nbv, ipt + 1 ) ;
+            return STS_E_MEMORY ;
+        }
+        ptsneighsV[ ipt ].NeighsV = neighsV ;
+
+        /* Only keep valid neighbours having a non-zero weight */
+        for ( iv = NeiStarts[ ipt ], nv = 0 ; iv < NeiStarts[ ipt + 1 ] ; iv ++ )
+        {
+            if ( ( 0 <= NeiIndex[ iv ] ) && ( NeiIndex[ iv ] < NbPts ) &&
+                 ( NeiWeights[ iv ] != 0.0 ) )
+            {
+                neighsV[ nv ].Index  = NeiIndex[ iv ] ;
+                neighsV[ nv ].Weight = NeiWeights[ iv ] ;
+                nv ++ ;
+            }
+        }
+
+        ptsneighsV[ ipt ].NbNeigh = nv ;
+        if ( nv > nmax )     nmax = nv ;
+    }
+
+    *MaxNeiP = nmax ;
+    return STS_OK ;
+
+}  /* end of SetPtsNeighs() */
+
 /* ------------------------------------------------------------------- */
 int GetEnum( const char* S, const char* SV[], int SizeV ) /*V1.04-b*/
 /*\
@@ -1856,6 +2266,8 @@ static void FreeAllocatedData
     {
     case TYPE_SPATIAL: 
       /* deallocate each point's neighbors */
+      if ( SpatialP->NeighData.PtsNeighsV == NULL )
+        break ;
       for ( ipt = 0; ipt < DataP->NbPts ; ipt ++ )
 	GenFree( SpatialP->NeighData.PtsNeighsV[ ipt ].NeighsV ) ;
 
@@ -36,4 +36,27 @@ extern int nem(const char* Fname,
         const char* init_file,
         const char* out_file_prefix,
         const int seed);
+
+extern int nem_arrays(const int nbPts,
+        const int nbVars,
+        const float* pointsM,
+        const int* neiStarts,
+        const int* neiIndex,
+        const float* neiWeights,
+        const int nk,
+        const char* algo,
+        const float beta,
+        const char* convergence,
+        const float convergence_th,
+        const int it_max,
+        const char* model_family,
+        const char* proportion,
+        const char* dispersion,
+        const int init_mode,
+        const float* init_param,
+        const char* log_prefix,
+        const int seed,
+        float* classifOut,
+        float* paramOut,
+        float* criteriaOut);
 #endif
@@ -1,3 +1,5 @@
+import numpy
+
 cdef extern from "nem_exe.h":
    cpdef int nem(const char* Fname,
                  const int   nk,
@@ -15,3 +17,86 @@ cdef extern from "nem_exe.h":
                  const char* init_file,
                  const char* out_file_prefix,
                  const int   seed);
+   int c_nem_arrays "nem_arrays"(const int    nbPts,
+                                 const int    nbVars,
+                                 const float* pointsM,
+                                 const int*   neiStarts,
+                                 const int*   neiIndex,
+                                 const float* neiWeights,
+                                 const int    nk,
+                                 const char*  algo,
+                                 const float  beta,
+                                 const char*  convergence,
+                                 const float  convergence_th,
+                                 const int    it_max,
+                                 const char*  model_family,
+                                 const char*  proportion,
+                                 const char*  dispersion,
+                                 const int    init_mode,
+                                 const float* init_param,
+                                 const char*  log_prefix,
+                                 const int    seed,
+                                 float*       classifOut,
+                                 float*       paramOut,
+                                 float*       criteriaOut);
+
+def nem_arrays(const float[:, ::1] points,
+               const int[::1]      nei_starts,
+               const int[::1]      nei_index,
+               const float[::1]    nei_weights,
+               const int           nk,
+               const char*         algo,
+               const float         beta,
+               const char*         convergence,
+               const float         convergence_th,
+               const int           it_max,
+               const char*         model_family,
+               const char*         proportion,
+               const char*         dispersion,
+               const int           init_mode,
+               const float[::1]    init_param,
+               const char*         log_prefix,
+               const int           seed):
+    """
+    Runs NEM on data held in memory instead of the .str/.dat/.nei/.m files.
+
+    The neighbors of the point i are nei_index[nei_starts[i]:nei_starts[i+1]] (0-based),
+    weighted by nei_weights at the same positions. init_param holds the values of the .m file
+    (without its leading 1) and is only used with the parameter file initialization.
+    Nothing is logged unless log_prefix is not empty.
+
+    :return: the NEM status (0 if it went well), the fuzzy classification (nb points x nk),
+    the proportions (nk), centers (nk x nb vars) and dispersions (nk x nb vars) of the classes,
+    and the criteria (U, D, L, M, Z and error rate)
+    :rtype: int, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+    cdef int nb_pts = points.shape[0]
+    cdef int nb_vars = points.shape[1]
+    if nei_starts.shape[0] != nb_pts + 1:
+        raise ValueError("nei_starts must have one element more than there are points")
+    if nei_index.shape[0] != nei_weights.shape[0]:
+        raise ValueError("nei_index and nei_weights must have the same length")
+
+    classif = numpy.zeros((nb_pts, nk), dtype=numpy.float32)
+    params = numpy.zeros(nk + 2 * nk * nb_vars, dtype=numpy.float32)
+    criteria = numpy.zeros(6, dtype=numpy.float32)
+    cdef float[:, ::1] classif_view = classif
+    cdef float[::1] params_view = params
+    cdef float[::1] criteria_view = criteria
+
+    status = c_nem_arrays(nb_pts, nb_vars,
+                          &points[0, 0] if nb_pts > 0 and nb_vars > 0 else NULL,
+                          &nei_starts[0],
+                          &nei_index[0] if nei_index.shape[0] > 0 else NULL,
+                          &nei_weights[0] if nei_weights.shape[0] > 0 else NULL,
+                          nk, algo, beta, convergence, convergence_th, it_max,
+                          model_family, proportion, dispersion, init_mode,
+                          &init_param[0] if init_param.shape[0] > 0 else NULL,
+                          log_prefix, seed,
+                          &classif_view[0, 0] if nb_pts > 0 and nk > 0 else NULL,
+                          &params_view[0] if params_view.shape[0] > 0 else NULL,
+                          &criteria_view[0])
+    return (status, classif, params[:nk],
+            params[nk:nk + nk * nb_vars].reshape(nk, nb_vars),
+            params[nk + nk * nb_vars:].reshape(nk, nb_vars),
+            criteria)
@@ -11,49 +11,168 @@ import os
 import argparse
 from collections import defaultdict, Counter
 import math
+import hashlib
 from shutil import copytree
 #installed libraries
 from tqdm import tqdm
+import numpy
 import plotly.offline as out_plotly
 import plotly.graph_objs as go
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import mkOutdir
-from ppanggolin.formats import checkPangenomeInfo, writePangenome, ErasePangenome
+from ppanggolin.formats import checkPangenomeInfo, writePangenome, ErasePangenome, readICLCache, writeICLCache
+from ppanggolin.nem.sharedPangenome import SharedPangenome
 
 #cython library (local)
 import nem_stats
 
-pan = None
-samples = []
+shared = None#the SharedPangenome the NEM inputs are built from, in the main process and in the subprocesses
 
-def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed = 42, init="param_file", keep_files = False, itermax=100, just_log_likelihood=False):
+ALGO           = b"nem" #fuzzy classification by mean field approximation
+MODEL          = b"bern" # multivariate Bernoulli mixture model
+PROPORTION     = b"pk" #equal proportion :  "p_"     varying proportion : "pk"
+CONVERGENCE    = b"clas"
+CONVERGENCE_TH = 0.01
+# (INIT_SORT, INIT_RANDOM, INIT_PARAM_FILE, INIT_FILE, INIT_LABEL, INIT_NB) = range(0,6)
+INIT_RANDOM, INIT_PARAM_FILE = range(1,3)
+ICL_PATIENCE   = 3 #number of partitions evaluated beyond the chosen one without changing it before the evaluation stops
+
+def init_parameters(nb_org, K):
+    """
+        Initial parameters of NEM, in the order of its .m parameter file (without the leading 1):
+        the proportions of the K-1 first partitions, then the centers and the dispersions of the K partitions.
+    """
+    props = [round(1/float(K),2) for k in range(K-1)]# 1/K give the initial proportition to each class (the last proportion is automaticaly determined by substraction in nem)
+    mu=[]
+    epsilon=[]
+    step = 0.5/(math.ceil(K/2))
+    for k in range(1,K+1):
+        if k <= K/2:
+            mu += [1]*nb_org
+            epsilon += [step*k]*nb_org
+        else:
+            mu += [0]*nb_org
+            epsilon += [step*(K-k+1)]*nb_org
+    return props + mu + epsilon
+
+def warm_parameters(all_parameters, nb_org, K):
+    """
+        Initial parameters of NEM for K partitions from the parameters estimated with fewer partitions (as returned by read_nem_results):
+        the new partitions are added before the cloud with the centers and dispersions of init_parameters at their position,
+        and the proportions of the former partitions are scaled to leave 1/K to each new one.
+    """
+    former = [all_parameters["persistent"]] + [ all_parameters["shell_"+str(k)] for k in range(1, len(all_parameters)-1) ] + [all_parameters["cloud"]]
+    default = init_parameters(nb_org, K)
+    props = [1/float(K)] * K
+    mu = numpy.array(default[K-1:K-1+K*nb_org]).reshape(K, nb_org)
+    epsilon = numpy.array(default[K-1+K*nb_org:]).reshape(K, nb_org)
+    for k, (mu_k, epsilon_k, prop_k) in enumerate(former):
+        pos = k if k < len(former)-1 else K-1#the cloud stays last
+        props[pos] = prop_k * len(former)/float(K)
+        mu[pos] = mu_k
+        epsilon[pos] = epsilon_k
+    return props[:-1] + mu.ravel().tolist() + epsilon.ravel().tolist()
+
+def former_partitions(pangenome, K):
+    """
+        Index, among the K partitions of NEM, of the partition the families of the pangenome already have, in the order of the shared pangenome.
+        Families without partition or in an undefined one ("S_", "U", or "S" which does not tell which shell when K > 3) are at -1.
+    """
+    index = {"P" : 0, "C" : K-1}
+    for k in range(1, K-1):
+        index["S"+str(k)] = k
+    if K == 3:
+        index["S"] = 1#partitions by chunks only keep the first letter
+    return numpy.array([ index.get(fam.partition, -1) for fam in pangenome.getFamilyIndex() ], dtype = numpy.int64)
+
+def former_parameters(organisms, former, K):
+    """
+        Initial parameters of NEM for the given organisms from the former partitions of the families (init "init_from_old"):
+        the center of each partition is the presence or absence of the majority of its families in each organism, its dispersion the proportion of the others,
+        and its proportion the one of its families among those present in the organisms. Partitions without any family keep the parameters of init_parameters.
+
+        :param organisms: indexes of the organisms
+        :param former: former partition of each family, as returned by former_partitions
+        :param K: number of partitions
+    """
+    nb_org = len(organisms)
+    matrix = shared.presence(organisms)
+    present = numpy.diff(matrix.indptr) > 0
+    default = init_parameters(nb_org, K)
+    mu = numpy.array(default[K-1:K-1+K*nb_org], dtype = float).reshape(K, nb_org)
+    epsilon = numpy.array(default[K-1+K*nb_org:], dtype = float).reshape(K, nb_org)
+    counts = numpy.zeros(K)
+    for k in range(K):
+        rows = numpy.flatnonzero(present & (former == k))
+        if len(rows) > 0:
+            freq = numpy.asarray(matrix[rows].mean(axis = 0)).ravel()
+            mu[k] = freq >= 0.5
+            epsilon[k] = numpy.clip(numpy.minimum(freq, 1 - freq), 0.01, 0.49)
+            counts[k] = len(rows)
+    missing = counts == 0
+    props = numpy.where(missing, 1/float(K), counts/max(counts.sum(), 1) * (1 - missing.sum()/float(K)))
+    return props[:-1].tolist() + mu.ravel().tolist() + epsilon.ravel().tolist()
+
+def read_nem_results(index_fam, classif, proportions, centers, dispersions, log_likelihood, K, just_log_likelihood=False):
+    """
+        Assigns the families to the partitions from their posterior probabilities computed by NEM.
+
+        :param index_fam: names of the families, in the order of the rows of classif
+        :param classif: posterior probabilities of each family (rows) to be in each of the K partitions (columns)
+        :param proportions: proportion of each partition
+        :param centers: center (presence/absence in each organism) of each partition
+        :param dispersions: dispersion (in each organism) of each partition
+        :param log_likelihood: log likelihood of the model
+        :param K: number of partitions
+        :param just_log_likelihood: only compute the log likelihood and the entropy of the model
+
+        :return: the partition of each family, the parameters of each partition and the log likelihood, or the number of partitions, the log likelihood, the entropy and the parameters of each partition if just_log_likelihood is True
+    """
+    partition               = {}
+    partition[0]   = "P"#PERSISTENT
+    partition[K-1] = "C"#CLOUD
+    for i in range(1,K-1):
+        partition[i]="S"+str(i)
+
+    all_parameters  = {}
+    for k in range(K):
+        mu_k = [ bool(mu_kj) for mu_kj in centers[k].tolist() ]
+        epsilon_k = dispersions[k].tolist()
+        if k == 0:
+            all_parameters["persistent"]=(mu_k,epsilon_k,proportions[k])
+        elif k == K-1:
+            all_parameters["cloud"]=(mu_k,epsilon_k,proportions[k])
+        else:
+            all_parameters["shell_"+str(k)]=(mu_k,epsilon_k,proportions[k])
+
+    if just_log_likelihood:
+        entropy = float(numpy.sum(classif * numpy.log(numpy.where(classif > 0, classif, 1))))
+        return (tuple([K,log_likelihood,entropy,all_parameters]))
+
+    partitions_list = ["U"] * len(index_fam)
+    max_prob = classif.max(axis=1)
+    nb_max = (classif == max_prob[:, None]).sum(axis=1)
+    for i, k in enumerate(classif.argmax(axis=1).tolist()):
+        if nb_max[i] > 1 or max_prob[i] < 0.5:
+            partitions_list[i]="S_"#SHELL in case of doubt gene families is attributed to shell
+        else:
+            partitions_list[i]=partition[k]
+    return((dict(zip(index_fam, partitions_list)),all_parameters,log_likelihood))
+
+def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed = 42, init="param_file", keep_files = False, itermax=100, just_log_likelihood=False, init_param=None):
+    """
+        Runs NEM on the input files written by write_nem_input_files in nem_dir_path, and reads its results from its output files.
+        run_nem does the same without any file, this is kept to be able to look at the NEM files.
+        init_param are the initial parameters of NEM (see init_parameters, used by default) if init is "param_file" or "init_from_old".
+    """
     logging.getLogger().debug("run_partitioning...")
-    if init=="param_file":
+    if init in ["param_file","init_from_old"]:
         with open(nem_dir_path+"/nem_file_init_"+str(K)+".m", "w") as m_file:
             m_file.write("1 ")# 1 to initialize parameter,
-            m_file.write(" ".join([str(round(1/float(K),2)) for k in range(K-1)])+" ")# 1/K give the initial proportition to each class (the last proportion is automaticaly determined by substraction in nem)
-            mu=[]
-            epsilon=[]
-            step = 0.5/(math.ceil(K/2))
-            for k in range(1,K+1):
-                if k <= K/2:
-                    mu += ["1"]*nb_org
-                    epsilon += [str(step*k)]*nb_org
-                else:
-                    mu += ["0"]*nb_org
-                    epsilon += [str(step*(K-k+1))]*nb_org
-
-            m_file.write(" ".join(mu)+" "+" ".join(epsilon))
-
-    ALGO           = b"nem" #fuzzy classification by mean field approximation
-    MODEL          = b"bern" # multivariate Bernoulli mixture model
-    PROPORTION     = b"pk" #equal proportion :  "p_"     varying proportion : "pk"
+            m_file.write(" ".join([ str(value) for value in (init_param or init_parameters(nb_org, K)) ]))
+
     VARIANCE_MODEL = b"skd" if free_dispersion else b"sk_"#one variance per partition and organism : "sdk"      one variance per partition, same in all organisms : "sd_"   one variance per organism, same in all partion : "s_d"    same variance in organisms and partitions : "s__"
-    CONVERGENCE    = b"clas"
-    CONVERGENCE_TH = 0.01
-    # (INIT_SORT, INIT_RANDOM, INIT_PARAM_FILE, INIT_FILE, INIT_LABEL, INIT_NB) = range(0,6)
-    INIT_RANDOM, INIT_PARAM_FILE = range(1,3)
     logging.getLogger().debug("Running NEM...")
     logging.getLogger().debug([nem_dir_path.encode('ascii')+b"/nem_file",
         K,
@@ -100,62 +219,24 @@ def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed =
         logging.getLogger().debug("No NEM output file found: "+ nem_dir_path+"/nem_file_"+str(K)+".uf")
         no_nem = True
     index_fam = []
-    all_parameters = {}
 
     with open(nem_dir_path+"/nem_file.index","r") as index_nem_file:
         for line in index_nem_file:
             index_fam.append(line.split("\t")[1].strip())
 
-    partitions_list = ["U"] * len(index_fam)
-    all_parameters  = {}
-    log_likelihood = None
-    entropy         = None
     try:
         with open(nem_dir_path+"/nem_file_"+str(K)+".uf","r") as partitions_nem_file, open(nem_dir_path+"/nem_file_"+str(K)+".mf","r") as parameters_nem_file:
             parameters      = parameters_nem_file.readlines()
             log_likelihood = float(parameters[2].split()[3])
-
-            sum_mu_k       = []
-            sum_epsilon_k  = []
-
-            for k, line in enumerate(parameters[-K:]):
-                vector = line.split()
-                mu_k = [bool(float(mu_kj)) for mu_kj in vector[0:nb_org]]
-                epsilon_k = [float(epsilon_kj) for epsilon_kj in vector[nb_org+1:]]
-                proportion = float(vector[nb_org])
-                sum_mu_k.append(sum(mu_k))
-                sum_epsilon_k.append(sum(epsilon_k))
-                if k == 0:
-                    all_parameters["persistent"]=(mu_k,epsilon_k,proportion)
-                elif k == K-1:
-                    all_parameters["cloud"]=(mu_k,epsilon_k,proportion)
-                else:
-                    all_parameters["shell_"+str(k)]=(mu_k,epsilon_k,proportion)
-
-            partition               = {}
-            partition[0]   = "P"#PERSISTENT
-            partition[K-1] = "C"#CLOUD
-            for i in range(1,K-1):
-                partition[i]="S"+str(i)
-            entropy = 0
-
-            for i, line in enumerate(partitions_nem_file):
-                elements = [float(el) for el in line.split()]
-                if just_log_likelihood:
-                    entropy +=sum([math.log(float(el))*float(el) if float(el)>0 else 0 for el in elements])
-                else:
-                    max_prob = max([float(el) for el in elements])
-                    positions_max_prob = [pos for pos, prob in enumerate(elements) if prob == max_prob]
-                    if (len(positions_max_prob)>1 or max_prob<0.5):
-                        partitions_list[i]="S_"#SHELL in case of doubt gene families is attributed to shell
-                    else:
-                        partitions_list[i]=partition[positions_max_prob.pop()]
+            params = numpy.array([ line.split() for line in parameters[-K:] ], dtype=float)
+            classif = numpy.array([ line.split() for line in partitions_nem_file ], dtype=float).reshape(-1, K)
+        results = read_nem_results(index_fam, classif, params[:, nb_org].tolist(), params[:, :nb_org], params[:, nb_org+1:], log_likelihood, K, just_log_likelihood)
     except IOError:
         logging.getLogger().debug("partitioning did not work (the number of organisms used is probably too low), see logs here to obtain more details "+nem_dir_path+"/nem_file_"+str(K)+".log")
         return  [{},None,None]#return empty objects.
     except ValueError:
-        ## return the default partitions_list which correspond to undefined
-        pass
+        ## return the default partitions which correspond to undefined
+        results = (K, None, None, None) if just_log_likelihood else (dict.fromkeys(index_fam, "U"), {}, None)
 
     if not keep_files and no_nem is False:
         os.remove(nem_dir_path+"/nem_file_"+str(K)+".uf")
@@ -168,32 +249,102 @@ def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed =
         os.remove(nem_dir_path+"/nem_file.nei")
         os.remove(nem_dir_path+"/nem_file.str")
 
-    if just_log_likelihood:
-        return (tuple([K,log_likelihood,entropy]))
-    else:
-        return((dict(zip(index_fam, partitions_list)),all_parameters,log_likelihood))
+    return results
+
+def run_nem(nem_input, nb_org, beta, free_dispersion, K = 3, seed = 42, init="param_file", itermax=100, just_log_likelihood=False, init_param=None):
+    """
+        Runs NEM on the input built by nem_input, without writing any file.
+
+        :param nem_input: the NEM input of the partitioned organisms, as returned by nem_input
+        :param nb_org: number of partitioned organisms
+        :param beta: strength of the smoothing using the graph topology
+        :param free_dispersion: whether the dispersion of each partition is free in each organism
+        :param K: number of partitions
+        :param seed: seed of NEM
+        :param init: how NEM is initialized ("param_file" or "init_from_old" to start from init_param, or random)
+        :param itermax: maximal number of iterations of NEM
+        :param just_log_likelihood: only compute the log likelihood and the entropy of the model
+        :param init_param: initial parameters of NEM if init is "param_file" or "init_from_old" (see init_parameters, used by default)
+
+        :return: same as read_nem_results, or [{},None,None] if NEM did not work
+    """
+    index_fam, points, nei_starts, nei_index, nei_weights, _ = nem_input
+    VARIANCE_MODEL = b"skd" if free_dispersion else b"sk_"
+    logging.getLogger().debug("Running NEM...")
+    status, classif, proportions, centers, dispersions, criteria = nem_stats.nem_arrays(
+                points          = points,
+                nei_starts      = nei_starts,
+                nei_index       = nei_index,
+                nei_weights     = nei_weights,
+                nk              = K,
+                algo            = ALGO,
+                beta            = beta,
+                convergence     = CONVERGENCE,
+                convergence_th  = CONVERGENCE_TH,
+                it_max          = itermax,
+                model_family    = MODEL,
+                proportion      = PROPORTION,
+                dispersion      = VARIANCE_MODEL,
+                init_mode       = INIT_PARAM_FILE if init in ["param_file","init_from_old"] else INIT_RANDOM,
+                init_param      = numpy.array((init_param or init_parameters(nb_org, K)) if init in ["param_file","init_from_old"] else [], dtype=numpy.float32),
+                log_prefix      = b"",
+                seed            = seed)
+    logging.getLogger().debug("After running NEM...")
+    if status != 0:
+        logging.getLogger().debug(f"partitioning did not work (the number of organisms used is probably too low), NEM status is {status}")
+        return  [{},None,None]#return empty objects.
+
+    # the posterior probabilities are rounded the same way NEM writes them in its files,
+    # as families which are equally likely in several partitions at this precision are put in the shell.
+    classif = numpy.round(classif.astype(float), 3)
+    # the 'log likelihood' that is used is the markovian pseudo likelihood (M) of the criteria (U, D, L, M, Z and error rate), as it has always been.
+    return read_nem_results(index_fam, classif, proportions.tolist(), centers, dispersions.astype(float), float(criteria[3]), K, just_log_likelihood)
+
+def init_shared(spec):
+    """ initializer of the subprocesses, which attach to the SharedPangenome of the main process """
+    global shared
+    shared = SharedPangenome(spec)
 
 def nemSingle(args):
     return run_partitioning(*args)
 
-def partition_nem(index, tmpdir, beta, sm_degree, free_dispersion, K, seed, init, keep_tmp_files):
-    currtmpdir = tmpdir + "/" +str(index)#unique directory name
-    samp = samples[index]#org_samples accessible because it is a global variable.
-    edges_weight, nb_fam = write_nem_input_files(tmpdir=currtmpdir, organisms=samp, sm_degree = sm_degree)
-    return run_partitioning( currtmpdir, len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files = keep_tmp_files)
+def nemSingleInput(args):
+    organisms, sm_degree, *args = args
+    return run_nem(nem_input(organisms, sm_degree), *args)
+
+def partition_nem(index, samp, tmpdir, beta, sm_degree, free_dispersion, K, seed, init, keep_tmp_files, init_param = None):
+    if keep_tmp_files:
+        currtmpdir = tmpdir + "/" +str(index)#unique directory name
+        edges_weight, nb_fam = write_nem_input_files(tmpdir=currtmpdir, organisms=samp, sm_degree = sm_degree)
+        return run_partitioning( currtmpdir, len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files = keep_tmp_files, init_param = init_param)
+    samp_input = nem_input(samp, sm_degree)
+    return run_nem( samp_input, len(samp), beta * (len(samp_input[0])/samp_input[-1]), free_dispersion, K = K, seed = seed, init = init, init_param = init_param)
 
 def nemSamples(pack):
     #run partitionning
     return partition_nem(*pack)
 
+def nem_input(organisms, sm_degree):
+    """
+        Builds the input of NEM for the given organisms from the shared pangenome.
+
+        :param organisms: indexes of the organisms to partition
+        :param sm_degree: maximal degree of the families whose neighbors are used for the smoothing
+
+        :return: the names of the families present in the organisms, and the rest of :func:`ppanggolin.nem.sharedPangenome.SharedPangenome.nemInput`
+        :rtype: list, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, float
+    """
+    rows, points, nei_starts, nei_index, nei_weights, total_edges_weight = shared.nemInput(organisms, sm_degree)
+    return shared.familyNames(rows), points, nei_starts, nei_index, nei_weights, total_edges_weight
+
 def write_nem_input_files( tmpdir, organisms, sm_degree):
 
     mkOutdir(tmpdir, force = False)
-    total_edges_weight = 0
+    organisms = list(organisms)
+    index_fam, points, nei_starts, nei_index, nei_weights, edges_weight = nem_input(organisms, sm_degree)
 
     with open(tmpdir+"/column_org_file", "w") as org_file:
-        org_file.write(" ".join([ f'"{org.name}"' for org in organisms]) + "\n")
-
+        org_file.write(" ".join([ f'"{name}"' for name in shared.organismNames(organisms)]) + "\n")
 
     logging.getLogger().debug("Writing nem_file.str nem_file.index nem_file.nei and nem_file.dat files")
     with open(tmpdir+"/nem_file.str", "w") as str_file,\
@@ -202,74 +353,46 @@ def write_nem_input_files( tmpdir, organisms, sm_degree):
         open(tmpdir+"/nem_file.dat", "w") as dat_file:
 
         nei_file.write("1\n")
-        index_fam = {}
-
-        index_org = {}
-        default_dat = []
-        for index, org in enumerate(organisms):
-            default_dat.append('0')
-            index_org[org] = index
-        for fam in pan.geneFamilies:
-            #could use bitarrays if this part is limiting?
-            if not organisms.isdisjoint(fam.organisms):
-                currDat = list(default_dat)
-                curr_orgs = fam.organisms & organisms
-                for org in curr_orgs:
-                    currDat[index_org[org]] = "1"
-                dat_file.write("\t".join(currDat) + "\n")
-                index_fam[fam] = len(index_fam) +1
-                index_file.write(f"{len(index_fam)}\t{fam.name}\n")
-
-        for fam in index_fam.keys():
-            row_fam = []
-            row_dist_score = []
-            neighbor_number = 0
-            sum_dist_score = 0
-            for edge in fam.edges:#iter on the family's edges.
-                coverage = sum([ len(gene_list) for org, gene_list in edge.organisms.items() if org in organisms ])
-                if coverage == 0:
-                    continue#nothing interesting to write, this edge does not exist with this subset of organisms.
-                distance_score = coverage / len(organisms)
-                sum_dist_score += distance_score
-                row_fam.append(str(index_fam[ edge.target if fam == edge.source else edge.source]))
-                row_dist_score.append(str(round(distance_score, 4)))
-                neighbor_number+=1
-            if neighbor_number > 0 and float(neighbor_number) < sm_degree:
-                total_edges_weight += sum_dist_score
-                nei_file.write('\t'.join([str(item) for sublist in [[index_fam[fam]],[neighbor_number],row_fam,row_dist_score] for item in sublist])+"\n")
-            else:
-                nei_file.write(str(index_fam[fam]) + "\t0\n")
+        for i, name in enumerate(index_fam):
+            dat_file.write("\t".join([ str(int(value)) for value in points[i] ]) + "\n")
+            index_file.write(f"{i+1}\t{name}\n")
+            start, stop = nei_starts[i], nei_starts[i+1]
+            nei_file.write("\t".join([str(i+1), str(stop - start)] + [ str(j+1) for j in nei_index[start:stop].tolist() ] +
+                                     [ str(round(weight, 4)) for weight in nei_weights[start:stop].tolist() ]) + "\n")
 
         str_file.write("S\t"+str(len(index_fam))+"\t"+str(len(organisms))+"\n")
-    return total_edges_weight/2, len(index_fam)
+    return edges_weight, len(index_fam)
+
+def select_K(all_ICLs, ICL_margin):
+    """
+        Returns the lowest number of partitions whose ICL is within ICL_margin of the maximal ICL (as ICL reaches a plateau), and the number of partitions with the maximal ICL.
+    """
+    max_icl_K  = max(all_ICLs, key=all_ICLs.get)
+    delta_ICL  = (all_ICLs[max_icl_K]-min(all_ICLs.values()))*ICL_margin
+    best_K = min({k for k, icl in all_ICLs.items() if icl>=all_ICLs[max_icl_K]-delta_ICL and k <= max_icl_K})
+    return best_K, max_icl_K
 
-def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir, show_bar=True):
+def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir, show_bar=True, keep_tmp_files=False, K_seeds=1, pangenomeFile=None):
+    """
+        Evaluates the number of partitions with the ICL of the models of NEM computed for an increasing number of partitions.
+        For each of them, the best of several models computed in parallel is kept: one from the default initial parameters, one initialized from the best model
+        of the previous number of partitions, and K_seeds - 1 randomly initialized ones. The evaluation stops once ICL has reached a plateau,
+        ICL_PATIENCE numbers of partitions after the chosen one.
+        The models that do not depend on the previous number of partitions (the default and random ones) are computed ahead on the cpus left idle by the current one,
+        so that all cpus are used while each number of partitions is still initialized from the best model of the previous one: the models, and the number of partitions
+        chosen, only depend on the seed and K_seeds, and not on the number of cpus. The models computed ahead beyond the plateau are discarded.
+        Organisms are given by their index in the shared pangenome. If pangenomeFile is given, the ICL computed on the same sample in former evaluations are reused,
+        and the new ones are saved in it.
+    """
     Newtmpdir = tmpdir + "/eval_partitions"
     ChosenK = 3
     if len(organisms) > chunk_size:
-        select_organisms = set(random.sample(set(organisms), chunk_size))
+        select_organisms = random.Random(seed).sample(list(organisms), chunk_size)#the same sample for a given seed, so that its evaluations can be reused
     else:
-        select_organisms = set(organisms)
-
-    _, nb_fam = write_nem_input_files( Newtmpdir, select_organisms, sm_degree)
-    max_icl_K      = 0
-    argsPartitionning = []
-    for k in range(Krange[0]-1, Krange[1]+1):
-        argsPartitionning.append((Newtmpdir, len(select_organisms), 0, free_dispersion, k, seed, "param_file", True, 10, True))#those arguments follow the order of the arguments of run_partitionning
-    allLogLikelihood = []
-
-    if cpu > 1:
-        bar = tqdm(range(len(argsPartitionning)), unit = "Number of number of partitions", disable = not show_bar)
-        with Pool(processes = cpu) as p:
-            for result in p.imap_unordered(nemSingle, argsPartitionning):
-                allLogLikelihood.append(result)
-                bar.update()
-            p.close()
-            p.join()
-        bar.close()
-    else:#for the case where it is called in a daemonic subprocess with a single cpu
-        for arguments in argsPartitionning:
-            allLogLikelihood.append(nemSingle(arguments))
+        select_organisms = list(organisms)
+    nb_org = len(select_organisms)
+    nb_fam = numpy.count_nonzero(numpy.diff(shared.presence(select_organisms).indptr))
+    Ks = range(Krange[0]-1, Krange[1]+1)
 
     def calculate_BIC(log_likelihood,nb_params,nb_points):
         return( log_likelihood - 0.5 *(math.log(nb_points) * nb_params))
@@ -277,17 +400,76 @@ def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Kr
     all_BICs = defaultdict(float)
     all_ICLs = defaultdict(float)
     all_LLs  = defaultdict(float)
-    for K_candidate, log_likelihood, entropy in allLogLikelihood:
+    def add_model(K, log_likelihood, entropy):
         if log_likelihood is not None:
-            all_BICs[K_candidate] = calculate_BIC(log_likelihood,K_candidate * (len(select_organisms) + 1 + (len(select_organisms) if free_dispersion else 1)),nb_fam)
-            all_ICLs[K_candidate] = all_BICs[K_candidate] - entropy
-            all_LLs[K_candidate]  = log_likelihood
+            all_BICs[K] = calculate_BIC(log_likelihood,K * (nb_org + 1 + (nb_org if free_dispersion else 1)),nb_fam)
+            all_ICLs[K] = all_BICs[K] - entropy
+            all_LLs[K]  = log_likelihood
+
+    def plateau(K):
+        return len(all_ICLs) > 3 and K - select_K(all_ICLs, ICL_margin)[0] >= ICL_PATIENCE
+
+    #the sample and the parameters of the evaluation that change its models
+    sample = hashlib.md5("\t".join(sorted(shared.organismNames(select_organisms)) + [str(Krange[0]), str(free_dispersion), str(seed), str(K_seeds)]).encode()).hexdigest()
+    cache = readICLCache(pangenomeFile, sample) if pangenomeFile is not None else {}
+    for K in Ks:
+        if K not in cache:
+            break
+        add_model(K, *cache[K])
+        if plateau(K):
+            break
+    if K in cache and (plateau(K) or K == Ks[-1]):
+        logging.getLogger().info("Reusing the models computed on the same organisms by a former evaluation of the number of partitions")
+    else:
+        all_BICs.clear()
+        all_ICLs.clear()
+        all_LLs.clear()
+        if keep_tmp_files:
+            write_nem_input_files( Newtmpdir, select_organisms, sm_degree)
+            runNem = nemSingle
+            def get_args(K, seed, init, init_param):#those arguments follow the order of the arguments of run_partitionning
+                return (Newtmpdir, nb_org, 0, free_dispersion, K, seed, init, True, 10, True, init_param)
+        else:
+            runNem = nemSingleInput
+            def get_args(K, seed, init, init_param):#the NEM input is built from the organisms, then those arguments follow the order of the arguments of run_nem
+                return (select_organisms, sm_degree, nb_org, 0, free_dispersion, K, seed, init, 10, True, init_param)
+
+        p = Pool(processes = cpu, initializer = init_shared, initargs = (shared.spec,)) if cpu > 1 else None#no pool for the case where it is called in a daemonic subprocess with a single cpu
+        def submit(args):
+            return p.map_async(runNem, args) if p is not None else list(map(runNem, args))
+        def collect(job):
+            return job.get() if p is not None else job
+        #the number of partitions whose default and random models are computed at once, one cpu being left for the model initialized from the previous number of partitions
+        ahead = max(1, (cpu - 1) // K_seeds) if p is not None else 1
+        coldJobs = {}
+        bar = tqdm(Ks, unit = "Number of partitions", disable = not show_bar)
+        warm = None
+        results = []
+        for i, K in enumerate(bar):
+            for nextK in Ks[i:i + ahead]:
+                if nextK not in coldJobs:
+                    coldJobs[nextK] = submit([ get_args(nextK, seed, "param_file", None) ] + [ get_args(nextK, seed + j, "random", None) for j in range(1, K_seeds) ])
+            warmJob = submit([ get_args(K, seed, "param_file", warm_parameters(warm, nb_org, K)) ]) if warm is not None else None
+            cold = collect(coldJobs.pop(K))
+            models = cold[:1] + (collect(warmJob) if warmJob is not None else []) + cold[1:]#the default, warm and random models, in that order
+            models = [ model for model in models if model[1] is not None ]
+            if len(models) > 0:
+                _, log_likelihood, entropy, warm = max(models, key = lambda model : model[1] - model[2])#the highest ICL, as they have the same number of parameters
+                results.append((K, log_likelihood, entropy))
+                add_model(K, log_likelihood, entropy)
+            else:
+                results.append((K, None, None))
+            if plateau(K):
+                break
+        bar.close()
+        if p is not None:
+            p.terminate()#the models computed ahead beyond the plateau are not needed
+            p.join()
+        if pangenomeFile is not None:
+            writeICLCache(pangenomeFile, sample, results)
 
-    ChosenK = 3
     if len(all_BICs)>3:
-        max_icl_K  = max(all_ICLs, key=all_ICLs.get)
-        delta_ICL  = (all_ICLs[max_icl_K]-min(all_ICLs.values()))*ICL_margin
-        best_K = min({k for k, icl in all_ICLs.items() if icl>=all_ICLs[max_icl_K]-delta_ICL and k <= max_icl_K})
+        best_K, max_icl_K = select_K(all_ICLs, ICL_margin)
         ChosenK = best_K if best_K >=3 else ChosenK
     if len(all_BICs)>0 and draw_ICL:
         traces = []
@@ -323,122 +505,137 @@ def checkPangenomeFormerPartition(pangenome,force):
     elif pangenome.status["partitionned"] == "inFile" and force == True:
         ErasePangenome(pangenome, partition = True)
 
-def partition(pangenome, tmpdir, outputdir = None, force = False, beta = 2.5, sm_degree = 10, free_dispersion=False, chunk_size=500, K=-1, Krange=None, ICL_margin=0.05, draw_ICL = False, cpu = 1, seed = 42, keep_tmp_files = False, show_bar=True):
+def partition(pangenome, tmpdir, outputdir = None, force = False, beta = 2.5, sm_degree = 10, free_dispersion=False, chunk_size=500, K=-1, Krange=None, ICL_margin=0.05, draw_ICL = False, cpu = 1, seed = 42, keep_tmp_files = False, show_bar=True, K_seeds=1, init="param_file"):
+    """
+        Partitions the gene families of the pangenome with NEM.
+        init is "param_file" to start NEM from default parameters, or "init_from_old" to start it from the partitions the families already have (see former_parameters),
+        which is what is done when genomes are added to a partitionned pangenome.
+    """
 
     Krange = Krange or [3,20]
-    global pan
-    global samples
-    pan = pangenome
+    global shared
 
     if draw_ICL and outputdir is None:
         raise Exception("Combination of option impossible: You asked to draw the ICL curves but did not provide an output directory!")
     checkPangenomeFormerPartition(pangenome, force)
     checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True, show_bar=show_bar)
-    organisms = set(pangenome.organisms)
+    shared = SharedPangenome.fromPangenome(pangenome)#exported once, the subprocesses attach to it
+    try:
+        organisms = list(range(pangenome.number_of_organisms()))#organisms are designated by their index in the shared pangenome
 
-    tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
-    tmpdir = tmpdirObj.name
+        tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
+        tmpdir = tmpdirObj.name
 
-    if len(organisms) <= 10:
-        logging.getLogger().warning(f"The number of selected organisms is too low ({len(organisms)} organisms used) to robustly partition the graph")
+        if len(organisms) <= 10:
+            logging.getLogger().warning(f"The number of selected organisms is too low ({len(organisms)} organisms used) to robustly partition the graph")
 
 
-    pangenome.parameters["partition"] = {}
-    pangenome.parameters["partition"]["beta"] = beta
-    pangenome.parameters["partition"]["free_dispersion"] = free_dispersion
-    pangenome.parameters["partition"]["max_node_degree_for_smoothing"] = sm_degree
-    if len(organisms) > chunk_size:
-        pangenome.parameters["partition"]["chunk_size"] = chunk_size
-    pangenome.parameters["partition"]["computed_K"] = False
+        pangenome.parameters["partition"] = {}
+        pangenome.parameters["partition"]["beta"] = beta
+        pangenome.parameters["partition"]["free_dispersion"] = free_dispersion
+        pangenome.parameters["partition"]["max_node_degree_for_smoothing"] = sm_degree
+        pangenome.parameters["partition"]["chunk_size"] = chunk_size#even when the organisms are not partitionned in chunks, so that an update does the same with more organisms
+        pangenome.parameters["partition"]["computed_K"] = False
+
+        if K < 3:
+            pangenome.parameters["partition"]["computed_K"] = True
+            logging.getLogger().info("Estimating the optimal number of partitions...")
+            K = evaluate_nb_partitions( organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir, show_bar=show_bar, keep_tmp_files=keep_tmp_files,
+                                        K_seeds=K_seeds, pangenomeFile=getattr(pangenome, "file", None))
+            logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
 
-    if K < 3:
-        pangenome.parameters["partition"]["computed_K"] = True
-        logging.getLogger().info("Estimating the optimal number of partitions...")
-        K = evaluate_nb_partitions( organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir, show_bar=show_bar)
-        logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
+        pangenome.parameters["partition"]["K"] = K
+        former = former_partitions(pangenome, K) if init == "init_from_old" else None
 
-    pangenome.parameters["partition"]["K"] = K
-    init = "param_file"
+        partitionning_results = {}
 
-    partitionning_results = {}
+        families = set()
+        cpt = 0
+        cpt_partition = {}
+        random.seed(seed)
 
-    families = set()
-    cpt = 0
-    cpt_partition = {}
-    random.seed(seed)
+        for fam in pangenome.geneFamilies:
+            families.add(fam)
+            if chunk_size < len(organisms):
+                cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
 
-    for fam in pangenome.geneFamilies:
-        families.add(fam)
+        start_partitionning = time.time()
+        logging.getLogger().info("Partitioning...")
+        pansize = len(families)
         if chunk_size < len(organisms):
-            cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
-
-    start_partitionning = time.time()
-    logging.getLogger().info("Partitioning...")
-    pansize = len(families)
-    if chunk_size < len(organisms):
-        validated = set()
-
-        def validate_family(result):
-            for node, nem_class in result[0].items():
-                cpt_partition[node][nem_class[0]]+=1
-                sum_partionning = sum(cpt_partition[node].values())
-                if (sum_partionning > len(organisms)/chunk_size and max(cpt_partition[node].values()) >= sum_partionning*0.5) or (sum_partionning > len(organisms)):
-                    if node not in validated:
-                        if max(cpt_partition[node].values()) < sum_partionning*0.5:
-                            cpt_partition[node]["U"] = len(organisms) #if despite len(select_organisms) partionning, an abosolute majority is not found then the families is set to undefined
-                        validated.add(node)
-
-        org_nb_sample = Counter()
-        for org in organisms:
-            org_nb_sample[org] = 0
-        condition = len(organisms)/chunk_size
-        while len(validated) < pansize:
-            prev = len(samples)#if we've been sampling already, samples is not empty.
-            while not all(val >= condition for val in org_nb_sample.values()):#each family must be tested at least len(select_organisms)/chunk_size times.
-                shuffled_orgs = list(organisms)#copy select_organisms
-                random.shuffle(shuffled_orgs)#shuffle the copied list
-                while len(shuffled_orgs) > chunk_size:
-                    samples.append(set(shuffled_orgs[:chunk_size]))
-                    for org in samples[-1]:
-                        org_nb_sample[org] +=1
-                    shuffled_orgs = shuffled_orgs[chunk_size:]
-            args = []
-            # tmpdir, beta, sm_degree, free_dispersion, K, seed
-            for i, _ in enumerate(samples[prev:], start=prev):
-                args.append((i, tmpdir, beta,sm_degree, free_dispersion, K, seed, init, keep_tmp_files))
-
-            logging.getLogger().info("Launching NEM")
-            with Pool(processes = cpu) as p:
-                #launch partitionnings
-                bar = tqdm(range(len(args)), unit = " samples partitionned", disable=not show_bar)
-                for result in p.imap_unordered(nemSamples, args):
-                    validate_family(result)
-                    bar.update()
-
-                bar.close()
-                condition += 1#if len(validated) < pan_size, we will want to resample more.
-                logging.getLogger().debug(f"There are {len(validated)} validated families out of {pansize} families.")
-                p.close()
-                p.join()
-        for fam, data in cpt_partition.items():
-            partitionning_results[fam]=max(data, key=data.get)
-
-        ## need to compute the median vectors of each partition ???
-        partitionning_results = [partitionning_results,[]]##introduces a 'non feature'.
-
-        logging.getLogger().info(f"Did {len(samples)} partitionning with chunks of size {chunk_size} among {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
-    else:
-        edges_weight, nb_fam = write_nem_input_files( tmpdir+"/"+str(cpt)+"/", organisms, sm_degree = sm_degree)
-        partitionning_results = run_partitioning( tmpdir+"/"+str(cpt)+"/", len(organisms), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files=keep_tmp_files)
-        if partitionning_results == [{},None,None]:
-            raise Exception("Statistical partitionning does not work on your data. This usually happens because you used very few (<15) genomes.")
-        cpt+=1
-        logging.getLogger().info(f"Partitionned {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
+            validated = set()
+
+            def validate_family(result):
+                for node, nem_class in result[0].items():
+                    cpt_partition[node][nem_class[0]]+=1
+                    sum_partionning = sum(cpt_partition[node].values())
+                    if (sum_partionning > len(organisms)/chunk_size and max(cpt_partition[node].values()) >= sum_partionning*0.5) or (sum_partionning > len(organisms)):
+                        if node not in validated:
+                            if max(cpt_partition[node].values()) < sum_partionning*0.5:
+                                cpt_partition[node]["U"] = len(organisms) #if despite len(select_organisms) partionning, an abosolute majority is not found then the families is set to undefined
+                            validated.add(node)
+
+            org_nb_sample = Counter()
+            for org in organisms:
+                org_nb_sample[org] = 0
+            condition = len(organisms)/chunk_size
+            samples = []
+            while len(validated) < pansize:
+                prev = len(samples)#if we've been sampling already, samples is not empty.
+                while not all(val >= condition for val in org_nb_sample.values()):#each family must be tested at least len(select_organisms)/chunk_size times.
+                    shuffled_orgs = list(organisms)#copy select_organisms
+                    random.shuffle(shuffled_orgs)#shuffle the copied list
+                    while len(shuffled_orgs) > chunk_size:
+                        samples.append(shuffled_orgs[:chunk_size])
+                        for org in samples[-1]:
+                            org_nb_sample[org] +=1
+                        shuffled_orgs = shuffled_orgs[chunk_size:]
+                args = []
+                # tmpdir, beta, sm_degree, free_dispersion, K, seed
+                for i, samp in enumerate(samples[prev:], start=prev):
+                    init_param = former_parameters(samp, former, K) if former is not None else None
+                    args.append((i, samp, tmpdir, beta,sm_degree, free_dispersion, K, seed, init, keep_tmp_files, init_param))
+
+                logging.getLogger().info("Launching NEM")
+                with Pool(processes = cpu, initializer = init_shared, initargs = (shared.spec,)) as p:
+                    #launch partitionnings
+                    bar = tqdm(range(len(args)), unit = " samples partitionned", disable=not show_bar)
+                    for result in p.imap_unordered(nemSamples, args):
+                        validate_family(result)
+                        bar.update()
+
+                    bar.close()
+                    condition += 1#if len(validated) < pan_size, we will want to resample more.
+                    logging.getLogger().debug(f"There are {len(validated)} validated families out of {pansize} families.")
+                    p.close()
+                    p.join()
+            for fam, data in cpt_partition.items():
+                partitionning_results[fam]=max(data, key=data.get)
+
+            ## need to compute the median vectors of each partition ???
+            partitionning_results = [partitionning_results,[]]##introduces a 'non feature'.
+
+            logging.getLogger().info(f"Did {len(samples)} partitionning with chunks of size {chunk_size} among {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
+        else:
+            init_param = former_parameters(organisms, former, K) if former is not None else None
+            if keep_tmp_files:
+                edges_weight, nb_fam = write_nem_input_files( tmpdir+"/"+str(cpt)+"/", organisms, sm_degree = sm_degree)
+                partitionning_results = run_partitioning( tmpdir+"/"+str(cpt)+"/", len(organisms), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files=keep_tmp_files, init_param = init_param)
+            else:
+                pan_input = nem_input(organisms, sm_degree)
+                partitionning_results = run_nem( pan_input, len(organisms), beta * (len(pan_input[0])/pan_input[-1]), free_dispersion, K = K, seed = seed, init = init, init_param = init_param)
+            if partitionning_results == [{},None,None]:
+                raise Exception("Statistical partitionning does not work on your data. This usually happens because you used very few (<15) genomes.")
+            cpt+=1
+            logging.getLogger().info(f"Partitionned {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
 
-    # pangenome.savePartitionParameters(K, beta, free_dispersion, sm_degree, partitionning_results[1], chunk_size)
+        # pangenome.savePartitionParameters(K, beta, free_dispersion, sm_degree, partitionning_results[1], chunk_size)
 
-    for famName, partition in partitionning_results[0].items():
-        pangenome.getGeneFamily(famName).partition = partition
+        for famName, partition in partitionning_results[0].items():
+            pangenome.getGeneFamily(famName).partition = partition
+    finally:
+        shared.unlink()#the shared memory segments would outlive the process otherwise
+        shared = None
 
     pangenome.status["partitionned"] = "Computed"
     if not keep_tmp_files:
@@ -454,7 +651,7 @@ def launch(args):
         mkOutdir(args.output, args.force)
     pangenome = Pangenome()
     pangenome.addFile(args.pangenome)
-    partition(pangenome, args.tmpdir, args.output, args.force, args.beta, args.max_degree_smoothing, args.free_dispersion, args.chunk_size, args.nb_of_partitions, args.krange, args.ICL_margin, args.draw_ICL, args.cpu, args.seed, args.keep_tmp_files, show_bar=args.show_prog_bars)
+    partition(pangenome, args.tmpdir, args.output, args.force, args.beta, args.max_degree_smoothing, args.free_dispersion, args.chunk_size, args.nb_of_partitions, args.krange, args.ICL_margin, args.draw_ICL, args.cpu, args.seed, args.keep_tmp_files, show_bar=args.show_prog_bars, K_seeds=args.K_seeds)
     writePangenome(pangenome,pangenome.file, args.force, show_bar=args.show_prog_bars)
 
 def partitionSubparser(subparser):
@@ -471,8 +668,9 @@ def partitionSubparser(subparser):
     optional.add_argument("-K","--nb_of_partitions",required=False, default=-1, type=int, help = "Number of partitions to use. Must be at least 3. If under 3, it will be detected automatically.")
     optional.add_argument("-Kmm","--krange",nargs=2,required = False, type=int, default=[3,20], help="Range of K values to test when detecting K automatically. Default between 3 and 20.")
     optional.add_argument("-im","--ICL_margin",required = False, type = float, default = 0.05, help = "K is detected automatically by maximizing ICL. However at some point the ICL reaches a plateau. Therefore we are looking for the minimal value of K without significative gain from the larger values of K measured by ICL. For that we take the lowest K that is found within a given 'margin' of the maximal ICL value. Basically, change this option only if you truly understand it, otherwise just leave it be.")
+    optional.add_argument("-Ks","--K_seeds",required = False, type = int, default = 1, help = "Number of models computed from different initializations for each number of partitions tested when detecting K automatically. The first one starts from default parameters, the others are randomly initialized (which is much slower as NEM tries many random starts). One more starts from the best model of the previous number of partitions.")
     optional.add_argument("--draw_ICL", required =False, default = False, action="store_true",help = "Use if you can to draw the ICL curve for all of the tested K values. Will not be done if K is given.")
-    optional.add_argument("--keep_tmp_files",required = False, default = False, action = "store_true",help = "Use if you want to keep the temporary NEM files")
+    optional.add_argument("--keep_tmp_files",required = False, default = False, action = "store_true",help = "Use if you want NEM to run on files and to keep them (NEM works in memory otherwise)")
     optional.add_argument("-se", "--seed", type = int, default = 42, help="seed used to generate random numbers")
 
     return parser
\ No newline at end of file
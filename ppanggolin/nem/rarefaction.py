@@ -14,7 +14,6 @@ import warnings
 
 #installed libraries
 from tqdm import tqdm
-import gmpy2
 import numpy
 from pandas import Series, read_csv
 import plotly.offline as out_plotly
@@ -25,25 +24,20 @@ import scipy.optimize as optimization
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import mkOutdir
 from ppanggolin.formats import checkPangenomeInfo
-import ppanggolin.nem.partition as ppp#import this way to use the global variable pan defined in ppanggolin.nem.partition
+import ppanggolin.nem.partition as ppp#import this way to use the global variable shared defined in ppanggolin.nem.partition
+from ppanggolin.nem.sharedPangenome import SharedPangenome
 
-samples = []
-
-def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed):
-    samp = samples[index]
-    currtmpdir = tmpdir+"/"+str(index)+"/"
+def raref_nem(index, samp, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed):
     if K < 3:
         K = ppp.evaluate_nb_partitions(samp, sm_degree, free_dispersion, chunk_size, krange, 0.05, False, 1, tmpdir + "/" + str(index) + "_eval", seed, None)
 
     if len(samp) <= chunk_size:#all good, just write stuff.
-        edges_weight, nb_fam = ppp.write_nem_input_files(tmpdir=currtmpdir,organisms= set(samp), sm_degree = sm_degree)
-        cpt_partition = ppp.run_partitioning( currtmpdir, len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file")[0]
+        samp_input = ppp.nem_input(samp, sm_degree)
+        cpt_partition = ppp.run_nem( samp_input, len(samp), beta * (len(samp_input[0])/samp_input[-1]), free_dispersion, K = K, seed = seed, init = "param_file")[0]
     else:#going to need multiple partitionnings for this sample...
 
-        families = set()
         cpt_partition = {}
         validated = set()
-        cpt=0
 
         def validate_family(result):
             for node, nem_class in result[0].items():
@@ -55,10 +49,10 @@ def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, kr
                             cpt_partition[node]["U"] = len(samp)
                         validated.add(node)
 
-        for fam in ppp.pan.geneFamilies:
-            if not samp.isdisjoint(fam.organisms):#otherwise useless to keep track of
-                families.add(fam)
-                cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
+        #only the families present in the sample are kept track of
+        families = ppp.shared.familyNames(numpy.flatnonzero(numpy.diff(ppp.shared.presence(samp).indptr)))
+        for fam in families:
+            cpt_partition[fam] = {"P":0,"S":0,"C":0,"U":0}
 
         org_nb_sample = Counter()
         for org in samp:
@@ -72,15 +66,14 @@ def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, kr
                 shuffled_orgs = list(samp)#copy select_organisms
                 random.shuffle(shuffled_orgs)#shuffle the copied list
                 while len(shuffled_orgs) > chunk_size:
-                    org_samples.append(set(shuffled_orgs[:chunk_size]))
+                    org_samples.append(shuffled_orgs[:chunk_size])
                     for org in org_samples[-1]:
                         org_nb_sample[org] +=1
                     shuffled_orgs = shuffled_orgs[chunk_size:]
             #making arguments for all samples:
             for samp in org_samples:
-                edges_weight, nb_fam = ppp.write_nem_input_files( currtmpdir+"/"+str(cpt)+"/", samp, sm_degree = sm_degree)
-                validate_family(ppp.run_partitioning( currtmpdir+"/"+str(cpt)+"/", len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file"))
-                cpt+=1
+                samp_input = ppp.nem_input(samp, sm_degree)
+                validate_family(ppp.run_nem( samp_input, len(samp), beta * (len(samp_input[0])/samp_input[-1]), free_dispersion, K = K, seed = seed, init = "param_file"))
     if len(cpt_partition) == 0:
         counts = {"persistent":"NA","shell":"NA","cloud":"NA", "undefined":"NA", "K": K}
     else:
@@ -251,90 +244,77 @@ def drawCurve(output, maxSampling, data):
 
 def makeRarefactionCurve( pangenome, output, tmpdir, beta=2.5, depth = 30, minSampling =1, maxSampling = 100, sm_degree = 10, free_dispersion=False, chunk_size = 500, K=-1, cpu = 1, seed=42, kestimate = False, krange = [3,-1], soft_core = 0.95, show_bar=True):
 
-    ppp.pan = pangenome#use the global from partition to store the pangenome, so that it is usable
-
     try:
-        krange[0] = ppp.pan.parameters["partition"]["K"] if krange[0]<0 else krange[0]
-        krange[1] = ppp.pan.parameters["partition"]["K"] if krange[1]<0 else krange[1]
+        krange[0] = pangenome.parameters["partition"]["K"] if krange[0]<0 else krange[0]
+        krange[1] = pangenome.parameters["partition"]["K"] if krange[1]<0 else krange[1]
     except KeyError:
         krange=[3,20]
     checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True, show_bar=show_bar)
-
-    tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
-    tmpdir = tmpdirObj.name
-
-    if float(len(pangenome.organisms)) < maxSampling:
-        maxSampling = len(pangenome.organisms)
-    else:
-        maxSampling = int(maxSampling)
-
-    if K < 3 and kestimate is False:#estimate K once and for all.
-        try:
-            K = ppp.pan.parameters["partition"]["K"]
-            logging.getLogger().info(f"Reuse the number of partitions {K}")
-        except KeyError:
-            logging.getLogger().info("Estimating the number of partitions...")
-            K = ppp.evaluate_nb_partitions(pangenome.organisms, sm_degree, free_dispersion, chunk_size, krange, 0.05, False, cpu, tmpdir, seed, None)
-            logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
-
-    logging.getLogger().info("Extracting samples ...")
-    AllSamples = []
-    for i in range(minSampling,maxSampling):#each point
-        for _ in range(depth):#number of samples per points
-            AllSamples.append(set(random.sample(set(pangenome.organisms), i+1)))
-    logging.getLogger().info(f"Done sampling organisms in the pangenome, there are {len(AllSamples)} samples")
-    SampNbPerPart = []
-
-    logging.getLogger().info("Computing bitarrays for each family...")
-    index_org = pangenome.computeFamilyBitarrays()
-    logging.getLogger().info(f"Done computing bitarrays. Comparing them to get exact and soft core stats for {len(AllSamples)} samples...")
-
-    bar = tqdm( range(len(AllSamples) * len(pangenome.geneFamilies)), unit = "gene family", disable=not show_bar)
-    for samp in AllSamples:
-        #make the sample's organism bitarray.
-        sampBitarray = gmpy2.xmpz(0)#pylint: disable=no-member
-        for org in samp:
-            sampBitarray[index_org[org]] = 1
-
-        part = Counter()
-        part["soft_core"] = 0
-        part["exact_core"] = 0
-        part["exact_accessory"] = 0
-        part["soft_accessory"] = 0
-        for fam in pangenome.geneFamilies:
-            nbCommonOrg = gmpy2.popcount(fam.bitarray & sampBitarray)#pylint: disable=no-member
+    ppp.shared = SharedPangenome.fromPangenome(pangenome)#use the global from partition, so that the subprocesses attach to it
+    try:
+        tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
+        tmpdir = tmpdirObj.name
+
+        if float(len(pangenome.organisms)) < maxSampling:
+            maxSampling = len(pangenome.organisms)
+        else:
+            maxSampling = int(maxSampling)
+
+        if K < 3 and kestimate is False:#estimate K once and for all.
+            try:
+                K = pangenome.parameters["partition"]["K"]
+                logging.getLogger().info(f"Reuse the number of partitions {K}")
+            except KeyError:
+                logging.getLogger().info("Estimating the number of partitions...")
+                K = ppp.evaluate_nb_partitions(range(pangenome.number_of_organisms()), sm_degree, free_dispersion, chunk_size, krange, 0.05, False, cpu, tmpdir, seed, None, pangenomeFile=getattr(pangenome, "file", None))
+                logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
+
+        logging.getLogger().info("Extracting samples ...")
+        AllSamples = []
+        for i in range(minSampling,maxSampling):#each point
+            for _ in range(depth):#number of samples per points
+                AllSamples.append(set(random.sample(set(pangenome.organisms), i+1)))
+        logging.getLogger().info(f"Done sampling organisms in the pangenome, there are {len(AllSamples)} samples")
+        SampNbPerPart = []
+
+        logging.getLogger().info("Computing the presence of each family in each organism...")
+        index_org = pangenome.getIndex()
+        presence = (pangenome.getFamilyMatrix() > 0).astype(numpy.uint32).tocsc()
+        logging.getLogger().info(f"Done computing the presence matrix. Using it to get exact and soft core stats for {len(AllSamples)} samples...")
+
+        bar = tqdm( range(len(AllSamples) * len(pangenome.geneFamilies)), unit = "gene family", disable=not show_bar)
+        for samp in AllSamples:
+            #number of organisms of the sample in which each family is present
+            nbCommonOrg = numpy.asarray(presence[:, [ index_org[org] for org in samp ]].sum(axis=1)).ravel()
+            nbCommonOrg = nbCommonOrg[nbCommonOrg != 0]#in that case the node 'does not exist'
+
+            part = Counter()
             part["nborgs"] = len(samp)
-            if nbCommonOrg != 0:#in that case the node 'does not exist'
-                if nbCommonOrg == len(samp):
-                    part["exact_core"] +=1
-                else:
-                    part["exact_accessory"] +=1
-
-                if float(nbCommonOrg) >= len(samp) * soft_core:
-                    part["soft_core"] +=1
-                else:
-                    part["soft_accessory"] +=1
-            bar.update()
-        SampNbPerPart.append(part)
-    bar.close()
-    #done with frequency of each family for each sample.
-
-    global samples
-    samples = AllSamples
-
-    args = []
-    for index, samp in enumerate(samples):
-        args.append((index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed))
-
-    with Pool(processes = cpu) as p:
-        #launch partitionnings
-        logging.getLogger().info("Partitionning all samples...")
-        bar = tqdm(range(len(args)), unit = "samples partitionned", disable=not show_bar)
-        random.shuffle(args)#shuffling the processing so that the progress bar is closer to reality.
-        for result in p.imap_unordered(launch_raref_nem, args):
-            SampNbPerPart[result[1]] = {**result[0], **SampNbPerPart[result[1]]}
-            bar.update()
-    bar.close()
+            part["exact_core"] = int(numpy.count_nonzero(nbCommonOrg == len(samp)))
+            part["exact_accessory"] = len(nbCommonOrg) - part["exact_core"]
+            part["soft_core"] = int(numpy.count_nonzero(nbCommonOrg >= len(samp) * soft_core))
+            part["soft_accessory"] = len(nbCommonOrg) - part["soft_core"]
+            bar.update(presence.shape[0])
+            SampNbPerPart.append(part)
+        bar.close()
+        #done with frequency of each family for each sample.
+
+        args = []
+        for index, samp in enumerate(AllSamples):
+            args.append((index, [ index_org[org] for org in samp ], tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed))
+
+        with Pool(processes = cpu, initializer = ppp.init_shared, initargs = (ppp.shared.spec,)) as p:
+            #launch partitionnings
+            logging.getLogger().info("Partitionning all samples...")
+            bar = tqdm(range(len(args)), unit = "samples partitionned", disable=not show_bar)
+            random.shuffle(args)#shuffling the processing so that the progress bar is closer to reality.
+            for result in p.imap_unordered(launch_raref_nem, args):
+                SampNbPerPart[result[1]] = {**result[0], **SampNbPerPart[result[1]]}
+                bar.update()
+        bar.close()
+    finally:
+        ppp.shared.unlink()#the shared memory segments would outlive the process otherwise
+        ppp.shared = None
 
     logging.getLogger().info("Done partitionning everything")
     warnings.filterwarnings("ignore")
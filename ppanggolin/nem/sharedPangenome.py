@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+try:
+    from multiprocessing import shared_memory
+except ImportError:#python < 3.8
+    shared_memory = None
+
+#installed libraries
+import numpy
+from scipy.sparse import csr_matrix
+
+
+class SharedPangenome:
+    """
+        The presence/absence matrix of the gene families in the organisms and the edges of a pangenome, stored in shared memory
+        so that the subprocesses partitioning samples of organisms build their NEM input with numpy, without the pangenome objects.
+
+        It is created in the main process with :func:`SharedPangenome.fromPangenome`, and the subprocesses attach to it
+        with `SharedPangenome(spec)`, `spec` being the one of the created object. This works whatever the start method
+        of multiprocessing is. Before python 3.8, which has no shared memory, `spec` holds the arrays themselves: the subprocesses of a pool
+        given it as initializer argument inherit them without copy when they are forked, and get a copy otherwise. Families and organisms are designated by their index in `pangenome.getFamilyIndex()`
+        and `pangenome.getIndex()`.
+
+        :param spec: the name, dtype and size of each shared array (or the array itself before python 3.8), and the number of families and organisms
+        :type spec: dict
+    """
+    _arrays = ("famIndptr", "famIndices", "famNames", "orgNames", "edgeSource", "edgeTarget", "edgeIndptr", "edgeIndices", "edgeCounts")
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.nbFams, self.nbOrgs = spec["shape"]
+        self._shms = []
+        for array in self._arrays:
+            if isinstance(spec[array], numpy.ndarray):#no shared memory
+                setattr(self, array, spec[array])
+                continue
+            name, dtype, size = spec[array]
+            shm = shared_memory.SharedMemory(name = name)
+            self._shms.append(shm)
+            setattr(self, array, numpy.ndarray(size, dtype = dtype, buffer = shm.buf))
+
+    @classmethod
+    def fromPangenome(cls, pangenome):
+        """
+            Exports the family matrix, the families linked by each edge and the edge matrix of the pangenome into shared memory.
+
+            :param pangenome: the pangenome to export
+            :type pangenome: :class:`ppanggolin.pangenome.Pangenome`
+
+            :return: the shared pangenome, which has to be unlinked once the subprocesses are done with it
+            :rtype: :class:`ppanggolin.nem.sharedPangenome.SharedPangenome`
+        """
+        matrix = pangenome.getFamilyMatrix()
+        edgeMatrix = pangenome.getEdgeMatrix()
+        famIndex = pangenome.getFamilyIndex()
+        arrays = {"famIndptr" : matrix.indptr, "famIndices" : matrix.indices,
+                  "famNames" : numpy.array([ fam.name.encode() for fam in famIndex ], dtype = bytes),
+                  "orgNames" : numpy.array([ org.name.encode() for org in pangenome.getIndex() ], dtype = bytes),
+                  "edgeIndptr" : edgeMatrix.indptr, "edgeIndices" : edgeMatrix.indices, "edgeCounts" : edgeMatrix.data}
+        edges = pangenome.edges#in the order of the rows of the edge matrix
+        arrays["edgeSource"] = numpy.array([ famIndex[edge.source] for edge in edges ], dtype = numpy.int64)
+        arrays["edgeTarget"] = numpy.array([ famIndex[edge.target] for edge in edges ], dtype = numpy.int64)
+
+        spec = {"shape" : matrix.shape}
+        if shared_memory is None:
+            spec.update(arrays)
+            return cls(spec)
+        shms = []
+        for array in cls._arrays:
+            values = arrays[array]
+            shm = shared_memory.SharedMemory(create = True, size = max(values.nbytes, 1))
+            numpy.ndarray(values.shape, dtype = values.dtype, buffer = shm.buf)[:] = values
+            spec[array] = (shm.name, values.dtype.str, values.shape[0])
+            shms.append(shm)
+        shared = cls(spec)
+        for shm in shms:#the arrays are mapped again by the constructor
+            shm.close()
+        return shared
+
+    def close(self):
+        """ Closes the access of this process to the shared arrays """
+        for array in self._arrays:
+            setattr(self, array, None)
+        for shm in self._shms:
+            shm.close()
+        self._shms = []
+
+    def unlink(self):
+        """ Closes and frees the shared arrays. To be called once, by the process which exported them """
+        for shm in self._shms:
+            shm.unlink()
+        self.close()
+
+    def familyNames(self, rows):
+        """
+            :param rows: indexes of families
+            :type rows: iterable[int]
+
+            :return: the names of the families
+            :rtype: list[str]
+        """
+        return [ name.decode() for name in self.famNames[numpy.asarray(rows, dtype = numpy.int64)].tolist() ]
+
+    def organismNames(self, orgs):
+        """
+            :param orgs: indexes of organisms
+            :type orgs: iterable[int]
+
+            :return: the names of the organisms
+            :rtype: list[str]
+        """
+        return [ name.decode() for name in self.orgNames[numpy.asarray(orgs, dtype = numpy.int64)].tolist() ]
+
+    def presence(self, orgs):
+        """
+            :param orgs: indexes of organisms
+            :type orgs: iterable[int]
+
+            :return: the presence/absence of all the families (rows) in the given organisms (columns, in the given order)
+            :rtype: :class:`scipy.sparse.csr_matrix`
+        """
+        return csr_matrix((numpy.ones(len(self.famIndices), dtype = numpy.float32), self.famIndices, self.famIndptr),
+                          shape = (self.nbFams, self.nbOrgs))[:, numpy.asarray(orgs, dtype = numpy.int64)]
+
+    def nemInput(self, orgs, sm_degree):
+        """
+            Builds the input of NEM for a sample of organisms: the presence/absence of the families present in them,
+            and the neighbors of each of these families, weighted by the proportion of organisms in which they are neighbors.
+            Families with as many neighbors as sm_degree or more are not smoothed, and have no neighbor.
+
+            :param orgs: indexes of the organisms of the sample, in the order of the columns of the presence/absence matrix
+            :type orgs: iterable[int]
+            :param sm_degree: maximal degree of the families whose neighbors are used for the smoothing
+            :type sm_degree: float
+
+            :return: the indexes of the families present in the organisms, their presence/absence in each organism (float32, families x organisms),
+            their neighbors (those of the family i being nei_index[nei_starts[i]:nei_starts[i+1]] with the weights nei_weights[nei_starts[i]:nei_starts[i+1]])
+            and the total weight of the edges
+            :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, float
+        """
+        orgs = numpy.asarray(list(orgs), dtype = numpy.int64)
+        nbOrg = len(orgs)
+        matrix = self.presence(orgs)
+        rows = numpy.flatnonzero(numpy.diff(matrix.indptr))
+        points = numpy.ascontiguousarray(matrix[rows].toarray(), dtype = numpy.float32)
+        famToPoint = numpy.full(self.nbFams, -1, dtype = numpy.int64)
+        famToPoint[rows] = numpy.arange(len(rows))
+
+        #number of pairs of genes of each edge in the organisms of the sample
+        inSample = numpy.zeros(self.nbOrgs, dtype = numpy.float64)
+        inSample[orgs] = 1
+        coverage = csr_matrix((self.edgeCounts, self.edgeIndices, self.edgeIndptr), shape = (len(self.edgeSource), self.nbOrgs)) @ inSample
+        edges = numpy.flatnonzero(coverage)
+        score = coverage[edges] / nbOrg
+        source = famToPoint[self.edgeSource[edges]]
+        target = famToPoint[self.edgeTarget[edges]]
+
+        #each edge is a neighbor of both of its families (once for a family linked to itself), in the order of the edges of each family
+        loop = source == target
+        nodes = numpy.concatenate([source, target[~loop]])
+        neighbors = numpy.concatenate([target, source[~loop]])
+        weights = numpy.concatenate([score, score[~loop]])
+        order = numpy.lexsort((numpy.concatenate([edges, edges[~loop]]), nodes))
+        nodes, neighbors, weights = nodes[order], neighbors[order], weights[order]
+
+        degree = numpy.bincount(nodes, minlength = len(rows))
+        smoothed = (degree > 0) & (degree < sm_degree)
+        kept = smoothed[nodes]
+        nei_starts = numpy.zeros(len(rows) + 1, dtype = numpy.int32)
+        numpy.cumsum(numpy.where(smoothed, degree, 0), out = nei_starts[1:])
+        total_edges_weight = float(weights[kept].sum())
+        return (rows, points, nei_starts, neighbors[kept].astype(numpy.int32),
+                numpy.round(weights[kept], 4).astype(numpy.float32), total_edges_weight / 2)
@@ -8,6 +8,8 @@ import logging
 
 #installed libraries
 import gmpy2
+import numpy
+from scipy.sparse import csr_matrix
 
 #local libraries
 from ppanggolin.genome import Organism, Gene
@@ -264,6 +266,80 @@ class Pangenome:
                 self._orgIndex[org] = index
         return self._orgIndex
 
+    def getFamilyIndex(self):#will not make a new index if it exists already
+        """Creates an index for gene families (each gene family is assigned an Integer, which is its row in :meth:`ppanggolin.pangenome.Pangenome.getFamilyMatrix`).
+
+        :return: A dictionnary with :class:`ppanggolin.geneFamily.GeneFamily` as key and `int` as value.
+        :rtype: dict[:class:`ppanggolin.geneFamily.GeneFamily`, int]
+        """
+        if not hasattr(self, "_famIndex"):#then the index does not exist yet
+            self._famIndex = { fam : index for index, fam in enumerate(self.geneFamilies) }
+        return self._famIndex
+
+    def getFamilyMatrix(self):
+        """Creates, if it does not exist yet, a sparse matrix with the number of genes of each gene family (rows, indexed by :meth:`ppanggolin.pangenome.Pangenome.getFamilyIndex`) in each organism (columns, indexed by :meth:`ppanggolin.pangenome.Pangenome.getIndex`).
+        The assumption behind this is that the gene families have been filled and no more gene will be added.
+
+        :return: the gene family x organism count matrix
+        :rtype: :class:`scipy.sparse.csr_matrix`
+        """
+        if not hasattr(self, "_famMatrix"):#then the matrix does not exist yet
+            orgIndex = self.getIndex()
+            famIndex = self.getFamilyIndex()
+            rows, cols, counts = [], [], []
+            for fam, row in famIndex.items():
+                for org, genes in fam.getOrgDict().items():
+                    rows.append(row)
+                    cols.append(orgIndex[org])
+                    counts.append(len(genes))
+            self._famMatrix = csr_matrix((numpy.array(counts, dtype = numpy.uint32), (numpy.array(rows, dtype = numpy.int64), numpy.array(cols, dtype = numpy.int64))),
+                                         shape = (len(famIndex), len(orgIndex)))
+            self._famMatrix.sort_indices()
+        return self._famMatrix
+
+    def getFamilyCounts(self, fam):
+        """Returns the organisms in which the given gene family is present, and its number of genes in each of them, from :meth:`ppanggolin.pangenome.Pangenome.getFamilyMatrix`.
+
+        :param fam: The gene family
+        :type fam: :class:`ppanggolin.geneFamily.GeneFamily`
+        :return: the organism indexes (as given by :meth:`ppanggolin.pangenome.Pangenome.getIndex`), and the corresponding numbers of genes
+        :rtype: tuple[:class:`numpy.ndarray`, :class:`numpy.ndarray`]
+        """
+        matrix = self.getFamilyMatrix()
+        row = self.getFamilyIndex()[fam]
+        start, stop = matrix.indptr[row], matrix.indptr[row+1]
+        return matrix.indices[start:stop], matrix.data[start:stop]
+
+    def getEdgeMatrix(self):
+        """Creates, if it does not exist yet, a sparse matrix with the number of pairs of genes of each edge (rows, in the order of :attr:`ppanggolin.pangenome.Pangenome.edges`) in each organism (columns, indexed by :meth:`ppanggolin.pangenome.Pangenome.getIndex`).
+        The number of pairs of genes of the edges in a set of organisms is the product of this matrix by the indicator vector of the set.
+        The assumption behind this is that the graph has been computed and no more edge will be added.
+
+        :return: the edge x organism count matrix
+        :rtype: :class:`scipy.sparse.csr_matrix`
+        """
+        if not hasattr(self, "_edgeMatrix"):#then the matrix does not exist yet
+            orgIndex = self.getIndex()
+            edges = self.edges
+            rows, cols, counts = [], [], []
+            for row, edge in enumerate(edges):
+                for org, pairs in edge.organisms.items():
+                    rows.append(row)
+                    cols.append(orgIndex[org])
+                    counts.append(len(pairs))
+            self._edgeMatrix = csr_matrix((numpy.array(counts, dtype = numpy.uint32), (numpy.array(rows, dtype = numpy.int64), numpy.array(cols, dtype = numpy.int64))),
+                                          shape = (len(edges), len(orgIndex)))
+            self._edgeMatrix.sort_indices()
+        return self._edgeMatrix
+
+    def clearIndexes(self):
+        """Removes the gene getter, the indexes, the matrices and the bitarrays computed from the organisms, gene families and edges of the pangenome,
+        so that they are computed again the next time they are needed. To be called when organisms are added to a pangenome that has already been filled.
+        """
+        for attr in ["_geneGetter", "_orgIndex", "_famIndex", "_famMatrix", "_edgeMatrix", "_famBitarrays"]:
+            if hasattr(self, attr):
+                delattr(self, attr)
+
     def computeFamilyBitarrays(self):
         """Based on the index generated by :meth:`ppanggolin.pangenome.Pangenome.getIndex`, generated a bitarray for each gene family.
         If the family j is present in the organism with the index i, the bit at position i will be 1. If it is not, the bit will be 0.
@@ -271,11 +347,12 @@ class Pangenome:
         :return: A dictionnary with :class:`ppanggolin.genome.Organism` as key and `int` as value.
         :rtype: dict[:class:`ppanggolin.genome.Organism`, int]
         """
-        if not hasattr(self, "_orgIndex"):#then the bitarrays don't exist yet, since the org index does not exist either.
-            self.getIndex()
+        if not hasattr(self, "_famBitarrays"):#then the bitarrays don't exist yet
             for fam in self.geneFamilies:
-                fam.mkBitarray(self._orgIndex)
-        #case where there is an index but the bitarrays have not been computed???
+                fam.bitarray = gmpy2.xmpz(0)#pylint: disable=no-member
+                for index in self.getFamilyCounts(fam)[0].tolist():
+                    fam.bitarray[index] = 1
+            self._famBitarrays = True
         return self._orgIndex
 
     def get_multigenics(self, dup_margin):
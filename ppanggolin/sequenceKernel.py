@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+from functools import lru_cache
+
+#installed libraries
+import numpy
+
+#local libraries
+from ppanggolin.genetic_codes import genetic_codes
+
+# see https://www.bioinformatics.org/sms/iupac.html for the code.
+_IUPAC = b"ACGTNRYSWKMBVDH"
+_COMPLEMENT = bytes.maketrans(_IUPAC, b"TGCANYRSWMKVBHD")
+
+#each byte is given the index of its base in _IUPAC, and any other byte the index len(_IUPAC) so that the codons containing it are unknown.
+_BASE_INDEX = numpy.full(256, len(_IUPAC), dtype = numpy.uint16)
+_BASE_INDEX[numpy.frombuffer(_IUPAC, dtype = numpy.uint8)] = numpy.arange(len(_IUPAC), dtype = numpy.uint16)
+_NB_BASES = len(_IUPAC) + 1
+
+def reverse_complement(seq):
+    """ reverse complement the given dna sequence """
+    return seq.encode("ascii").translate(_COMPLEMENT)[::-1].decode("ascii")
+
+def get_dna_sequence(contigSeq, gene):
+    """ gets the dna sequence of the gene, on its strand, from the sequence of its contig """
+    if gene.strand == "+":
+        return contigSeq[gene.start-1:gene.stop]
+    elif gene.strand == "-":
+        return reverse_complement(contigSeq[gene.start-1:gene.stop])
+
+@lru_cache(maxsize = None)
+def codon_tables(code):
+    """
+        Gets the arrays giving the amino acid of each codon for the start codon and for the other ones in the given genetic code,
+        indexed by the codon index computed from _BASE_INDEX. Codons absent from the genetic code give 'X'.
+
+        :param code: the number of the genetic code
+        :type code: str
+        :return: the start codon table and the codon table
+        :rtype: numpy.ndarray, numpy.ndarray
+    """
+    tables = []
+    for table in [genetic_codes(code)["start_table"], genetic_codes(code)["trans_table"]]:
+        arr = numpy.full(_NB_BASES ** 3, ord("X"), dtype = numpy.uint8)
+        for codon, aa in table.items():
+            idx = _BASE_INDEX[numpy.frombuffer(codon.encode("ascii"), dtype = numpy.uint8)]
+            arr[(int(idx[0]) * _NB_BASES + int(idx[1])) * _NB_BASES + int(idx[2])] = ord(aa)
+        tables.append(arr)
+    return tables[0], tables[1]
+
+def translate(seq, code):
+    """
+        translates the given dna sequence with the given genetic code.
+        The first codon is translated with the start codons table. Codons that cannot be determined are translated as 'X'.
+
+        :param seq: the dna sequence, of a length that is a multiple of 3
+        :type seq: str
+        :param code: the number of the genetic code
+        :type code: str
+        :return: the protein sequence
+        :rtype: str
+    """
+    if len(seq) % 3 != 0:
+        raise IndexError("Given sequence length modulo 3 was different than 0, which is unexpected.")
+    if len(seq) == 0:
+        return ""
+    start_table, table = codon_tables(str(code))
+    bases = _BASE_INDEX.take(numpy.frombuffer(seq.encode("ascii"), dtype = numpy.uint8))
+    codons = bases[0::3] * (_NB_BASES * _NB_BASES)
+    codons += bases[1::3] * _NB_BASES
+    codons += bases[2::3]
+    protein = table.take(codons)
+    protein[0] = start_table[codons[0]]
+    return protein.tobytes().decode("ascii")
+
+#2-bit code of each base for the packed dna sequences, and 4 for the bases that cannot be packed.
+_DNA_CODES = numpy.full(256, 4, dtype = numpy.uint8)
+_DNA_CODES[numpy.frombuffer(b"ACGT", dtype = numpy.uint8)] = numpy.arange(4, dtype = numpy.uint8)
+_DNA_CODES_BYTES = _DNA_CODES.tobytes()
+#the 4 bases of each packed byte, viewed as a single 32-bit word so that a byte is unpacked with a single lookup.
+_DNA_UNPACK = numpy.ascontiguousarray(numpy.frombuffer(b"ACGT", dtype = numpy.uint8)[(numpy.arange(256)[:, None] >> numpy.array([6, 4, 2, 0])) & 3]).view(numpy.uint32).ravel()
+
+def pack_dna(seq):
+    """
+        Packs dna sequences with 2 bits per base, 4 bases per byte with the first one in the highest bits.
+        The bases other than A, C, G and T are packed as A, and are returned apart so that they can be restored.
+
+        :param seq: the bases, of a length that is a multiple of 4
+        :type seq: :class:`numpy.ndarray` of uint8
+        :return: the packed bytes, the positions of the bases that could not be packed, and those bases
+        :rtype: :class:`numpy.ndarray`, :class:`numpy.ndarray`, :class:`numpy.ndarray`
+    """
+    codes = _DNA_CODES.take(seq)
+    exceptions = numpy.flatnonzero(codes == 4)
+    exceptionBases = seq[exceptions]
+    codes[exceptions] = 0
+    codes = codes.reshape(-1, 4)
+    packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+    return packed, exceptions, exceptionBases
+
+def unpack_dna(packed, skip, length):
+    """
+        Unpacks bases packed by :func:`pack_dna`, without restoring the bases that could not be packed.
+
+        :param packed: the packed bytes
+        :type packed: :class:`numpy.ndarray` of uint8
+        :param skip: the number of bases to skip at the start of the first byte
+        :param length: the number of bases to unpack
+        :return: the bases
+        :rtype: :class:`numpy.ndarray` of uint8
+    """
+    return _DNA_UNPACK[packed].view(numpy.uint8)[skip:skip + length]
+
+@lru_cache(maxsize = None)
+def _packed_codon_table(code):
+    """ gets the array giving the amino acid of each codon of A, C, G and T indexed by its 2-bit codes, without the start codons """
+    table = codon_tables(code)[1]
+    codons = numpy.arange(64)
+    bases = _BASE_INDEX[numpy.frombuffer(b"ACGT", dtype = numpy.uint8)].astype(numpy.int64)
+    arr = numpy.full(128, ord("X"), dtype = numpy.uint8)#codes of the other bases give indexes up to 84, whose values do not matter.
+    arr[:64] = table[(bases[codons >> 4] * _NB_BASES + bases[(codons >> 2) & 3]) * _NB_BASES + bases[codons & 3]]
+    return arr
+
+def translate_all(seqs, code):
+    """
+        translates at once the given dna sequences with the given genetic code.
+        Unlike :func:`translate`, the first codons are translated with the codons table and not the start codons table.
+
+        :param seqs: the dna sequences
+        :type seqs: list of str
+        :param code: the number of the genetic code
+        :type code: str
+        :return: the protein sequences, or None for the sequences with a length that is not a multiple of 3 or with bases other than A, C, G and T
+        :rtype: list of bytes
+    """
+    inFrame = [ len(seq) % 3 == 0 for seq in seqs ]
+    data = "".join( seq for seq, ok in zip(seqs, inFrame) if ok ).encode("ascii")
+    codes = numpy.frombuffer(data.translate(_DNA_CODES_BYTES), dtype = numpy.uint8)
+    stops = numpy.cumsum([ len(seq) for seq, ok in zip(seqs, inFrame) if ok ], dtype = numpy.int64)
+    #the sequences with bases that are not A, C, G or T are those with an exception position before their end.
+    untranslatable = set(numpy.searchsorted(stops, numpy.flatnonzero(codes == 4), side = "right").tolist())
+    codons = codes[0::3] << 4
+    codons |= codes[1::3] << 2
+    codons |= codes[2::3]
+    proteins = _packed_codon_table(str(code))[codons].tobytes()
+    translations = []
+    i = 0
+    prevStop = 0
+    for ok in inFrame:
+        if not ok:
+            translations.append(None)
+            continue
+        stop = int(stops[i])
+        translations.append(None if i in untranslatable else proteins[prevStop // 3:stop // 3])
+        prevStop = stop
+        i += 1
+    return translations
@@ -30,7 +30,7 @@ def launch(args):
         if args.clusters is not None:
             getSeq = False
         start_anno = time.time()
-        readAnnotations(pangenome, args.anno, cpu = args.cpu, getSeq = getSeq, show_bar=args.show_prog_bars)
+        readAnnotations(pangenome, args.anno, cpu = args.cpu, getSeq = getSeq, show_bar=args.show_prog_bars, cache=args.cache)
         annotime = time.time() - start_anno
         start_writing = time.time()
         writePangenome(pangenome, filename, args.force, show_bar=args.show_prog_bars)
@@ -39,7 +39,7 @@ def launch(args):
             raise Exception("The gff/gbff provided did not have any sequence informations, you did not provide clusters and you did not provide fasta file. Thus, we do not have the information we need to continue the analysis.")
 
         elif args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is not None:
-            getGeneSequencesFromFastas(pangenome, args.fasta)
+            getGeneSequencesFromFastas(pangenome, args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
         start_clust = time.time()
         if args.clusters is not None:
             readClustering(pangenome, args.clusters, show_bar=args.show_prog_bars)
@@ -49,7 +49,7 @@ def launch(args):
         clust_time = time.time() - start_clust
     elif args.fasta is not None:
         start_anno = time.time()
-        annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu, show_bar=args.show_prog_bars)
+        annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu, show_bar=args.show_prog_bars, cache=args.cache)
         annotime = time.time() - start_anno
         start_writing = time.time()
         writePangenome(pangenome, filename, args.force, show_bar=args.show_prog_bars)
@@ -120,5 +120,6 @@ def panRGPSubparser(subparser):
     optional.add_argument("--interest",required=False, type=str, default="",help = "Comma separated list of elements to flag when drawing and writing hotspots")
     optional.add_argument("--defrag", required=False, action = "store_true", help = argparse.SUPPRESS)##This ensures compatibility with workflows built with the old option "defrag" when it was not the default
     optional.add_argument("--no_defrag",required=False, action="store_true", help = "DO NOT Realign gene families to link fragments with their non-fragmented gene family.")
+    optional.add_argument("--cache", required=False, type=str, default=None, help = "A directory where the annotations of each genome are kept, and read back instead of being computed again when the same file is given with the same parameters.")
 
     return parser
\ No newline at end of file
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import logging
+import tempfile
+import argparse
+import os
+
+#installed libraries
+import tables
+
+#local libraries
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.utils import restricted_float
+from ppanggolin.annotate import annotatePangenome, readAnnotations, getGeneSequencesFromFastas, writeContigSequences
+from ppanggolin.cluster import firstClustering, read_faa, read_tsv
+from ppanggolin.align import alignSeqToPang, readAlignments, writeGeneFamSequences
+from ppanggolin.graph import remove_high_copy_number, computeOrganismEdges
+from ppanggolin.nem.partition import partition
+from ppanggolin.RGP.genomicIsland import predictRGP
+from ppanggolin.RGP.spot import predictHotspots
+from ppanggolin.formats import readPangenome, writePangenome, writeGeneSequencesFromAnnotations, readProdigalTraining
+### adds new genomes to a pangenome without computing it again from scratch.
+
+def loadPangenome(pangenome, show_bar = True):
+    """
+        Reads everything from the pangenome file, since the whole file is written again once the new genomes are added, and flags it as computed.
+        RGP and spots are not read as they are predicted again.
+
+        :return: whether the pangenome had RGP and spots
+        :rtype: bool, bool
+    """
+    if pangenome.status["genomesAnnotated"] != "inFile" or pangenome.status["genesClustered"] != "inFile" or pangenome.status["neighborsGraph"] != "inFile":
+        raise Exception("Only pangenomes that have been annotated, clustered and which have a graph can be updated. See the 'workflow' subcommand to build one.")
+    if pangenome.status["geneFamilySequences"] != "inFile":
+        raise Exception("The gene families of your pangenome do not have representative sequences (the clustering was read from a file), so the genes of the new genomes cannot be aligned to them.")
+    readPangenome(pangenome, annotation = True, geneFamilies = True, graph = True, geneSequences = pangenome.status["geneSequences"] == "inFile", show_bar = show_bar)
+    rgp = pangenome.status["predictedRGP"] == "inFile"
+    spots = pangenome.status["spots"] == "inFile"
+    pangenome.status["predictedRGP"] = "No"
+    pangenome.status["spots"] = "No"
+    for key, value in pangenome.status.items():
+        if value in ["Loaded", "inFile"]:
+            pangenome.status[key] = "Computed"
+    return rgp, spots
+
+def annotateNewGenomes(pangenome, tmpdir, cpu, fasta = None, anno = None, pseudo = False, show_bar = True):
+    """
+        Annotates the new genomes, or reads their annotations, in a pangenome of their own, the same way the genomes of the pangenome were.
+
+        :return: the pangenome of the new genomes
+        :rtype: :class:`ppanggolin.pangenome.Pangenome`
+    """
+    parameters = pangenome.parameters.get("annotation", {})
+    newPangenome = Pangenome()
+    if anno is not None:
+        readAnnotations(newPangenome, anno, cpu, pseudo = pseudo, show_bar = show_bar)
+        if newPangenome.status["geneSequences"] == "No":
+            if fasta is None:
+                raise Exception("The annotation files of the new genomes do not have the genomic sequences, which are needed to align their genes to the gene families. Provide them with --fasta.")
+            getGeneSequencesFromFastas(newPangenome, fasta, cpu = cpu, show_bar = show_bar)
+    else:
+        training = parameters.get("prodigal_training")
+        trainingDir = tempfile.TemporaryDirectory(dir = tmpdir)
+        if training is not None:
+            if readProdigalTraining(pangenome.file, trainingDir.name + "/prodigal_training.trn"):
+                training = trainingDir.name + "/prodigal_training.trn"
+            elif not os.path.exists(training):#the training file was not stored by former versions
+                logging.getLogger().warning(f"The Prodigal training file used to annotate the genomes of the pangenome ({training}) does not exist anymore. Prodigal will be trained on each new genome.")
+                training = None
+        annotatePangenome(newPangenome, fasta, tmpdir, cpu, translation_table = parameters.get("translation_table", "11"), kingdom = parameters.get("kingdom", "bacteria"),
+                          norna = not parameters.get("annotate_RNA", True), overlap = parameters.get("remove_Overlapping_CDS", True), show_bar = show_bar, training = training)
+        trainingDir.cleanup()
+    redundant = set(org.name for org in newPangenome.organisms) & set(org.name for org in pangenome.organisms)
+    if len(redundant) > 0:
+        raise Exception(f"Some of the new genomes are already in the pangenome : '{' '.join(sorted(redundant))}'")
+    return newPangenome
+
+def assignGenes(pangenome, newPangenome, tmpdir, cpu, code = "11", coverage = 0.8, identity = 0.8, mode = "1", defrag = True, show_bar = True):
+    """
+        Adds the genes of the new genomes to the gene family whose representative sequence they best align to,
+        and clusters the genes that do not align to any of them in new gene families.
+    """
+    newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir)
+    geneFile = open(newtmpdir.name + "/new_genes.fna", "w")
+    writeGeneSequencesFromAnnotations(newPangenome, geneFile, show_bar = show_bar)
+    famFile = open(newtmpdir.name + "/representatives.faa", "w")
+    writeGeneFamSequences(pangenome, famFile)
+    blastTab = alignSeqToPang(famFile, geneFile, newtmpdir.name, newtmpdir, cpu, defrag, identity, coverage, is_nucl = True, code = code)
+    geneFile.close()
+    famFile.close()
+
+    gene2fam = readAlignments(blastTab, pangenome)
+    unassigned = []
+    for gene in newPangenome.genes:
+        fam = gene2fam.get(gene.ID)
+        if fam is None:
+            unassigned.append(gene)
+        else:
+            fam.addGene(gene)
+    logging.getLogger().info(f"{len(gene2fam)} genes of the new genomes were assigned to existing gene families")
+
+    if len(unassigned) > 0:
+        logging.getLogger().info(f"Clustering the {len(unassigned)} remaining genes in new gene families...")
+        geneFile = open(newtmpdir.name + "/unassigned_genes.fna", "w")
+        writeGeneSequencesFromAnnotations(newPangenome, geneFile, list_CDS = unassigned, show_bar = False)
+        rep, tsv = firstClustering(geneFile, newtmpdir, cpu, code, coverage, identity, mode)
+        geneFile.close()
+        fam2seq = read_faa(rep)
+        genes2fam = read_tsv(tsv)[0]
+        formerNames = set(fam.name for fam in pangenome.geneFamilies)
+        for famName, protein in fam2seq.items():
+            if famName in formerNames:
+                raise Exception(f"A new gene family would have the name of an existing one ({famName}).")
+            pangenome.addGeneFamily(famName).addSequence(protein)
+        for gene in unassigned:
+            pangenome.getGeneFamily(genes2fam[gene.ID][0]).addGene(gene)
+        logging.getLogger().info(f"{len(fam2seq)} new gene families were created")
+    newtmpdir.cleanup()
+
+def update(pangenome, tmpdir, cpu, fasta = None, anno = None, pseudo = False, coverage = None, identity = None, mode = "1", seed = 42, show_bar = True):
+    """
+        Adds new genomes to a pangenome: they are annotated, their genes are assigned to the existing gene families or clustered in new ones,
+        their edges are added to the graph, and the gene families are partitionned again starting from their former partitions.
+        The RGP and spots are predicted again if the pangenome had them, with the same parameters.
+    """
+    rgp, spots = loadPangenome(pangenome, show_bar = show_bar)
+    newPangenome = annotateNewGenomes(pangenome, tmpdir, cpu, fasta, anno, pseudo, show_bar = show_bar)
+
+    clusterParameters = pangenome.parameters.get("cluster", {})
+    code = clusterParameters.get("translation_table", pangenome.parameters.get("annotation", {}).get("translation_table", "11"))
+    assignGenes(pangenome, newPangenome, tmpdir, cpu, code = code,
+                coverage = coverage if coverage is not None else clusterParameters.get("coverage", 0.8),
+                identity = identity if identity is not None else clusterParameters.get("identity", 0.8),
+                mode = mode, defrag = clusterParameters.get("defragmentation", False), show_bar = show_bar)
+    for org in newPangenome.organisms:
+        pangenome.addOrganism(org)
+    pangenome.clearIndexes()
+    logging.getLogger().info(f"Added {len(newPangenome.organisms)} genomes to the pangenome")
+
+    graphParameters = pangenome.parameters.get("graph", {})
+    if graphParameters.get("removed_high_copy_number_families", False):
+        remove_high_copy_number(pangenome, graphParameters["removed_high_copy_number_of_families_above"])
+    for org in newPangenome.organisms:
+        computeOrganismEdges(pangenome, org)
+
+    if pangenome.status["partitionned"] == "Computed":
+        partitionParameters = pangenome.parameters["partition"]
+        computedK = partitionParameters["computed_K"]
+        partition(pangenome, tmpdir, beta = partitionParameters["beta"], sm_degree = partitionParameters["max_node_degree_for_smoothing"],
+                  free_dispersion = partitionParameters["free_dispersion"], chunk_size = partitionParameters.get("chunk_size", 500), K = partitionParameters["K"],
+                  cpu = cpu, seed = seed, show_bar = show_bar, init = "init_from_old")
+        pangenome.parameters["partition"]["computed_K"] = computedK
+        if rgp:
+            RGPParameters = pangenome.parameters["RGP"]
+            predictRGP(pangenome, persistent_penalty = RGPParameters["persistent_penalty"], variable_gain = RGPParameters["variable_gain"], min_length = RGPParameters["min_length"],
+                       min_score = RGPParameters["min_score"], dup_margin = RGPParameters["dup_margin"], cpu = cpu, show_bar = show_bar)
+        if spots:
+            spotParameters = pangenome.parameters["spots"]
+            predictHotspots(pangenome, tmpdir, cpu = cpu, overlapping_match = spotParameters["overlapping_match"], set_size = spotParameters["set_size"],
+                            exact_match = spotParameters["exact_match"], show_bar = show_bar)
+
+def copyStoredData(formerFile, newFile, genomes_file, cpu = 1, show_bar = True):
+    """
+        Stores in the new pangenome file the data of the former one that are not part of the pangenome objects: the Prodigal training file,
+        and the sequences of the contigs, to which those of the new genomes are added from their genome files.
+        The cache of the evaluations of the number of partitions is not kept, as the graph the models are computed on has changed.
+    """
+    h5f = tables.open_file(formerFile, "r")
+    contigSequences, ICLCache = "/contigSequences" in h5f, "/ICLCache" in h5f
+    if "/prodigalTraining" in h5f:
+        newh5f = tables.open_file(newFile, "a")
+        h5f.copy_node("/prodigalTraining", newparent = newh5f.root)
+        newh5f.close()
+    h5f.close()
+    if contigSequences:
+        logging.getLogger().info("Storing the sequences of the contigs of the new genomes with those of the former ones...")
+        newPangenome = Pangenome()
+        newPangenome.addFile(newFile)
+        writeContigSequences(newPangenome, genomes_file, cpu = cpu, show_bar = show_bar, formerFile = formerFile)
+    if ICLCache:
+        logging.getLogger().warning("The models computed by former evaluations of the number of partitions were not kept, as the graph of the pangenome has changed.")
+
+def launch(args):
+    pangenome = Pangenome()
+    pangenome.addFile(args.pangenome)
+    update(pangenome, args.tmpdir, args.cpu, fasta = args.fasta, anno = args.anno, pseudo = args.use_pseudo, coverage = args.coverage, identity = args.identity,
+           mode = args.mode, seed = args.seed, show_bar = args.show_prog_bars)
+    #the whole file is written again, in a temporary one first so that the former pangenome is kept if something goes wrong
+    newFile = args.pangenome + ".tmp"
+    writePangenome(pangenome, newFile, args.force, show_bar = args.show_prog_bars)
+    copyStoredData(args.pangenome, newFile, args.anno if args.fasta is None else args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
+    os.replace(newFile, args.pangenome)
+
+def updateSubparser(subparser):
+    parser = subparser.add_parser("update", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required = parser.add_argument_group(title = "Required arguments", description = "The pangenome, and one of --fasta or --anno are required :")
+    required.add_argument('-p','--pangenome',  required=True, type=str, help="The pangenome .h5 file to add the genomes to")
+    required.add_argument('--fasta',  required=False, type=str, help="A tab-separated file listing the names of the new organisms, and the fasta filepath of their genomic sequence(s) (the fastas can be compressed with gzip). One line per organism.")
+    required.add_argument('--anno', required=False, type=str, help="A tab-separated file listing the names of the new organisms, and the gff/gbff filepath of their annotations (the files can be compressed with gzip). One line per organism. If this is provided, those annotations will be used.")
+
+    optional = parser.add_argument_group(title = "Optional arguments")
+    optional.add_argument("--use_pseudo",required=False, action="store_true",help = "In the context of provided annotation, use this option to read pseudogenes. (Default behavior is to ignore them)")
+    optional.add_argument("--coverage", required=False, type=restricted_float, default=None, help = "Minimal coverage of the alignment for a gene to be in a gene family. The one used for the clustering of the pangenome by default")
+    optional.add_argument("--identity", required=False, type=restricted_float, default=None, help = "Minimal identity percent for a gene to be in a gene family. The one used for the clustering of the pangenome by default")
+    optional.add_argument("--mode", required=False, default="1", choices=["0","1","2","3"], help = "the cluster mode of MMseqs2 for the genes in no gene family. 0: Setcover, 1: single linkage (or connected component), 2: CD-HIT-like, 3: CD-HIT-like (lowmem)")
+    optional.add_argument("-se", "--seed", type = int, default = 42, help="seed used to generate random numbers for the partitionning")
+    return parser
@@ -26,13 +26,13 @@ def launch(args):
         getSeq = True
         if args.clusters is not None:
             getSeq = False
-        readAnnotations(pangenome, args.anno, cpu = args.cpu, getSeq = getSeq, show_bar=args.show_prog_bars)
+        readAnnotations(pangenome, args.anno, cpu = args.cpu, getSeq = getSeq, show_bar=args.show_prog_bars, cache=args.cache)
         writePangenome(pangenome, filename, args.force)
         if args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is None:
             raise Exception("The gff/gbff provided did not have any sequence informations, you did not provide clusters and you did not provide fasta file. Thus, we do not have the information we need to continue the analysis.")
 
         elif args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is not None:
-            getGeneSequencesFromFastas(pangenome, args.fasta)
+            getGeneSequencesFromFastas(pangenome, args.fasta, cpu = args.cpu, show_bar = args.show_prog_bars)
 
         if args.clusters is not None:
             readClustering(pangenome, args.clusters, show_bar=args.show_prog_bars)
@@ -41,7 +41,7 @@ def launch(args):
             clustering(pangenome, tmpdir = args.tmpdir, cpu = args.cpu, defrag = not args.no_defrag, show_bar=args.show_prog_bars)
     elif args.fasta is not None:
         pangenome = Pangenome()
-        annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu, show_bar=args.show_prog_bars)
+        annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu, show_bar=args.show_prog_bars, cache=args.cache)
         writePangenome(pangenome, filename, args.force,show_bar=args.show_prog_bars)
         clustering(pangenome, tmpdir = args.tmpdir,cpu = args.cpu, defrag = not args.no_defrag,show_bar=args.show_prog_bars)
 
@@ -76,4 +76,5 @@ def workflowSubparser(subparser):
     optional.add_argument("-K","--nb_of_partitions",required=False, default=-1, type=int, help = "Number of partitions to use. Must be at least 3. If under 3, it will be detected automatically.")
     optional.add_argument("--defrag", required=False, action = "store_true", help = argparse.SUPPRESS)##This ensures compatibility with workflows built with the old option "defrag" when it was not the default
     optional.add_argument("--no_defrag",required=False, action="store_true", help = "DO NOT Realign gene families to link fragments with their non-fragmented gene family.")
+    optional.add_argument("--cache", required=False, type=str, default=None, help = "A directory where the annotations of each genome are kept, and read back instead of being computed again when the same file is given with the same parameters.")
     return parser
\ No newline at end of file
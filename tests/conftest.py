@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+
+import pytest
+from random import randint
+
+from ppanggolin.genome import Organism, Gene, RNA
+
+@pytest.fixture()
+def make_org_with_genes():
+    def _make_org_with_genes(org):
+        """make an organism, add from 2 to 10 contigs
+        with 2 to 10 genes each."""
+        l_genes = []
+        o_org = Organism(org)
+        for i in range(randint(2,10)):
+            o_ctg = o_org.getOrAddContig("k_{}".format(i))
+            for j in range(randint(2,10)):
+                name = "{}.{}.{}".format(org, o_ctg.name, j)
+                o_gene = Gene(name)
+                o_gene.position = j
+                o_gene.start = j
+                o_ctg.addGene(o_gene)
+                l_genes.append(o_gene)
+        return o_org, l_genes
+    return _make_org_with_genes
+
+
+@pytest.fixture()
+def make_org():
+    def _fill(o_feature, annotations, o_org, o_ctg):
+        annotations = dict(annotations)
+        dna = annotations.pop("dna", None)
+        o_feature.fill_annotations(**annotations)
+        if dna is not None:
+            o_feature.add_dna(dna)
+        o_feature.fill_parents(o_org, o_ctg)
+
+    def _make_org(name, genes = (), rnas = (), contig = "contig", circular = False):
+        """make an organism with a contig holding the given genes and RNAs,
+        each one given by the arguments of fill_annotations with an optional 'dna' sequence.
+        They are named {name}_CDS_{i} and {name}_tRNA_{i}, and the genes are at their index by default."""
+        o_org = Organism(name)
+        o_ctg = o_org.getOrAddContig(contig, circular)
+        for i, annotations in enumerate(genes):
+            o_gene = Gene(f"{name}_CDS_{i}")
+            _fill(o_gene, dict({"position" : i}, **annotations), o_org, o_ctg)
+            o_ctg.addGene(o_gene)
+        for i, annotations in enumerate(rnas):
+            o_rna = RNA(f"{name}_tRNA_{i}")
+            _fill(o_rna, annotations, o_org, o_ctg)
+            o_ctg.addRNA(o_rna)
+        return o_org
+    return _make_org
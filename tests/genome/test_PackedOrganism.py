@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+
+import pickle
+
+import pytest
+
+from ppanggolin.genome import PackedOrganism
+
+@pytest.fixture()
+def o_org(make_org):
+    o_org = make_org("org", genes = [ dict(start = start, stop = stop, strand = strand, geneType = "CDS", name = f"gene{i}", product = "", local_identifier = "loc", genetic_code = "4", dna = dna)
+                                      for i, (start, stop, strand, dna) in enumerate([(1, 9, "+", "ATGAAATAG"), (12, 17, "-", "ATGTAA")]) ],
+                     rnas = [ dict(start = 20, stop = 25, strand = "+", geneType = "tRNA", product = "tRNA-Phe", dna = "ACGTAC") ], circular = True)
+    o_org.getOrAddContig("empty")
+    return o_org
+
+def features(org):
+    genes = [ (gene.contig.name, gene.ID, gene.start, gene.stop, gene.strand, gene.type, gene.name, gene.product, gene.local_identifier,
+               gene.position, gene.genetic_code, gene.is_fragment, gene.dna, gene.organism is org) for gene in org.genes ]
+    RNAs = [ (rna.contig.name, rna.ID, rna.start, rna.stop, rna.strand, rna.type, rna.name, rna.product, rna.dna, rna.organism is org)
+             for contig in org.contigs for rna in contig.RNAs ]
+    return genes, RNAs
+
+def test_unpack(o_org):
+    packed = pickle.loads(pickle.dumps(PackedOrganism(o_org)))
+    org = packed.unpack()
+    assert org.name == "org"
+    assert [ (contig.name, contig.is_circular) for contig in org.contigs ] == [("contig", True), ("empty", False)]
+    assert features(org) == features(o_org)
+
+def test_unpack_without_sequences(o_org):
+    for gene in o_org.genes:
+        del gene.dna
+    packed = PackedOrganism(o_org)
+    assert packed.genes["dna"] is None
+    org = packed.unpack()
+    assert all(not hasattr(gene, "dna") for gene in org.genes)
+    assert [ rna.dna for contig in org.contigs for rna in contig.RNAs ] == ["ACGTAC"]
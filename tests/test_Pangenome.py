@@ -172,26 +172,6 @@ def make_gene_pair():
     return _make_gene_pair
 
 
-@pytest.fixture()
-def make_org_with_genes():
-    def _make_org_with_genes(org):
-        """make an organism, add from 2 to 10 contigs
-        with 2 to 10 genes each."""
-        l_genes = []
-        o_org = Organism(org)
-        for i in range(randint(2,10)):
-            o_ctg = o_org.getOrAddContig("k_{}".format(i))
-            for j in range(randint(2,10)):
-                name = "{}.{}.{}".format(org, o_ctg.name, j)
-                o_gene = Gene(name)
-                o_gene.position = j
-                o_gene.start = j
-                o_ctg.addGene(o_gene)
-                l_genes.append(o_gene)
-        return o_org, l_genes
-    return _make_org_with_genes
-
-
 @pytest.fixture()
 def fill_fam_with_genes():
     def _fill_fam_with_genes(o_fam):
@@ -328,6 +308,73 @@ def test_familyHaveBitarrays(o_pang, l_orgs):
         assert hasattr(o_fam,'bitarray')
 
 
+def test_getFamilyMatrix(o_pang, make_org_with_genes):
+    """test that the matrix counts the genes of each family in each organism."""
+    l_fams = [ o_pang.addGeneFamily(str(i_fam)) for i_fam in range(randint(5,10)) ]
+    for i_org in range(randint(3,6)):
+        o_org, l_genes = make_org_with_genes(str(i_org))
+        o_pang.addOrganism(o_org)
+        for o_gene in l_genes:
+            o_gene.fill_parents(o_org, None)
+            choices(l_fams)[0].addGene(o_gene)
+
+    mat = o_pang.getFamilyMatrix()
+    assert o_pang.getFamilyMatrix() is mat
+    assert mat.shape == (len(l_fams), o_pang.number_of_organisms())
+
+    org_idx = o_pang.getIndex()
+    fam_idx = o_pang.getFamilyIndex()
+    for o_fam in l_fams:
+        for o_org in o_pang.organisms:
+            assert mat[fam_idx[o_fam], org_idx[o_org]] == len(o_fam.getOrgDict().get(o_org, set()))
+        cols, counts = o_pang.getFamilyCounts(o_fam)
+        assert set(cols) == { org_idx[o_org] for o_org in o_fam.organisms }
+        assert counts.sum() == len(o_fam.genes)
+
+
+def test_getEdgeMatrix(o_pang, make_org_with_genes):
+    """test that the matrix counts the pairs of genes of each edge in each organism."""
+    l_fams = [ o_pang.addGeneFamily(str(i_fam)) for i_fam in range(randint(3,6)) ]
+    for i_org in range(randint(3,6)):
+        o_org, l_genes = make_org_with_genes(str(i_org))
+        o_pang.addOrganism(o_org)
+        for o_gene in l_genes:
+            o_gene.fill_parents(o_org, None)
+            choices(l_fams)[0].addGene(o_gene)
+        for o_gene1, o_gene2 in zip(l_genes, l_genes[1:]):
+            o_pang.addEdge(o_gene1, o_gene2)
+
+    mat = o_pang.getEdgeMatrix()
+    assert o_pang.getEdgeMatrix() is mat
+    assert mat.shape == (len(o_pang.edges), o_pang.number_of_organisms())
+
+    org_idx = o_pang.getIndex()
+    for row, o_edge in enumerate(o_pang.edges):
+        for o_org in o_pang.organisms:
+            assert mat[row, org_idx[o_org]] == len(o_edge.organisms.get(o_org, []))
+
+
+def test_clearIndexes(o_pang, make_org_with_genes):
+    """test that organisms added after the indexes were computed are in the recomputed ones."""
+    o_fam = o_pang.addGeneFamily("fam")
+    for i_org in range(2):
+        o_org, l_genes = make_org_with_genes(str(i_org))
+        o_pang.addOrganism(o_org)
+        for o_gene in l_genes:
+            o_gene.fill_parents(o_org, None)
+            o_fam.addGene(o_gene)
+        if i_org == 0:
+            o_pang.getFamilyMatrix()
+            o_pang.getGene(l_genes[0].ID)
+
+    with pytest.raises(KeyError):
+        o_pang.getGene(l_genes[0].ID)
+    o_pang.clearIndexes()
+    assert o_pang.getGene(l_genes[0].ID) == l_genes[0]
+    assert len(o_pang.getIndex()) == 2
+    assert o_pang.getFamilyMatrix().shape == (1, 2)
+
+
 def test_getGene_empty(o_pang):
     with pytest.raises(KeyError):
         o_gene = o_pang.getGene(33)
@@ -0,0 +1,45 @@
+#! /usr/bin/env python3
+
+import pytest
+
+import ppanggolin.formats#ppanggolin.annotate can only be imported once ppanggolin.formats is, as they import each other
+from ppanggolin.annotate.cache import cacheKey, readCachedOrganism, writeCachedOrganism
+
+@pytest.fixture()
+def genome(tmp_path):
+    fileName = tmp_path / "genome.fna"
+    fileName.write_text(">contig\nATGAAATAG\n")
+    return str(fileName)
+
+@pytest.fixture()
+def o_org(make_org):
+    return make_org("org", genes = [ dict(start = 1, stop = 9, strand = "+", geneType = "CDS", name = "gene", product = "product", local_identifier = "loc", genetic_code = "11", dna = "ATGAAATAG") ],
+                    rnas = [ dict(start = 2, stop = 4, strand = "-", geneType = "tRNA", product = "tRNA-Phe") ], circular = True)
+
+def test_cacheKey(genome, tmp_path):
+    key = cacheKey(genome, "11", "bacteria")
+    assert key == cacheKey(genome, "11", "bacteria")
+    assert key != cacheKey(genome, "4", "bacteria")
+    other = tmp_path / "other.fna"
+    other.write_text(">contig\nATGAAATAA\n")
+    assert key != cacheKey(str(other), "11", "bacteria")
+
+def test_cache_roundtrip(genome, o_org, tmp_path):
+    cache = str(tmp_path / "cache")
+    key = cacheKey(genome, "11")
+    assert readCachedOrganism(cache, key, "org") is None
+    writeCachedOrganism(cache, key, o_org)
+
+    # the organism can be read back under another name
+    org, hasSeq = readCachedOrganism(cache, key, "renamed")
+    assert hasSeq
+    assert org.name == "renamed"
+    contig = list(org.contigs)[0]
+    assert contig.name == "contig" and contig.is_circular
+    gene = contig.genes[0]
+    assert (gene.ID, gene.start, gene.stop, gene.strand, gene.name, gene.product, gene.local_identifier, gene.position, gene.genetic_code, gene.dna) == \
+           ("renamed_CDS_0", 1, 9, "+", "gene", "product", "loc", 0, "11", "ATGAAATAG")
+    assert gene.organism == org and gene.contig == contig
+    rna = list(contig.RNAs)[0]
+    assert (rna.ID, rna.start, rna.stop, rna.strand, rna.type, rna.product) == ("renamed_tRNA_0", 2, 4, "-", "tRNA", "tRNA-Phe")
+    assert not hasattr(rna, "dna")
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+
+import pytest
+import tables
+
+from ppanggolin.formats import AnnotationWriter, createPangenomeFile, readPangenome, readStringPool
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def make_org_with_dna(make_org):
+    def _make_org_with_dna(name, dna):
+        return make_org(name, genes = [ dict(start = 1, stop = len(seq), strand = "+", geneType = "CDS", name = "gene", product = "product", genetic_code = "11", dna = seq) for seq in dna ],
+                        rnas = [ dict(start = 2, stop = 4, strand = "-", geneType = "tRNA", product = "tRNA-Phe") ], circular = True)
+    return _make_org_with_dna
+
+def test_stream_organisms(make_org_with_dna, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    writer = AnnotationWriter(createPangenomeFile(fileName), sequences = True)
+    writer.addOrganism(make_org_with_dna("org1", ["ATGAAATAG", "ATGTAA"]))
+    writer.addOrganism(make_org_with_dna("org2", ["ATGCCCGGGTAG"]))
+    # the organisms were not kept in the pangenome
+    o_pang.status["genomesAnnotated"] = "inFile"
+    o_pang.status["geneSequences"] = "inFile"
+    writer.close(o_pang)
+
+    o_read = Pangenome()
+    o_read.addFile(fileName)
+    assert o_read.status["genomesAnnotated"] == "inFile" and o_read.status["geneSequences"] == "inFile"
+    readPangenome(o_read, annotation = True, geneSequences = True, show_bar = False)
+    assert sorted((gene.ID, gene.position, gene.dna) for gene in o_read.genes) == \
+           [("org1_CDS_0", 0, "ATGAAATAG"), ("org1_CDS_1", 1, "ATGTAA"), ("org2_CDS_0", 0, "ATGCCCGGGTAG")]
+    assert sorted(rna.ID for org in o_read.organisms for contig in org.contigs for rna in contig.RNAs) == ["org1_tRNA_0", "org2_tRNA_0"]
+
+def test_stream_without_sequences(make_org_with_dna, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    o_org = make_org_with_dna("org", ["ATGTAA"])
+    del list(o_org.contigs)[0].genes[0].dna
+    writer = AnnotationWriter(createPangenomeFile(fileName), sequences = True)
+    writer.addOrganism(o_org)
+    o_pang.addOrganism(o_org)
+    o_pang.status["genomesAnnotated"] = "Computed"
+    writer.close(o_pang)
+    assert o_pang.status["genomesAnnotated"] == "Loaded" and o_pang.status["geneSequences"] == "No"
+
+    o_read = Pangenome()
+    o_read.addFile(fileName)
+    assert o_read.status["genomesAnnotated"] == "inFile" and o_read.status["geneSequences"] == "No"
+    readPangenome(o_read, annotation = True, show_bar = False)
+    assert [gene.ID for gene in o_read.genes] == ["org_CDS_0"]
+
+def test_identifiers_are_not_indexed(make_org_with_dna, tmp_path):
+    """the memory of the string pool does not grow with the number of genes"""
+    fileName = str(tmp_path / "pangenome.h5")
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    writer.pool.chunk = 2
+    for i in range(10):
+        writer.addOrganism(make_org_with_dna(f"org{i}", ["ATGAAATAG", "ATGTAA"]))
+    assert not any(string.startswith("org0_") for string in writer.pool._index)
+    assert len(writer.pool._new) < 2#the new strings are written chunk per chunk
+    o_pang = Pangenome()
+    o_pang.status["genomesAnnotated"] = "inFile"
+    writer.close(o_pang)
+
+    o_read = Pangenome()
+    o_read.addFile(fileName)
+    readPangenome(o_read, annotation = True, show_bar = False)
+    assert sorted(gene.ID for gene in o_read.genes) == sorted(f"org{i}_CDS_{j}" for i in range(10) for j in range(2))
+    assert set(gene.product for gene in o_read.genes) == {"product"}
+    h5f = tables.open_file(fileName)
+    assert readStringPool(h5f).tolist().count("product") == 1#the other strings are still deduplicated
+    h5f.close()
@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+
+import io
+import random
+from collections import defaultdict
+
+import networkx
+import pytest
+
+from ppanggolin.cluster.cluster import writeUniqueSequences, read_tsv, refineClustering
+from ppanggolin.annotate import readAnnoFile
+from ppanggolin.sequenceKernel import translate_all, translate
+
+def test_translate_all():
+    assert translate_all([], "11") == []
+    # the first codons are not read from the start codon table
+    assert translate_all(["TTGTTGTAA", "", "ATGTGA"], "11") == [b"LL*", b"", b"M*"]
+    assert translate_all(["ATGTGA"], "4") == [b"MW"]
+    # sequences that cannot be translated codon by codon
+    assert translate_all(["ATGTG", "ATGNGA", "ATGTGA"], "11") == [None, None, b"M*"]
+
+@pytest.fixture()
+def fasta(tmp_path):
+    fasta = tmp_path / "sequences.fna"
+    fasta.write_text(">gene0\nATGCTTTAA\n"
+                     ">gene1\nATGCTGTAA\n"#synonymous codon
+                     ">gene2\nGTGCTTTAA\n"#another start codon
+                     ">gene3\nATGCTTTAG\n"#another stop codon
+                     ">gene4\nATGCTNTAA\n"#an ambiguous base
+                     ">gene5\nATGCTNTAA\n"
+                     ">gene6\nATGCTTTA\n"#not a multiple of 3
+                     ">gene7\nATGCTGTAA\n")
+    return str(fasta)
+
+def test_writeUniqueSequences(fasta):
+    unique = io.StringIO()
+    copies = writeUniqueSequences(fasta, unique, "11", chunk = 3)
+    assert unique.getvalue() == ">gene0\nATGCTTTAA\n>gene2\nGTGCTTTAA\n>gene4\nATGCTNTAA\n>gene6\nATGCTTTA\n"
+    assert dict(copies) == {"gene0": ["gene1", "gene3", "gene7"], "gene4": ["gene5"]}
+
+def test_read_tsv(tmp_path):
+    tsv = tmp_path / "families_tsv"
+    tsv.write_text("gene0\tgene0\ngene0\tgene2\ngene4\tgene4\n")
+    genes2fam, fam2genes = read_tsv(str(tsv), {"gene0": ["gene1", "gene3"], "gene4": ["gene5"]})
+    assert genes2fam == {"gene0": ("gene0", False), "gene1": ("gene0", False), "gene3": ("gene0", False),
+                         "gene2": ("gene0", False), "gene4": ("gene4", False), "gene5": ("gene4", False)}
+    assert fam2genes == {"gene0": {"gene0", "gene1", "gene2", "gene3"}, "gene4": {"gene4", "gene5"}}
+    assert read_tsv(str(tsv))[0] == {"gene0": ("gene0", False), "gene2": ("gene0", False), "gene4": ("gene4", False)}
+
+def refineClusteringGraph(tsv, alnFile, fam2seq, copies = None):
+    """ the former implementation of refineClustering, with a graph of the families """
+    simgraph = networkx.Graph()
+    genes2fam, fam2genes = read_tsv(tsv, copies)
+    for fam, genes in fam2genes.items():
+        simgraph.add_node(fam, nbgenes = len(genes) )
+    with open(alnFile,"r") as alnfile:
+        for line in alnfile:
+            line = line.split()
+            if line[0] != line[1]:
+                simgraph.add_edge(line[0],line[1], score = float(line[4]))
+                simgraph.nodes[line[0]]["length"] = int(line[2])
+                simgraph.nodes[line[1]]["length"] = int(line[3])
+    for node, nodedata in simgraph.nodes(data = True):
+        choice = (None, 0, 0, 0)
+        for neighbor in simgraph.neighbors(node):
+            nei = simgraph.nodes[neighbor]
+            score = simgraph[neighbor][node]["score"]
+            if nei["length"] > nodedata["length"] and nei["nbgenes"] >= nodedata["nbgenes"] and  choice[3] < score:
+                choice = (genes2fam[neighbor][0], nei["length"] , nei["nbgenes"], score)
+        if choice[0] is not None:
+            genestochange = fam2genes[node]
+            for gene in genestochange:
+                genes2fam[gene] = (choice[0], True)
+                fam2genes[choice[0]].add(gene)
+            del fam2genes[node]
+    newFam2seq = {}
+    for fam in fam2genes:
+        newFam2seq[fam] = fam2seq[fam]
+    return genes2fam, newFam2seq
+
+def compare_refineClustering(tsv, aln, fam2seq, copies = None):
+    genes2fam, newFam2seq = refineClustering(tsv, aln, fam2seq, copies)
+    expected = refineClusteringGraph(tsv, aln, fam2seq, copies)
+    assert list(genes2fam.items()) == list(expected[0].items())
+    assert list(newFam2seq.items()) == list(expected[1].items())
+    return genes2fam
+
+def test_refineClustering_testingDataset(tmp_path):
+    # the families gather the genes with the same protein, and the representatives whose proteins start the same way are aligned
+    fasta = tmp_path / "sequences.fna"
+    with open(fasta, "w") as fastaFile:
+        for line in open("testingDataset/organisms.gbff.list").readlines()[:4]:
+            name, path = line.split()
+            org = readAnnoFile(name, "testingDataset/" + path, [], True, False)[0]
+            for gene in org.genes:
+                fastaFile.write(f">{gene.ID}\n{gene.dna}\n")
+    unique = tmp_path / "unique.fna"
+    with open(unique, "w") as uniqueFile:
+        copies = writeUniqueSequences(str(fasta), uniqueFile, "11")
+    reps = unique.read_text().split("\n")
+    fam2seq = { ID[1:] : translate(dna[:len(dna) - len(dna) % 3], "11") for ID, dna in zip(reps[0::2], reps[1::2]) }
+    tsv = tmp_path / "families_tsv"
+    tsv.write_text("".join( f"{fam}\t{fam}\n" for fam in fam2seq ))
+    byPrefix = defaultdict(list)
+    for fam, protein in fam2seq.items():
+        byPrefix[protein[1:11]].append(fam)
+    aln = tmp_path / "rep_families_tsv"
+    with open(aln, "w") as alnFile:
+        for fams in byPrefix.values():
+            for query in fams:
+                for target in fams:
+                    qseq, tseq = fam2seq[query], fam2seq[target]
+                    bits = sum(a == b for a, b in zip(qseq, tseq))
+                    alnFile.write(f"{query}\t{target}\t{len(qseq)}\t{len(tseq)}\t{bits}\n")
+    genes2fam = compare_refineClustering(str(tsv), str(aln), fam2seq, copies)
+    assert any( is_frag for _, is_frag in genes2fam.values() )
+
+def test_refineClustering_ties(tmp_path):
+    # few distinct lengths and scores, and pairs aligned several times in both directions
+    rng = random.Random(0)
+    fams = [ f"fam{i}" for i in range(300) ]
+    lengths = { fam : rng.randint(1, 5) for fam in fams }
+    tsv = tmp_path / "families_tsv"
+    tsv.write_text("".join( f"{fam}\t{fam}_gene{j}\n" for fam in fams for j in range(rng.randint(0, 3)) ) + "".join( f"{fam}\t{fam}\n" for fam in fams ))
+    aln = tmp_path / "rep_families_tsv"
+    # the last length given for a representative is used
+    aln.write_text("".join( f"{q}\t{t}\t{lengths[q] + rng.randint(0, 1)}\t{lengths[t]}\t{rng.randint(0, 3)}\n" for q, t in ( rng.sample(fams, 2) for _ in range(2000) ) ))
+    compare_refineClustering(str(tsv), str(aln), { fam : "M" for fam in fams })
+    aln.write_text("")
+    compare_refineClustering(str(tsv), str(aln), { fam : "M" for fam in fams })
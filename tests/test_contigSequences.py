@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+
+import pytest
+import tables
+
+from ppanggolin.formats import AnnotationWriter, createPangenomeFile, SequenceReader, getContigIndex
+from ppanggolin.formats.writeSequences import writeRegionsSequences, hasContigSequences
+from ppanggolin.annotate import writeContigSequences
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def genomes(tmp_path):
+    fasta = tmp_path / "org1.fna"
+    fasta.write_text(">unused\nAAAA\n>ctg1 description\nacgtaCCCGG\nGTTNA\n")
+    gff = tmp_path / "org2.gff"
+    gff.write_text("##gff-version 3\n##sequence-region ctg2 1 8\n##FASTA\n>ctg2\nTTTTGGGG\n")
+    genomes = tmp_path / "genomes.list"
+    genomes.write_text(f"org1\t{fasta}\norg2\t{gff}\n")
+    return str(genomes)
+
+@pytest.fixture()
+def o_pang(make_org, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    for orgName, contigName, stop in [("org1", "ctg1", 12), ("org2", "ctg2", 6)]:
+        o_org = make_org(orgName, genes = [ dict(start = 3, stop = stop, strand = "+") ], contig = contigName)
+        o_pang.addOrganism(o_org)
+        writer.addOrganism(o_org)
+    o_pang.status["genomesAnnotated"] = "Computed"
+    writer.close(o_pang)
+    o_pang.addFile(fileName)
+    return o_pang
+
+def test_writeContigSequences(o_pang, genomes):
+    writeContigSequences(o_pang, genomes, show_bar = False)
+    h5f = tables.open_file(o_pang.file)
+    assert getContigIndex(h5f) == {("org1", "ctg1"): 0, ("org2", "ctg2"): 1}
+    contigs = SequenceReader(h5f.root.contigSequences)
+    assert contigs.read() == ["ACGTACCCGGGTTNA", "TTTTGGGG"]
+    assert contigs.readSlice(0, 3, 12) == "TACCCGGGT"
+    assert contigs.readSlice(1, 6, 100) == "GG"
+    h5f.close()
+
+def test_writeRegionsSequences(o_pang, genomes, tmp_path):
+    writeContigSequences(o_pang, genomes, show_bar = False)
+    for org in o_pang.organisms:
+        o_pang.getOrAddRegion(f"{org.name}_RGP_0").append(next(iter(org.contigs)).genes[0])
+    writeRegionsSequences(o_pang, str(tmp_path), False, "all", None, None, show_bar = False)
+    assert (tmp_path / "all_rgp_genomic_sequences.fasta").read_text() == ">org1_RGP_0\nTACCCGGGT\n>org2_RGP_0\nTGG\n"
+
+def test_missing_contig(o_pang, tmp_path):
+    fasta = tmp_path / "org.fna"
+    fasta.write_text(">other\nAAAA\n")
+    genomes = tmp_path / "genomes.list"
+    genomes.write_text(f"org1\t{fasta}\norg2\t{fasta}\n")
+    with pytest.raises(KeyError):
+        writeContigSequences(o_pang, str(genomes), show_bar = False)
+    # the sequences of the contigs that were read are not kept
+    assert not hasContigSequences(o_pang.file)
+
+def test_writeContigSequences_from_former_file(o_pang, genomes, make_org, tmp_path):
+    writeContigSequences(o_pang, genomes, show_bar = False)
+    # a new pangenome file, with the organisms in another order and a new one whose genome is the only one listed
+    fileName = str(tmp_path / "new.h5")
+    o_new = Pangenome()
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    for orgName, contigName in [("org2", "ctg2"), ("org3", "ctg3"), ("org1", "ctg1")]:
+        o_org = make_org(orgName, contig = contigName)
+        o_new.addOrganism(o_org)
+        writer.addOrganism(o_org)
+    o_new.status["genomesAnnotated"] = "Computed"
+    writer.close(o_new)
+    o_new.addFile(fileName)
+    fasta = tmp_path / "org3.fna"
+    fasta.write_text(">ctg3\nCCCC\n")
+    newGenomes = tmp_path / "new_genomes.list"
+    newGenomes.write_text(f"org3\t{fasta}\n")
+    writeContigSequences(o_new, str(newGenomes), show_bar = False, formerFile = o_pang.file)
+    h5f = tables.open_file(fileName)
+    assert getContigIndex(h5f) == {("org2", "ctg2"): 0, ("org3", "ctg3"): 1, ("org1", "ctg1"): 2}
+    assert SequenceReader(h5f.root.contigSequences).read() == ["TTTTGGGG", "CCCC", "ACGTACCCGGGTTNA"]
+    h5f.close()
@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+import pytest
+import tables
+
+from ppanggolin.formats import AnnotationWriter, createPangenomeFile, readPangenome
+from ppanggolin.annotate import getGeneSequencesFromFastas
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def fastaList(tmp_path):
+    fasta = tmp_path / "org.fna"
+    fasta.write_text(">other\nAAAA\n>contig description\nccATGAAA\nTAGttt\n")
+    fastaList = tmp_path / "fasta.list"
+    fastaList.write_text(f"org\t{fasta}\n")
+    return str(fastaList)
+
+@pytest.fixture()
+def o_pang(make_org):
+    o_pang = Pangenome()
+    o_pang.addOrganism(make_org("org", genes = [ dict(start = 3, stop = 11, strand = "+"), dict(start = 9, stop = 14, strand = "-") ],
+                                rnas = [ dict(start = 1, stop = 4, strand = "+") ]))
+    o_pang.status["genomesAnnotated"] = "Computed"
+    return o_pang
+
+def test_organisms_in_memory(o_pang, fastaList):
+    getGeneSequencesFromFastas(o_pang, fastaList, show_bar = False)
+    assert o_pang.status["geneSequences"] == "Computed"
+    assert [ gene.dna for gene in o_pang.genes ] == ["ATGAAATAG", "AAACTA"]
+    assert [ rna.dna for org in o_pang.organisms for contig in org.contigs for rna in contig.RNAs ] == ["CCAT"]
+
+def test_organisms_in_file(o_pang, fastaList, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    writer.addOrganism(list(o_pang.organisms)[0])
+    writer.close(o_pang)
+    o_file = Pangenome()
+    o_file.addFile(fileName)
+    getGeneSequencesFromFastas(o_file, fastaList, show_bar = False)
+    assert o_file.status["geneSequences"] == "inFile"
+
+    o_read = Pangenome()
+    o_read.addFile(fileName)
+    readPangenome(o_read, annotation = True, geneSequences = True, show_bar = False)
+    assert [ gene.dna for gene in o_read.genes ] == ["ATGAAATAG", "AAACTA"]
+
+def test_missing_contig(o_pang, tmp_path):
+    fasta = tmp_path / "org.fna"
+    fasta.write_text(">other\nAAAA\n")
+    fastaList = tmp_path / "fasta.list"
+    fastaList.write_text(f"org\t{fasta}\n")
+    with pytest.raises(KeyError):
+        getGeneSequencesFromFastas(o_pang, str(fastaList), show_bar = False)
+
+def test_missing_contig_in_file(o_pang, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    writer.addOrganism(list(o_pang.organisms)[0])
+    writer.close(o_pang)
+    o_file = Pangenome()
+    o_file.addFile(fileName)
+    fasta = tmp_path / "org.fna"
+    fasta.write_text(">other\nAAAA\n")
+    fastaList = tmp_path / "fasta.list"
+    fastaList.write_text(f"org\t{fasta}\n")
+    with pytest.raises(KeyError):
+        getGeneSequencesFromFastas(o_file, str(fastaList), show_bar = False)
+    # the sequences of the genes that were read are not kept
+    o_read = Pangenome()
+    o_read.addFile(fileName)
+    assert o_read.status["geneSequences"] == "No"
+    h5f = tables.open_file(fileName)
+    assert "/geneSequences" not in h5f
+    h5f.close()
@@ -0,0 +1,42 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from ppanggolin.formats import writePangenome
+from ppanggolin.formats.lazyPangenome import LazyPangenome
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def pangenomeFile(make_org, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    for i in range(3):
+        o_org = make_org(f"org{i}", genes = [ dict(start = 100 * j + 1, stop = 100 * j + 90, strand = "+") for j in range(4) ])
+        o_pang.addOrganism(o_org)
+        for j, gene in enumerate(o_org.genes):
+            o_pang.addGeneFamily(f"fam{j}").addGene(gene)
+    o_pang.status["genomesAnnotated"] = "Computed"
+    o_pang.status["genesClustered"] = "Computed"
+    writePangenome(o_pang, fileName, False, show_bar = False)
+    return fileName
+
+def test_number_of_geneFamilies(pangenomeFile):
+    o_pang = LazyPangenome()
+    o_pang.addFile(pangenomeFile)
+    assert o_pang.number_of_organisms() == 3
+    assert o_pang.number_of_geneFamilies() == 4
+    assert len(o_pang._fams) == 0#no family was read to count them
+    o_pang.getGeneFamily("fam1")
+    o_pang.addGeneFamily("newFam")
+    assert o_pang.number_of_geneFamilies() == 5
+    assert len(o_pang.geneFamilies) == 5
+    o_pang.closeFile()
+
+def test_file_closed_on_error(pangenomeFile):
+    with pytest.raises(KeyError):
+        with LazyPangenome() as o_pang:
+            o_pang.addFile(pangenomeFile)
+            h5f = o_pang._h5f
+            o_pang.getGeneFamily("missing")
+    assert not h5f.isopen
+    assert not o_pang._lazy
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+
+import pytest
+import random
+import os
+
+from ppanggolin.graph import computeNeighborsGraph
+import ppanggolin.nem.partition as ppp
+import ppanggolin.nem.sharedPangenome as sharedPangenome
+from ppanggolin.nem.partition import partition
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def o_pang(make_org):
+    """15 organisms with 10 core families, 20 shell families in about half of them and a cloud family each"""
+    rng = random.Random(0)
+    o_pang = Pangenome()
+    for i in range(15):
+        families = list(range(10)) + [ fam for fam in range(10, 30) if rng.random() < 0.5 ] + [30 + i]
+        o_org = make_org(f"org{i}", genes = [ dict(start = 100 * j + 1, stop = 100 * j + 90, strand = "+") for j in range(len(families)) ])
+        o_pang.addOrganism(o_org)
+        for fam, gene in zip(families, o_org.genes):
+            o_pang.addGeneFamily(f"fam{fam}").addGene(gene)
+    o_pang.status["genomesAnnotated"] = "Computed"
+    o_pang.status["genesClustered"] = "Computed"
+    computeNeighborsGraph(o_pang, show_bar = False)
+    return o_pang
+
+def test_partition_evaluated_K(o_pang, tmp_path):
+    partition(o_pang, str(tmp_path), K = -1, Krange = [3, 8], show_bar = False)
+    assert o_pang.parameters["partition"]["computed_K"]
+    assert 3 <= o_pang.parameters["partition"]["K"] <= 8
+    assert all(fam.partition != "" for fam in o_pang.geneFamilies)
+    assert all(o_pang.getGeneFamily(f"fam{fam}").namedPartition == "persistent" for fam in range(10))
+    assert all(o_pang.getGeneFamily(f"fam{fam}").namedPartition == "cloud" for fam in range(30, 45))
+
+@pytest.mark.parametrize("K_seeds", [1, 2])
+def test_evaluate_nb_partitions_does_not_depend_on_cpu(o_pang, tmp_path, monkeypatch, K_seeds):
+    """the models computed ahead on the idle cpus change neither the models nor the cache they are saved in"""
+    saved = []
+    monkeypatch.setattr(ppp, "readICLCache", lambda pangenomeFile, sample : {})
+    monkeypatch.setattr(ppp, "writeICLCache", lambda pangenomeFile, sample, results : saved.append((sample, results)))
+    Ks = []
+    for cpu in [1, 4]:
+        ppp.shared = ppp.SharedPangenome.fromPangenome(o_pang)
+        try:
+            Ks.append(ppp.evaluate_nb_partitions(range(o_pang.number_of_organisms()), 10, False, 500, [3, 8], 0.05, False, cpu, str(tmp_path), 42, None,
+                                                 show_bar = False, K_seeds = K_seeds, pangenomeFile = "pangenome.h5"))
+        finally:
+            ppp.shared.unlink()
+            ppp.shared = None
+    assert Ks[0] == Ks[1]
+    assert saved[0] == saved[1]
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason = "the shared memory segments are not files")
+def test_partition_failure_releases_shared_memory(o_pang, tmp_path, monkeypatch):
+    monkeypatch.setattr(ppp, "run_nem", lambda *args, **kwargs : [{}, None, None])
+    before = set(os.listdir("/dev/shm"))
+    with pytest.raises(Exception, match = "Statistical partitionning does not work"):
+        partition(o_pang, str(tmp_path), K = 3, show_bar = False)
+    assert set(os.listdir("/dev/shm")) == before
+    assert ppp.shared is None
+
+@pytest.mark.parametrize("cpu", [1, 2])
+def test_partition_without_shared_memory(o_pang, tmp_path, monkeypatch, cpu):
+    """before python 3.8, the arrays are given to the subprocesses instead of being shared"""
+    partition(o_pang, str(tmp_path), K = 3, chunk_size = 10, cpu = cpu, show_bar = False)
+    expected = { fam.name : fam.partition for fam in o_pang.geneFamilies }
+    monkeypatch.setattr(sharedPangenome, "shared_memory", None)
+    o_pang.status["partitionned"] = "No"
+    partition(o_pang, str(tmp_path), K = 3, chunk_size = 10, cpu = cpu, show_bar = False)
+    assert { fam.name : fam.partition for fam in o_pang.geneFamilies } == expected
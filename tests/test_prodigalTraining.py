@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+import os
+import stat
+import argparse
+
+import pytest
+import tables
+
+from ppanggolin.formats import AnnotationWriter, createPangenomeFile, readProdigalTraining
+from ppanggolin.annotate import annotatePangenome, syntaSubparser, launch
+import ppanggolin.annotate.synta as synta
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def prodigal(tmp_path, monkeypatch):
+    # writes the training file where it is asked, relatively to its working directory, and finds no gene
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    prodigal = bindir / "prodigal"
+    prodigal.write_text("#!/bin/sh\n"
+                        "cat > /dev/null\n"
+                        "while [ $# -gt 0 ]; do\n"
+                        "    if [ \"$1\" = \"-t\" ] && [ ! -e \"$2\" ]; then echo trained > \"$2\" || exit 1; fi\n"
+                        "    shift\n"
+                        "done\n")
+    prodigal.chmod(prodigal.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bindir}{os.pathsep}{os.environ['PATH']}")
+
+def test_train_prodigal_relative_output(prodigal, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "output").mkdir()
+    (tmp_path / "tmpdir").mkdir()
+    (tmp_path / "org.fna").write_text(">contig\nACGTACGTACGT\n")
+    (tmp_path / "fasta.list").write_text("org\torg.fna\n")
+    o_pang = Pangenome()
+    annotatePangenome(o_pang, "fasta.list", "tmpdir", 1, norna = True, show_bar = False, training = "output/prodigal_training.trn", training_genomes = 1)
+    assert (tmp_path / "output" / "prodigal_training.trn").read_text() == "trained\n"
+    assert o_pang.parameters["annotation"]["prodigal_training"] == str(tmp_path / "output" / "prodigal_training.trn")
+
+def test_store_prodigal_training(prodigal, tmp_path):
+    (tmp_path / "tmpdir").mkdir()
+    (tmp_path / "org.fna").write_text(">contig\nACGTACGTACGT\n")
+    (tmp_path / "fasta.list").write_text(f"org\t{tmp_path / 'org.fna'}\n")
+    training = tmp_path / "prodigal_training.trn"
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    writer = AnnotationWriter(createPangenomeFile(fileName))
+    annotatePangenome(o_pang, str(tmp_path / "fasta.list"), str(tmp_path / "tmpdir"), 1, norna = True, show_bar = False, training = str(training), training_genomes = 1,
+                      writer = writer, release = True)
+    writer.close(o_pang)
+    training.unlink()#the training file is in the pangenome file
+    assert readProdigalTraining(fileName, str(tmp_path / "restored.trn"))
+    assert (tmp_path / "restored.trn").read_text() == "trained\n"
+    h5f = tables.open_file(fileName)
+    assert h5f.root.prodigalTraining._v_attrs.path == str(training)
+    h5f.close()
+
+@pytest.mark.parametrize("arguments", [["--train_prodigal", "1", "--prodigal_training", "training.trn"], ["--prodigal_training", "missing.trn"]])
+def test_launch_checks_training_arguments(tmp_path, monkeypatch, arguments):
+    """wrong training arguments are reported before the pangenome file is created"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "training.trn").write_text("trained\n")
+    parser = argparse.ArgumentParser()
+    syntaSubparser(parser.add_subparsers()).add_argument("-f", "--force", action = "store_true")
+    args = parser.parse_args(["annotate", "--fasta", "fasta.list", "-o", "output"] + arguments)
+    with pytest.raises(Exception, match = "--train_prodigal and --prodigal_training|does not exist"):
+        launch(args)
+    assert not (tmp_path / "output").exists()
+
+def test_train_prodigal_stops_at_training_size(tmp_path, monkeypatch):
+    """the genomes after the size Prodigal trains on are not read"""
+    monkeypatch.setattr(synta, "PRODIGAL_TRAINING_SIZE", 20)
+    given = []
+    monkeypatch.setattr(synta, "train_prodigal", lambda fnaFile, code, training, contigs, tmpdir : given.append(contigs))
+    fileNames = []
+    for i in range(3):
+        (tmp_path / f"org{i}.fna").write_text(">contig1\nACGTACGTACGT\n>contig2\nACGTACGTACGT\n>contig3\nACGT\n")
+        fileNames.append(str(tmp_path / f"org{i}.fna"))
+    fileNames.append(str(tmp_path / "missing.fna"))
+    assert synta.train_prodigal_on_genomes(fileNames, "11", str(tmp_path / "training.trn"), str(tmp_path)) == 1
+    assert list(given[0]) == ["0_contig1", "0_contig2"]
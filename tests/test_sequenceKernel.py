@@ -0,0 +1,42 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from ppanggolin.genome import Gene
+from ppanggolin.genetic_codes import genetic_codes
+from ppanggolin.sequenceKernel import reverse_complement, get_dna_sequence, translate
+
+def test_reverse_complement():
+    assert reverse_complement("") == ""
+    assert reverse_complement("ATGC") == "GCAT"
+    assert reverse_complement("AACGTTN") == "NAACGTT"
+    # IUPAC ambiguity codes are complemented too
+    assert reverse_complement("RYSWKMBVDH") == "DHBVKMWSRY"
+
+def test_get_dna_sequence():
+    contig = "AAATGCCCGGGTTT"
+    o_gene = Gene("gene")
+    o_gene.fill_annotations(start = 3, stop = 8, strand = "+")
+    assert get_dna_sequence(contig, o_gene) == "ATGCCC"
+    o_gene.fill_annotations(start = 3, stop = 8, strand = "-")
+    assert get_dna_sequence(contig, o_gene) == "GGGCAT"
+
+def test_translate():
+    assert translate("", "11") == ""
+    # the first codon is read from the start codon table
+    assert translate("TTGTTGTAA", "11") == "ML*"
+    assert translate("ATGTGA", "4") == "MW"
+    assert translate("ATGTGA", "11") == "M*"
+    # codons that are not in the table are unknown
+    assert translate("ATGNNNAXG", "11") == "MXX"
+    with pytest.raises(IndexError):
+        translate("ATGA", "11")
+
+def test_translate_all_codons():
+    for code in ["1", "4", "11"]:
+        table = genetic_codes(code)["trans_table"]
+        start_table = genetic_codes(code)["start_table"]
+        codons = list(table.keys())
+        assert translate("".join(codons), code)[1:] == "".join(table[codon] for codon in codons)[1:]
+        for codon in start_table:
+            assert translate(codon + codon, code) == start_table[codon] + table.get(codon, "X")
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+import io
+import random
+
+import pytest
+import tables
+
+from ppanggolin.formats import SequenceWriter, SequenceReader, AnnotationWriter, createPangenomeFile, getGeneIndexes, getGeneSequencesFromFile
+from ppanggolin.pangenome import Pangenome
+
+@pytest.fixture()
+def sequences():
+    rng = random.Random(0)
+    sequences = [ "".join(rng.choice("ACGT") for _ in range(rng.randint(0, 50))) for _ in range(200) ]
+    sequences[3] = "ACGNNTRYacgt"#bases that cannot be packed
+    sequences[-1] = "ACGTA"#the last byte is not full
+    return sequences
+
+@pytest.mark.parametrize("packed", [True, False])
+def test_roundtrip(sequences, packed, tmp_path):
+    fileName = str(tmp_path / "sequences.h5")
+    h5f = createPangenomeFile(fileName)
+    writer = SequenceWriter(h5f, "/", "sequences", packed = packed, chunk = 101)#so that the sequences are written in several chunks
+    for seq in sequences[:100]:
+        writer.append(seq)
+    writer.extend("".join(sequences[100:]).encode(), [ sum(len(seq) for seq in sequences[100:i + 1]) for i in range(100, len(sequences)) ])
+    writer.close()
+    h5f.close()
+
+    h5f = tables.open_file(fileName)
+    reader = SequenceReader(h5f.root.sequences, gap = 30)
+    assert len(reader) == len(sequences)
+    assert reader.read() == sequences
+    assert [ seq for _, chunk in reader.chunks(7) for seq in chunk ] == sequences
+    indices = [150, 3, 3, 0, 199, 42, 43]
+    assert reader[indices] == [ sequences[i] for i in indices ]
+    assert reader[[]] == []
+    h5f.close()
+
+@pytest.fixture()
+def pangenomeFile(sequences, make_org, tmp_path):
+    fileName = str(tmp_path / "pangenome.h5")
+    writer = AnnotationWriter(createPangenomeFile(fileName), sequences = True)
+    for orgIndex in range(4):
+        writer.addOrganism(make_org(f"org{orgIndex}", genes = [ dict(start = 1, stop = len(seq), strand = "+", dna = seq) for seq in sequences[orgIndex * 50:(orgIndex + 1) * 50] ]))
+    o_pang = Pangenome()
+    o_pang.status["genomesAnnotated"] = "inFile"
+    o_pang.status["geneSequences"] = "inFile"
+    writer.close(o_pang)
+    return fileName
+
+def test_getGeneIndexes(pangenomeFile):
+    h5f = tables.open_file(pangenomeFile)
+    assert getGeneIndexes(h5f, ["org2_CDS_7", "org0_CDS_3", "unknown", "org3_CDS_49"]).tolist() == [3, 107, 199]
+    assert getGeneIndexes(h5f, []).tolist() == []
+    h5f.close()
+
+@pytest.mark.parametrize("cpu", [1, 2])
+def test_getGeneSequencesFromFile(sequences, pangenomeFile, cpu):
+    fasta = io.StringIO()
+    getGeneSequencesFromFile(pangenomeFile, fasta, ["org1_CDS_2", "org0_CDS_3", "org3_CDS_49", "unknown"], cpu = cpu, chunk = 2)
+    assert fasta.getvalue() == f">org0_CDS_3\n{sequences[3]}\n>org1_CDS_2\n{sequences[52]}\n>org3_CDS_49\n{sequences[199]}\n"
+    fasta = io.StringIO()
+    getGeneSequencesFromFile(pangenomeFile, fasta, cpu = cpu, chunk = 30)
+    assert fasta.getvalue().split("\n")[1::2] == sequences
@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+
+import pytest
+import argparse
+import random
+import tables
+
+from ppanggolin.formats import writePangenome, readPangenome, SequenceReader, getContigIndex, createPangenomeFile, writeProdigalTraining
+from ppanggolin.formats.writeSequences import hasContigSequences
+from ppanggolin.annotate import writeContigSequences
+from ppanggolin.cluster import read_faa
+from ppanggolin.graph import computeNeighborsGraph
+from ppanggolin.nem.partition import partition
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.sequenceKernel import translate
+
+#the update workflow predicts the spots again, which needs rpy2
+pytest.importorskip("rpy2")
+import ppanggolin.workflow.update as update
+
+#10 core families, 10 shell families in half of the organisms, and 10 cloud families in a single one
+NB_ORG = 20
+CORE = range(0, 10)
+SHELL = range(10, 20)
+CLOUD = range(20, 30)
+CODONS = [ a + b + c for a in "ACGT" for b in "ACGT" for c in "ACGT" if a + b + c not in ["TAA", "TAG", "TGA"] ]
+
+def random_cds(rng, nb_codons = 30):
+    return "ATG" + "".join(rng.choice(CODONS) for _ in range(nb_codons)) + "TAA"
+
+def build_contig(families, famDNA):
+    """the contig sequence holding the genes of the given families one after the other, and the start and stop of each gene"""
+    seq = "GG"
+    positions = []
+    for fam in families:
+        positions.append((len(seq) + 1, len(seq) + len(famDNA[fam])))
+        seq += famDNA[fam] + "GG"
+    return seq, positions
+
+@pytest.fixture()
+def famDNA():
+    rng = random.Random(0)
+    return [ random_cds(rng) for _ in range(30) ]
+
+@pytest.fixture()
+def pangenomeFile(make_org, famDNA, tmp_path):
+    rng = random.Random(1)
+    fileName = str(tmp_path / "pangenome.h5")
+    o_pang = Pangenome()
+    genomes = tmp_path / "genomes.list"
+    with open(genomes, "w") as genomesList:
+        for i in range(NB_ORG):
+            families = list(CORE) + [ fam for fam in SHELL if rng.random() < 0.5 ] + [ CLOUD[i % len(CLOUD)] ]
+            seq, positions = build_contig(families, famDNA)
+            o_org = make_org(f"org{i}", genes = [ dict(start = start, stop = stop, strand = "+", dna = famDNA[fam]) for fam, (start, stop) in zip(families, positions) ])
+            o_pang.addOrganism(o_org)
+            for fam, gene in zip(families, o_org.genes):
+                o_fam = o_pang.addGeneFamily(f"fam{fam}")
+                if o_fam.sequence == "":
+                    o_fam.addSequence(translate(famDNA[fam], "11"))
+                o_fam.addGene(gene)
+            fasta = tmp_path / f"org{i}.fna"
+            fasta.write_text(f">contig\n{seq}\n")
+            genomesList.write(f"org{i}\t{fasta}\n")
+    for status in ["genomesAnnotated", "geneSequences", "genesClustered", "geneFamilySequences"]:
+        o_pang.status[status] = "Computed"
+    o_pang.parameters["cluster"] = {"coverage" : 0.8, "identity" : 0.8, "defragmentation" : False, "translation_table" : "11"}
+    computeNeighborsGraph(o_pang, show_bar = False)
+    partition(o_pang, str(tmp_path), K = 3, chunk_size = 100, show_bar = False)
+    writePangenome(o_pang, fileName, False, show_bar = False)
+    o_pang.addFile(fileName)
+    writeContigSequences(o_pang, str(genomes), show_bar = False)
+    return fileName
+
+@pytest.fixture()
+def newGenomes(famDNA, tmp_path):
+    """two genomes with the core genes and a gene of a new family, given by their gff"""
+    rng = random.Random(2)
+    newDNA = [ random_cds(rng) for _ in range(2) ]
+    genomes = tmp_path / "new_genomes.list"
+    with open(genomes, "w") as genomesList:
+        for i, dna in enumerate(newDNA):
+            seq, positions = build_contig(list(CORE) + [len(famDNA)], famDNA + [dna])
+            lines = ["##gff-version 3", f"##sequence-region ctg 1 {len(seq)}"]
+            lines += [ f"ctg\t.\tCDS\t{start}\t{stop}\t.\t+\t0\tID=cds{j}" for j, (start, stop) in enumerate(positions) ]
+            lines += ["##FASTA", ">ctg", seq]
+            gff = tmp_path / f"new{i}.gff"
+            gff.write_text("\n".join(lines) + "\n")
+            genomesList.write(f"new{i}\t{gff}\n")
+    return str(genomes), seq
+
+def read_fasta(fileName):
+    seqs = {}
+    with open(fileName) as fasta:
+        for line in fasta:
+            if line.startswith(">"):
+                name = line[1:].split()[0]
+                seqs[name] = ""
+            else:
+                seqs[name] += line.strip()
+    return seqs
+
+def fake_alignSeqToPang(famFile, geneFile, output, tmpdir, cpu = 1, defrag = False, identity = 0.8, coverage = 0.8, is_nucl = False, code = "11"):
+    """aligns the genes whose translation is the representative sequence of a family"""
+    prot2fam = { seq : fam for fam, seq in read_faa(famFile.name).items() }
+    outfile = output + "/input_to_pangenome_associations.blast-tab"
+    with open(outfile, "w") as aln:
+        for gene, dna in read_fasta(geneFile.name).items():
+            fam = prot2fam.get(translate(dna, code))
+            if fam is not None:
+                aln.write(f"{gene}\t{fam}\t100.0\n")
+    return outfile
+
+def fake_firstClustering(sequences, tmpdir, cpu, code, coverage, identity, mode):
+    """puts each gene in a family of its own"""
+    rep, tsv = tmpdir.name + "/representative_sequences.fasta", tmpdir.name + "/cluster.tsv"
+    with open(rep, "w") as repFile, open(tsv, "w") as tsvFile:
+        for gene, dna in read_fasta(sequences.name).items():
+            repFile.write(f">{gene}\n{translate(dna, code)}\n")
+            tsvFile.write(f"{gene}\t{gene}\n")
+    return rep, tsv
+
+def test_update(pangenomeFile, newGenomes, tmp_path, monkeypatch):
+    anno, newSeq = newGenomes
+    monkeypatch.setattr(update, "alignSeqToPang", fake_alignSeqToPang)
+    monkeypatch.setattr(update, "firstClustering", fake_firstClustering)
+    update.launch(argparse.Namespace(pangenome = pangenomeFile, tmpdir = str(tmp_path), cpu = 1, fasta = None, anno = anno, use_pseudo = False,
+                                     coverage = None, identity = None, mode = "1", seed = 42, show_prog_bars = False, force = False))
+
+    o_pang = Pangenome()
+    o_pang.addFile(pangenomeFile)
+    readPangenome(o_pang, annotation = True, geneFamilies = True, graph = True, show_bar = False)
+    assert o_pang.number_of_organisms() == NB_ORG + 2
+    organisms = { org.name : org for org in o_pang.organisms }
+    for i in range(2):
+        genes = sorted(organisms[f"new{i}"].genes, key = lambda gene : gene.start)
+        for fam, gene in zip(CORE, genes[:len(CORE)]):
+            assert gene.family.name == f"fam{fam}"
+        #the gene that aligns to no family is in a new one
+        assert genes[-1].family.name == genes[-1].ID
+        assert set(genes[-1].family.genes) == {genes[-1]}
+    assert len(o_pang.geneFamilies) == 30 + 2
+    assert all(fam.partition != "" for fam in o_pang.geneFamilies)
+    assert all(o_pang.getGeneFamily(f"fam{fam}").namedPartition == "persistent" for fam in CORE)
+    assert o_pang.parameters["partition"]["K"] == 3
+    assert o_pang.parameters["partition"]["chunk_size"] == 100
+
+    h5f = tables.open_file(pangenomeFile)
+    assert hasContigSequences(pangenomeFile)
+    contigIndex = getContigIndex(h5f)
+    contigs = SequenceReader(h5f.root.contigSequences)
+    assert contigs[[contigIndex[("new1", "ctg")]]] == [newSeq]
+    assert len(contigs[[contigIndex[("org0", "contig")]]][0]) > 0
+    h5f.close()
+
+def test_loadPangenome_not_partitionable(pangenomeFile):
+    h5f = tables.open_file(pangenomeFile, "a")
+    h5f.root.status._v_attrs.geneFamilySequences = False
+    h5f.close()
+    o_pang = Pangenome()
+    o_pang.addFile(pangenomeFile)
+    with pytest.raises(Exception, match = "representative sequences"):
+        update.loadPangenome(o_pang, show_bar = False)
+
+@pytest.mark.parametrize("stored", [True, False])
+def test_annotateNewGenomes_training(tmp_path, monkeypatch, stored):
+    """the new genomes are annotated with the Prodigal training stored in the pangenome file, even if the training file was removed"""
+    training = tmp_path / "prodigal_training.trn"
+    training.write_text("trained\n")
+    fileName = str(tmp_path / "pangenome.h5")
+    h5f = createPangenomeFile(fileName)
+    if stored:
+        writeProdigalTraining(h5f, str(training))
+    h5f.close()
+    training.unlink()
+    used = []
+    monkeypatch.setattr(update, "annotatePangenome", lambda pangenome, fasta, tmpdir, cpu, training = None, **kwargs : used.append(None if training is None else open(training).read()))
+    o_pang = Pangenome()
+    o_pang.file = fileName
+    o_pang.parameters["annotation"] = {"prodigal_training" : str(training)}
+    update.annotateNewGenomes(o_pang, str(tmp_path), 1, fasta = "genomes.list", show_bar = False)
+    assert used == (["trained\n"] if stored else [None])